@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -80,6 +81,26 @@ DATABASES = {
     }
 }
 
+# SQLite production profile, for serving with several gunicorn workers: set
+# ERP_SQLITE_PROFILE=production. WAL lets reads run while a write commits,
+# IMMEDIATE transactions take the write lock up front so a busy writer waits
+# out busy_timeout instead of failing with "database is locked", and the
+# posting services queue their writes per process (inventory/services/write_queue.py).
+# `manage.py benchmark_sqlite` compares throughput with and without it.
+SQLITE_PRODUCTION_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA mmap_size=268435456',
+        'PRAGMA cache_size=-65536',
+        'PRAGMA busy_timeout=20000',
+    ]),
+}
+SQLITE_WRITE_QUEUE = os.environ.get('ERP_SQLITE_PROFILE') == 'production'
+if SQLITE_WRITE_QUEUE:
+    DATABASES['default']['OPTIONS'] = SQLITE_PRODUCTION_OPTIONS
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -126,3 +147,29 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Delta sync and outbox relay cursors (inventory/services/cursors.py). On
+# databases that cannot list their open transactions (neither SQLite nor
+# PostgreSQL), a hole in the change or event IDs is skipped once the row
+# after it is this many seconds old. Defaults to 10.
+# SEQUENCE_GAP_GRACE_SECONDS = 10
+
+# In-process bitmap index over batch and item attributes
+# (inventory/services/bitmaps.py). When on, the batch list and inventory
+# report answer their filters, counts and low-stock totals in memory and
+# read only the page shown. Each worker builds its own copy on first use,
+# replays the sync change log on every query, and rebuilds at the first
+# use of a new day and once the copy is BITMAP_INDEX_MAX_AGE seconds old.
+# Off by default; the age defaults to 3600.
+# BITMAP_INDEX = True
+# BITMAP_INDEX_MAX_AGE = 3600
+
+# Shared read-only master-data snapshot (inventory/services/master_snapshot.py).
+# When on, items, approved suppliers, storage zones and active locations
+# for dropdowns, lookups and the item details API are read from one file
+# that every worker on the node maps, rebuilt when one of those tables
+# changes. The directory must be shared by the workers of a node and
+# writable by them. Off by default; the directory defaults to
+# BASE_DIR / 'master_snapshot'.
+# MASTER_SNAPSHOT = True
+# MASTER_SNAPSHOT_DIR = BASE_DIR / 'master_snapshot'
@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.utils.html import format_html
 from .models import (
     Supplier, ItemRecord, Product, ProductVersion, SupplierProduct, Batch,
-    StorageZone, StorageLocation, Customer, QAReview, QAReviewUnit, InventoryTransaction
+    StorageZone, StorageLocation, Customer, QAReview, QAReviewUnit, InventoryTransaction,
+    StorageOccupancy, TransactionDocuments, TransactionEquipment, TransactionDispatch, TransactionDisposal,
+    TransactionUsage, DeviceToken
 )
 
 # Master Data Admin
@@ -139,18 +141,26 @@ class StorageZoneAdmin(admin.ModelAdmin):
 
 @admin.register(StorageLocation)
 class StorageLocationAdmin(admin.ModelAdmin):
-    list_display = ['location_id', 'zone_id', 'rack_shelf', 'max_capacity', 'active']
+    list_display = ['location_id', 'zone_id', 'rack_shelf', 'max_capacity', 'occupied_quantity', 'active']
     list_filter = ['active', 'zone_id']
     search_fields = ['location_id', 'rack_shelf']
+    readonly_fields = ['occupied_quantity']
     fieldsets = (
         ('Location Information', {
             'fields': ('location_id', 'zone_id', 'rack_shelf')
         }),
         ('Capacity & Status', {
-            'fields': ('max_capacity', 'active')
+            'fields': ('max_capacity', 'capacity_quantity', 'capacity_unit', 'occupied_quantity', 'active')
         }),
     )
 
+@admin.register(StorageOccupancy)
+class StorageOccupancyAdmin(admin.ModelAdmin):
+    list_display = ['location', 'item', 'batch', 'quantity', 'updated_at']
+    list_filter = ['location__zone_id']
+    search_fields = ['location__location_id', 'item__item_name', 'batch__batch_id']
+    readonly_fields = ['location', 'item', 'batch', 'quantity', 'updated_at']
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['customer_code', 'customer_name', 'customer_type', 'city', 'country', 'approved']
@@ -221,10 +231,30 @@ class QAReviewUnitAdmin(admin.ModelAdmin):
     )
 
 # Inventory Transaction Admin
+class TransactionDetailInline(admin.StackedInline):
+    max_num = 1
+    can_delete = True
+    exclude = ['updated_at']
+
+class TransactionDocumentsInline(TransactionDetailInline):
+    model = TransactionDocuments
+
+class TransactionEquipmentInline(TransactionDetailInline):
+    model = TransactionEquipment
+
+class TransactionDispatchInline(TransactionDetailInline):
+    model = TransactionDispatch
+
+class TransactionDisposalInline(TransactionDetailInline):
+    model = TransactionDisposal
+
+class TransactionUsageInline(TransactionDetailInline):
+    model = TransactionUsage
+
 @admin.register(InventoryTransaction)
 class InventoryTransactionAdmin(admin.ModelAdmin):
     list_display = ['transaction_id', 'transaction_type', 'item_code', 'quantity', 'transaction_datetime', 'qa_status']
-    list_filter = ['transaction_type', 'qa_status', 'transaction_datetime', 'coa_provided', 'sds_provided']
+    list_filter = ['transaction_type', 'qa_status', 'transaction_datetime', 'documents__coa_provided', 'documents__sds_provided']
     search_fields = ['transaction_id', 'item_code__item_name', 'batch_id__batch_id', 'invoice_no']
     readonly_fields = ['transaction_id']
     date_hierarchy = 'transaction_datetime'
@@ -252,33 +282,22 @@ class InventoryTransactionAdmin(admin.ModelAdmin):
             'fields': ('quantity', 'unit')
         }),
         ('Document Status', {
-            'fields': ('coa_provided', 'sds_provided', 'label_applied')
+            'fields': ('label_applied',)
         }),
         ('Storage Information', {
             'fields': ('storage_zone', 'storage_location')
         }),
         ('QA Information', {
-            'fields': ('qa_status', 'qa_review_id', 'qa_file_link', 'sub_ingredient_log_id')
+            'fields': ('qa_status', 'qa_review_id')
         }),
-        ('Document Matching', {
-            'fields': ('coa_match', 'sds_match', 'spec_match')
-        }),
-        ('Usage Information', {
-            'fields': ('used_in', 'used_by', 'used_date', 'finished_date')
-        }),
-        ('Return & Adjustment', {
-            'fields': ('return_status', 'adjustment_reason')
-        }),
-        ('Equipment Information', {
-            'fields': ('serial_number', 'maintenance_due_date', 'calibration_date', 'condition', 'physical_location')
-        }),
-        ('Dispatch Information', {
-            'fields': ('recipient_contact', 'dispatch_method', 'dispatch_address', 'courier_name', 'tracking_number')
-        }),
-        ('Disposal Information', {
-            'fields': ('disposed_date', 'disposed_by', 'disposed_as', 'disposal_comments')
+        ('Adjustment', {
+            'fields': ('adjustment_reason',)
         }),
     )
+    inlines = [
+        TransactionDocumentsInline, TransactionEquipmentInline, TransactionDispatchInline, TransactionDisposalInline,
+        TransactionUsageInline,
+    ]
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
@@ -286,6 +305,17 @@ class InventoryTransactionAdmin(admin.ModelAdmin):
             'storage_zone', 'storage_location', 'qa_review_id'
         )
 
+@admin.register(DeviceToken)
+class DeviceTokenAdmin(admin.ModelAdmin):
+    list_display = ['device_id', 'user', 'active', 'created_at']
+    list_filter = ['active']
+    search_fields = ['device_id', 'user__username']
+    readonly_fields = ['key_digest', 'user', 'device_id', 'created_at']
+
+    def has_add_permission(self, request):
+        # Tokens are issued with the issue_device_token command, which shows the key once
+        return False
+
 # Customize admin site
 admin.site.site_header = "Pluviago ERP System"
 admin.site.site_title = "Pluviago ERP Admin"
@@ -0,0 +1,74 @@
+"""
+Authentication for the JSON APIs handhelds and scripts call.
+
+A device sends 'Authorization: Token <key>' with a key from
+issue_device_token; no cookie is involved, so such requests skip the CSRF
+check. Browser calls keep using the session and must still pass it
+(X-CSRFToken header). Anything else is answered 401 in JSON rather than
+redirected to the login page.
+"""
+import hashlib
+import secrets
+from functools import wraps
+
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import DeviceToken
+
+TOKEN_PREFIX = 'Token '
+
+
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue_device_token(user, device_id):
+    """Create a token for `device_id` acting as `user`; returns the key, which is not stored"""
+    key = secrets.token_urlsafe(32)
+    DeviceToken.objects.create(key_digest=_digest(key), user=user, device_id=device_id)
+    return key
+
+
+def device_token(request):
+    """Active token named by the Authorization header, or None"""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith(TOKEN_PREFIX):
+        return None
+    return (
+        DeviceToken.objects.select_related('user')
+        .filter(key_digest=_digest(header[len(TOKEN_PREFIX):].strip()), active=True, user__is_active=True)
+        .first()
+    )
+
+
+def _csrf_failure(request):
+    """The CSRF middleware's verdict for a session request: None, or its 403 response"""
+    return CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+
+
+def api_auth(view):
+    """
+    Require a device token or a logged-in session. Token requests get
+    `request.user` from the token and `request.device_token` set; session
+    requests get None there.
+    """
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.device_token = None
+        if request.headers.get('Authorization', '').startswith(TOKEN_PREFIX):
+            token = device_token(request)
+            if token is None:
+                return JsonResponse({'error': 'Invalid or revoked device token'}, status=401)
+            request.user = token.user
+            request.device_token = token
+        elif not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        else:
+            failure = _csrf_failure(request)
+            if failure is not None:
+                return failure
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,109 @@
+"""
+Conditional GET (ETag / Last-Modified) for pages and JSON endpoints.
+
+Validators are built from the per-table change counters kept in
+IdentifierSequence (services.lookups) and the `updated_at` columns, so a
+repeat request is answered with 304 after one or two small indexed reads,
+before the view runs any of its own queries. The ETag also covers the query
+string (the filter set of list pages), the user, the CSRF cookie and today's
+date, since pages render all of these.
+"""
+import hashlib
+from datetime import date
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .services.lookups import table_versions
+
+
+def _table(dependency):
+    return dependency if isinstance(dependency, str) else dependency._meta.db_table
+
+
+def _timestamped(dependency):
+    return not isinstance(dependency, str) and any(
+        field.name == 'updated_at' for field in dependency._meta.concrete_fields
+    )
+
+
+class Validators:
+    """ETag and Last-Modified of one request, computed once and shared by both callbacks"""
+
+    def __init__(self, request, dependencies, pk_kwarg, kwargs):
+        self.etag = None
+        self.last_modified = None
+        # Flash messages are consumed when rendered, so never answer 304 over them
+        if len(get_messages(request)):
+            return
+
+        tables = [_table(dependency) for dependency in dependencies]
+        versions = table_versions(tables)
+        pk = kwargs.get(pk_kwarg) if pk_kwarg else None
+        parts = [
+            request.path,
+            sorted(request.GET.lists()),
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            date.today().isoformat(),
+            [versions[table] for table in tables],
+        ]
+        self.etag = hashlib.md5(repr(parts).encode()).hexdigest()
+        if self.etag in request.headers.get('If-None-Match', ''):
+            # The ETag alone decides this request (If-Modified-Since is then ignored)
+            return
+
+        # Last-Modified only when every dependency carries updated_at; the
+        # ETag stays authoritative since deletes do not move any timestamp
+        if all(_timestamped(dependency) for dependency in dependencies):
+            main, *others = dependencies
+            if pk is not None:
+                # Detail URLs of coded tables carry the code, not the integer key
+                key_field = getattr(main._default_manager, 'code_field', 'pk')
+                stamps = [main.objects.filter(**{key_field: pk}).values_list('updated_at', flat=True).first()]
+            else:
+                stamps = [main.objects.aggregate(latest=Max('updated_at'))['latest']]
+            stamps += [model.objects.aggregate(latest=Max('updated_at'))['latest'] for model in others]
+            stamps = [stamp for stamp in stamps if stamp is not None]
+            self.last_modified = max(stamps) if stamps else None
+
+    @classmethod
+    def for_request(cls, request, dependencies, pk_kwarg, kwargs):
+        validators = getattr(request, '_conditional_validators', None)
+        if validators is None:
+            validators = request._conditional_validators = cls(request, dependencies, pk_kwarg, kwargs)
+        return validators
+
+
+def conditional_get(*dependencies, pk_kwarg=None):
+    """
+    Answer repeat GETs with 304 when nothing the view reads has changed.
+
+    `dependencies` are the models (or db_table names) the view reads, main
+    model first. With `pk_kwarg` the view is a detail page for the main
+    model's row with that primary key (or code); otherwise it is a list page and the
+    main model's latest `updated_at` is used.
+    """
+    def etag_func(request, *args, **kwargs):
+        return Validators.for_request(request, dependencies, pk_kwarg, kwargs).etag
+
+    def last_modified_func(request, *args, **kwargs):
+        return Validators.for_request(request, dependencies, pk_kwarg, kwargs).last_modified
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                # Browsers keep the copy but must revalidate it on every use
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
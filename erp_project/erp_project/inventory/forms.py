@@ -4,7 +4,8 @@ from .models import (
     CategoryChoices, ChemicalSubtypeChoices, BiologicalSubtypeChoices,
     PackagingSubtypeChoices, PlasticwaresSubtypeChoices, ElectricalSubtypeChoices,
     EquipmentSubtypeChoices, ConsumablesSubtypeChoices, StationerySubtypeChoices,
-    GradeChoices, HazardClassChoices, ChemicalFamilyChoices, UOMChoices
+    GradeChoices, HazardClassChoices, ChemicalFamilyChoices, UOMChoices,
+    SUBTYPE_CHOICES_BY_CATEGORY
 )
 
 class ItemRecordForm(forms.ModelForm):
@@ -45,24 +46,9 @@ class ItemRecordForm(forms.ModelForm):
     
     def get_subtype_choices(self, category):
         """Get appropriate subtype choices based on category"""
-        if category == CategoryChoices.BIOLOGICAL:
-            return [('', 'Select subtype')] + list(BiologicalSubtypeChoices.choices)
-        elif category == CategoryChoices.CHEMICAL:
-            return [('', 'Select subtype')] + list(ChemicalSubtypeChoices.choices)
-        elif category == CategoryChoices.PACKAGING:
-            return [('', 'Select subtype')] + list(PackagingSubtypeChoices.choices)
-        elif category == CategoryChoices.PLASTICWARES:
-            return [('', 'Select subtype')] + list(PlasticwaresSubtypeChoices.choices)
-        elif category == CategoryChoices.ELECTRICAL:
-            return [('', 'Select subtype')] + list(ElectricalSubtypeChoices.choices)
-        elif category == CategoryChoices.EQUIPMENT:
-            return [('', 'Select subtype')] + list(EquipmentSubtypeChoices.choices)
-        elif category == CategoryChoices.CONSUMABLES:
-            return [('', 'Select subtype')] + list(ConsumablesSubtypeChoices.choices)
-        elif category == CategoryChoices.STATIONERY:
-            return [('', 'Select subtype')] + list(StationerySubtypeChoices.choices)
-        else:
-            return [('', 'Select a category first')]
+        if category in SUBTYPE_CHOICES_BY_CATEGORY:
+            return [('', 'Select subtype')] + list(SUBTYPE_CHOICES_BY_CATEGORY[category])
+        return [('', 'Select a category first')]
 
 class SupplierForm(forms.ModelForm):
     """Form for creating/editing Supplier"""
@@ -157,15 +143,8 @@ class InventoryTransactionForm(forms.ModelForm):
             'recipient_code', 'recipient_company', 'invoice_no', 'invoice_date',
             'product_code', 'item_code', 'product_name', 'batch_id', 'unit_id',
             'mfg_date', 'expiry_date', 'opened_date', 'quantity', 'unit',
-            'coa_provided', 'sds_provided', 'label_applied', 'storage_zone',
-            'storage_location', 'qa_status', 'qa_review_id', 'qa_file_link',
-            'sub_ingredient_log_id', 'coa_match', 'sds_match', 'spec_match',
-            'used_in', 'used_by', 'used_date', 'finished_date', 'return_status',
-            'adjustment_reason', 'serial_number', 'maintenance_due_date',
-            'calibration_date', 'condition', 'physical_location',
-            'recipient_contact', 'dispatch_method', 'dispatch_address',
-            'courier_name', 'tracking_number', 'disposed_date', 'disposed_by',
-            'disposed_as', 'disposal_comments'
+            'label_applied', 'storage_zone', 'storage_location', 'qa_status',
+            'qa_review_id', 'adjustment_reason'
         ]
         widgets = {
             'transaction_id': forms.TextInput(attrs={'class': 'form-control'}),
@@ -189,38 +168,12 @@ class InventoryTransactionForm(forms.ModelForm):
             'opened_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control'}),
             'unit': forms.Select(attrs={'class': 'form-control'}),
-            'coa_provided': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-            'sds_provided': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'label_applied': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'storage_zone': forms.Select(attrs={'class': 'form-control'}),
             'storage_location': forms.Select(attrs={'class': 'form-control'}),
             'qa_status': forms.Select(attrs={'class': 'form-control'}),
             'qa_review_id': forms.Select(attrs={'class': 'form-control'}),
-            'qa_file_link': forms.TextInput(attrs={'class': 'form-control'}),
-            'sub_ingredient_log_id': forms.TextInput(attrs={'class': 'form-control'}),
-            'coa_match': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-            'sds_match': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-            'spec_match': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
-            'used_in': forms.TextInput(attrs={'class': 'form-control'}),
-            'used_by': forms.TextInput(attrs={'class': 'form-control'}),
-            'used_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'finished_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'return_status': forms.TextInput(attrs={'class': 'form-control'}),
             'adjustment_reason': forms.TextInput(attrs={'class': 'form-control'}),
-            'serial_number': forms.TextInput(attrs={'class': 'form-control'}),
-            'maintenance_due_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'calibration_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'condition': forms.Select(attrs={'class': 'form-control'}),
-            'physical_location': forms.TextInput(attrs={'class': 'form-control'}),
-            'recipient_contact': forms.TextInput(attrs={'class': 'form-control'}),
-            'dispatch_method': forms.Select(attrs={'class': 'form-control'}),
-            'dispatch_address': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-            'courier_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'tracking_number': forms.TextInput(attrs={'class': 'form-control'}),
-            'disposed_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'disposed_by': forms.TextInput(attrs={'class': 'form-control'}),
-            'disposed_as': forms.Select(attrs={'class': 'form-control'}),
-            'disposal_comments': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
 class QAReviewForm(forms.ModelForm):
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from inventory.services.segregation import audit_segregation, ZONE_NOT_PERMITTED
+
+
+class Command(BaseCommand):
+    help = 'Audit all storage locations for hazard segregation violations (intended to run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print violations as JSON instead of text'
+        )
+
+    def handle(self, *args, **options):
+        violations = audit_segregation()
+        
+        if options['json']:
+            self.stdout.write(json.dumps(violations, indent=2))
+            return
+        
+        for violation in violations:
+            if violation['type'] == ZONE_NOT_PERMITTED:
+                self.stdout.write(
+                    f"{violation['location_id']}: {violation['hazard_class']} not permitted in zone {violation['zone_id']}"
+                )
+            else:
+                self.stdout.write(
+                    f"{violation['location_id']}: {violation['hazard_class']} stored with "
+                    f"{', '.join(violation['conflicts_with'])}"
+                )
+        
+        if violations:
+            self.stdout.write(self.style.ERROR(f'{len(violations)} segregation violations found'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No segregation violations found'))
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+
+from inventory.models import InventoryTransaction, ItemRecord, StorageLocation, TransactionTypeChoices
+from inventory.services.sync import push_transactions
+
+# Connection options and write queue setting of each profile compared
+PROFILES = {
+    'default': ({}, False),
+    'production': (settings.SQLITE_PRODUCTION_OPTIONS, True),
+}
+
+
+def read(item_codes):
+    """A list page: one page of items and a ledger count"""
+    code = random.choice(item_codes)
+    list(ItemRecord.objects.filter(item_record_id__gte=code).order_by('item_record_id').values('item_record_id', 'item_name')[:25])
+    InventoryTransaction.objects.filter(item_code__item_record_id=code).count()
+
+
+def write(item_codes, location_ids):
+    """A handheld receipt posted through the sync API"""
+    push_transactions([{
+        'client_uuid': str(uuid.uuid4()),
+        'transaction_type': TransactionTypeChoices.RCV_PUR,
+        'item_code': random.choice(item_codes),
+        'storage_location': random.choice(location_ids) if location_ids else None,
+        'quantity': '1',
+    }], device_id='benchmark', user='benchmark')
+
+
+def run_thread(deadline, write_ratio, item_codes, location_ids, totals, lock):
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+    while time.monotonic() < deadline:
+        writing = random.random() < write_ratio
+        try:
+            if writing:
+                write(item_codes, location_ids)
+            else:
+                read(item_codes)
+            counts['writes' if writing else 'reads'] += 1
+        except DatabaseError as e:
+            counts['locked' if 'locked' in str(e) else 'errors'] += 1
+    connection.close()
+    with lock:
+        for name, value in counts.items():
+            totals[name] += value
+
+
+def run_worker(database, options, write_queue, threads, seconds, write_ratio, results):
+    """One gunicorn-like worker process with `threads` request threads"""
+    connections['default'].settings_dict.update(NAME=database, OPTIONS=options)
+    settings.SQLITE_WRITE_QUEUE = write_queue
+    item_codes = list(ItemRecord.objects.values_list('item_record_id', flat=True))
+    location_ids = list(StorageLocation.objects.filter(active=True).values_list('location_id', flat=True))
+    connection.close()
+
+    totals = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    workers = [
+        threading.Thread(target=run_thread, args=(deadline, write_ratio, item_codes, location_ids, totals, lock))
+        for _ in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    results.put(totals)
+
+
+class Command(BaseCommand):
+    help = 'Compare read and write throughput of concurrent workers with and without the SQLite production profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes')
+        parser.add_argument('--threads', type=int, default=4, help='Request threads per worker')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each run')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of requests that write')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite needs the SQLite database backend')
+        source = str(settings.DATABASES['default']['NAME'])
+        context = multiprocessing.get_context('fork')
+
+        self.stdout.write(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'locked':>8} {'errors':>8}")
+        with tempfile.TemporaryDirectory() as directory:
+            for profile, (profile_options, write_queue) in PROFILES.items():
+                # Every run starts from a copy of the database, in the journal mode of its profile
+                database = os.path.join(directory, f'{profile}.sqlite3')
+                original, copy = sqlite3.connect(source), sqlite3.connect(database)
+                original.backup(copy)
+                copy.execute('PRAGMA journal_mode=WAL' if write_queue else 'PRAGMA journal_mode=DELETE')
+                original.close()
+                copy.close()
+                connections.close_all()
+
+                results = context.Queue()
+                processes = [
+                    context.Process(target=run_worker, args=(
+                        database, profile_options, write_queue, options['threads'], options['seconds'],
+                        options['write_ratio'], results,
+                    ))
+                    for _ in range(options['workers'])
+                ]
+                for process in processes:
+                    process.start()
+                totals = {'reads': 0, 'writes': 0, 'locked': 0, 'errors': 0}
+                for _ in processes:
+                    for name, value in results.get().items():
+                        totals[name] += value
+                for process in processes:
+                    process.join()
+
+                seconds = options['seconds']
+                self.stdout.write(
+                    f"{profile:<12} {totals['reads'] / seconds:>10.1f} {totals['writes'] / seconds:>10.1f} "
+                    f"{totals['locked']:>8} {totals['errors']:>8}"
+                )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.master_snapshot import build, TABLE_SPECS
+
+
+class Command(BaseCommand):
+    help = 'Write the shared master-data snapshot file that worker processes map read-only'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Write to this file instead of MASTER_SNAPSHOT_DIR'
+        )
+
+    def handle(self, *args, **options):
+        path = build(options['path'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(TABLE_SPECS)} tables to {path}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.reviews import recompute_review_schedule, review_queue_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute next review due dates for all suppliers and supplier-products (Logic C5)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing review schedule...')
+        updated = recompute_review_schedule()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {updated['suppliers']} suppliers and "
+                f"{updated['supplier_products']} supplier-products"
+            )
+        )
+        
+        counts = review_queue_counts()
+        for key, label in (('suppliers', 'Suppliers'), ('supplier_products', 'Supplier-products')):
+            self.stdout.write(
+                f"{label}: {counts[key]['overdue']} overdue, {counts[key]['due_soon']} due soon"
+            )
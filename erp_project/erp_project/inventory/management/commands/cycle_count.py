@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import CountSession, StorageZone
+from inventory.services.counts import (
+    start_session, record_counts, parse_counts_csv, variances, post_adjustments, CountError
+)
+
+
+class Command(BaseCommand):
+    help = 'Run a cycle count or physical inventory: start, load scanned counts, review and post variances'
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        start = actions.add_parser('start', help='Open a count session and freeze expected balances')
+        start.add_argument('--zone', help='Storage zone to count (default: every location)')
+        start.add_argument('--location', action='append', dest='locations', help='Location to count (repeatable)')
+        start.add_argument('--name', default='', help='Description of the count')
+        start.add_argument('--user', default='system', help='User recorded on the session')
+
+        load = actions.add_parser('load', help='Load a CSV of scanned counts (location,item,batch,quantity)')
+        load.add_argument('count_id')
+        load.add_argument('csv_file')
+        load.add_argument('--user', default='system', help='User recorded on the counted lines')
+
+        review = actions.add_parser('variances', help='Summarise the variances of a session')
+        review.add_argument('count_id')
+        review.add_argument('--uncounted-as-zero', action='store_true', help='Full physical inventory: uncounted lines count as zero')
+
+        post = actions.add_parser('post', help='Post variances as ADJ-GAIN/ADJ-LOSS transactions')
+        post.add_argument('count_id')
+        post.add_argument('--reason', required=True, help='Adjustment reason written to every transaction')
+        post.add_argument('--uncounted-as-zero', action='store_true', help='Full physical inventory: uncounted lines count as zero')
+        post.add_argument('--user', default='system', help='User recorded on the adjustments')
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(options)
+        except CountError as e:
+            raise CommandError(str(e))
+
+    def get_session(self, count_id):
+        try:
+            return CountSession.objects.get(count_id=count_id)
+        except CountSession.DoesNotExist:
+            raise CommandError(f'Count session {count_id} not found')
+
+    def handle_start(self, options):
+        zone = None
+        if options['zone']:
+            zone = StorageZone.objects.filter(zone_id=options['zone']).first()
+            if zone is None:
+                raise CommandError(f"Storage zone {options['zone']} not found")
+        session = start_session(options['user'], zone=zone, location_ids=options['locations'], name=options['name'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Started {session.count_id} with {session.lines.count()} expected lines'
+        ))
+
+    def handle_load(self, options):
+        session = self.get_session(options['count_id'])
+        with open(options['csv_file'], encoding='utf-8-sig', newline='') as handle:
+            entries = parse_counts_csv(handle.read())
+        result = record_counts(session, entries, options['user'])
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f'Rejected: {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {len(entries)} rows: {result['updated']} lines counted, {result['added']} unexpected lines added, "
+            f"{len(result['errors'])} rejected"
+        ))
+
+    def handle_variances(self, options):
+        session = self.get_session(options['count_id'])
+        _, summary = variances(session, options['uncounted_as_zero'])
+        self.stdout.write(
+            f"{session.count_id}: {summary['counted']}/{summary['lines']} lines counted, "
+            f"{summary['with_variance']} with a variance (gain {summary['gain'] or 0}, loss {summary['loss'] or 0})"
+        )
+
+    def handle_post(self, options):
+        session = self.get_session(options['count_id'])
+        rows = post_adjustments(session, options['user'], options['reason'], options['uncounted_as_zero'])
+        self.stdout.write(self.style.SUCCESS(f'Posted {len(rows)} adjustment transactions for {session.count_id}'))
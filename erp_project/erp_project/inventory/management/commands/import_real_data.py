@@ -8,6 +8,7 @@ from inventory.models import (
     Supplier, ItemRecord, Batch, InventoryTransaction, StorageZone, StorageLocation,
     CategoryChoices, GradeChoices, UOMChoices, TransactionTypeChoices, QAStatusChoices
 )
+from inventory.services.records import LedgerWriter
 
 class Command(BaseCommand):
     help = 'Import real data from CSV files into the ERP system'
@@ -35,6 +36,8 @@ class Command(BaseCommand):
 
         try:
             with transaction.atomic():
+                self.ledger = LedgerWriter()
+                
                 # Step 1: Create storage zones and locations
                 self.create_storage_infrastructure()
                 
@@ -47,6 +50,10 @@ class Command(BaseCommand):
                 # Step 4: Import transaction data
                 self.import_transaction_data(data_dir)
                 
+                # Write the ledger rows still queued
+                self.ledger.flush()
+                self.stdout.write(f'Wrote {self.ledger.written} transactions')
+                
                 self.stdout.write(
                     self.style.SUCCESS('Data import completed successfully!')
                 )
@@ -420,11 +427,11 @@ class Command(BaseCommand):
         transaction_id = f"TXN-{received_dt.strftime('%Y%m%d')}-{batch.batch_id[:6]}" if received_dt else f"TXN-{timezone.now().strftime('%Y%m%d')}-{batch.batch_id[:6]}"
         
         # Check if transaction already exists
-        if InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
+        if transaction_id in self.ledger or InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
             return
             
-        # Create transaction
-        transaction = InventoryTransaction.objects.create(
+        # Queue transaction (written in bulk by the ledger writer)
+        self.ledger.add(
             transaction_id=transaction_id,
             transaction_datetime=timezone.now(),
             transaction_user='system_import',
@@ -439,13 +446,11 @@ class Command(BaseCommand):
             supplier_name=supplier.supplier_name,
             mfg_date=batch.received_date,
             expiry_date=batch.expiry_date,
-            coa_provided=coa == 'ü',
-            sds_provided=sds == 'ü',
-            spec_match=spec == 'ü',
             qa_status=batch.qa_status,
             invoice_no=invoice_no,
             invoice_date=invoice_dt,
-            comments=f'Imported from stock data - {batch.batch_number}'
+            comments=f'Imported from stock data - {batch.batch_number}',
+            details={'coa_provided': coa == 'ü', 'sds_provided': sds == 'ü', 'spec_match': spec == 'ü'},
         )
         
         self.stdout.write(f'Created transaction: {transaction_id}')
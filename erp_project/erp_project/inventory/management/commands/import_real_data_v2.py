@@ -1,7 +1,6 @@
-import csv
 import os
-from datetime import datetime
-from django.core.management.base import BaseCommand
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 from inventory.models import (
@@ -9,16 +8,59 @@ from inventory.models import (
     CategoryChoices, GradeChoices, UOMChoices, TransactionTypeChoices, QAStatusChoices,
     Customer
 )
+from inventory.services import import_validation
+from inventory.services.records import LedgerWriter
+from inventory.services import source_schemas
+from inventory.services.workbooks import WorkbookSet, WorkbookError
+
+# Source workbooks. Each sheet is read from <workbook>.xlsx when it is in
+# the data directory, otherwise from its CSV export <workbook>_<sheet>.csv
+STOCK_WORKBOOK = 'LPS2.Stock details -Pluviago (2) (1)'
+TRANSACTION_WORKBOOK = 'AS.1.List Incoming _Out Going... (1)'
+
+# Stock sheets and the category their items are imported under
+STOCK_SHEETS = {
+    'LP3aEquipment': 'Equipment',
+    'LP3bChemicals': 'Chemical',
+    'LP3cPBR1': 'Biological',
+    'LP3dGlasswares': 'Plasticwares',
+    'LP3ePlasticwares': 'Plasticwares',
+    'LP3fDisposables': 'Consumables',
+    'LP3gStationery': 'Stationery',
+    'LP3hBiological_samples': 'Biological',
+    'LP3iOthers': 'Consumables',
+    'LP3jElectricals': 'Electrical',
+    'LP3kmiscellaneous': 'Consumables'
+}
+PBR_SHEET = 'PBR'
+PBR1_SHEET = 'LP3cPBR1'
+INCOMING_SHEET = 'Incoming_details'
+OUTGOING_SHEET = 'Outgoing_details'
+
 
 class Command(BaseCommand):
-    help = 'Import real data from CSV files into the ERP system (Version 2)'
+    help = 'Import real data from the source workbooks (or their CSV exports) into the ERP system (Version 2)'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--data-dir',
             type=str,
             default='Public/data',
-            help='Directory containing the CSV data files'
+            help='Directory containing the source workbooks (.xlsx) or their per-sheet CSV exports'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the source files and report problems without writing to the database'
+        )
+        parser.add_argument(
+            '--report',
+            help='Write the validation report (every issue, as JSON) to this file'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Import even when validation finds errors (rows with errors are skipped or defaulted)'
         )
 
     def handle(self, *args, **options):
@@ -30,12 +72,30 @@ class Command(BaseCommand):
             )
             return
 
+        with WorkbookSet() as self.workbooks:
+            report = self.validate(data_dir, options.get('report'))
+            if options.get('dry_run'):
+                self.stdout.write(self.style.SUCCESS(
+                    f'Dry run: {len(report.errors)} errors, {len(report.warnings)} warnings; nothing was imported'
+                ))
+                return
+            if report.errors and not options.get('force'):
+                raise CommandError(
+                    f'Validation found {len(report.errors)} errors; nothing was imported. '
+                    'Fix the source files or pass --force to import anyway'
+                )
+            self.run_import(data_dir)
+
+    def run_import(self, data_dir):
+        """Import every source inside one transaction"""
         self.stdout.write(
             self.style.SUCCESS('Starting comprehensive data import process...')
         )
 
         try:
             with transaction.atomic():
+                self.ledger = LedgerWriter()
+                
                 # Step 1: Create storage infrastructure
                 self.create_storage_infrastructure()
                 
@@ -54,6 +114,10 @@ class Command(BaseCommand):
                 # Step 6: Import transaction data
                 self.import_transaction_data(data_dir)
                 
+                # Write the ledger rows still queued
+                self.ledger.flush()
+                self.stdout.write(f'Wrote {self.ledger.written} transactions')
+                
                 self.stdout.write(
                     self.style.SUCCESS('Comprehensive data import completed successfully!')
                 )
@@ -64,6 +128,54 @@ class Command(BaseCommand):
             )
             raise
 
+    def source(self, data_dir, workbook, sheet):
+        """
+        (name, raw rows) for one sheet: streamed from the workbook when it
+        is present, else from the sheet's CSV export. Rows are None when
+        neither exists.
+        """
+        workbook_path = os.path.join(data_dir, f'{workbook}.xlsx')
+        if os.path.exists(workbook_path):
+            try:
+                if self.workbooks.has_sheet(workbook_path, sheet):
+                    return f'{workbook}.xlsx [{sheet}]', self.workbooks.rows(workbook_path, sheet)
+            except WorkbookError as e:
+                self.stdout.write(self.style.WARNING(f'{e}; falling back to CSV exports'))
+        csv_name = f'{workbook}_{sheet}.csv'
+        csv_path = os.path.join(data_dir, csv_name)
+        if os.path.exists(csv_path):
+            return csv_name, source_schemas.csv_rows(csv_path)
+        return csv_name, None
+
+    def source_files(self, data_dir):
+        """Every sheet the import reads as (name, raw rows, schema it is validated against)"""
+        sheets = [(STOCK_WORKBOOK, sheet, source_schemas.STOCK) for sheet in STOCK_SHEETS]
+        sheets += [
+            (STOCK_WORKBOOK, PBR_SHEET, source_schemas.PBR),
+            (STOCK_WORKBOOK, PBR1_SHEET, source_schemas.PBR1),
+            (TRANSACTION_WORKBOOK, INCOMING_SHEET, source_schemas.INCOMING),
+            (TRANSACTION_WORKBOOK, OUTGOING_SHEET, source_schemas.OUTGOING),
+        ]
+        return [(*self.source(data_dir, workbook, sheet), schema) for workbook, sheet, schema in sheets]
+
+    def validate(self, data_dir, report_path=None, limit=20):
+        """Validate every source file before anything is written"""
+        self.stdout.write('Validating source files...')
+        report = import_validation.validate_sources(self.source_files(data_dir))
+        for filename, counts in report.files.items():
+            if counts['error'] or counts['warning']:
+                self.stdout.write(
+                    f"  {filename}: {counts['rows']} rows, {counts['error']} errors, {counts['warning']} warnings"
+                )
+        for (filename, column, severity, message), count in import_validation.summarise(report)[:limit]:
+            style = self.style.ERROR if severity == import_validation.ERROR else self.style.WARNING
+            where = f'{filename} [{column}]' if column else filename
+            self.stdout.write(style(f'  {count} x {where}: {message}'))
+        if report_path:
+            report.write(report_path)
+            self.stdout.write(f'Validation report written to {report_path}')
+        return report
+
     def create_storage_infrastructure(self):
         """Create basic storage zones and locations"""
         self.stdout.write('Creating storage infrastructure...')
@@ -289,72 +401,50 @@ class Command(BaseCommand):
         """Import stock data from all category files"""
         self.stdout.write('Importing stock data...')
         
-        # Define file mappings
-        file_mappings = {
-            'LP3aEquipment.csv': 'Equipment',
-            'LP3bChemicals.csv': 'Chemical',
-            'LP3cPBR1.csv': 'Biological',
-            'LP3dGlasswares.csv': 'Plasticwares',
-            'LP3ePlasticwares.csv': 'Plasticwares',
-            'LP3fDisposables.csv': 'Consumables',
-            'LP3gStationery.csv': 'Stationery',
-            'LP3hBiological_samples.csv': 'Biological',
-            'LP3iOthers.csv': 'Consumables',
-            'LP3jElectricals.csv': 'Electrical',
-            'LP3kmiscellaneous.csv': 'Consumables'
-        }
-        
-        for filename, category in file_mappings.items():
-            filepath = os.path.join(data_dir, f'LPS2.Stock details -Pluviago (2) (1)_{filename}')
-            if os.path.exists(filepath):
-                self.import_category_data(filepath, category)
+        for sheet, category in STOCK_SHEETS.items():
+            name, rows = self.source(data_dir, STOCK_WORKBOOK, sheet)
+            if rows is not None:
+                self.import_category_data(name, rows, category)
             else:
-                self.stdout.write(f'Warning: File {filepath} not found')
+                self.stdout.write(f'Warning: File {name} not found')
 
-    def import_category_data(self, filepath, category):
-        """Import data from a specific category file"""
-        self.stdout.write(f'Importing {category} data from {os.path.basename(filepath)}...')
+    def import_category_data(self, name, rows, category):
+        """Import data from a specific category sheet"""
+        self.stdout.write(f'Importing {category} data from {name}...')
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        self.process_stock_row(row, category)
-                    except Exception as e:
-                        self.stdout.write(f'Error processing row: {row.get("Name", "Unknown")} - {str(e)}')
-                        continue
+            for row in source_schemas.read_records(rows, source_schemas.STOCK):
+                try:
+                    self.process_stock_row(row, category)
+                except Exception as e:
+                    self.stdout.write(f'Error processing row: {row.name} - {str(e)}')
+                    continue
                         
         except Exception as e:
-            self.stdout.write(f'Error reading file {filepath}: {str(e)}')
+            self.stdout.write(f'Error reading file {name}: {str(e)}')
 
     def process_stock_row(self, row, category):
-        """Process a single stock row"""
-        # Skip empty rows
-        if not row.get('Name') or row['Name'].strip() == '':
-            return
-            
+        """Process a single stock row (a source_schemas.STOCK record)"""
         # Extract data from row
-        item_name = row['Name'].strip()
-        grade = row.get('Grade', '').strip()
-        product_code = row.get('Product code', '').strip()
-        lot_no = row.get('Lot No.', '').strip()
-        quantity = row.get('Qty', '').strip()
-        unit = row.get('Unit', '').strip()
-        brand = row.get('Brand', '').strip()
-        supplier_name = row.get('Supplier', '').strip()
-        received_date = row.get('Received on', '').strip()
-        mfg_date = row.get('Mfg. Date/QC* release date', '').strip()
-        expiry_date = row.get('Exp./Retest* Date', '').strip()
-        opened_date = row.get('Opened on', '').strip()
-        finished_date = row.get('Finished on', '').strip()
-        coa = row.get('COA', '').strip()
-        spec = row.get('Spec', '').strip()
-        sds = row.get('SDS', '').strip()
-        comments = row.get('Comments', '').strip()
-        invoice_no = row.get('Invoice No.', '').strip()
-        invoice_date = row.get('Invoice date', '').strip()
+        item_name = row.name
+        grade = row.grade
+        product_code = row.product_code
+        lot_no = row.lot_no
+        quantity = row.quantity
+        unit = row.unit
+        brand = row.brand
+        supplier_name = row.supplier
+        received_date = row.received_on
+        mfg_date = row.mfg_date
+        expiry_date = row.expiry_date
+        opened_date = row.opened_on
+        finished_date = row.finished_on
+        coa = row.coa
+        spec = row.spec
+        sds = row.sds
+        comments = row.comments
+        invoice_no = row.invoice_no
+        invoice_date = row.invoice_date
         
         # Create or get supplier
         supplier = self.get_or_create_supplier(supplier_name)
@@ -383,47 +473,42 @@ class Command(BaseCommand):
         """Import PBR equipment data (special format)"""
         self.stdout.write('Importing PBR equipment data...')
         
-        # Import PBR.csv
-        pbr_file = os.path.join(data_dir, 'LPS2.Stock details -Pluviago (2) (1)_PBR.csv')
-        if os.path.exists(pbr_file):
-            self.import_pbr_file(pbr_file)
+        # Import PBR sheet
+        _, rows = self.source(data_dir, STOCK_WORKBOOK, PBR_SHEET)
+        if rows is not None:
+            self.import_pbr_file(rows)
         
-        # Import PBR1.csv (already handled in stock data, but with special processing)
-        pbr1_file = os.path.join(data_dir, 'LPS2.Stock details -Pluviago (2) (1)_LP3cPBR1.csv')
-        if os.path.exists(pbr1_file):
-            self.import_pbr1_file(pbr1_file)
+        # Import PBR1 sheet (already handled in stock data, but with special processing)
+        _, rows = self.source(data_dir, STOCK_WORKBOOK, PBR1_SHEET)
+        if rows is not None:
+            self.import_pbr1_file(rows)
 
-    def import_pbr_file(self, filepath):
+    def import_pbr_file(self, rows):
         """Import PBR equipment file"""
         self.stdout.write('Importing PBR equipment...')
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        self.process_pbr_row(row)
-                    except Exception as e:
-                        self.stdout.write(f'Error processing PBR row: {str(e)}')
-                        continue
+            for row in source_schemas.read_records(rows, source_schemas.PBR):
+                try:
+                    self.process_pbr_row(row)
+                except Exception as e:
+                    self.stdout.write(f'Error processing PBR row: {str(e)}')
+                    continue
                         
         except Exception as e:
             self.stdout.write(f'Error reading PBR file: {str(e)}')
 
     def process_pbr_row(self, row):
-        """Process PBR equipment row"""
-        item_name = row.get('Item', '').strip()
-        if not item_name:
-            return
-            
-        quantity = row.get('Qty', '').strip()
-        unit = row.get('Unit', '').strip()
-        brand = row.get('Brand', '').strip()
-        supplier_name = row.get('Supplier', '').strip()
-        purchased_date = row.get('Purchased on', '').strip()
-        finished_date = row.get('Finished on ', '').strip()
-        comments = row.get('Comments', '').strip()
+        """Process PBR equipment row (a source_schemas.PBR record)"""
+        item_name = row.item
+        quantity = row.quantity
+        unit = row.unit
+        brand = row.brand
+        supplier_name = row.supplier
+        purchased_date = row.purchased_on
+        purchased_text = row.purchased_on_text
+        finished_date = row.finished_on
+        comments = row.comments
         
         # Create or get supplier
         supplier = self.get_or_create_supplier(supplier_name)
@@ -435,7 +520,7 @@ class Command(BaseCommand):
         )
         
         # Create batch
-        batch_id = f"PBR-{item_name[:10].upper().replace(' ', '')}-{purchased_date[:10]}" if purchased_date else f"PBR-{item_name[:10].upper().replace(' ', '')}"
+        batch_id = f"PBR-{item_name[:10].upper().replace(' ', '')}-{purchased_text[:10]}" if purchased_text else f"PBR-{item_name[:10].upper().replace(' ', '')}"
         
         batch = self.get_or_create_batch(
             batch_id, item_record, supplier, quantity, unit,
@@ -449,39 +534,34 @@ class Command(BaseCommand):
                 purchased_date, '', '', False, False, False
             )
 
-    def import_pbr1_file(self, filepath):
+    def import_pbr1_file(self, rows):
         """Import PBR1 components file"""
         self.stdout.write('Importing PBR1 components...')
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        self.process_pbr1_row(row)
-                    except Exception as e:
-                        self.stdout.write(f'Error processing PBR1 row: {str(e)}')
-                        continue
+            for row in source_schemas.read_records(rows, source_schemas.PBR1):
+                try:
+                    self.process_pbr1_row(row)
+                except Exception as e:
+                    self.stdout.write(f'Error processing PBR1 row: {str(e)}')
+                    continue
                         
         except Exception as e:
             self.stdout.write(f'Error reading PBR1 file: {str(e)}')
 
     def process_pbr1_row(self, row):
-        """Process PBR1 component row"""
-        item_name = row.get('Item', '').strip()
-        if not item_name:
-            return
-            
-        quantity = row.get('Qty', '').strip()
-        unit = row.get('Unit', '').strip()
-        brand = row.get('Brand', '').strip()
-        supplier_name = row.get('Supplier', '').strip()
-        purchased_date = row.get('Purchased on', '').strip()
-        finished_date = row.get('Finished on ', '').strip()
-        comments = row.get('Comments', '').strip()
-        invoice_no = row.get('Invoice no.', '').strip()
-        invoice_date = row.get('Invoice date', '').strip()
+        """Process PBR1 component row (a source_schemas.PBR1 record)"""
+        item_name = row.item
+        quantity = row.quantity
+        unit = row.unit
+        brand = row.brand
+        supplier_name = row.supplier
+        purchased_date = row.purchased_on
+        purchased_text = row.purchased_on_text
+        finished_date = row.finished_on
+        comments = row.comments
+        invoice_no = row.invoice_no
+        invoice_date = row.invoice_date
         
         # Create or get supplier
         supplier = self.get_or_create_supplier(supplier_name)
@@ -493,7 +573,7 @@ class Command(BaseCommand):
         )
         
         # Create batch
-        batch_id = f"PBR1-{item_name[:10].upper().replace(' ', '')}-{purchased_date[:10]}" if purchased_date else f"PBR1-{item_name[:10].upper().replace(' ', '')}"
+        batch_id = f"PBR1-{item_name[:10].upper().replace(' ', '')}-{purchased_text[:10]}" if purchased_text else f"PBR1-{item_name[:10].upper().replace(' ', '')}"
         
         batch = self.get_or_create_batch(
             batch_id, item_record, supplier, quantity, unit,
@@ -632,11 +712,11 @@ class Command(BaseCommand):
         transaction_id = f"TXN-{received_dt.strftime('%Y%m%d')}-{batch.batch_id[:6]}" if received_dt else f"TXN-{timezone.now().strftime('%Y%m%d')}-{batch.batch_id[:6]}"
         
         # Check if transaction already exists
-        if InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
+        if transaction_id in self.ledger or InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
             return
             
-        # Create transaction
-        transaction = InventoryTransaction.objects.create(
+        # Queue transaction (written in bulk by the ledger writer)
+        self.ledger.add(
             transaction_id=transaction_id,
             transaction_datetime=timezone.now(),
             transaction_user='system_import',
@@ -651,35 +731,26 @@ class Command(BaseCommand):
             supplier_name=supplier.supplier_name,
             mfg_date=batch.received_date,
             expiry_date=batch.expiry_date,
-            coa_provided=coa == 'ü',
-            sds_provided=sds == 'ü',
-            spec_match=spec == 'ü',
             qa_status=batch.qa_status,
             invoice_no=invoice_no,
             invoice_date=invoice_dt,
-            comments=f'Imported from stock data - {batch.batch_id}'
+            comments=f'Imported from stock data - {batch.batch_id}',
+            details={'coa_provided': coa == 'ü', 'sds_provided': sds == 'ü', 'spec_match': spec == 'ü'},
         )
         
         self.stdout.write(f'Created transaction: {transaction_id}')
 
     def parse_date(self, date_str):
         """Parse date string to datetime object"""
+        if isinstance(date_str, date):
+            # Already parsed by the source schema
+            return date_str
         if not date_str or date_str.strip() == '':
             return None
             
         date_str = date_str.strip()
         
-        # Handle various date formats
-        date_formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%d',
-            '%d-%m-%Y',
-            '%d/%m/%Y',
-            '%d-%m-%y',
-            '%d/%m/%y'
-        ]
-        
-        for fmt in date_formats:
+        for fmt in source_schemas.DATE_FORMATS:
             try:
                 return datetime.strptime(date_str, fmt).date()
             except ValueError:
@@ -692,51 +763,45 @@ class Command(BaseCommand):
         self.stdout.write('Importing transaction data...')
         
         # Import incoming transactions
-        incoming_file = os.path.join(data_dir, 'AS.1.List Incoming _Out Going... (1)_Incoming_details.csv')
-        if os.path.exists(incoming_file):
-            self.import_incoming_transactions(incoming_file)
+        _, rows = self.source(data_dir, TRANSACTION_WORKBOOK, INCOMING_SHEET)
+        if rows is not None:
+            self.import_incoming_transactions(rows)
         
         # Import outgoing transactions
-        outgoing_file = os.path.join(data_dir, 'AS.1.List Incoming _Out Going... (1)_Outgoing_details.csv')
-        if os.path.exists(outgoing_file):
-            self.import_outgoing_transactions(outgoing_file)
+        _, rows = self.source(data_dir, TRANSACTION_WORKBOOK, OUTGOING_SHEET)
+        if rows is not None:
+            self.import_outgoing_transactions(rows)
 
-    def import_incoming_transactions(self, filepath):
+    def import_incoming_transactions(self, rows):
         """Import incoming transaction data"""
         self.stdout.write('Importing incoming transactions...')
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        self.process_incoming_row(row)
-                    except Exception as e:
-                        self.stdout.write(f'Error processing incoming row: {str(e)}')
-                        continue
+            for row in source_schemas.read_records(rows, source_schemas.INCOMING):
+                try:
+                    self.process_incoming_row(row)
+                except Exception as e:
+                    self.stdout.write(f'Error processing incoming row: {str(e)}')
+                    continue
                         
         except Exception as e:
             self.stdout.write(f'Error reading incoming file: {str(e)}')
 
     def process_incoming_row(self, row):
-        """Process incoming transaction row"""
+        """Process incoming transaction row (a source_schemas.INCOMING record)"""
         # Extract data
-        product_name = row.get('Product Name', '').strip()
-        quantity = row.get('Qty. Received', '').strip()
-        batch_no = row.get('Batch  No', '').strip()
-        product_code = row.get('Product code', '').strip()
-        mfg_date = row.get('Mfg.Date', '').strip()
-        expiry_date = row.get('Expiry Date', '').strip()
-        manufacturer = row.get('Manufacturer name', '').strip()
-        supplier_name = row.get('     Sample Received From', '').strip()
-        received_date = row.get('Received Date', '').strip()
-        invoice_no = row.get('Invoice no:', '').strip()
-        invoice_date = row.get('Invoice date ', '').strip()
-        comment = row.get('Comment', '').strip()
-        
-        if not product_name:
-            return
+        product_name = row.product_name
+        quantity = row.quantity
+        batch_no = row.batch_no
+        product_code = row.product_code
+        mfg_date = row.mfg_date
+        expiry_date = row.expiry_date
+        manufacturer = row.manufacturer
+        supplier_name = row.supplier
+        received_date = row.received_date
+        invoice_no = row.invoice_no
+        invoice_date = row.invoice_date
+        comment = row.comment
             
         # Create or get supplier
         supplier = self.get_or_create_supplier(supplier_name)
@@ -761,38 +826,35 @@ class Command(BaseCommand):
                     received_date, invoice_no, invoice_date, True, True, True
                 )
 
-    def import_outgoing_transactions(self, filepath):
+    def import_outgoing_transactions(self, rows):
         """Import outgoing transaction data"""
         self.stdout.write('Importing outgoing transactions...')
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                for row in reader:
-                    try:
-                        self.process_outgoing_row(row)
-                    except Exception as e:
-                        self.stdout.write(f'Error processing outgoing row: {str(e)}')
-                        continue
+            for row in source_schemas.read_records(rows, source_schemas.OUTGOING):
+                try:
+                    self.process_outgoing_row(row)
+                except Exception as e:
+                    self.stdout.write(f'Error processing outgoing row: {str(e)}')
+                    continue
                         
         except Exception as e:
             self.stdout.write(f'Error reading outgoing file: {str(e)}')
 
     def process_outgoing_row(self, row):
-        """Process outgoing transaction row"""
+        """Process outgoing transaction row (a source_schemas.OUTGOING record)"""
         # Extract data
-        product_name = row.get('Product Name', '').strip()
-        quantity = row.get('Qty. Sent', '').strip()
-        batch_no = row.get('Batch  No', '').strip()
-        mfg_date = row.get('Mfg.Date', '').strip()
-        expiry_date = row.get('Expiry .Date', '').strip()
-        manufacturer = row.get('Manufacturer name', '').strip()
-        customer_name = row.get('     Sample Sent to', '').strip()
-        sent_date = row.get('Sent Date', '').strip()
-        courier_details = row.get('Courier details', '').strip()
-        
-        if not product_name or not customer_name:
+        product_name = row.product_name
+        quantity = row.quantity
+        batch_no = row.batch_no
+        mfg_date = row.mfg_date
+        expiry_date = row.expiry_date
+        manufacturer = row.manufacturer
+        customer_name = row.customer
+        sent_date = row.sent_date
+        courier_details = row.courier_details
+        
+        if not customer_name:
             return
             
         # Get or create customer
@@ -863,11 +925,11 @@ class Command(BaseCommand):
         transaction_id = f"TXN-{sent_dt.strftime('%Y%m%d')}-OUT-{item_record.item_record_id[:6]}" if sent_dt else f"TXN-{timezone.now().strftime('%Y%m%d')}-OUT-{item_record.item_record_id[:6]}"
         
         # Check if transaction already exists
-        if InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
+        if transaction_id in self.ledger or InventoryTransaction.objects.filter(transaction_id=transaction_id).exists():
             return
             
-        # Create transaction
-        transaction = InventoryTransaction.objects.create(
+        # Queue transaction (written in bulk by the ledger writer)
+        self.ledger.add(
             transaction_id=transaction_id,
             transaction_datetime=timezone.now(),
             transaction_user='system_import',
@@ -880,10 +942,12 @@ class Command(BaseCommand):
             unit=item_record.unit_of_measure,
             recipient_code=customer,
             recipient_company=customer.customer_name,
-            recipient_contact=customer.contact_person,
-            dispatch_method='Courier',
-            courier_name=courier_details,
-            comments=f'Outgoing shipment - {customer.customer_name}'
+            comments=f'Outgoing shipment - {customer.customer_name}',
+            details={
+                'recipient_contact': customer.contact_person,
+                'dispatch_method': 'Courier',
+                'courier_name': courier_details,
+            },
         )
         
         self.stdout.write(f'Created outgoing transaction: {transaction_id}') 
\ No newline at end of file
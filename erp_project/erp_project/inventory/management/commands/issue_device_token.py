@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.api_auth import issue_device_token
+
+
+class Command(BaseCommand):
+    help = 'Issue an API token for a handheld; the key is printed once and only its digest is stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the device acts as')
+        parser.add_argument('device_id', help='Handheld the token is for')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        key = issue_device_token(user, options['device_id'][:50])
+        self.stdout.write(self.style.SUCCESS(f"Token for {options['device_id']}: {key}"))
@@ -240,8 +240,8 @@ class Command(BaseCommand):
     def create_supplier_products(self):
         supplier_products = [
             {
-                'item_code_id': 'CHE-SOL-ETH-001',
-                'supplier_name_id': 'SUP-CHEMCO',
+                'item_code': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
+                'supplier_name': Supplier.objects.get(supplier_id='SUP-CHEMCO'),
                 'manufacturer_name': 'Chemical Co. Ltd.',
                 'grade': 'USP',
                 'product_code': 'ETH-99.9-1L',
@@ -257,8 +257,8 @@ class Command(BaseCommand):
                 'review_frequency': '6 months'
             },
             {
-                'item_code_id': 'BIO-RM-ALG-001',
-                'supplier_name_id': 'SUP-ALGAMO',
+                'item_code': ItemRecord.objects.get(item_record_id='BIO-RM-ALG-001'),
+                'supplier_name': Supplier.objects.get(supplier_id='SUP-ALGAMO'),
                 'manufacturer_name': 'Algamo S.R.O.',
                 'grade': 'USP',
                 'product_code': 'ALG-EXT-1KG',
@@ -277,8 +277,8 @@ class Command(BaseCommand):
         
         for sp_data in supplier_products:
             supplier_product, created = SupplierProduct.objects.get_or_create(
-                item_code_id=sp_data['item_code_id'],
-                supplier_name_id=sp_data['supplier_name_id'],
+                item_code=sp_data['item_code'],
+                supplier_name=sp_data['supplier_name'],
                 defaults=sp_data
             )
             if created:
@@ -326,7 +326,7 @@ class Command(BaseCommand):
                 'received_date': timezone.now().date() - timedelta(days=30),
                 'expiry_date': timezone.now().date() + timedelta(days=365),
                 'qa_status': 'Approved',
-                'storage_location': 'LOC-CHEM-A1'
+                'storage_location': StorageLocation.objects.get(location_id='LOC-CHEM-A1')
             },
             {
                 'batch_id': 'BATCH-BIO-RM-ALG-001-20240720-001',
@@ -336,7 +336,7 @@ class Command(BaseCommand):
                 'received_date': timezone.now().date() - timedelta(days=15),
                 'expiry_date': timezone.now().date() + timedelta(days=730),
                 'qa_status': 'Approved',
-                'storage_location': 'LOC-BIO-A1'
+                'storage_location': StorageLocation.objects.get(location_id='LOC-BIO-A1')
             }
         ]
         
@@ -352,9 +352,9 @@ class Command(BaseCommand):
         qa_reviews = [
             {
                 'qa_review_id': 'QA-20240720-001',
-                'batch_number_id': Batch.objects.get(batch_id='BATCH-CHE-SOL-ETH-001-20240720-001'),
-                'item_code_id': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
-                'supplier_code_id': Supplier.objects.get(supplier_id='SUP-CHEMCO'),
+                'batch_number': Batch.objects.get(batch_id='BATCH-CHE-SOL-ETH-001-20240720-001'),
+                'item_code': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
+                'supplier_code': Supplier.objects.get(supplier_id='SUP-CHEMCO'),
                 'coa_match': True,
                 'sds_match': True,
                 'spec_match': True,
@@ -370,9 +370,9 @@ class Command(BaseCommand):
             },
             {
                 'qa_review_id': 'QA-20240720-002',
-                'batch_number_id': Batch.objects.get(batch_id='BATCH-BIO-RM-ALG-001-20240720-001'),
-                'item_code_id': ItemRecord.objects.get(item_record_id='BIO-RM-ALG-001'),
-                'supplier_code_id': Supplier.objects.get(supplier_id='SUP-ALGAMO'),
+                'batch_number': Batch.objects.get(batch_id='BATCH-BIO-RM-ALG-001-20240720-001'),
+                'item_code': ItemRecord.objects.get(item_record_id='BIO-RM-ALG-001'),
+                'supplier_code': Supplier.objects.get(supplier_id='SUP-ALGAMO'),
                 'coa_match': True,
                 'sds_match': False,
                 'spec_match': True,
@@ -403,26 +403,28 @@ class Command(BaseCommand):
                 'transaction_datetime': timezone.now() - timedelta(days=30),
                 'transaction_user': 'admin',
                 'transaction_type': 'RCV-PUR',
-                'item_code_id': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
+                'item_code': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
                 'product_code': 'ETH-99.9-1L',
                 'product_name': 'Ethanol 99.9%',
                 'batch_id': Batch.objects.get(batch_id='BATCH-CHE-SOL-ETH-001-20240720-001'),
                 'quantity': 10.0,
                 'unit': 'L',
-                'supplier_code_id': Supplier.objects.get(supplier_id='SUP-CHEMCO'),
+                'supplier_code': Supplier.objects.get(supplier_id='SUP-CHEMCO'),
                 'supplier_name': 'Chemical Co. Ltd.',
                 'invoice_no': 'INV-2024-001',
                 'invoice_date': timezone.now().date() - timedelta(days=30),
-                'coa_provided': True,
-                'sds_provided': True,
                 'label_applied': True,
-                'storage_zone_id': StorageZone.objects.get(zone_id='ZONE-CHEM-001'),
-                'storage_location_id': StorageLocation.objects.get(location_id='LOC-CHEM-A1'),
+                'storage_zone': StorageZone.objects.get(zone_id='ZONE-CHEM-001'),
+                'storage_location': StorageLocation.objects.get(location_id='LOC-CHEM-A1'),
                 'qa_status': 'Approved',
                 'qa_review_id': QAReview.objects.get(qa_review_id='QA-20240720-001'),
-                'coa_match': True,
-                'sds_match': True,
-                'spec_match': True,
+                'details': {
+                    'coa_provided': True,
+                    'sds_provided': True,
+                    'coa_match': True,
+                    'sds_match': True,
+                    'spec_match': True,
+                },
                 'mfg_date': timezone.now().date() - timedelta(days=35),
                 'expiry_date': timezone.now().date() + timedelta(days=365),
                 'comments': 'Initial receipt of ethanol batch'
@@ -432,26 +434,28 @@ class Command(BaseCommand):
                 'transaction_datetime': timezone.now() - timedelta(days=15),
                 'transaction_user': 'admin',
                 'transaction_type': 'RCV-PUR',
-                'item_code_id': ItemRecord.objects.get(item_record_id='BIO-RM-ALG-001'),
+                'item_code': ItemRecord.objects.get(item_record_id='BIO-RM-ALG-001'),
                 'product_code': 'ALG-EXT-1KG',
                 'product_name': 'Algae Extract',
                 'batch_id': Batch.objects.get(batch_id='BATCH-BIO-RM-ALG-001-20240720-001'),
                 'quantity': 5.0,
                 'unit': 'kg',
-                'supplier_code_id': Supplier.objects.get(supplier_id='SUP-ALGAMO'),
+                'supplier_code': Supplier.objects.get(supplier_id='SUP-ALGAMO'),
                 'supplier_name': 'Algamo S.R.O.',
                 'invoice_no': 'INV-2024-002',
                 'invoice_date': timezone.now().date() - timedelta(days=15),
-                'coa_provided': True,
-                'sds_provided': False,
                 'label_applied': True,
-                'storage_zone_id': StorageZone.objects.get(zone_id='ZONE-BIO-001'),
-                'storage_location_id': StorageLocation.objects.get(location_id='LOC-BIO-A1'),
+                'storage_zone': StorageZone.objects.get(zone_id='ZONE-BIO-001'),
+                'storage_location': StorageLocation.objects.get(location_id='LOC-BIO-A1'),
                 'qa_status': 'Approved',
                 'qa_review_id': QAReview.objects.get(qa_review_id='QA-20240720-002'),
-                'coa_match': True,
-                'sds_match': False,
-                'spec_match': True,
+                'details': {
+                    'coa_provided': True,
+                    'sds_provided': False,
+                    'coa_match': True,
+                    'sds_match': False,
+                    'spec_match': True,
+                },
                 'mfg_date': timezone.now().date() - timedelta(days=20),
                 'expiry_date': timezone.now().date() + timedelta(days=730),
                 'comments': 'Receipt of algae extract for production'
@@ -461,26 +465,31 @@ class Command(BaseCommand):
                 'transaction_datetime': timezone.now() - timedelta(days=5),
                 'transaction_user': 'admin',
                 'transaction_type': 'ISS-MFG',
-                'item_code_id': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
+                'item_code': ItemRecord.objects.get(item_record_id='CHE-SOL-ETH-001'),
                 'product_code': 'ETH-99.9-1L',
                 'product_name': 'Ethanol 99.9%',
                 'batch_id': Batch.objects.get(batch_id='BATCH-CHE-SOL-ETH-001-20240720-001'),
                 'quantity': 2.0,
                 'unit': 'L',
-                'used_in': 'BATCH-PRD-001',
-                'used_by': 'Production Team',
-                'used_date': timezone.now().date() - timedelta(days=5),
-                'storage_zone_id': StorageZone.objects.get(zone_id='ZONE-CHEM-001'),
-                'storage_location_id': StorageLocation.objects.get(location_id='LOC-CHEM-A1'),
+                'details': {
+                    'used_in': 'BATCH-PRD-001',
+                    'used_by': 'Production Team',
+                    'used_date': timezone.now().date() - timedelta(days=5),
+                },
+                'storage_zone': StorageZone.objects.get(zone_id='ZONE-CHEM-001'),
+                'storage_location': StorageLocation.objects.get(location_id='LOC-CHEM-A1'),
                 'qa_status': 'Approved',
                 'comments': 'Issued for manufacturing batch PRD-001'
             }
         ]
         
         for txn_data in transactions:
+            details = txn_data.pop('details', None)
             transaction, created = InventoryTransaction.objects.get_or_create(
                 transaction_id=txn_data['transaction_id'],
                 defaults=txn_data
             )
             if created:
+                if details:
+                    transaction.save_details(**details)
                 self.stdout.write(f'Created transaction: {transaction.transaction_id}') 
\ No newline at end of file
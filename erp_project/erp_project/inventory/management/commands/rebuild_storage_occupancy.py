@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.storage import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Rebuild storage location occupancy from the inventory transaction ledger'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding storage occupancy from the ledger...')
+        slots = rebuild_occupancy()
+        self.stdout.write(
+            self.style.SUCCESS(f'Storage occupancy rebuilt: {slots} occupied location slots')
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the supplier, customer and item related-row counts and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drifted rows, do not fix them'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(fix=not options['check'])
+        for counter, rows in drift.items():
+            if rows:
+                self.stdout.write(self.style.WARNING(f'{counter}: {rows} rows off'))
+        total = sum(drift.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS('All counters match'))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(f'{total} counter values drifted (not fixed)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {total} counter values'))
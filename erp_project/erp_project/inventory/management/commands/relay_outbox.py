@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.services.outbox import get_sink, relay_batch, prune_delivered, RELAY_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Stream outbox events in order to a sink (file, socket or webhook) with at-least-once delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sink',
+            default='file',
+            help='Sink name (file, socket, webhook) or dotted path to a sink class'
+        )
+        parser.add_argument(
+            '--target',
+            required=True,
+            help='File path, socket path or host:port, or webhook URL'
+        )
+        parser.add_argument(
+            '--consumer',
+            default='default',
+            help='Consumer name; each consumer keeps its own delivery cursor'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RELAY_BATCH_SIZE,
+            help='Events per delivery'
+        )
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep running and poll for new events'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds between polls when idle in --follow mode'
+        )
+        parser.add_argument(
+            '--max-retries',
+            type=int,
+            default=5,
+            help='Consecutive sink failures tolerated before giving up'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete events every consumer has acknowledged, after relaying'
+        )
+
+    def handle(self, *args, **options):
+        sink = get_sink(options['sink'], options['target'])
+        delivered = 0
+        failures = 0
+        
+        try:
+            while True:
+                try:
+                    sent = relay_batch(sink, options['consumer'], options['batch_size'])
+                    failures = 0
+                except OSError as e:
+                    failures += 1
+                    if failures > options['max_retries']:
+                        raise CommandError(f'Sink failed {failures} times in a row: {e}')
+                    self.stderr.write(f'Sink error ({e}); retrying')
+                    time.sleep(min(2 ** failures, 60))
+                    continue
+                
+                delivered += sent
+                if sent:
+                    continue
+                if not options['follow']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.close()
+        
+        self.stdout.write(self.style.SUCCESS(f'Delivered {delivered} events to {options["sink"]}'))
+        if options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Pruned {prune_delivered()} acknowledged events'))
@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from inventory.services.jobs import run_pending, requeue_stale, worker_name
+
+
+def work(poll_interval, once):
+    """Worker process loop: drain due jobs, then poll"""
+    worker = worker_name()
+    while True:
+        ran = run_pending(worker)
+        if once:
+            return
+        if not ran:
+            requeue_stale()
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (imports, exports, recomputes) from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to start'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run every job that is due, then exit'
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} jobs from workers that stopped responding'))
+        
+        workers = max(options['workers'], 1)
+        if workers == 1:
+            self.stdout.write(f'Worker {worker_name()} started')
+            work(options['poll_interval'], options['once'])
+            return
+        
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(options['poll_interval'], options['once']), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(self.style.SUCCESS(f'Started {workers} job workers'))
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.services.snapshots import take_snapshot, refresh_stale, prune_daily, DAILY, MONTHLY
+
+
+class Command(BaseCommand):
+    help = 'Snapshot closing stock balances and costing state for fast as-of queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Day to snapshot (YYYY-MM-DD); defaults to yesterday, or the last day of the previous month with --period monthly'
+        )
+        parser.add_argument(
+            '--period',
+            choices=[DAILY, MONTHLY],
+            default=DAILY,
+            help='Monthly snapshots are kept when daily ones are pruned'
+        )
+        parser.add_argument(
+            '--prune-daily',
+            type=int,
+            metavar='DAYS',
+            help='Also delete daily snapshots older than this many days'
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['date']:
+            as_of = parse_date(options['date'])
+            if as_of is None:
+                raise CommandError('--date must be YYYY-MM-DD')
+        elif options['period'] == MONTHLY:
+            as_of = today.replace(day=1) - timedelta(days=1)
+        else:
+            as_of = today - timedelta(days=1)
+        
+        for stale in refresh_stale():
+            self.stdout.write(f'Re-took stale {stale.period} snapshot for {stale.as_of}')
+
+        run = take_snapshot(as_of, options['period'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{run.period.capitalize()} snapshot for {run.as_of}: {run.positions} balances, {run.costs.count()} item cost states'
+        ))
+        
+        if options['prune_daily'] is not None:
+            deleted = prune_daily(today - timedelta(days=options['prune_daily']))
+            self.stdout.write(f'Pruned {deleted} rows of old daily snapshots')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_supplier_next_review_due_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['next_review_due'], name='supplier_review_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierproduct',
+            index=models.Index(fields=['next_review_due'], name='supplier_prod_review_due_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:13
+
+import re
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of the model helpers as they stood when this migration was written
+HAZARD_CLASSES = ['Flammable', 'Oxidizer', 'Corrosive', 'Toxic', 'Reactive', 'None']
+
+
+def parse_capacity(max_capacity):
+    match = re.match(r'^\s*([\d][\d,]*(?:\.\d+)?)\s*(.*?)\s*$', max_capacity or '')
+    if not match:
+        return None, ''
+    try:
+        return Decimal(match.group(1).replace(',', '')), match.group(2)[:20]
+    except InvalidOperation:
+        return None, ''
+
+
+def parse_hazard_compatibility(hazard_compatibility):
+    canonical = {value.lower(): value for value in HAZARD_CLASSES}
+    hazards = set()
+    for token in re.split(r'[,;/]', hazard_compatibility or ''):
+        token = token.strip()
+        if token:
+            hazards.add(canonical.get(token.lower(), token))
+    return hazards
+
+
+def parse_existing_storage(apps, schema_editor):
+    """Fill numeric capacities and the zone hazard index from the free-text fields"""
+    StorageZone = apps.get_model('inventory', 'StorageZone')
+    StorageZoneHazard = apps.get_model('inventory', 'StorageZoneHazard')
+    StorageLocation = apps.get_model('inventory', 'StorageLocation')
+
+    StorageZoneHazard.objects.bulk_create([
+        StorageZoneHazard(zone_id=zone_id, hazard_class=hazard)
+        for zone_id, compatibility in StorageZone.objects.values_list('zone_id', 'hazard_compatibility')
+        for hazard in parse_hazard_compatibility(compatibility)
+    ])
+
+    locations = list(StorageLocation.objects.exclude(max_capacity=''))
+    for location in locations:
+        location.capacity_quantity, location.capacity_unit = parse_capacity(location.max_capacity)
+    StorageLocation.objects.bulk_update(locations, ['capacity_quantity', 'capacity_unit'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_review_due_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, help_text='Quantity on hand at this location', max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'storage_occupancy',
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageZoneHazard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hazard_class', models.CharField(help_text='Hazard permitted in the zone', max_length=50)),
+            ],
+            options={
+                'db_table': 'storage_zone_hazard',
+            },
+        ),
+        migrations.AddField(
+            model_name='storagelocation',
+            name='capacity_quantity',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Numeric capacity parsed from max_capacity', max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='storagelocation',
+            name='capacity_unit',
+            field=models.CharField(blank=True, help_text='Unit the capacity is expressed in', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='storagelocation',
+            name='occupied_quantity',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Quantity currently stored, maintained from the ledger', max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='storagelocation',
+            index=models.Index(fields=['zone_id', 'active', 'occupied_quantity'], name='location_fill_idx'),
+        ),
+        migrations.AddField(
+            model_name='storageoccupancy',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Batch stored (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.batch'),
+        ),
+        migrations.AddField(
+            model_name='storageoccupancy',
+            name='item',
+            field=models.ForeignKey(help_text='Item stored', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AddField(
+            model_name='storageoccupancy',
+            name='location',
+            field=models.ForeignKey(help_text='Storage location', on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='inventory.storagelocation'),
+        ),
+        migrations.AddField(
+            model_name='storagezonehazard',
+            name='zone',
+            field=models.ForeignKey(help_text='Storage zone', on_delete=django.db.models.deletion.CASCADE, related_name='hazards', to='inventory.storagezone'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='storageoccupancy',
+            unique_together={('location', 'batch', 'item')},
+        ),
+        migrations.AddIndex(
+            model_name='storagezonehazard',
+            index=models.Index(fields=['hazard_class', 'zone'], name='zone_hazard_lookup_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='storagezonehazard',
+            unique_together={('zone', 'hazard_class')},
+        ),
+        migrations.RunPython(parse_existing_storage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_storage_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdentifierSequence',
+            fields=[
+                ('name', models.CharField(help_text='Sequence name', max_length=50, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveBigIntegerField(default=0, help_text='Last number handed out')),
+            ],
+            options={
+                'db_table': 'identifier_sequence',
+            },
+        ),
+    ]
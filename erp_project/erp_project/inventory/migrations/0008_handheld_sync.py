@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_identifier_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('seq', models.BigAutoField(help_text='Server change-sequence number', primary_key=True, serialize=False)),
+                ('entity', models.CharField(help_text='Synced entity (item, batch, location, balance)', max_length=20)),
+                ('object_key', models.CharField(help_text='Primary key of the changed record', max_length=300)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'sync_change',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncPush',
+            fields=[
+                ('client_uuid', models.UUIDField(help_text='Client-generated idempotency key', primary_key=True, serialize=False)),
+                ('device_id', models.CharField(blank=True, help_text='Handheld that queued the transaction', max_length=50)),
+                ('status', models.CharField(choices=[('applied', 'Applied'), ('conflict', 'Conflict')], help_text='Whether the transaction was posted', max_length=20)),
+                ('transaction_id', models.CharField(blank=True, help_text='Ledger row created for the push', max_length=20)),
+                ('conflict', models.CharField(blank=True, help_text='Conflict code when not applied', max_length=50)),
+                ('detail', models.CharField(blank=True, help_text='Conflict explanation', max_length=500)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'sync_push',
+                'indexes': [models.Index(fields=['device_id', 'received_at'], name='sync_push_device_idx')],
+            },
+        ),
+    ]
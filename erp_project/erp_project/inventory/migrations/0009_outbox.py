@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_handheld_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxCursor',
+            fields=[
+                ('consumer', models.CharField(help_text='Relay consumer name', max_length=50, primary_key=True, serialize=False)),
+                ('last_event_id', models.BigIntegerField(default=0, help_text='Highest event ID acknowledged by the sink')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'outbox_cursor',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(help_text='Delivery order', primary_key=True, serialize=False)),
+                ('event_type', models.CharField(help_text='e.g. inventory_transaction.created', max_length=50)),
+                ('aggregate', models.CharField(help_text='Entity the event is about', max_length=30)),
+                ('aggregate_id', models.CharField(help_text='Primary key of that entity', max_length=100)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Event body')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'outbox_event',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last modification time, used for HTTP cache validators'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last modification time, used for HTTP cache validators'),
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last modification time, used for HTTP cache validators'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last modification time, used for HTTP cache validators'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last modification time, used for HTTP cache validators'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, help_text='Quantity on hand at the end of the day', max_digits=14)),
+            ],
+            options={
+                'db_table': 'balance_snapshot',
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshotRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(help_text='Day whose closing balances the snapshot holds', unique=True)),
+                ('period', models.CharField(choices=[('daily', 'Daily'), ('monthly', 'Monthly')], default='daily', help_text='Daily snapshots may be pruned; monthly ones are kept for audit', max_length=10)),
+                ('positions', models.PositiveIntegerField(default=0, help_text='Balance rows in the snapshot')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'balance_snapshot_run',
+                'ordering': ['-as_of'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CostSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, help_text='Quantity on hand across all locations', max_digits=14)),
+                ('average_cost', models.DecimalField(decimal_places=4, default=0, help_text='Moving weighted-average unit cost', max_digits=14)),
+                ('fifo_layers', models.JSONField(default=list, help_text='Open receipt layers, oldest first, as [unit_cost, quantity] strings')),
+            ],
+            options={
+                'db_table': 'cost_snapshot',
+            },
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Unit cost on the vendor invoice, used for stock valuation', max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['transaction_datetime'], name='txn_datetime_idx'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Batch (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.batch'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='item',
+            field=models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='location',
+            field=models.ForeignKey(blank=True, help_text='Storage location (blank for stock without one)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.storagelocation'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='zone',
+            field=models.ForeignKey(blank=True, help_text='Zone of the location, copied for zone queries', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.storagezone'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='run',
+            field=models.ForeignKey(help_text='Snapshot the row belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='inventory.balancesnapshotrun'),
+        ),
+        migrations.AddField(
+            model_name='costsnapshot',
+            name='item',
+            field=models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AddField(
+            model_name='costsnapshot',
+            name='run',
+            field=models.ForeignKey(help_text='Snapshot the row belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='costs', to='inventory.balancesnapshotrun'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['run', 'zone'], name='balance_snapshot_zone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['run', 'item'], name='balance_snapshot_item_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='costsnapshot',
+            unique_together={('run', 'item')},
+        ),
+    ]
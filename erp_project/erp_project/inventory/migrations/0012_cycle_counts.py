@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_balance_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountSession',
+            fields=[
+                ('count_id', models.CharField(help_text='e.g. CNT-20240720-001', max_length=30, primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, help_text='What is being counted', max_length=200)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('posted', 'Posted'), ('cancelled', 'Cancelled')], default='open', help_text='Open sessions accept counts; posting writes the adjustments', max_length=20)),
+                ('created_by', models.CharField(help_text='User who started the count', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('posted_by', models.CharField(blank=True, help_text='User who posted the adjustments', max_length=50)),
+                ('posted_at', models.DateTimeField(blank=True, help_text='When the adjustments were posted', null=True)),
+                ('adjustment_reason', models.CharField(blank=True, help_text='Reason written to the adjustment transactions', max_length=200)),
+                ('zone', models.ForeignKey(blank=True, help_text='Zone in scope (blank with explicit locations or for a full count)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.storagezone')),
+            ],
+            options={
+                'db_table': 'count_session',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expected_quantity', models.DecimalField(decimal_places=2, default=0, help_text='On hand when the count started', max_digits=12)),
+                ('counted_quantity', models.DecimalField(blank=True, decimal_places=2, help_text='Physically counted (blank until counted)', max_digits=12, null=True)),
+                ('variance', models.DecimalField(blank=True, decimal_places=2, help_text='Counted minus expected', max_digits=12, null=True)),
+                ('counted_by', models.CharField(blank=True, help_text='User or device that submitted the count', max_length=50)),
+                ('counted_at', models.DateTimeField(blank=True, help_text='When the count was submitted', null=True)),
+                ('adjustment_transaction_id', models.CharField(blank=True, help_text='ADJ-GAIN/ADJ-LOSS ledger row posted for the variance', max_length=20)),
+                ('batch', models.ForeignKey(blank=True, help_text='Batch (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.batch')),
+                ('item', models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord')),
+                ('location', models.ForeignKey(help_text='Counted location', on_delete=django.db.models.deletion.CASCADE, to='inventory.storagelocation')),
+                ('session', models.ForeignKey(help_text='Count session', on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.countsession')),
+            ],
+            options={
+                'db_table': 'count_line',
+                'unique_together': {('session', 'location', 'batch', 'item')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:34
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_cycle_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('task', models.CharField(help_text='Registered task name (services.jobs.TASKS)', max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Keyword arguments for the task')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', help_text='Lifecycle state', max_length=20)),
+                ('priority', models.SmallIntegerField(default=0, help_text='Lower runs first')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Runs started so far')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, help_text='Runs allowed before the job fails')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Not picked up before this time (retry back-off)')),
+                ('progress', models.FloatField(default=0, help_text='Fraction done, 0 to 1')),
+                ('progress_message', models.CharField(blank=True, help_text='Latest progress note from the task', max_length=500)),
+                ('cancel_requested', models.BooleanField(default=False, help_text='Set to stop a running job at its next progress report')),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Return value of the task', null=True)),
+                ('error', models.TextField(blank=True, help_text='Traceback of the last failed attempt')),
+                ('created_by', models.CharField(blank=True, help_text='User who queued the job', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, help_text='Start of the current or last attempt', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='When the job reached a final state', null=True)),
+                ('worker', models.CharField(blank=True, help_text='Worker running the job (host:pid)', max_length=100)),
+                ('heartbeat_at', models.DateTimeField(blank=True, help_text='Last sign of life from the worker', null=True)),
+            ],
+            options={
+                'db_table': 'job',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'priority', 'run_after'], name='job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Expand step of the move to integer surrogate keys on suppliers, item
+    records and batches: nullable columns only, so it is safe to apply
+    while the previous release is still serving. 0015 backfills them and
+    0016 switches the primary and foreign keys over.
+    """
+
+    dependencies = [
+        ('inventory', '0013_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, help_text='Surrogate key, backfilled before it becomes the primary key'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, help_text='Surrogate key, backfilled before it becomes the primary key'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, help_text='Surrogate key, backfilled before it becomes the primary key'),
+        ),
+        migrations.AddField(
+            model_name='supplierproduct',
+            name='item_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='supplierproduct',
+            name='supplier_name_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of supplier_name, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='item_record_id_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item_record_id, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='supplier_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of supplier_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='qareview',
+            name='batch_number_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch_number, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='qareview',
+            name='item_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='qareview',
+            name='supplier_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of supplier_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='qareviewunit',
+            name='batch_number_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch_number, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='supplier_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of supplier_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='item_code_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item_code, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='batch_id_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch_id, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='storageoccupancy',
+            name='batch_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='storageoccupancy',
+            name='item_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='batch_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='item_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='costsnapshot',
+            name='item_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='countline',
+            name='batch_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of batch, backfilled before it replaces the foreign key'),
+        ),
+        migrations.AddField(
+            model_name='countline',
+            name='item_ref',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Surrogate key of item, backfilled before it replaces the foreign key'),
+        ),
+    ]
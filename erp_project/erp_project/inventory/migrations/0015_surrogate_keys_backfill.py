@@ -0,0 +1,95 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:42
+
+from django.db import migrations, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+CHUNK_SIZE = 2000
+
+# Tables that get an integer surrogate key
+PARENTS = ['supplier', 'itemrecord', 'batch']
+
+# (model, foreign key, parent): each foreign key gets a <field>_ref shadow column
+REFERENCES = [
+    ('supplierproduct', 'item_code', 'itemrecord'),
+    ('supplierproduct', 'supplier_name', 'supplier'),
+    ('batch', 'item_record_id', 'itemrecord'),
+    ('batch', 'supplier_code', 'supplier'),
+    ('qareview', 'batch_number', 'batch'),
+    ('qareview', 'item_code', 'itemrecord'),
+    ('qareview', 'supplier_code', 'supplier'),
+    ('qareviewunit', 'batch_number', 'batch'),
+    ('inventorytransaction', 'supplier_code', 'supplier'),
+    ('inventorytransaction', 'item_code', 'itemrecord'),
+    ('inventorytransaction', 'batch_id', 'batch'),
+    ('storageoccupancy', 'batch', 'batch'),
+    ('storageoccupancy', 'item', 'itemrecord'),
+    ('balancesnapshot', 'batch', 'batch'),
+    ('balancesnapshot', 'item', 'itemrecord'),
+    ('costsnapshot', 'item', 'itemrecord'),
+    ('countline', 'batch', 'batch'),
+    ('countline', 'item', 'itemrecord'),
+]
+
+
+def chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Primary keys of `queryset` in key order, a chunk at a time (keyset pagination)"""
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def number_rows(Model):
+    """Give every row without one the next surrogate key, in code order"""
+    last = Model.objects.aggregate(top=Max('id'))['top'] or 0
+    for pks in chunks(Model.objects.filter(id__isnull=True)):
+        with transaction.atomic():
+            Model.objects.bulk_update(
+                [Model(pk=pk, id=number) for number, pk in enumerate(pks, last + 1)], ['id']
+            )
+        last += len(pks)
+
+
+def fill_references(Model, field, Parent):
+    """Copy the parent's surrogate key into <field>_ref; rows whose parent is missing stay empty"""
+    shadow = f'{field}_ref'
+    attname = Model._meta.get_field(field).attname
+    parent_id = Subquery(Parent.objects.filter(pk=OuterRef(attname)).values('id')[:1])
+    pending = Model.objects.filter(**{f'{shadow}__isnull': True, f'{field}__id__isnull': False})
+    for pks in chunks(pending):
+        Model.objects.filter(pk__in=pks).update(**{shadow: parent_id})
+
+
+def backfill(apps, schema_editor):
+    """
+    Number the parents, then copy the numbers into the shadow columns. Only
+    empty columns are written, so it can be re-run to catch rows the
+    previous release inserted in the meantime.
+    """
+    for model in PARENTS:
+        number_rows(apps.get_model('inventory', model))
+    for model, field, parent in REFERENCES:
+        fill_references(apps.get_model('inventory', model), field, apps.get_model('inventory', parent))
+
+
+class Migration(migrations.Migration):
+    """
+    Backfill step, in chunks that each commit on their own so the previous
+    release keeps writing while it runs on a large ledger.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0014_surrogate_keys_expand'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
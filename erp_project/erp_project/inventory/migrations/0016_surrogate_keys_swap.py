@@ -0,0 +1,411 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:44
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+backfill = import_module('inventory.migrations.0015_surrogate_keys_backfill')
+
+
+class SwapPrimaryKey(migrations.operations.base.Operation):
+    """
+    Make the backfilled `id` column the primary key of `model_name`, with
+    `code_field` (the former primary key) kept as the unique column given
+    by `field`. Foreign keys to the model must be removed beforehand.
+    """
+
+    reversible = False
+
+    def __init__(self, model_name, code_field, field):
+        self.model_name = model_name
+        self.code_field = code_field
+        self.field = field
+
+    def deconstruct(self):
+        return self.__class__.__name__, [], {
+            'model_name': self.model_name, 'code_field': self.code_field, 'field': self.field,
+        }
+
+    def state_forwards(self, app_label, state):
+        model_state = state.models[app_label, self.model_name]
+        fields = dict(model_state.fields)
+        fields.pop('id')
+        model_state.fields = {
+            'id': models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+            **fields,
+        }
+        model_state.fields[self.code_field] = self.field
+        state.reload_model(app_label, self.model_name, delay=True)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, to_model):
+            return
+        from_model = from_state.apps.get_model(app_label, self.model_name)
+        # Promoting `id` drops the old primary key; the code column then gets its unique constraint
+        schema_editor.alter_field(from_model, from_model._meta.get_field('id'), to_model._meta.get_field('id'))
+        schema_editor.alter_field(
+            to_model, from_model._meta.get_field(self.code_field), to_model._meta.get_field(self.code_field)
+        )
+        # New rows continue after the backfilled numbers
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [to_model]):
+            schema_editor.execute(sql)
+
+    def describe(self):
+        return f'Make id the primary key of {self.model_name}, keeping {self.code_field} unique'
+
+    @property
+    def migration_name_fragment(self):
+        return f'swap_primary_key_{self.model_name}'
+
+
+def rekey_balance_changes(apps, schema_editor):
+    """
+    Sync-log balance keys (location|batch|item) name the batch and item by
+    code; rewrite them with the surrogate keys. Keys of batches or items
+    that no longer exist are dropped.
+    """
+    SyncChange = apps.get_model('inventory', 'SyncChange')
+    Batch = apps.get_model('inventory', 'Batch')
+    ItemRecord = apps.get_model('inventory', 'ItemRecord')
+    for pks in backfill.chunks(SyncChange.objects.filter(entity='balance')):
+        changes = list(SyncChange.objects.filter(pk__in=pks))
+        keys = [change.object_key.split('|') for change in changes]
+        batches = dict(Batch.objects.filter(pk__in={key[1] for key in keys if len(key) == 3}).values_list('pk', 'id'))
+        items = dict(ItemRecord.objects.filter(pk__in={key[2] for key in keys if len(key) == 3}).values_list('pk', 'id'))
+        rekeyed, stale = [], []
+        for change, key in zip(changes, keys):
+            if len(key) == 3 and key[2] in items and (not key[1] or key[1] in batches):
+                location, batch, item = key
+                change.object_key = f"{location}|{batches[batch] if batch else ''}|{items[item]}"
+                rekeyed.append(change)
+            else:
+                stale.append(change.pk)
+        SyncChange.objects.bulk_update(rekeyed, ['object_key'])
+        SyncChange.objects.filter(pk__in=stale).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Contract step: catch up on rows written since the backfill, then swap
+    the primary keys and re-point every foreign key at them. Deploy it with
+    the release that reads the new keys.
+    """
+
+    dependencies = [
+        ('inventory', '0015_surrogate_keys_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill.backfill),
+        migrations.RunPython(rekey_balance_changes),
+        migrations.AlterUniqueTogether(
+            name='supplierproduct',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='storageoccupancy',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='costsnapshot',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='countline',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='balancesnapshot',
+            name='balance_snapshot_item_idx',
+        ),
+        migrations.RemoveField(
+            model_name='supplierproduct',
+            name='item_code',
+        ),
+        migrations.RemoveField(
+            model_name='supplierproduct',
+            name='supplier_name',
+        ),
+        migrations.RemoveField(
+            model_name='batch',
+            name='item_record_id',
+        ),
+        migrations.RemoveField(
+            model_name='batch',
+            name='supplier_code',
+        ),
+        migrations.RemoveField(
+            model_name='qareview',
+            name='batch_number',
+        ),
+        migrations.RemoveField(
+            model_name='qareview',
+            name='item_code',
+        ),
+        migrations.RemoveField(
+            model_name='qareview',
+            name='supplier_code',
+        ),
+        migrations.RemoveField(
+            model_name='qareviewunit',
+            name='batch_number',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='supplier_code',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='item_code',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='batch_id',
+        ),
+        migrations.RemoveField(
+            model_name='storageoccupancy',
+            name='batch',
+        ),
+        migrations.RemoveField(
+            model_name='storageoccupancy',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='batch',
+        ),
+        migrations.RemoveField(
+            model_name='balancesnapshot',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='costsnapshot',
+            name='item',
+        ),
+        migrations.RemoveField(
+            model_name='countline',
+            name='batch',
+        ),
+        migrations.RemoveField(
+            model_name='countline',
+            name='item',
+        ),
+        SwapPrimaryKey(
+            model_name='supplier',
+            code_field='supplier_id',
+            field=models.CharField(help_text='Unique identifier for the supplier', max_length=20, unique=True),
+        ),
+        SwapPrimaryKey(
+            model_name='itemrecord',
+            code_field='item_record_id',
+            field=models.CharField(help_text='Unique internal ID formatted as [CAT]-[SUB]-[CODE]', max_length=50, unique=True),
+        ),
+        SwapPrimaryKey(
+            model_name='batch',
+            code_field='batch_id',
+            field=models.CharField(help_text='Unique ID for each received or created batch', max_length=100, unique=True),
+        ),
+        migrations.RenameField(
+            model_name='supplierproduct',
+            old_name='item_code_ref',
+            new_name='item_code',
+        ),
+        migrations.RenameField(
+            model_name='supplierproduct',
+            old_name='supplier_name_ref',
+            new_name='supplier_name',
+        ),
+        migrations.RenameField(
+            model_name='batch',
+            old_name='item_record_id_ref',
+            new_name='item_record_id',
+        ),
+        migrations.RenameField(
+            model_name='batch',
+            old_name='supplier_code_ref',
+            new_name='supplier_code',
+        ),
+        migrations.RenameField(
+            model_name='qareview',
+            old_name='batch_number_ref',
+            new_name='batch_number',
+        ),
+        migrations.RenameField(
+            model_name='qareview',
+            old_name='item_code_ref',
+            new_name='item_code',
+        ),
+        migrations.RenameField(
+            model_name='qareview',
+            old_name='supplier_code_ref',
+            new_name='supplier_code',
+        ),
+        migrations.RenameField(
+            model_name='qareviewunit',
+            old_name='batch_number_ref',
+            new_name='batch_number',
+        ),
+        migrations.RenameField(
+            model_name='inventorytransaction',
+            old_name='supplier_code_ref',
+            new_name='supplier_code',
+        ),
+        migrations.RenameField(
+            model_name='inventorytransaction',
+            old_name='item_code_ref',
+            new_name='item_code',
+        ),
+        migrations.RenameField(
+            model_name='inventorytransaction',
+            old_name='batch_id_ref',
+            new_name='batch_id',
+        ),
+        migrations.RenameField(
+            model_name='storageoccupancy',
+            old_name='batch_ref',
+            new_name='batch',
+        ),
+        migrations.RenameField(
+            model_name='storageoccupancy',
+            old_name='item_ref',
+            new_name='item',
+        ),
+        migrations.RenameField(
+            model_name='balancesnapshot',
+            old_name='batch_ref',
+            new_name='batch',
+        ),
+        migrations.RenameField(
+            model_name='balancesnapshot',
+            old_name='item_ref',
+            new_name='item',
+        ),
+        migrations.RenameField(
+            model_name='costsnapshot',
+            old_name='item_ref',
+            new_name='item',
+        ),
+        migrations.RenameField(
+            model_name='countline',
+            old_name='batch_ref',
+            new_name='batch',
+        ),
+        migrations.RenameField(
+            model_name='countline',
+            old_name='item_ref',
+            new_name='item',
+        ),
+        migrations.AlterField(
+            model_name='supplierproduct',
+            name='item_code',
+            field=models.ForeignKey(help_text='FK to Item Master', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='supplierproduct',
+            name='supplier_name',
+            field=models.ForeignKey(help_text='Vendor supplying the product', on_delete=django.db.models.deletion.CASCADE, to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='batch',
+            name='item_record_id',
+            field=models.ForeignKey(help_text='Link to item definition', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='batch',
+            name='supplier_code',
+            field=models.ForeignKey(blank=True, help_text='Source supplier', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='qareview',
+            name='batch_number',
+            field=models.ForeignKey(help_text='Batch under review', on_delete=django.db.models.deletion.CASCADE, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='qareview',
+            name='item_code',
+            field=models.ForeignKey(help_text='Product or chemical being reviewed', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='qareview',
+            name='supplier_code',
+            field=models.ForeignKey(help_text='Source supplier', on_delete=django.db.models.deletion.CASCADE, to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='qareviewunit',
+            name='batch_number',
+            field=models.ForeignKey(help_text='Batch to which this unit belongs', on_delete=django.db.models.deletion.CASCADE, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='supplier_code',
+            field=models.ForeignKey(blank=True, help_text='Identifier for supplier', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='item_code',
+            field=models.ForeignKey(help_text='Internal product code', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='batch_id',
+            field=models.ForeignKey(blank=True, help_text='Batch or lot ID', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='storageoccupancy',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Batch stored (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='storageoccupancy',
+            name='item',
+            field=models.ForeignKey(help_text='Item stored', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Batch (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='item',
+            field=models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='costsnapshot',
+            name='item',
+            field=models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterField(
+            model_name='countline',
+            name='batch',
+            field=models.ForeignKey(blank=True, help_text='Batch (blank for untracked stock)', null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.batch'),
+        ),
+        migrations.AlterField(
+            model_name='countline',
+            name='item',
+            field=models.ForeignKey(help_text='Item', on_delete=django.db.models.deletion.CASCADE, to='inventory.itemrecord'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='supplierproduct',
+            unique_together={('item_code', 'supplier_name')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='storageoccupancy',
+            unique_together={('location', 'batch', 'item')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='costsnapshot',
+            unique_together={('run', 'item')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='countline',
+            unique_together={('session', 'location', 'batch', 'item')},
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['run', 'item'], name='balance_snapshot_item_idx'),
+        ),
+    ]
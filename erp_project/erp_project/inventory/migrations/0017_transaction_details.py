@@ -0,0 +1,211 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+# Sidecar model and the columns it takes over from inventorytransaction
+DETAILS = [
+    ('transactiondocuments', ['coa_provided', 'sds_provided', 'qa_file_link', 'sub_ingredient_log_id',
+                              'coa_match', 'sds_match', 'spec_match']),
+    ('transactionequipment', ['serial_number', 'maintenance_due_date', 'calibration_date', 'condition',
+                              'physical_location']),
+    ('transactiondispatch', ['recipient_contact', 'dispatch_method', 'dispatch_address', 'courier_name',
+                             'tracking_number']),
+    ('transactiondisposal', ['disposed_date', 'disposed_by', 'disposed_as', 'disposal_comments']),
+]
+
+
+def is_set(value):
+    return value not in (None, '', False)
+
+
+def copy_details(apps, schema_editor):
+    """Give a transaction a sidecar row only when one of its columns holds something"""
+    Transaction = apps.get_model('inventory', 'inventorytransaction')
+    for model, fields in DETAILS:
+        Detail = apps.get_model('inventory', model)
+        rows = Transaction.objects.order_by('pk').values_list('pk', *fields)
+        batch = []
+        for pk, *values in rows.iterator(chunk_size=CHUNK_SIZE):
+            if any(is_set(value) for value in values):
+                batch.append(Detail(transaction_id=pk, **dict(zip(fields, values))))
+            if len(batch) >= CHUNK_SIZE:
+                Detail.objects.bulk_create(batch)
+                batch = []
+        Detail.objects.bulk_create(batch)
+
+
+def restore_details(apps, schema_editor):
+    Transaction = apps.get_model('inventory', 'inventorytransaction')
+    for model, fields in DETAILS:
+        Detail = apps.get_model('inventory', model)
+        batch = []
+        for pk, *values in Detail.objects.order_by('pk').values_list('pk', *fields).iterator(chunk_size=CHUNK_SIZE):
+            batch.append(Transaction(pk=pk, **dict(zip(fields, values))))
+            if len(batch) >= CHUNK_SIZE:
+                Transaction.objects.bulk_update(batch, fields)
+                batch = []
+        Transaction.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_surrogate_keys_swap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionDispatch',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last modification time, used for HTTP cache validators')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dispatch', serialize=False, to='inventory.inventorytransaction')),
+                ('recipient_contact', models.CharField(blank=True, help_text="Recipient's contact person", max_length=100)),
+                ('dispatch_method', models.CharField(blank=True, choices=[('Courier', 'Courier'), ('Hand Delivery', 'Hand Delivery'), ('Postal', 'Postal'), ('Express', 'Express'), ('Refrigerated', 'Refrigerated'), ('Frozen', 'Frozen'), ('Controlled Temperature', 'Controlled Temperature'), ('Hazardous Material', 'Hazardous Material'), ('Air Freight', 'Air Freight'), ('Sea Freight', 'Sea Freight'), ('Road Freight', 'Road Freight')], help_text='Mode of dispatch', max_length=50)),
+                ('dispatch_address', models.CharField(blank=True, help_text='Where item was shipped to', max_length=500)),
+                ('courier_name', models.CharField(blank=True, help_text='Courier service used', max_length=100)),
+                ('tracking_number', models.CharField(blank=True, help_text='Tracking ID from courier', max_length=50)),
+            ],
+            options={
+                'verbose_name_plural': 'transaction dispatches',
+                'db_table': 'inventory_transaction_dispatch',
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionDisposal',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last modification time, used for HTTP cache validators')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='disposal', serialize=False, to='inventory.inventorytransaction')),
+                ('disposed_date', models.DateField(blank=True, help_text='Date of disposal', null=True)),
+                ('disposed_by', models.CharField(blank=True, help_text='User who discarded the item', max_length=50)),
+                ('disposed_as', models.CharField(blank=True, choices=[('Neutralized', 'Neutralized'), ('Incinerated', 'Incinerated'), ('Returned', 'Returned'), ('Landfill', 'Landfill'), ('Recycled', 'Recycled'), ('Composted', 'Composted'), ('Autoclaved', 'Autoclaved'), ('Chemical Treatment', 'Chemical Treatment'), ('Biological Treatment', 'Biological Treatment'), ('Thermal Treatment', 'Thermal Treatment')], help_text='Disposal method used', max_length=50)),
+                ('disposal_comments', models.TextField(blank=True, help_text='Notes on disposal reason')),
+            ],
+            options={
+                'db_table': 'inventory_transaction_disposal',
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionDocuments',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last modification time, used for HTTP cache validators')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documents', serialize=False, to='inventory.inventorytransaction')),
+                ('coa_provided', models.BooleanField(default=False, help_text='COA document was provided')),
+                ('sds_provided', models.BooleanField(default=False, help_text='SDS document was provided')),
+                ('qa_file_link', models.CharField(blank=True, help_text='Path to QA review files', max_length=500)),
+                ('sub_ingredient_log_id', models.CharField(blank=True, help_text='Reference to sub-ingredient QA log', max_length=100)),
+                ('coa_match', models.BooleanField(default=False, help_text='Whether COA matched expected')),
+                ('sds_match', models.BooleanField(default=False, help_text='Whether SDS matched expected')),
+                ('spec_match', models.BooleanField(default=False, help_text='Whether item met specification')),
+            ],
+            options={
+                'verbose_name': 'transaction documents',
+                'verbose_name_plural': 'transaction documents',
+                'db_table': 'inventory_transaction_documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionEquipment',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last modification time, used for HTTP cache validators')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='equipment', serialize=False, to='inventory.inventorytransaction')),
+                ('serial_number', models.CharField(blank=True, help_text='Equipment serial number', max_length=50)),
+                ('maintenance_due_date', models.DateField(blank=True, help_text='Next preventive maintenance', null=True)),
+                ('calibration_date', models.DateField(blank=True, help_text='Date of last calibration', null=True)),
+                ('condition', models.CharField(blank=True, choices=[('Good', 'Good'), ('Needs Repair', 'Needs Repair')], help_text='Condition of item or asset', max_length=20)),
+                ('physical_location', models.CharField(blank=True, help_text='Actual location of item', max_length=200)),
+            ],
+            options={
+                'verbose_name': 'transaction equipment',
+                'verbose_name_plural': 'transaction equipment',
+                'db_table': 'inventory_transaction_equipment',
+            },
+        ),
+        migrations.RunPython(copy_details, restore_details),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='calibration_date',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='coa_match',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='coa_provided',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='condition',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='courier_name',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='dispatch_address',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='dispatch_method',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='disposal_comments',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='disposed_as',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='disposed_by',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='disposed_date',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='maintenance_due_date',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='physical_location',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='qa_file_link',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='recipient_contact',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='sds_match',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='sds_provided',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='serial_number',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='spec_match',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='sub_ingredient_log_id',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='tracking_number',
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:41
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# (parent, column, related model, foreign key, conditions), as in services/counters.py
+COUNTERS = [
+    ('supplier', 'product_count', 'supplierproduct', 'supplier_name', {}),
+    ('supplier', 'batch_count', 'batch', 'supplier_code', {}),
+    ('supplier', 'transaction_count', 'inventorytransaction', 'supplier_code', {}),
+    ('supplier', 'qa_review_count', 'qareview', 'supplier_code', {}),
+    ('itemrecord', 'supplier_count', 'supplierproduct', 'item_code', {}),
+    ('itemrecord', 'batch_count', 'batch', 'item_record_id', {}),
+    ('itemrecord', 'transaction_count', 'inventorytransaction', 'item_code', {}),
+    ('itemrecord', 'qa_review_count', 'qareview', 'item_code', {}),
+    ('customer', 'transaction_count', 'inventorytransaction', 'recipient_code', {}),
+    ('customer', 'shipment_count', 'inventorytransaction', 'recipient_code', {'transaction_type': 'SHIP-CUS'}),
+]
+
+
+def fill_counts(apps, schema_editor):
+    """One set-based UPDATE per counter"""
+    for parent, column, model, field, conditions in COUNTERS:
+        related = (
+            apps.get_model('inventory', model).objects.filter(**{field: OuterRef('pk')}, **conditions)
+            .order_by().values(field).annotate(total=Count('pk')).values('total')
+        )
+        apps.get_model('inventory', parent).objects.update(
+            **{column: Coalesce(Subquery(related, output_field=IntegerField()), Value(0))}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_transaction_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='shipment_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Customer shipments (SHIP-CUS)'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Ledger rows sent to this customer'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='batch_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Batches of this item'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='qa_review_count',
+            field=models.IntegerField(default=0, editable=False, help_text='QA reviews of this item'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='supplier_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Supplier-product pairs'),
+        ),
+        migrations.AddField(
+            model_name='itemrecord',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Ledger rows of this item'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='batch_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Batches from this supplier'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='product_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Supplier-product pairs'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='qa_review_count',
+            field=models.IntegerField(default=0, editable=False, help_text="QA reviews of this supplier's batches"),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='transaction_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Ledger rows naming this supplier'),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_related_counts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='qareviewunit',
+            name='visual_check',
+            field=models.CharField(blank=True, choices=[('Passed', 'Passed'), ('Failed', 'Failed')], help_text='Labeling, damage, visual QA (blank until checked)', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_visual_check_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balancesnapshotrun',
+            name='stale',
+            field=models.BooleanField(default=False, help_text='A ledger row dated on or before the day was written after the snapshot; re-taken by the next snapshot run'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_snapshot_run_stale'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_digest', models.CharField(help_text='SHA-256 of the token; the token itself is shown once', max_length=64, unique=True)),
+                ('device_id', models.CharField(help_text='Handheld the token was issued to', max_length=50)),
+                ('active', models.BooleanField(default=True, help_text='Clear to revoke the token')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(help_text='User the device acts as', on_delete=django.db.models.deletion.CASCADE, related_name='device_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'device_token',
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 2000
+
+# Columns TransactionUsage takes over from inventorytransaction
+FIELDS = ['used_in', 'used_by', 'used_date', 'finished_date', 'return_status']
+
+
+def copy_usage(apps, schema_editor):
+    """Give a transaction a usage row only when one of its columns holds something"""
+    Transaction = apps.get_model('inventory', 'inventorytransaction')
+    Usage = apps.get_model('inventory', 'transactionusage')
+    rows = Transaction.objects.order_by('pk').values_list('pk', *FIELDS)
+    batch = []
+    for pk, *values in rows.iterator(chunk_size=CHUNK_SIZE):
+        if any(value not in (None, '') for value in values):
+            batch.append(Usage(transaction_id=pk, **dict(zip(FIELDS, values))))
+        if len(batch) >= CHUNK_SIZE:
+            Usage.objects.bulk_create(batch)
+            batch = []
+    Usage.objects.bulk_create(batch)
+
+
+def restore_usage(apps, schema_editor):
+    Transaction = apps.get_model('inventory', 'inventorytransaction')
+    Usage = apps.get_model('inventory', 'transactionusage')
+    batch = []
+    for pk, *values in Usage.objects.order_by('pk').values_list('pk', *FIELDS).iterator(chunk_size=CHUNK_SIZE):
+        batch.append(Transaction(pk=pk, **dict(zip(FIELDS, values))))
+        if len(batch) >= CHUNK_SIZE:
+            Transaction.objects.bulk_update(batch, FIELDS)
+            batch = []
+    Transaction.objects.bulk_update(batch, FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_device_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionUsage',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last modification time, used for HTTP cache validators')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='inventory.inventorytransaction')),
+                ('used_in', models.CharField(blank=True, help_text='Linked production batch or experiment', max_length=100)),
+                ('used_by', models.CharField(blank=True, help_text='Person who used the item', max_length=50)),
+                ('used_date', models.DateField(blank=True, help_text='Date item was used', null=True)),
+                ('finished_date', models.DateField(blank=True, help_text='Date item was finished', null=True)),
+                ('return_status', models.CharField(blank=True, help_text='Flag for return tracking', max_length=20)),
+            ],
+            options={
+                'verbose_name': 'transaction usage',
+                'verbose_name_plural': 'transaction usage',
+                'db_table': 'inventory_transaction_usage',
+            },
+        ),
+        migrations.RunPython(copy_usage, restore_usage),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='finished_date',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='return_status',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='used_by',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='used_date',
+        ),
+        migrations.RemoveField(
+            model_name='inventorytransaction',
+            name='used_in',
+        ),
+    ]
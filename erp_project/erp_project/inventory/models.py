@@ -1,8 +1,12 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+import re
 import uuid
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 
 # Enum choices for various fields
 class CategoryChoices(models.TextChoices):
@@ -167,6 +171,21 @@ class StationerySubtypeChoices(models.TextChoices):
     TAPE = 'Tape', 'Tape'
     BINDER = 'Binder', 'Binder'
 
+# Subtype choices per category, built once at import
+SUBTYPE_CHOICES_BY_CATEGORY = {
+    category: tuple(choices.choices)
+    for category, choices in (
+        (CategoryChoices.BIOLOGICAL, BiologicalSubtypeChoices),
+        (CategoryChoices.CHEMICAL, ChemicalSubtypeChoices),
+        (CategoryChoices.PACKAGING, PackagingSubtypeChoices),
+        (CategoryChoices.PLASTICWARES, PlasticwaresSubtypeChoices),
+        (CategoryChoices.ELECTRICAL, ElectricalSubtypeChoices),
+        (CategoryChoices.EQUIPMENT, EquipmentSubtypeChoices),
+        (CategoryChoices.CONSUMABLES, ConsumablesSubtypeChoices),
+        (CategoryChoices.STATIONERY, StationerySubtypeChoices),
+    )
+}
+
 class ChemicalFamilyChoices(models.TextChoices):
     # Oxidizers
     PEROXIDES = 'Peroxides', 'Peroxides'
@@ -263,6 +282,20 @@ class TransactionTypeChoices(models.TextChoices):
     SAMPLE_IN = 'SAMPLE-IN', 'Sample Received'
     SAMPLE_OUT = 'SAMPLE-OUT', 'Sample Issued'
 
+# Stock direction of each transaction type; XFER and ADJ-CYCLE carry their sign in the quantity
+INBOUND_TRANSACTION_TYPES = {
+    TransactionTypeChoices.RCV_PUR, TransactionTypeChoices.RCV_INT, TransactionTypeChoices.RCV_PACK,
+    TransactionTypeChoices.RCV_ENG, TransactionTypeChoices.RCV_MIS, TransactionTypeChoices.RCV_FG,
+    TransactionTypeChoices.RET_INT, TransactionTypeChoices.ADJ_GAIN, TransactionTypeChoices.SAMPLE_IN,
+}
+OUTBOUND_TRANSACTION_TYPES = {
+    TransactionTypeChoices.ISS_MISC, TransactionTypeChoices.ISS_MFG, TransactionTypeChoices.ISS_QC,
+    TransactionTypeChoices.ISS_RND, TransactionTypeChoices.RET_VND, TransactionTypeChoices.ADJ_LOSS,
+    TransactionTypeChoices.SCRAP, TransactionTypeChoices.SHIP_CUS, TransactionTypeChoices.SHIP_CM,
+    TransactionTypeChoices.SAMPLE_OUT,
+}
+SIGNED_TRANSACTION_TYPES = {TransactionTypeChoices.XFER, TransactionTypeChoices.ADJ_CYCLE}
+
 class QAStatusChoices(models.TextChoices):
     PENDING = 'Pending', 'Pending'
     APPROVED = 'Approved', 'Approved'
@@ -287,6 +320,12 @@ class ReviewFrequencyChoices(models.TextChoices):
     ONE_YEAR = '1 year', '1 year'
     ON_CHANGE = 'On change', 'On change'
 
+# Logic C5 - review interval per frequency ('On change' is manual only)
+REVIEW_INTERVAL_DAYS = {
+    ReviewFrequencyChoices.SIX_MONTHS: 180,
+    ReviewFrequencyChoices.ONE_YEAR: 365,
+}
+
 # Add missing enums after existing ones
 class DisposalMethodChoices(models.TextChoices):
     NEUTRALIZED = 'Neutralized', 'Neutralized'
@@ -318,10 +357,63 @@ class DocumentMatchChoices(models.TextChoices):
     PARTIAL = 'Partial', 'Partial'
     NO = 'No', 'No'
 
+class CodeManager(models.Manager):
+    """
+    Manager of a high fan-out master table keyed by an integer surrogate
+    `id`, with the business code (supplier ID, item code, batch number) in
+    a unique column. URLs, forms, imports and API payloads carry codes;
+    foreign keys and the ledger carry the integer.
+    """
+
+    def __init__(self, code_field=None):
+        # Related managers are built from this class without arguments
+        super().__init__()
+        self.code_field = code_field
+
+    def get_by_natural_key(self, code):
+        return self.get(**{self.code_field: code})
+
+    def pks(self, codes):
+        """{code: pk} for the given codes, one query"""
+        codes = {code for code in codes if code}
+        if not codes:
+            return {}
+        return dict(self.filter(**{f'{self.code_field}__in': codes}).values_list(self.code_field, 'pk'))
+
+    def codes(self, pks):
+        """{pk: code} for the given primary keys, one query"""
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return {}
+        return dict(self.filter(pk__in=pks).values_list('pk', self.code_field))
+
+
+class CountedModel(models.Model):
+    """
+    Master row carrying related-row counts for its detail page, kept
+    current by services/counters.py. Saving an existing row leaves the
+    count columns out, so an edit cannot write back counts that have moved
+    since the row was read.
+    """
+    COUNTER_FIELDS = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    class Meta:
+        abstract = True
+
+
 # Master Data Tables
-class Supplier(models.Model):
+class Supplier(CountedModel):
     """Supplier Master Table - A2.1"""
-    supplier_id = models.CharField(max_length=20, primary_key=True, help_text="Unique identifier for the supplier")
+    supplier_id = models.CharField(max_length=20, unique=True, help_text="Unique identifier for the supplier")
     supplier_name = models.CharField(max_length=200, help_text="Full legal name of the supplier")
     business_unit = models.CharField(max_length=100, blank=True, help_text="If internal supplier, name of internal entity")
     address = models.TextField(help_text="Address and contact details")
@@ -333,26 +425,39 @@ class Supplier(models.Model):
     review_frequency = models.CharField(max_length=20, choices=ReviewFrequencyChoices.choices, default=ReviewFrequencyChoices.ONE_YEAR)
     next_review_due = models.DateField(null=True, blank=True, help_text="When next QA check is expected")
     notes = models.TextField(blank=True, help_text="Optional comments on performance or conditions")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    # Related-row counts (services/counters.py)
+    product_count = models.IntegerField(default=0, editable=False, help_text="Supplier-product pairs")
+    batch_count = models.IntegerField(default=0, editable=False, help_text="Batches from this supplier")
+    transaction_count = models.IntegerField(default=0, editable=False, help_text="Ledger rows naming this supplier")
+    qa_review_count = models.IntegerField(default=0, editable=False, help_text="QA reviews of this supplier's batches")
+    COUNTER_FIELDS = ('product_count', 'batch_count', 'transaction_count', 'qa_review_count')
+    
+    objects = CodeManager('supplier_id')
     
     def save(self, *args, **kwargs):
         # Calculate next review due date (Logic C5)
-        if self.last_reviewed_on and self.review_frequency:
-            if self.review_frequency == ReviewFrequencyChoices.SIX_MONTHS:
-                self.next_review_due = self.last_reviewed_on + timedelta(days=180)
-            elif self.review_frequency == ReviewFrequencyChoices.ONE_YEAR:
-                self.next_review_due = self.last_reviewed_on + timedelta(days=365)
-            # For 'On change', next_review_due remains blank (manual only)
+        self.next_review_due = calculate_next_review_due(
+            self.last_reviewed_on, self.review_frequency, self.next_review_due
+        )
         super().save(*args, **kwargs)
     
+    def natural_key(self):
+        return (self.supplier_id,)
+    
     def __str__(self):
         return f"{self.supplier_id} - {self.supplier_name}"
     
     class Meta:
         db_table = 'supplier_master'
+        indexes = [
+            models.Index(fields=['next_review_due'], name='supplier_review_due_idx'),
+        ]
 
-class ItemRecord(models.Model):
+class ItemRecord(CountedModel):
     """Item Records Table - A2.1 (Key Fields)"""
-    item_record_id = models.CharField(max_length=50, primary_key=True, help_text="Unique internal ID formatted as [CAT]-[SUB]-[CODE]")
+    item_record_id = models.CharField(max_length=50, unique=True, help_text="Unique internal ID formatted as [CAT]-[SUB]-[CODE]")
     item_name = models.CharField(max_length=200, help_text="Standardized name aligned with label and QA docs")
     unit_of_measure = models.CharField(max_length=10, choices=UOMChoices.choices, help_text="Standard unit of measurement")
     category = models.CharField(max_length=20, choices=CategoryChoices.choices, help_text="Inventory grouping")
@@ -373,6 +478,16 @@ class ItemRecord(models.Model):
     sds_mandatory = models.BooleanField(default=False, help_text="Safety Data Sheet required?")
     coa_mandatory = models.BooleanField(default=False, help_text="Certificate of Analysis required?")
     spec_required = models.BooleanField(default=False, help_text="Specification document required?")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    # Related-row counts (services/counters.py)
+    supplier_count = models.IntegerField(default=0, editable=False, help_text="Supplier-product pairs")
+    batch_count = models.IntegerField(default=0, editable=False, help_text="Batches of this item")
+    transaction_count = models.IntegerField(default=0, editable=False, help_text="Ledger rows of this item")
+    qa_review_count = models.IntegerField(default=0, editable=False, help_text="QA reviews of this item")
+    COUNTER_FIELDS = ('supplier_count', 'batch_count', 'transaction_count', 'qa_review_count')
+    
+    objects = CodeManager('item_record_id')
     
     def save(self, *args, **kwargs):
         # Calculate derived fields before saving
@@ -380,54 +495,18 @@ class ItemRecord(models.Model):
         super().save(*args, **kwargs)
     
     def calculate_derived_fields(self):
-        """Implement LOGIC.C1, C2, C3 from documentation"""
-        # LOGIC.C1 - QA Required?
-        self.qa_required = calculate_qa_required(
-            self.grade, 
-            self.critical_to_product, 
-            self.contamination_risk, 
-            self.traceability_level
-        )
-        
-        # LOGIC.C2 - Traceability Level (simplified for now)
-        if self.qa_required and self.contamination_risk == 'High':
-            self.traceability_level = TraceabilityLevelChoices.FULL
-        elif self.qa_required:
-            self.traceability_level = TraceabilityLevelChoices.BATCH_LEVEL
-        else:
-            self.traceability_level = TraceabilityLevelChoices.NONE
-        
-        # LOGIC.C3 - Document Requirements
-        self.coa_mandatory, self.sds_mandatory, self.spec_required = calculate_document_requirements(
-            self.qa_required, 
-            self.hazard_class, 
-            self.traceability_level
-        )
-        
-        # LOGIC.C4 - Segregation Rule Required?
-        self.segregation_rule_required = self.hazard_class in ['Flammable', 'Corrosive', 'Oxidizer', 'Reactive']
+        """Implement LOGIC.C1, C2, C3, C4 from documentation"""
+        # One lookup in the compiled item-record decision table (services/rules.py)
+        from .services.rules import ITEM_RECORD_RULE
+        ITEM_RECORD_RULE.apply(self)
     
     @classmethod
     def get_subtype_choices(cls, category):
         """Get appropriate subtype choices based on category"""
-        if category == CategoryChoices.BIOLOGICAL:
-            return BiologicalSubtypeChoices.choices
-        elif category == CategoryChoices.CHEMICAL:
-            return ChemicalSubtypeChoices.choices
-        elif category == CategoryChoices.PACKAGING:
-            return PackagingSubtypeChoices.choices
-        elif category == CategoryChoices.PLASTICWARES:
-            return PlasticwaresSubtypeChoices.choices
-        elif category == CategoryChoices.ELECTRICAL:
-            return ElectricalSubtypeChoices.choices
-        elif category == CategoryChoices.EQUIPMENT:
-            return EquipmentSubtypeChoices.choices
-        elif category == CategoryChoices.CONSUMABLES:
-            return ConsumablesSubtypeChoices.choices
-        elif category == CategoryChoices.STATIONERY:
-            return StationerySubtypeChoices.choices
-        else:
-            return []
+        return list(SUBTYPE_CHOICES_BY_CATEGORY.get(category, ()))
+    
+    def natural_key(self):
+        return (self.item_record_id,)
     
     def __str__(self):
         return f"{self.item_record_id} - {self.item_name}"
@@ -499,20 +578,20 @@ class SupplierProduct(models.Model):
     def save(self, *args, **kwargs):
         # Calculate derived fields before saving
         self.calculate_derived_fields()
-        super().save(*args, **kwargs)
+        # The supplier and item counters are adjusted in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     def calculate_derived_fields(self):
         """Implement LOGIC.C5, C6, C7 from documentation"""
         # LOGIC.C5 - Review Due Date
-        if self.last_reviewed_on and self.review_frequency:
-            if self.review_frequency == '6 months':
-                self.next_review_due = self.last_reviewed_on + timedelta(days=180)
-            elif self.review_frequency == '1 year':
-                self.next_review_due = self.last_reviewed_on + timedelta(days=365)
+        self.next_review_due = calculate_next_review_due(
+            self.last_reviewed_on, self.review_frequency, self.next_review_due
+        )
         
         # LOGIC.C6 - Default Supplier-Product
-        if self.approved and self.preferred_vendor:
-            self.is_default = True
+        from .services.rules import SUPPLIER_PRODUCT_RULE
+        SUPPLIER_PRODUCT_RULE.apply(self)
         
         # LOGIC.C7 - Spec Sheet Verified?
         # This would be set by QA during review process
@@ -523,6 +602,9 @@ class SupplierProduct(models.Model):
     class Meta:
         db_table = 'supplier_product'
         unique_together = ['item_code', 'supplier_name']
+        indexes = [
+            models.Index(fields=['next_review_due'], name='supplier_prod_review_due_idx'),
+        ]
 
 class StorageZone(models.Model):
     """Storage Zone Table - A2.1"""
@@ -533,29 +615,76 @@ class StorageZone(models.Model):
     hazard_compatibility = models.CharField(max_length=500, blank=True, help_text="Types of hazards permitted in zone")
     default_for_category = models.CharField(max_length=20, choices=CategoryChoices.choices, blank=True, help_text="If this zone is the default for a category")
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Keep the indexed hazard set in step with the free-text list
+        hazards = parse_hazard_compatibility(self.hazard_compatibility)
+        StorageZoneHazard.objects.filter(zone=self).exclude(hazard_class__in=hazards).delete()
+        existing = set(StorageZoneHazard.objects.filter(zone=self).values_list('hazard_class', flat=True))
+        StorageZoneHazard.objects.bulk_create([
+            StorageZoneHazard(zone=self, hazard_class=hazard) for hazard in hazards if hazard not in existing
+        ])
+        # The segregation matrix of every worker is keyed on this version
+        from .services.lookups import bump_version
+        bump_version(StorageZoneHazard._meta.db_table)
+    
     def __str__(self):
         return f"{self.zone_id} - {self.zone_name}"
     
     class Meta:
         db_table = 'storage_zone'
 
+class StorageZoneHazard(models.Model):
+    """Parsed StorageZone.hazard_compatibility - one indexed row per permitted hazard"""
+    zone = models.ForeignKey(StorageZone, on_delete=models.CASCADE, related_name='hazards', help_text="Storage zone")
+    hazard_class = models.CharField(max_length=50, help_text="Hazard permitted in the zone")
+    
+    def __str__(self):
+        return f"{self.zone_id} - {self.hazard_class}"
+    
+    class Meta:
+        db_table = 'storage_zone_hazard'
+        unique_together = ['zone', 'hazard_class']
+        indexes = [
+            models.Index(fields=['hazard_class', 'zone'], name='zone_hazard_lookup_idx'),
+        ]
+
 class StorageLocation(models.Model):
     """Storage Location Table - A2.1"""
     location_id = models.CharField(max_length=20, primary_key=True, help_text="Unique code for individual storage point")
     zone_id = models.ForeignKey(StorageZone, on_delete=models.CASCADE, help_text="FK to Storage Zone Table")
     rack_shelf = models.CharField(max_length=100, blank=True, help_text="Physical sub-location information")
     max_capacity = models.CharField(max_length=100, blank=True, help_text="Capacity in volume or units")
+    capacity_quantity = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Numeric capacity parsed from max_capacity")
+    capacity_unit = models.CharField(max_length=20, blank=True, help_text="Unit the capacity is expressed in")
+    occupied_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Quantity currently stored, maintained from the ledger")
     active = models.BooleanField(default=True, help_text="Whether this location is active for use")
     
+    def save(self, *args, **kwargs):
+        # Derive numeric capacity from the free-text field when not set explicitly
+        if self.capacity_quantity is None and self.max_capacity:
+            self.capacity_quantity, self.capacity_unit = parse_capacity(self.max_capacity)
+        super().save(*args, **kwargs)
+    
+    @property
+    def available_quantity(self):
+        """Remaining capacity, or None when the location has no numeric capacity"""
+        if self.capacity_quantity is None:
+            return None
+        return self.capacity_quantity - self.occupied_quantity
+    
     def __str__(self):
         return f"{self.location_id} - {self.zone_id.zone_name}"
     
     class Meta:
         db_table = 'storage_location'
+        indexes = [
+            models.Index(fields=['zone_id', 'active', 'occupied_quantity'], name='location_fill_idx'),
+        ]
 
 class Batch(models.Model):
     """Batch Table - A2.1"""
-    batch_id = models.CharField(max_length=100, primary_key=True, help_text="Unique ID for each received or created batch")
+    batch_id = models.CharField(max_length=100, unique=True, help_text="Unique ID for each received or created batch")
     item_record_id = models.ForeignKey(ItemRecord, on_delete=models.CASCADE, help_text="Link to item definition")
     subtype = models.CharField(max_length=50, help_text="Subtype classification for the batch")
     supplier_code = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, help_text="Source supplier")
@@ -567,6 +696,19 @@ class Batch(models.Model):
     expiry_date = models.DateField(help_text="Batch expiration date")
     qa_status = models.CharField(max_length=20, choices=QAStatusChoices.choices, default=QAStatusChoices.PENDING, help_text="Current QA status")
     storage_location = models.ForeignKey(StorageLocation, on_delete=models.SET_NULL, null=True, blank=True, help_text="Where the batch is currently stored")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    objects = CodeManager('batch_id')
+    
+    def save(self, *args, **kwargs):
+        from .services.outbox import emit_batches
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            emit_batches([self], 'created' if adding else 'updated')
+    
+    def natural_key(self):
+        return (self.batch_id,)
     
     def __str__(self):
         return f"{self.batch_id} - {self.item_record_id.item_name}"
@@ -574,7 +716,7 @@ class Batch(models.Model):
     class Meta:
         db_table = 'batch_master'
 
-class Customer(models.Model):
+class Customer(CountedModel):
     """Customer Master Table - A2.1"""
     customer_code = models.CharField(max_length=20, primary_key=True, help_text="Unique identifier for the customer or recipient entity")
     customer_name = models.CharField(max_length=200, help_text="Full legal name of the institution or company")
@@ -594,6 +736,12 @@ class Customer(models.Model):
     approved = models.BooleanField(default=False, help_text="Flag to enable/disable dispatch to this customer")
     approved_on = models.DateField(null=True, blank=True, help_text="Date customer was approved")
     remarks = models.TextField(blank=True, help_text="Optional notes")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    # Related-row counts (services/counters.py)
+    transaction_count = models.IntegerField(default=0, editable=False, help_text="Ledger rows sent to this customer")
+    shipment_count = models.IntegerField(default=0, editable=False, help_text="Customer shipments (SHIP-CUS)")
+    COUNTER_FIELDS = ('transaction_count', 'shipment_count')
     
     def __str__(self):
         return f"{self.customer_code} - {self.customer_name}"
@@ -624,6 +772,13 @@ class QAReview(models.Model):
     inventory_txn_id = models.CharField(max_length=20, blank=True, help_text="Linked transaction in inventory log")
     comments = models.TextField(blank=True, help_text="Free text comments or notes")
     
+    def save(self, *args, **kwargs):
+        from .services.outbox import emit_qa_reviews
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            emit_qa_reviews([self], 'created' if adding else 'updated')
+    
     def __str__(self):
         return f"{self.qa_review_id} - {self.batch_number.batch_id}"
     
@@ -637,13 +792,20 @@ class QAReviewUnit(models.Model):
     unit_id = models.CharField(max_length=20, help_text="Identifier for the unit")
     batch_number = models.ForeignKey(Batch, on_delete=models.CASCADE, help_text="Batch to which this unit belongs")
     sub_ingredient_log = models.CharField(max_length=100, blank=True, help_text="Reference ID or path to the QA Sub-Ingredient Log")
-    visual_check = models.CharField(max_length=10, choices=[('Passed', 'Passed'), ('Failed', 'Failed')], help_text="Labeling, damage, visual QA")
+    visual_check = models.CharField(max_length=10, choices=[('Passed', 'Passed'), ('Failed', 'Failed')], blank=True, help_text="Labeling, damage, visual QA (blank until checked)")
     spec_check = models.CharField(max_length=10, choices=[('Passed', 'Passed'), ('Failed', 'Failed')], blank=True, help_text="Unit-level QC spec confirmation")
     disposition = models.CharField(max_length=20, choices=QAStatusChoices.choices, help_text="Approved, Quarantined, or Rejected")
     reviewer = models.CharField(max_length=50, help_text="QA reviewer ID")
     reviewed_on = models.DateField(help_text="Date of check")
     notes = models.TextField(blank=True, help_text="Comments or observations")
     
+    def save(self, *args, **kwargs):
+        from .services.outbox import emit_qa_review_units
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            emit_qa_review_units([self], 'created' if adding else 'updated')
+    
     def __str__(self):
         return f"{self.qa_review_id.qa_review_id} - {self.unit_id}"
     
@@ -651,8 +813,22 @@ class QAReviewUnit(models.Model):
         db_table = 'qa_review_unit'
 
 # Inventory Transaction Ledger - A2.3
+# Fields that decide how a ledger row moves stock (see services.storage.apply_movements)
+MOVEMENT_FIELDS = ['storage_location', 'batch_id', 'item_code', 'transaction_type', 'quantity']
+MOVEMENT_ATTNAMES = ['storage_location_id', 'batch_id_id', 'item_code_id', 'transaction_type', 'quantity']
+
+
 class InventoryTransaction(models.Model):
-    """Master Inventory Transaction Ledger - A2.3"""
+    """
+    Master Inventory Transaction Ledger - A2.3
+
+    Only the columns that ledger scans read stay on this row: balances,
+    snapshots and storage (item, batch, quantity, unit, location, QA
+    status), sync and the outbox (the whole core row), valuation (unit
+    cost, invoice), the importers (supplier, recipient and product text,
+    lot dates) and count postings (adjustment reason). Groups that only
+    the detail page reads are in the sidecars (TRANSACTION_DETAILS).
+    """
     transaction_id = models.CharField(max_length=20, primary_key=True, help_text="Unique identifier for each inventory transaction")
     transaction_datetime = models.DateTimeField(help_text="Timestamp when the transaction occurred")
     transaction_user = models.CharField(max_length=50, help_text="User performing the transaction")
@@ -668,6 +844,7 @@ class InventoryTransaction(models.Model):
     # Invoice Information
     invoice_no = models.CharField(max_length=50, blank=True, help_text="Vendor invoice number")
     invoice_date = models.DateField(null=True, blank=True, help_text="Date of invoice")
+    unit_cost = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, help_text="Unit cost on the vendor invoice, used for stock valuation")
     
     # Product Information
     product_code = models.CharField(max_length=100, help_text="Product or catalog code from supplier")
@@ -687,9 +864,7 @@ class InventoryTransaction(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2, help_text="Quantity moved")
     unit = models.CharField(max_length=10, choices=UOMChoices.choices, help_text="Unit of measure")
     
-    # Document Status
-    coa_provided = models.BooleanField(default=False, help_text="COA document was provided")
-    sds_provided = models.BooleanField(default=False, help_text="SDS document was provided")
+    # Document Status (documents received and matched are in TransactionDocuments)
     label_applied = models.BooleanField(default=False, help_text="Internal label was applied")
     
     # Storage Information
@@ -699,50 +874,382 @@ class InventoryTransaction(models.Model):
     # QA Information
     qa_status = models.CharField(max_length=20, choices=QAStatusChoices.choices, blank=True, help_text="Quality disposition status")
     qa_review_id = models.ForeignKey(QAReview, on_delete=models.SET_NULL, null=True, blank=True, help_text="Linked QA Review record ID")
+    
+    # Adjustment Information (usage and return tracking are in TransactionUsage)
+    adjustment_reason = models.CharField(max_length=200, blank=True, help_text="Reason for manual adjustment")
+    
+    # Equipment, dispatch and disposal details are in the sidecar tables below
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    def save(self, *args, **kwargs):
+        from .services.outbox import emit_transactions
+        from .services.snapshots import invalidate_snapshots
+        from .services.storage import apply_movements, refresh_slots
+        adding = self._state.adding
+        with transaction.atomic():
+            previous = None
+            if not adding:
+                previous = InventoryTransaction.objects.filter(pk=self.pk).only(*MOVEMENT_FIELDS).first()
+            super().save(*args, **kwargs)
+            if adding:
+                if self.storage_location_id:
+                    apply_movements([self])
+            elif previous is not None and any(
+                getattr(previous, name) != getattr(self, name) for name in MOVEMENT_ATTNAMES
+            ):
+                # An edit that changes the movement re-derives the slots it moved stock in and out of
+                refresh_slots([previous, self])
+            invalidate_snapshots([self])
+            emit_transactions([self], 'created' if adding else 'updated')
+    
+    def save_details(self, **values):
+        """
+        Write sidecar fields (see TRANSACTION_DETAILS) for this saved
+        transaction. Only the sidecars named in `values` are touched; one
+        is created on first use.
+        """
+        for model in TRANSACTION_DETAILS:
+            fields = {name: values.pop(name) for name in model.detail_fields() if name in values}
+            if fields:
+                model.objects.update_or_create(transaction=self, defaults=fields)
+        if values:
+            raise TypeError(f"Unknown transaction detail fields: {', '.join(values)}")
+    
+    def __str__(self):
+        return f"{self.transaction_id} - {self.item_code.item_name} - {self.transaction_type}"
+    
+    class Meta:
+        db_table = 'inventory_transaction'
+        ordering = ['-transaction_datetime']
+        indexes = [
+            models.Index(fields=['transaction_datetime'], name='txn_datetime_idx'),
+        ]
+
+# Transaction sidecars - detail columns most ledger rows leave empty. A row
+# exists only for transactions that have the details, and only the
+# transaction detail page reads them, so ledger scans stay on the narrow row.
+class TransactionDetail(models.Model):
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last modification time, used for HTTP cache validators")
+    
+    @classmethod
+    def detail_fields(cls):
+        return [field.name for field in cls._meta.concrete_fields if field.name not in ('transaction', 'updated_at')]
+    
+    def __str__(self):
+        return f"{self.transaction_id} - {self._meta.verbose_name}"
+    
+    class Meta:
+        abstract = True
+
+class TransactionDocuments(TransactionDetail):
+    """QA documents received with a transaction and how they matched - A2.3"""
+    transaction = models.OneToOneField(InventoryTransaction, on_delete=models.CASCADE, primary_key=True, related_name='documents')
+    coa_provided = models.BooleanField(default=False, help_text="COA document was provided")
+    sds_provided = models.BooleanField(default=False, help_text="SDS document was provided")
     qa_file_link = models.CharField(max_length=500, blank=True, help_text="Path to QA review files")
     sub_ingredient_log_id = models.CharField(max_length=100, blank=True, help_text="Reference to sub-ingredient QA log")
-    
-    # Document Matching
     coa_match = models.BooleanField(default=False, help_text="Whether COA matched expected")
     sds_match = models.BooleanField(default=False, help_text="Whether SDS matched expected")
     spec_match = models.BooleanField(default=False, help_text="Whether item met specification")
     
-    # Usage Information
-    used_in = models.CharField(max_length=100, blank=True, help_text="Linked production batch or experiment")
-    used_by = models.CharField(max_length=50, blank=True, help_text="Person who used the item")
-    used_date = models.DateField(null=True, blank=True, help_text="Date item was used")
-    finished_date = models.DateField(null=True, blank=True, help_text="Date item was finished")
-    
-    # Return and Adjustment Information
-    return_status = models.CharField(max_length=20, blank=True, help_text="Flag for return tracking")
-    adjustment_reason = models.CharField(max_length=200, blank=True, help_text="Reason for manual adjustment")
-    
-    # Equipment Information
+    class Meta:
+        db_table = 'inventory_transaction_documents'
+        verbose_name = 'transaction documents'
+        verbose_name_plural = 'transaction documents'
+
+class TransactionEquipment(TransactionDetail):
+    """Equipment and asset details of a transaction - A2.3"""
+    transaction = models.OneToOneField(InventoryTransaction, on_delete=models.CASCADE, primary_key=True, related_name='equipment')
     serial_number = models.CharField(max_length=50, blank=True, help_text="Equipment serial number")
     maintenance_due_date = models.DateField(null=True, blank=True, help_text="Next preventive maintenance")
     calibration_date = models.DateField(null=True, blank=True, help_text="Date of last calibration")
     condition = models.CharField(max_length=20, choices=[('Good', 'Good'), ('Needs Repair', 'Needs Repair')], blank=True, help_text="Condition of item or asset")
     physical_location = models.CharField(max_length=200, blank=True, help_text="Actual location of item")
     
-    # Dispatch Information
+    class Meta:
+        db_table = 'inventory_transaction_equipment'
+        verbose_name = 'transaction equipment'
+        verbose_name_plural = 'transaction equipment'
+
+class TransactionDispatch(TransactionDetail):
+    """Shipping details of an outbound transaction - A2.3"""
+    transaction = models.OneToOneField(InventoryTransaction, on_delete=models.CASCADE, primary_key=True, related_name='dispatch')
     recipient_contact = models.CharField(max_length=100, blank=True, help_text="Recipient's contact person")
     dispatch_method = models.CharField(max_length=50, choices=DispatchMethodChoices.choices, blank=True, help_text="Mode of dispatch")
     dispatch_address = models.CharField(max_length=500, blank=True, help_text="Where item was shipped to")
     courier_name = models.CharField(max_length=100, blank=True, help_text="Courier service used")
     tracking_number = models.CharField(max_length=50, blank=True, help_text="Tracking ID from courier")
     
-    # Disposal Information
+    class Meta:
+        db_table = 'inventory_transaction_dispatch'
+        verbose_name_plural = 'transaction dispatches'
+
+class TransactionDisposal(TransactionDetail):
+    """How and when the stock of a transaction was disposed of - A2.3"""
+    transaction = models.OneToOneField(InventoryTransaction, on_delete=models.CASCADE, primary_key=True, related_name='disposal')
     disposed_date = models.DateField(null=True, blank=True, help_text="Date of disposal")
     disposed_by = models.CharField(max_length=50, blank=True, help_text="User who discarded the item")
     disposed_as = models.CharField(max_length=50, choices=DisposalMethodChoices.choices, blank=True, help_text="Disposal method used")
     disposal_comments = models.TextField(blank=True, help_text="Notes on disposal reason")
     
+    class Meta:
+        db_table = 'inventory_transaction_disposal'
+
+class TransactionUsage(TransactionDetail):
+    """Where the stock of a transaction was used, finished or returned - A2.3"""
+    transaction = models.OneToOneField(InventoryTransaction, on_delete=models.CASCADE, primary_key=True, related_name='usage')
+    used_in = models.CharField(max_length=100, blank=True, help_text="Linked production batch or experiment")
+    used_by = models.CharField(max_length=50, blank=True, help_text="Person who used the item")
+    used_date = models.DateField(null=True, blank=True, help_text="Date item was used")
+    finished_date = models.DateField(null=True, blank=True, help_text="Date item was finished")
+    return_status = models.CharField(max_length=20, blank=True, help_text="Flag for return tracking")
+    
+    class Meta:
+        db_table = 'inventory_transaction_usage'
+        verbose_name = 'transaction usage'
+        verbose_name_plural = 'transaction usage'
+
+TRANSACTION_DETAILS = (
+    TransactionDocuments, TransactionEquipment, TransactionDispatch, TransactionDisposal, TransactionUsage
+)
+
+class IdentifierSequence(models.Model):
+    """Named counters for allocating human-readable IDs (e.g. UNIT-00001) in blocks"""
+    name = models.CharField(max_length=50, primary_key=True, help_text="Sequence name")
+    last_value = models.PositiveBigIntegerField(default=0, help_text="Last number handed out")
+    
+    @classmethod
+    def allocate(cls, name, count, seed=0):
+        """Reserve `count` consecutive numbers and return the first; `seed` starts a new sequence"""
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(
+                name=name, defaults={'last_value': seed}
+            )
+            first = sequence.last_value + 1
+            cls.objects.filter(name=name).update(last_value=models.F('last_value') + count)
+        return first
+    
     def __str__(self):
-        return f"{self.transaction_id} - {self.item_code.item_name} - {self.transaction_type}"
+        return f"{self.name}: {self.last_value}"
     
     class Meta:
-        db_table = 'inventory_transaction'
-        ordering = ['-transaction_datetime']
+        db_table = 'identifier_sequence'
+
+class StorageOccupancy(models.Model):
+    """What is currently stored where - per location and batch, maintained from the ledger"""
+    location = models.ForeignKey(StorageLocation, on_delete=models.CASCADE, related_name='occupancy', help_text="Storage location")
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, null=True, blank=True, help_text="Batch stored (blank for untracked stock)")
+    item = models.ForeignKey(ItemRecord, on_delete=models.CASCADE, help_text="Item stored")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Quantity on hand at this location")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.location_id} - {self.batch.batch_id if self.batch_id else self.item.item_record_id}: {self.quantity}"
+    
+    class Meta:
+        db_table = 'storage_occupancy'
+        unique_together = ['location', 'batch', 'item']
+
+class SyncChange(models.Model):
+    """Change log feeding handheld delta sync - one row per changed record, ordered by seq"""
+    seq = models.BigAutoField(primary_key=True, help_text="Server change-sequence number")
+    entity = models.CharField(max_length=20, help_text="Synced entity (item, batch, location, balance)")
+    object_key = models.CharField(max_length=300, help_text="Primary key of the changed record")
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.seq}: {self.entity} {self.object_key}"
+    
+    class Meta:
+        db_table = 'sync_change'
+
+class SyncPush(models.Model):
+    """Outcome of one offline transaction pushed by a handheld, keyed by its client UUID"""
+    client_uuid = models.UUIDField(primary_key=True, help_text="Client-generated idempotency key")
+    device_id = models.CharField(max_length=50, blank=True, help_text="Handheld that queued the transaction")
+    status = models.CharField(max_length=20, choices=[('applied', 'Applied'), ('conflict', 'Conflict')], help_text="Whether the transaction was posted")
+    transaction_id = models.CharField(max_length=20, blank=True, help_text="Ledger row created for the push")
+    conflict = models.CharField(max_length=50, blank=True, help_text="Conflict code when not applied")
+    detail = models.CharField(max_length=500, blank=True, help_text="Conflict explanation")
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.client_uuid} ({self.status})"
+    
+    class Meta:
+        db_table = 'sync_push'
+        indexes = [
+            models.Index(fields=['device_id', 'received_at'], name='sync_push_device_idx'),
+        ]
+
+class DeviceToken(models.Model):
+    """API token a handheld sends as 'Authorization: Token <key>' instead of a session cookie"""
+    key_digest = models.CharField(max_length=64, unique=True, help_text="SHA-256 of the token; the token itself is shown once")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='device_tokens', help_text="User the device acts as")
+    device_id = models.CharField(max_length=50, help_text="Handheld the token was issued to")
+    active = models.BooleanField(default=True, help_text="Clear to revoke the token")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.device_id} ({self.user})"
+    
+    class Meta:
+        db_table = 'device_token'
+
+class OutboxEvent(models.Model):
+    """Transactional outbox - change events written alongside ledger, batch and QA writes"""
+    id = models.BigAutoField(primary_key=True, help_text="Delivery order")
+    event_type = models.CharField(max_length=50, help_text="e.g. inventory_transaction.created")
+    aggregate = models.CharField(max_length=30, help_text="Entity the event is about")
+    aggregate_id = models.CharField(max_length=100, help_text="Primary key of that entity")
+    payload = models.JSONField(encoder=DjangoJSONEncoder, help_text="Event body")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.id}: {self.event_type} {self.aggregate_id}"
+    
+    class Meta:
+        db_table = 'outbox_event'
+
+class OutboxCursor(models.Model):
+    """Last event delivered to each relay consumer"""
+    consumer = models.CharField(max_length=50, primary_key=True, help_text="Relay consumer name")
+    last_event_id = models.BigIntegerField(default=0, help_text="Highest event ID acknowledged by the sink")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.consumer}: {self.last_event_id}"
+    
+    class Meta:
+        db_table = 'outbox_cursor'
+
+class BalanceSnapshotRun(models.Model):
+    """Closing stock positions and costing state as of the end of one day"""
+    as_of = models.DateField(unique=True, help_text="Day whose closing balances the snapshot holds")
+    period = models.CharField(max_length=10, choices=[('daily', 'Daily'), ('monthly', 'Monthly')], default='daily', help_text="Daily snapshots may be pruned; monthly ones are kept for audit")
+    positions = models.PositiveIntegerField(default=0, help_text="Balance rows in the snapshot")
+    stale = models.BooleanField(default=False, help_text="A ledger row dated on or before the day was written after the snapshot; re-taken by the next snapshot run")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.as_of} ({self.period})"
+    
+    class Meta:
+        db_table = 'balance_snapshot_run'
+        ordering = ['-as_of']
+
+class BalanceSnapshot(models.Model):
+    """Closing quantity per location, batch and item in a snapshot"""
+    run = models.ForeignKey(BalanceSnapshotRun, on_delete=models.CASCADE, related_name='balances', help_text="Snapshot the row belongs to")
+    location = models.ForeignKey(StorageLocation, on_delete=models.SET_NULL, null=True, blank=True, help_text="Storage location (blank for stock without one)")
+    zone = models.ForeignKey(StorageZone, on_delete=models.SET_NULL, null=True, blank=True, help_text="Zone of the location, copied for zone queries")
+    batch = models.ForeignKey(Batch, on_delete=models.SET_NULL, null=True, blank=True, help_text="Batch (blank for untracked stock)")
+    item = models.ForeignKey(ItemRecord, on_delete=models.CASCADE, help_text="Item")
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, help_text="Quantity on hand at the end of the day")
+    
+    def __str__(self):
+        return f"{self.run_id}: {self.location_id} - {self.batch.batch_id if self.batch_id else self.item.item_record_id}: {self.quantity}"
+    
+    class Meta:
+        db_table = 'balance_snapshot'
+        indexes = [
+            models.Index(fields=['run', 'zone'], name='balance_snapshot_zone_idx'),
+            models.Index(fields=['run', 'item'], name='balance_snapshot_item_idx'),
+        ]
+
+class CostSnapshot(models.Model):
+    """Per-item costing state in a snapshot, so valuations only replay later ledger rows"""
+    run = models.ForeignKey(BalanceSnapshotRun, on_delete=models.CASCADE, related_name='costs', help_text="Snapshot the row belongs to")
+    item = models.ForeignKey(ItemRecord, on_delete=models.CASCADE, help_text="Item")
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, help_text="Quantity on hand across all locations")
+    average_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0, help_text="Moving weighted-average unit cost")
+    fifo_layers = models.JSONField(default=list, help_text="Open receipt layers, oldest first, as [unit_cost, quantity] strings")
+    
+    def __str__(self):
+        return f"{self.run_id}: {self.item.item_record_id} {self.quantity} @ {self.average_cost}"
+    
+    class Meta:
+        db_table = 'cost_snapshot'
+        unique_together = ['run', 'item']
+
+class CountSession(models.Model):
+    """Cycle count or physical inventory - expected balances frozen when the count starts"""
+    count_id = models.CharField(max_length=30, primary_key=True, help_text="e.g. CNT-20240720-001")
+    name = models.CharField(max_length=200, blank=True, help_text="What is being counted")
+    zone = models.ForeignKey(StorageZone, on_delete=models.SET_NULL, null=True, blank=True, help_text="Zone in scope (blank with explicit locations or for a full count)")
+    status = models.CharField(max_length=20, choices=[('open', 'Open'), ('posted', 'Posted'), ('cancelled', 'Cancelled')], default='open', help_text="Open sessions accept counts; posting writes the adjustments")
+    created_by = models.CharField(max_length=50, help_text="User who started the count")
+    created_at = models.DateTimeField(auto_now_add=True)
+    posted_by = models.CharField(max_length=50, blank=True, help_text="User who posted the adjustments")
+    posted_at = models.DateTimeField(null=True, blank=True, help_text="When the adjustments were posted")
+    adjustment_reason = models.CharField(max_length=200, blank=True, help_text="Reason written to the adjustment transactions")
+    
+    def __str__(self):
+        return f"{self.count_id} ({self.status})"
+    
+    class Meta:
+        db_table = 'count_session'
+        ordering = ['-created_at']
+
+class CountLine(models.Model):
+    """Expected versus counted quantity of one location, batch and item"""
+    session = models.ForeignKey(CountSession, on_delete=models.CASCADE, related_name='lines', help_text="Count session")
+    location = models.ForeignKey(StorageLocation, on_delete=models.CASCADE, help_text="Counted location")
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, null=True, blank=True, help_text="Batch (blank for untracked stock)")
+    item = models.ForeignKey(ItemRecord, on_delete=models.CASCADE, help_text="Item")
+    expected_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="On hand when the count started")
+    counted_quantity = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Physically counted (blank until counted)")
+    variance = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Counted minus expected")
+    counted_by = models.CharField(max_length=50, blank=True, help_text="User or device that submitted the count")
+    counted_at = models.DateTimeField(null=True, blank=True, help_text="When the count was submitted")
+    adjustment_transaction_id = models.CharField(max_length=20, blank=True, help_text="ADJ-GAIN/ADJ-LOSS ledger row posted for the variance")
+    
+    def __str__(self):
+        return f"{self.session_id}: {self.location_id} - {self.batch.batch_id if self.batch_id else self.item.item_record_id}"
+    
+    class Meta:
+        db_table = 'count_line'
+        unique_together = ['session', 'location', 'batch', 'item']
+
+class Job(models.Model):
+    """Background job run by the run_jobs workers - imports, exports and bulk recomputes"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    task = models.CharField(max_length=50, help_text="Registered task name (services.jobs.TASKS)")
+    params = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, help_text="Keyword arguments for the task")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', help_text="Lifecycle state")
+    priority = models.SmallIntegerField(default=0, help_text="Lower runs first")
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Runs started so far")
+    max_attempts = models.PositiveSmallIntegerField(default=3, help_text="Runs allowed before the job fails")
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry back-off)")
+    progress = models.FloatField(default=0, help_text="Fraction done, 0 to 1")
+    progress_message = models.CharField(max_length=500, blank=True, help_text="Latest progress note from the task")
+    cancel_requested = models.BooleanField(default=False, help_text="Set to stop a running job at its next progress report")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, help_text="Return value of the task")
+    error = models.TextField(blank=True, help_text="Traceback of the last failed attempt")
+    created_by = models.CharField(max_length=50, blank=True, help_text="User who queued the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="Start of the current or last attempt")
+    finished_at = models.DateTimeField(null=True, blank=True, help_text="When the job reached a final state")
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker running the job (host:pid)")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the worker")
+    
+    def __str__(self):
+        return f"{self.id}: {self.task} ({self.status})"
+    
+    class Meta:
+        db_table = 'job'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_after'], name='job_queue_idx'),
+        ]
 
 # Helper functions for derived field calculations
 def calculate_qa_required(grade, critical_to_product, contamination_risk, traceability_level):
@@ -757,18 +1264,6 @@ def calculate_qa_required(grade, critical_to_product, contamination_risk, tracea
         return True
     return False
 
-def calculate_traceability_level(qa_required, contamination_risk, batch_code_format_known, spec_verified):
-    """Logic C2 - Traceability Level calculation"""
-    if not qa_required and contamination_risk == 'Low':
-        return 'None'
-    if qa_required and (contamination_risk == 'Medium' or not batch_code_format_known):
-        return 'Basic'
-    if qa_required and batch_code_format_known and not spec_verified:
-        return 'Batch-level'
-    if qa_required and batch_code_format_known and spec_verified:
-        return 'Full'
-    return 'None'
-
 def calculate_document_requirements(qa_required, hazard_class, traceability_level):
     """Logic C3 - COA/SDS/Spec Required? calculation"""
     coa_required = qa_required or traceability_level in ['Batch-level', 'Full']
@@ -776,3 +1271,31 @@ def calculate_document_requirements(qa_required, hazard_class, traceability_leve
     spec_required = qa_required or traceability_level in ['Batch-level', 'Full']
     
     return coa_required, sds_required, spec_required
+
+def calculate_next_review_due(last_reviewed_on, review_frequency, current_due=None):
+    """Logic C5 - Next review due date calculation"""
+    interval = REVIEW_INTERVAL_DAYS.get(review_frequency)
+    if last_reviewed_on and interval:
+        return last_reviewed_on + timedelta(days=interval)
+    # For 'On change', next_review_due stays as entered (manual only)
+    return current_due
+
+def parse_capacity(max_capacity):
+    """Split free-text capacity such as '1000 items' into (Decimal('1000'), 'items')"""
+    match = re.match(r'^\s*([\d][\d,]*(?:\.\d+)?)\s*(.*?)\s*$', max_capacity or '')
+    if not match:
+        return None, ''
+    try:
+        return Decimal(match.group(1).replace(',', '')), match.group(2)[:20]
+    except InvalidOperation:
+        return None, ''
+
+def parse_hazard_compatibility(hazard_compatibility):
+    """Parse 'Flammable, Corrosive' into a set of hazard names, canonicalised to HazardClassChoices"""
+    canonical = {value.lower(): value for value in HazardClassChoices.values}
+    hazards = set()
+    for token in re.split(r'[,;/]', hazard_compatibility or ''):
+        token = token.strip()
+        if token:
+            hazards.add(canonical.get(token.lower(), token))
+    return hazards
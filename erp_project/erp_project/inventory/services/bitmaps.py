@@ -0,0 +1,475 @@
+"""
+In-process bitmap index over the low-cardinality attributes of batches and items.
+
+Each attribute value keeps a bitmap of the integer primary keys of the rows
+that have it, so a filter such as category x QA status x zone x expiry
+bucket x supplier is a handful of AND/OR operations in memory instead of a
+multi-join query. Rows are numbered in sort order (with room between
+neighbours for inserts), so the n-th match of a bitmap is the n-th row of
+the list and a page is found by select() without walking the rows before
+it. The list pages then fetch only the page of rows they show
+(IndexedResults). Items also carry their stock level (approved batch
+quantity), kept current as batches change.
+
+The index is optional (settings.BITMAP_INDEX) and is built on first use in
+each worker process. It is kept current from the sync change log, which the
+model signals and the bulk QA paths append to. Every query replays the log
+entries since the last one. A full rebuild happens at the first use of a
+new day, because expiry buckets are relative to today, and after
+BITMAP_INDEX_MAX_AGE seconds. A category or zone reassignment also
+triggers one, since it moves many batches at once.
+
+pyroaring's compressed bitmaps are used when installed. Otherwise a Python
+int stands in for each bitmap: AND/OR run over machine words in C, but
+memory grows with the row count times SLOT_GAP rather than with the matches.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .sync import ITEM, BATCH, LOCATION
+from ..models import Batch, ItemRecord, QAStatusChoices, StorageLocation, SyncChange
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pragma: no cover - optional dependency
+    BitMap = None
+
+# Expiry buckets, relative to the day the index was built
+EXPIRED = 'expired'
+EXPIRING_SOON = 'expiring_soon'
+VALID = 'valid'
+EXPIRING_SOON_DAYS = 30
+
+# Item stock levels by approved batch quantity, as on the inventory report
+LOW_STOCK = 'low'
+HIGH_STOCK = 'high'
+NORMAL_STOCK = 'normal'
+LOW_STOCK_LEVEL = 10
+HIGH_STOCK_LEVEL = 100
+
+# Rows are numbered this far apart, so an insert between two rows usually
+# finds a free number; when it does not, the index is renumbered
+SLOT_GAP = 8
+
+# More log entries than this since the last query are cheaper to rebuild from
+CATCH_UP_LIMIT = 5000
+
+
+class IntBitMap:
+    """
+    The part of pyroaring's BitMap API used here, over a Python int with
+    bit n set for row n. Membership tests read a bytes copy taken once per
+    bitmap, since shifting a large int for each test would copy it.
+    """
+    __slots__ = ('bits', '_bytes', '_blocks')
+    # Bytes per block of the running counts select() seeks with
+    BLOCK = 64
+
+    def __init__(self, values=(), bits=0):
+        if values:
+            positions = list(values)
+            buffer = bytearray(max(positions) // 8 + 1)
+            for n in positions:
+                buffer[n >> 3] |= 1 << (n & 7)
+            bits |= int.from_bytes(buffer, 'little')
+        self.bits = bits
+        self._bytes = None
+        self._blocks = None
+
+    def _view(self):
+        if self._bytes is None:
+            self._bytes = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+        return self._bytes
+
+    def _counts(self):
+        """Set bits before each block, so select() only scans one block"""
+        if self._blocks is None:
+            view = self._view()
+            total, counts = 0, []
+            for start in range(0, len(view), self.BLOCK):
+                counts.append(total)
+                total += int.from_bytes(view[start:start + self.BLOCK], 'little').bit_count()
+            self._blocks = counts
+        return self._blocks
+
+    def add(self, n):
+        self.bits |= 1 << n
+        self._bytes = self._blocks = None
+
+    def discard(self, n):
+        if n in self:
+            self.bits ^= 1 << n
+            self._bytes = self._blocks = None
+
+    def __and__(self, other):
+        return IntBitMap(bits=self.bits & other.bits)
+
+    def __or__(self, other):
+        return IntBitMap(bits=self.bits | other.bits)
+
+    def __sub__(self, other):
+        return IntBitMap(bits=self.bits & ~other.bits)
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __contains__(self, n):
+        view = self._view()
+        index = n >> 3
+        return index < len(view) and bool(view[index] >> (n & 7) & 1)
+
+    def __iter__(self):
+        for index, byte in enumerate(self._view()):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield index * 8 + bit
+
+    def __getitem__(self, rank):
+        """The value with `rank` smaller values in the bitmap (select), as BitMap[rank]"""
+        if rank < 0:
+            rank += len(self)
+        counts = self._counts()
+        block = bisect_right(counts, rank) - 1
+        if rank < 0 or block < 0:
+            raise IndexError('bitmap index out of range')
+        view = self._view()
+        rank -= counts[block]
+        for index in range(block * self.BLOCK, min(len(view), (block + 1) * self.BLOCK)):
+            found = view[index].bit_count()
+            if rank < found:
+                byte = view[index]
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        if not rank:
+                            return index * 8 + bit
+                        rank -= 1
+            rank -= found
+        raise IndexError('bitmap index out of range')
+
+
+Bitmap = BitMap or IntBitMap
+
+
+def enabled():
+    return getattr(settings, 'BITMAP_INDEX', False)
+
+
+def expiry_bucket(expiry_date, today):
+    if expiry_date is None:
+        return None
+    if expiry_date < today:
+        return EXPIRED
+    if expiry_date <= today + timedelta(days=EXPIRING_SOON_DAYS):
+        return EXPIRING_SOON
+    return VALID
+
+
+class BitmapIndex:
+    """
+    Bitmaps per (attribute, value) over one table's rows. Each row has a
+    slot number, and slots follow the sort order, so the bitmaps hold slots
+    and a page of matches is read by rank without the database.
+    """
+
+    def __init__(self, attributes):
+        self.attributes = attributes
+        self.rows = {}
+        self.codes = {}
+        self.slots = {}
+        self.pks = {}
+        self.bitmaps = {attribute: {} for attribute in attributes}
+        self.all = Bitmap()
+        self.order = []
+
+    def load(self, rows):
+        """Replace the contents with (pk, code, sort key, values, extra) rows"""
+        rows = sorted(rows, key=lambda row: (row[2], row[0]))
+        positions = {attribute: defaultdict(list) for attribute in self.attributes}
+        self.rows, self.codes, self.slots, self.pks = {}, {}, {}, {}
+        for number, (pk, code, key, values, extra) in enumerate(rows, 1):
+            slot = number * SLOT_GAP
+            self.rows[pk] = (code, key, values, extra)
+            self.codes[code] = pk
+            self.slots[pk] = slot
+            self.pks[slot] = pk
+            for attribute, value in zip(self.attributes, values):
+                positions[attribute][value].append(slot)
+        self.bitmaps = {
+            attribute: {value: Bitmap(slots) for value, slots in by_value.items()}
+            for attribute, by_value in positions.items()
+        }
+        self.all = Bitmap(self.pks)
+        self.order = [(key, pk) for pk, _, key, _, _ in rows]
+
+    def _free_slot(self, position):
+        """A slot between the neighbours of order[position], or None when they are adjacent"""
+        low = self.slots[self.order[position - 1][1]] if position else 0
+        if position + 1 == len(self.order):
+            return low + SLOT_GAP
+        high = self.slots[self.order[position + 1][1]]
+        return (low + high) // 2 if high - low > 1 else None
+
+    def set(self, pk, code, key, values, extra=None):
+        old = self.rows.get(pk)
+        # A row keeping its place keeps its slot
+        slot = self.slots[pk] if old is not None and old[1] == key else None
+        self.remove(pk)
+        self.rows[pk] = (code, key, values, extra)
+        self.codes[code] = pk
+        position = bisect_left(self.order, (key, pk))
+        self.order.insert(position, (key, pk))
+        if slot is None:
+            slot = self._free_slot(position)
+        if slot is None:
+            self.load([(pk, *row) for pk, row in self.rows.items()])
+            return
+        self.slots[pk] = slot
+        self.pks[slot] = pk
+        for attribute, value in zip(self.attributes, values):
+            self.bitmaps[attribute].setdefault(value, Bitmap()).add(slot)
+        self.all.add(slot)
+
+    def remove(self, pk):
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        code, key, values, _ = row
+        self.codes.pop(code, None)
+        slot = self.slots.pop(pk)
+        del self.pks[slot]
+        for attribute, value in zip(self.attributes, values):
+            self.bitmaps[attribute][value].discard(slot)
+        self.all.discard(slot)
+        del self.order[bisect_left(self.order, (key, pk))]
+
+    def get(self, pk, attribute):
+        return self.rows[pk][2][self.attributes.index(attribute)]
+
+    def extra(self, pk):
+        return self.rows[pk][3]
+
+    def bitmap(self, attribute, values):
+        """Rows having any of `values` for `attribute` (OR)"""
+        result = Bitmap()
+        for value in values:
+            found = self.bitmaps[attribute].get(value)
+            if found is not None:
+                result = result | found
+        return result
+
+    def match(self, criteria):
+        """Rows matching every (attribute, [values]) pair of `criteria` (AND of ORs)"""
+        # A copy, since the index's own bitmaps change as the log is replayed
+        result = Bitmap() | self.all
+        for attribute, values in criteria:
+            result = result & self.bitmap(attribute, values)
+        return result
+
+    def of(self, pks):
+        """Bitmap of the rows with these primary keys"""
+        return Bitmap({self.slots[pk] for pk in pks if pk in self.slots})
+
+    def page(self, bits, start, stop=None, reverse=False):
+        """Primary keys of the matches in `bits` from position `start` to `stop`, in sort order"""
+        count = len(bits)
+        stop = count if stop is None else min(stop, count)
+        ranks = range(start, stop)
+        if reverse:
+            ranks = [count - 1 - rank for rank in ranks]
+        return [self.pks[bits[rank]] for rank in ranks]
+
+
+def stock_level(quantity):
+    if quantity < LOW_STOCK_LEVEL:
+        return LOW_STOCK
+    if quantity > HIGH_STOCK_LEVEL:
+        return HIGH_STOCK
+    return NORMAL_STOCK
+
+
+BATCH_ATTRIBUTES = ('qa_status', 'batch_source', 'batch_type', 'supplier', 'zone', 'category', 'expiry')
+ITEM_ATTRIBUTES = ('category', 'grade', 'hazard_class', 'qa_required', 'stock_level')
+
+BATCH_COLUMNS = (
+    'pk', 'batch_id', 'received_date', 'qa_status', 'batch_source', 'batch_type', 'supplier_code__supplier_id',
+    'storage_location__zone_id', 'item_record_id__category', 'expiry_date', 'item_record_id', 'quantity_received',
+)
+ITEM_COLUMNS = ('pk', 'item_record_id', 'category', 'grade', 'hazard_class', 'qa_required')
+
+
+class Indexes:
+    """The batch and item indexes of this process and the log position they reflect"""
+
+    def __init__(self):
+        self.batches = BitmapIndex(BATCH_ATTRIBUTES)
+        self.items = BitmapIndex(ITEM_ATTRIBUTES)
+        # Approved batch quantity per item pk
+        self.stock = defaultdict(Decimal)
+        self.zones = {}
+        self.seq = 0
+        self.built_on = None
+        self.built_at = 0
+
+    def _batch_row(self, row):
+        pk, code, received, qa_status, source, batch_type, supplier, zone, category, expiry, item, quantity = row
+        values = (qa_status, source, batch_type, supplier, zone, category, expiry_bucket(expiry, self.built_on))
+        approved = quantity if qa_status == QAStatusChoices.APPROVED else Decimal(0)
+        # Batches sort by received date, newest last; the primary key breaks ties
+        return pk, code, (received, pk), values, (item, approved)
+
+    def _item_row(self, row):
+        pk, code, *values = row
+        return pk, code, code, (*values, stock_level(self.stock[pk])), None
+
+    def build(self):
+        # Read the log position first: changes made while loading are replayed after
+        self.seq = SyncChange.objects.aggregate(top=Max('seq'))['top'] or 0
+        self.built_on = timezone.now().date()
+        self.built_at = time.monotonic()
+        self.zones = dict(StorageLocation.objects.values_list('location_id', 'zone_id'))
+        batch_rows = [self._batch_row(row) for row in Batch.objects.values_list(*BATCH_COLUMNS).iterator()]
+        for _, _, _, _, (item, approved) in batch_rows:
+            self.stock[item] += approved
+        self.batches.load(batch_rows)
+        self.items.load(self._item_row(row) for row in ItemRecord.objects.values_list(*ITEM_COLUMNS).iterator())
+
+    def stale(self):
+        max_age = getattr(settings, 'BITMAP_INDEX_MAX_AGE', 3600)
+        return self.built_on != timezone.now().date() or time.monotonic() - self.built_at > max_age
+
+    def _set_batch(self, row):
+        """Index a batch row and move its approved quantity to its item; returns the items touched"""
+        pk, code, key, values, extra = self._batch_row(row)
+        touched = {extra[0]}
+        if pk in self.batches.rows:
+            item, approved = self.batches.extra(pk)
+            self.stock[item] -= approved
+            touched.add(item)
+        self.batches.set(pk, code, key, values, extra)
+        self.stock[extra[0]] += extra[1]
+        return touched
+
+    def _remove_batch(self, pk):
+        item, approved = self.batches.extra(pk)
+        self.stock[item] -= approved
+        self.batches.remove(pk)
+        return {item}
+
+    def catch_up(self):
+        """
+        Apply the log entries written since the last query. Returns False
+        when a full rebuild is needed instead.
+        """
+        changes = list(
+            SyncChange.objects.filter(seq__gt=self.seq, entity__in=[ITEM, BATCH, LOCATION])
+            .order_by('seq').values_list('seq', 'entity', 'object_key')[:CATCH_UP_LIMIT + 1]
+        )
+        if len(changes) > CATCH_UP_LIMIT:
+            return False
+        if not changes:
+            return True
+        keys = defaultdict(set)
+        for _, entity, object_key in changes:
+            keys[entity].add(object_key)
+
+        if keys[LOCATION]:
+            zones = dict(StorageLocation.objects.filter(location_id__in=keys[LOCATION]).values_list('location_id', 'zone_id'))
+            # A location moved to another zone carries its batches along
+            if any(self.zones.get(location) not in (None, zones.get(location)) for location in keys[LOCATION]):
+                return False
+            self.zones.update(zones)
+        if keys[ITEM]:
+            rows = {row[1]: row for row in ItemRecord.objects.filter(item_record_id__in=keys[ITEM]).values_list(*ITEM_COLUMNS)}
+            for code in keys[ITEM]:
+                pk = self.items.codes.get(code)
+                row = rows.get(code)
+                if pk is not None and row is not None and self.items.get(pk, 'category') != row[2]:
+                    return False
+                if row is None:
+                    if pk is not None:
+                        self.items.remove(pk)
+                else:
+                    self.items.set(*self._item_row(row))
+        if keys[BATCH]:
+            rows = {row[1]: row for row in Batch.objects.filter(batch_id__in=keys[BATCH]).values_list(*BATCH_COLUMNS)}
+            touched = set()
+            for code in keys[BATCH]:
+                row = rows.get(code)
+                if row is not None:
+                    touched |= self._set_batch(row)
+                elif code in self.batches.codes:
+                    touched |= self._remove_batch(self.batches.codes[code])
+            # Items whose approved quantity crossed a stock level move to the new one
+            for pk in touched:
+                if pk in self.items.rows and self.items.get(pk, 'stock_level') != stock_level(self.stock[pk]):
+                    code, key, values, extra = self.items.rows[pk]
+                    self.items.set(pk, code, key, (*values[:-1], stock_level(self.stock[pk])), extra)
+        self.seq = changes[-1][0]
+        return True
+
+    def items_with_batches(self, batch_bits):
+        """Items having at least one of the batches in `batch_bits`"""
+        return self.items.of({self.batches.extra(self.batches.pks[slot])[0] for slot in batch_bits})
+
+
+_indexes = None
+_lock = threading.Lock()
+
+
+def current():
+    """The up-to-date indexes of this process, or None when BITMAP_INDEX is off"""
+    global _indexes
+    if not enabled():
+        return None
+    with _lock:
+        if _indexes is None or _indexes.stale() or not _indexes.catch_up():
+            indexes = Indexes()
+            indexes.build()
+            _indexes = indexes
+        return _indexes
+
+
+def clear():
+    """Drop this process's indexes; the next query rebuilds them"""
+    global _indexes
+    with _lock:
+        _indexes = None
+
+
+class IndexedResults:
+    """
+    Bitmap matches as a Paginator object list: the count comes from the
+    bitmap and slicing fetches only the requested rows, in index order.
+    """
+    ordered = True
+
+    def __init__(self, queryset, index, bits, reverse=False):
+        self.queryset = queryset
+        self.index = index
+        self.bits = bits
+        self.reverse = reverse
+
+    def count(self):
+        return len(self.bits)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        pks = self.index.page(self.bits, key.start or 0, key.stop, self.reverse)
+        rows = self.queryset.in_bulk(pks)
+        return [rows[pk] for pk in pks if pk in rows]
@@ -0,0 +1,66 @@
+"""
+Business codes for foreign keys to suppliers, items and batches.
+
+Those tables are keyed by an integer `id`, with the supplier ID, item code
+and batch number kept in unique columns (see CodeManager). Pages, the sync
+API and outbox events still speak in codes, so these helpers swap the
+integers back a set of rows at a time instead of a query per row.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+
+
+def code_field_of(field):
+    """Code column of the model a foreign key points at, or None for other relations"""
+    related = getattr(field, 'related_model', None)
+    return getattr(related._default_manager, 'code_field', None) if related else None
+
+
+def related_codes(instances, field_name):
+    """
+    {pk: code} for the `field_name` foreign key of `instances`. Related
+    objects already loaded are used as they are; the rest take one query.
+    """
+    instances = list(instances)
+    if not instances:
+        return {}
+    field = instances[0]._meta.get_field(field_name)
+    code_field = code_field_of(field)
+    codes, missing = {}, set()
+    for instance in instances:
+        pk = getattr(instance, field.attname)
+        if pk is None:
+            continue
+        # Records (see records.RecordTable) hold no related objects
+        if hasattr(instance, '_state') and field.is_cached(instance):
+            codes[pk] = getattr(field.get_cached_value(instance), code_field)
+        else:
+            missing.add(pk)
+    missing -= codes.keys()
+    if missing:
+        codes.update(field.related_model._default_manager.codes(missing))
+    return codes
+
+
+def code_values(queryset, *fields, **expressions):
+    """
+    queryset.values(*fields, **expressions), with foreign keys to coded
+    tables returned as their codes under the same keys. The codes come from
+    a join, so it is still one query.
+    """
+    opts = queryset.model._meta
+    codes = {}
+    for name in fields:
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation on the queryset
+            continue
+        code_field = code_field_of(field) if field.is_relation else None
+        if code_field:
+            codes[f'_code_{name}'] = F(f'{field.name}__{code_field}')
+    if not codes:
+        return list(queryset.values(*fields, **expressions))
+    rows = queryset.values(*[name for name in fields if f'_code_{name}' not in codes], **codes, **expressions)
+    keys = [(name, f'_code_{name}' if f'_code_{name}' in codes else name) for name in (*fields, *expressions)]
+    return [{name: row[key] for name, key in keys} for row in rows]
@@ -0,0 +1,107 @@
+"""
+Related-row counts on suppliers, customers and items.
+
+The detail pages show how many supplier products, batches, ledger rows and
+QA reviews a master row has. Those numbers are kept in *_count columns of
+the master row instead of being counted on every view: inserts and deletes
+adjust them in the writer's transaction, single saves and deletes through
+signals and bulk inserts by calling count_rows() next to the other ledger
+hooks. Writes that move a row to another parent in place (or bypass the
+ORM) are not tracked; reconcile_counters() recounts and fixes that drift.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from ..models import (
+    Supplier, Customer, ItemRecord, SupplierProduct, Batch, QAReview, InventoryTransaction,
+    TransactionTypeChoices
+)
+
+# `conditions` narrows the counted rows, e.g. shipments among a customer's ledger rows
+Counter = namedtuple('Counter', 'parent column model field conditions')
+
+COUNTERS = [
+    Counter(Supplier, 'product_count', SupplierProduct, 'supplier_name', {}),
+    Counter(Supplier, 'batch_count', Batch, 'supplier_code', {}),
+    Counter(Supplier, 'transaction_count', InventoryTransaction, 'supplier_code', {}),
+    Counter(Supplier, 'qa_review_count', QAReview, 'supplier_code', {}),
+    Counter(ItemRecord, 'supplier_count', SupplierProduct, 'item_code', {}),
+    Counter(ItemRecord, 'batch_count', Batch, 'item_record_id', {}),
+    Counter(ItemRecord, 'transaction_count', InventoryTransaction, 'item_code', {}),
+    Counter(ItemRecord, 'qa_review_count', QAReview, 'item_code', {}),
+    Counter(Customer, 'transaction_count', InventoryTransaction, 'recipient_code', {}),
+    Counter(Customer, 'shipment_count', InventoryTransaction, 'recipient_code',
+            {'transaction_type': TransactionTypeChoices.SHIP_CUS}),
+]
+
+COUNTED_MODELS = {counter.model for counter in COUNTERS}
+
+
+def _matches(row, conditions):
+    return all(getattr(row, name) == value for name, value in conditions.items())
+
+
+def _update_by_delta(parent, column, deltas, chunk_size=500):
+    """Add {pk: delta} to `column`, one UPDATE per distinct delta"""
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            pks_by_delta[delta].append(pk)
+    for delta, pks in pks_by_delta.items():
+        for start in range(0, len(pks), chunk_size):
+            parent._base_manager.filter(pk__in=pks[start:start + chunk_size]).update(
+                **{column: F(column) + delta}
+            )
+
+
+def count_rows(model, rows, sign=1):
+    """
+    Add new `rows` of `model` to their parents' counters, or take deleted
+    ones off with sign=-1. Rows are summed per parent first, so a bulk
+    receipt costs a few UPDATEs however many rows it has.
+    """
+    counters = [counter for counter in COUNTERS if counter.model is model]
+    if not counters:
+        return
+    rows = list(rows)
+    with transaction.atomic():
+        for counter in counters:
+            attname = model._meta.get_field(counter.field).attname
+            deltas = defaultdict(int)
+            for row in rows:
+                pk = getattr(row, attname)
+                if pk is not None and _matches(row, counter.conditions):
+                    deltas[pk] += sign
+            _update_by_delta(counter.parent, counter.column, deltas)
+
+
+def actual_count(counter):
+    """Subquery counting a parent row's related rows, for annotate() and update()"""
+    related = (
+        counter.model._base_manager.filter(**{counter.field: OuterRef('pk')}, **counter.conditions)
+        .order_by().values(counter.field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(related, output_field=IntegerField()), Value(0))
+
+
+def reconcile_counters(fix=True):
+    """
+    Recount every counter from the related tables and, with `fix`, correct
+    the rows that drifted. Returns {'Model.column': rows that were off}.
+    """
+    drift = {}
+    for counter in COUNTERS:
+        column = counter.column
+        drifted = list(
+            counter.parent._base_manager.annotate(actual=actual_count(counter))
+            .exclude(**{column: F('actual')})
+            .values_list('pk', column, 'actual')
+        )
+        drift[f'{counter.parent.__name__}.{column}'] = len(drifted)
+        if fix and drifted:
+            with transaction.atomic():
+                _update_by_delta(counter.parent, column, {pk: actual - stored for pk, stored, actual in drifted})
+    return drift
@@ -0,0 +1,258 @@
+"""
+Cycle counts and physical inventory reconciliation.
+
+Starting a session freezes the expected balance of every occupied slot in
+scope into count lines. Scanned counts are loaded in bulk (CSV or API),
+variances are computed with one UPDATE, and posting writes one ADJ-GAIN or
+ADJ-LOSS ledger row per non-zero variance in a single bulk insert, so the
+cost of a count grows with the number of lines, not with round trips.
+"""
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .counters import count_rows
+from .lookups import bump_version
+from .outbox import emit_transactions
+from .receiving import allocate_transaction_ids
+from .snapshots import invalidate_snapshots
+from .storage import apply_movements
+from .write_queue import serialized
+from ..models import (
+    IdentifierSequence, CountSession, CountLine, StorageOccupancy, StorageLocation, Batch, ItemRecord,
+    InventoryTransaction, TransactionTypeChoices
+)
+
+COUNT_TXN_KIND = 'C'
+OPEN = 'open'
+POSTED = 'posted'
+CANCELLED = 'cancelled'
+
+CSV_COLUMNS = ('location', 'item', 'batch', 'quantity')
+
+
+class CountError(ValueError):
+    """Raised when a count session cannot be started, loaded or posted"""
+
+
+def next_count_id(day=None):
+    day = day or timezone.localdate()
+    number = IdentifierSequence.allocate(f"count-{day.strftime('%Y%m%d')}", 1)
+    return f"CNT-{day.strftime('%Y%m%d')}-{number:03d}"
+
+
+def start_session(user, zone=None, location_ids=None, name=''):
+    """
+    Open a count over a zone, a list of locations, or (neither given) the
+    whole warehouse, with one count line per occupied slot in scope.
+    """
+    occupancy = StorageOccupancy.objects.filter(quantity__gt=0)
+    if zone is not None:
+        occupancy = occupancy.filter(location__zone_id=zone)
+    if location_ids:
+        occupancy = occupancy.filter(location_id__in=location_ids)
+
+    with transaction.atomic():
+        session = CountSession.objects.create(
+            count_id=next_count_id(), name=name, zone=zone, created_by=user
+        )
+        CountLine.objects.bulk_create([
+            CountLine(
+                session=session, location_id=location_id, batch_id=batch_id, item_id=item_id,
+                expected_quantity=quantity,
+            )
+            for location_id, batch_id, item_id, quantity in occupancy.values_list(
+                'location_id', 'batch_id', 'item_id', 'quantity'
+            ).iterator(chunk_size=2000)
+        ], batch_size=1000)
+    return session
+
+
+def parse_counts_csv(text):
+    """Count entries from CSV text with location, item, batch and quantity columns"""
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in ('location', 'item', 'quantity') if column not in (reader.fieldnames or [])]
+    if missing:
+        raise CountError(f'CSV is missing columns: {", ".join(missing)}')
+    return [{column: (row.get(column) or '').strip() for column in CSV_COLUMNS} for row in reader]
+
+
+def _open_session(session):
+    if session.status != OPEN:
+        raise CountError(f'Count {session.count_id} is {session.status}')
+
+
+@serialized
+def record_counts(session, entries, user):
+    """
+    Load scanned counts. Entries for the same slot within one load are
+    summed (one scan per container); a load replaces any earlier count of
+    the slots it contains. Slots that were not expected become new lines
+    with an expected quantity of zero. Returns counts of updated and added
+    lines plus one error per rejected entry.
+    """
+    _open_session(session)
+    totals, errors = {}, []
+    for index, entry in enumerate(entries):
+        try:
+            quantity = Decimal(str(entry.get('quantity', '')).strip())
+        except InvalidOperation:
+            errors.append({'row': index + 1, 'error': 'invalid quantity'})
+            continue
+        if quantity < 0:
+            errors.append({'row': index + 1, 'error': 'negative quantity'})
+            continue
+        key = (entry.get('location') or '', entry.get('batch') or None, entry.get('item') or '')
+        totals[key] = totals.get(key, Decimal('0')) + quantity
+
+    locations = set(StorageLocation.objects.filter(
+        location_id__in={key[0] for key in totals}
+    ).values_list('location_id', flat=True))
+    items = ItemRecord.objects.pks(key[2] for key in totals)
+    batches = {
+        batch_id: (pk, item_pk)
+        for batch_id, pk, item_pk in Batch.objects.filter(
+            batch_id__in={key[1] for key in totals if key[1]}
+        ).values_list('batch_id', 'id', 'item_record_id')
+    }
+    lines = {
+        (line.location_id, line.batch_id, line.item_id): line
+        for line in session.lines.all()
+    }
+
+    now = timezone.now()
+    changed, added = [], []
+    for key, quantity in totals.items():
+        location_id, batch_id, item_id = key
+        error = None
+        if location_id not in locations:
+            error = f'unknown location {location_id}'
+        elif item_id not in items:
+            error = f'unknown item {item_id}'
+        elif batch_id and batch_id not in batches:
+            error = f'unknown batch {batch_id}'
+        elif batch_id and batches[batch_id][1] != items[item_id]:
+            error = f'batch {batch_id} is not item {item_id}'
+        if error:
+            errors.append({'location': location_id, 'item': item_id, 'batch': batch_id, 'error': error})
+            continue
+        batch_pk = batches[batch_id][0] if batch_id else None
+        line = lines.get((location_id, batch_pk, items[item_id]))
+        if line is None:
+            added.append(CountLine(
+                session=session, location_id=location_id, batch_id=batch_pk, item_id=items[item_id],
+                expected_quantity=0, counted_quantity=quantity, counted_by=user, counted_at=now,
+            ))
+        else:
+            line.counted_quantity = quantity
+            changed.append(line)
+
+    # Scanned quantities repeat a lot, so one UPDATE per distinct quantity
+    ids_by_quantity = defaultdict(list)
+    for line in changed:
+        ids_by_quantity[line.counted_quantity].append(line.id)
+    with transaction.atomic():
+        for quantity, line_ids in ids_by_quantity.items():
+            for start in range(0, len(line_ids), 500):
+                CountLine.objects.filter(id__in=line_ids[start:start + 500]).update(
+                    counted_quantity=quantity, counted_by=user, counted_at=now
+                )
+        CountLine.objects.bulk_create(added, batch_size=1000)
+    return {'updated': len(changed), 'added': len(added), 'errors': errors}
+
+
+def variance_expression(uncounted_as_zero=False):
+    """
+    counted - expected. Uncounted lines have no variance in a cycle count,
+    or count as zero in a full physical inventory.
+    """
+    counted = Coalesce('counted_quantity', Value(Decimal('0'))) if uncounted_as_zero else F('counted_quantity')
+    return ExpressionWrapper(counted - F('expected_quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def variances(session, uncounted_as_zero=False):
+    """Lines with a non-zero variance and the session totals, computed in SQL without writing"""
+    lines = session.lines.annotate(delta=variance_expression(uncounted_as_zero))
+    summary = lines.aggregate(
+        lines=Count('id'),
+        counted=Count('id', filter=Q(counted_quantity__isnull=False)),
+        with_variance=Count('id', filter=Q(delta__isnull=False) & ~Q(delta=0)),
+        gain=Sum('delta', filter=Q(delta__gt=0)),
+        loss=Sum('delta', filter=Q(delta__lt=0)),
+    )
+    return lines.exclude(delta__isnull=True).exclude(delta=0), summary
+
+
+@serialized
+def post_adjustments(session, user, reason, uncounted_as_zero=False):
+    """
+    Post every non-zero variance as an ADJ-GAIN or ADJ-LOSS ledger row with
+    `reason` as the adjustment reason, and close the session. Occupancy,
+    snapshots, counters and outbox events are updated once for the whole set.
+    """
+    _open_session(session)
+    if not reason:
+        raise CountError('An adjustment reason is required')
+
+    with transaction.atomic():
+        session = CountSession.objects.select_for_update().get(pk=session.pk)
+        _open_session(session)
+        lines = session.lines.all()
+        if uncounted_as_zero:
+            lines.filter(counted_quantity__isnull=True).update(counted_quantity=0)
+        lines.update(variance=variance_expression())
+        lines = list(
+            session.lines.exclude(variance__isnull=True).exclude(variance=0)
+            .select_related('location', 'item')
+        )
+        now = timezone.now()
+        rows = [
+            InventoryTransaction(
+                transaction_id=transaction_id,
+                transaction_datetime=now,
+                transaction_user=user,
+                transaction_type=TransactionTypeChoices.ADJ_GAIN if line.variance > 0 else TransactionTypeChoices.ADJ_LOSS,
+                comments=f'{session.count_id}: counted {line.counted_quantity}, expected {line.expected_quantity}',
+                product_code=line.item.item_record_id,
+                item_code=line.item,
+                product_name=line.item.item_name,
+                batch_id_id=line.batch_id,
+                quantity=abs(line.variance),
+                unit=line.item.unit_of_measure,
+                storage_zone_id=line.location.zone_id_id,
+                storage_location=line.location,
+                adjustment_reason=reason,
+            )
+            for line, transaction_id in zip(lines, allocate_transaction_ids(len(lines), now, kind=COUNT_TXN_KIND))
+        ]
+        InventoryTransaction.objects.bulk_create(rows, batch_size=500)
+        apply_movements(rows)
+        invalidate_snapshots(rows)
+        emit_transactions(rows)
+        count_rows(InventoryTransaction, rows)
+        if rows:
+            bump_version(InventoryTransaction._meta.db_table)
+
+        for line, row in zip(lines, rows):
+            line.adjustment_transaction_id = row.transaction_id
+        CountLine.objects.bulk_update(lines, ['adjustment_transaction_id'], batch_size=200)
+
+        session.status = POSTED
+        session.posted_by = user
+        session.posted_at = now
+        session.adjustment_reason = reason
+        session.save(update_fields=['status', 'posted_by', 'posted_at', 'adjustment_reason'])
+    return rows
+
+
+def cancel_session(session):
+    _open_session(session)
+    session.status = CANCELLED
+    session.save(update_fields=['status'])
+    return session
@@ -0,0 +1,92 @@
+"""
+Gap-tolerant cursors over auto-increment logs (SyncChange, OutboxEvent).
+
+IDs are handed out when a row is inserted but become visible when its
+transaction commits, so a reader can see ID 11 while ID 10 is still in
+flight; a cursor advanced to 11 would skip 10 for good. Readers therefore
+stop at the first hole in the IDs while the transaction that may own it
+could still be open:
+
+- SQLite admits one writer at a time, and IDs are allocated under its
+  write lock, so a hole a reader can see is always a rollback and is
+  skipped at once.
+- PostgreSQL lists open transactions in pg_stat_activity. The hole was
+  allocated before the row after it was written, so once every open
+  transaction started after that row, the hole's owner has ended and the
+  hole is skipped.
+- Elsewhere a hole is skipped when the row after it is older than
+  GAP_GRACE.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+GAP_GRACE = timedelta(seconds=10)
+# Allowance for the application and database clocks disagreeing
+CLOCK_MARGIN = timedelta(seconds=1)
+
+OLDEST_OPEN_TRANSACTION_SQL = {
+    'postgresql': (
+        "SELECT min(xact_start) FROM pg_stat_activity "
+        "WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL"
+    ),
+}
+
+
+def gap_grace():
+    seconds = getattr(settings, 'SEQUENCE_GAP_GRACE_SECONDS', None)
+    return GAP_GRACE if seconds is None else timedelta(seconds=seconds)
+
+
+def open_write_cutoff(now=None):
+    """
+    Holes in front of rows created at or before this time can no longer be
+    filled by a transaction that is still open
+    """
+    now = now or timezone.now()
+    if connection.vendor == 'sqlite':
+        return now
+    sql = OLDEST_OPEN_TRANSACTION_SQL.get(connection.vendor)
+    if sql is None:
+        return now - gap_grace()
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        started = cursor.fetchone()[0]
+    return now if started is None else min(now, started - CLOCK_MARGIN)
+
+
+def settled(rows, after, key, now=None):
+    """
+    The leading rows of `rows` (read in ID order after cursor `after`) that
+    the cursor may move past. `key(row)` returns the row's (id, created_at).
+    """
+    cutoff = None
+    expected = after + 1
+    for index, row in enumerate(rows):
+        row_id, created_at = key(row)
+        if row_id != expected:
+            # Only a hole needs the cutoff, which may cost a query
+            if cutoff is None:
+                cutoff = open_write_cutoff(now)
+            if created_at > cutoff:
+                return rows[:index]
+        expected = row_id + 1
+    return rows
+
+
+def high_water(queryset, id_field, time_field, now=None):
+    """
+    Highest ID of `queryset` a new reader can start from: every older ID is
+    committed or rolled back.
+    """
+    cutoff = open_write_cutoff(now)
+    queryset = queryset.order_by(id_field)
+    last = (
+        queryset.filter(**{f'{time_field}__lte': cutoff})
+        .order_by(f'-{id_field}').values_list(id_field, flat=True).first()
+    ) or 0
+    recent = list(queryset.filter(**{f'{id_field}__gt': last}).values_list(id_field, time_field))
+    rows = settled(recent, last, key=lambda row: row, now=now)
+    return rows[-1][0] if rows else last
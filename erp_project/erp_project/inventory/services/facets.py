@@ -0,0 +1,157 @@
+"""
+Per-value counts for the filter dropdowns of list pages.
+
+A facet's counts are taken under every active filter except its own, so
+picking a category still shows how many rows each other category would
+give. That is one grouped query per facet; facets whose own filter is not
+set share the same rows, and on PostgreSQL they are counted together in
+one GROUPING SETS query.
+
+Results are cached per process like the dropdown payloads (see lookups):
+keyed by the page and a hash of its filter values, and thrown away when
+one of the tables the page reads changes version.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from django.db import connection
+from django.db.models import Count
+
+from .lookups import table_versions
+from ..models import (
+    Batch, InventoryTransaction, ItemRecord,
+    CategoryChoices, GradeChoices, QAStatusChoices, TransactionTypeChoices
+)
+
+# Filter sets remembered per process; the least recently used is dropped first
+FACET_CACHE_SIZE = 256
+
+
+class Facet:
+    """One filter dropdown: the field it filters on and its options"""
+
+    def __init__(self, field, choices):
+        self.field = field
+        self.choices = choices
+
+    def options(self, counts):
+        """(value, label, count) for every choice, 0 for values with no rows"""
+        return [(value, label, counts.get(value, 0)) for value, label in self.choices]
+
+
+class FacetSet:
+    """The facets of one list page and the tables its rows come from"""
+
+    def __init__(self, name, tables, facets):
+        self.name = name
+        self.tables = tables
+        self.facets = facets
+
+
+FACET_SETS = {
+    facet_set.name: facet_set
+    for facet_set in (
+        FacetSet('items', [ItemRecord._meta.db_table], [
+            Facet('category', CategoryChoices.choices),
+            Facet('grade', GradeChoices.choices),
+        ]),
+        FacetSet('batches', [Batch._meta.db_table, ItemRecord._meta.db_table], [
+            Facet('qa_status', QAStatusChoices.choices),
+        ]),
+        FacetSet('transactions', [
+            InventoryTransaction._meta.db_table, ItemRecord._meta.db_table, Batch._meta.db_table
+        ], [
+            Facet('transaction_type', TransactionTypeChoices.choices),
+            Facet('qa_status', QAStatusChoices.choices),
+        ]),
+    )
+}
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+def filter_hash(filters):
+    """Stable digest of the active filter values (today's date included for relative filters)"""
+    values = sorted((name, str(value)) for name, (value, _) in filters.items())
+    return hashlib.md5(repr([values, date.today().isoformat()]).encode()).hexdigest()
+
+
+def _grouped_counts(queryset, field):
+    return dict(queryset.order_by().values(field).annotate(total=Count('pk')).values_list(field, 'total'))
+
+
+def _grouping_sets_counts(queryset, fields):
+    """{field: {value: count}} for several fields over the same rows, one query (PostgreSQL)"""
+    opts = queryset.model._meta
+    quote = connection.ops.quote_name
+    columns = [quote(opts.get_field(field).column) for field in fields]
+    inner, params = queryset.order_by().values(*fields).query.sql_with_params()
+    sql = 'SELECT {columns}, {groupings}, COUNT(*) FROM ({inner}) AS facet_rows GROUP BY GROUPING SETS ({sets})'.format(
+        columns=', '.join(columns),
+        groupings=', '.join(f'GROUPING({column})' for column in columns),
+        inner=inner,
+        sets=', '.join(f'({column})' for column in columns),
+    )
+    counts = {field: {} for field in fields}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            values, groupings, total = row[:len(fields)], row[len(fields):-1], row[-1]
+            # GROUPING() is 0 for the column a row was grouped by
+            index = groupings.index(0)
+            counts[fields[index]][values[index]] = total
+    return counts
+
+
+def _count(facet_set, queryset, filters):
+    counts = {}
+    shared = []
+    for facet in facet_set.facets:
+        if facet.field in filters:
+            others = [condition for name, (_, condition) in filters.items() if name != facet.field]
+            counts[facet.field] = _grouped_counts(queryset.filter(*others), facet.field)
+        else:
+            shared.append(facet.field)
+    if shared:
+        rows = queryset.filter(*[condition for _, condition in filters.values()])
+        if connection.vendor == 'postgresql' and len(shared) > 1:
+            counts.update(_grouping_sets_counts(rows, shared))
+        else:
+            for field in shared:
+                counts[field] = _grouped_counts(rows, field)
+    return {facet.field: facet.options(counts[facet.field]) for facet in facet_set.facets}
+
+
+def facet_counts(name, queryset, filters):
+    """
+    {field: [(value, label, count)]} for the facets of list page `name`.
+
+    `queryset` is the page's rows before filtering and `filters` maps each
+    active filter's request parameter to (value, Q); a facet's own filter is
+    its field name. Cached until a table of the page changes.
+    """
+    facet_set = FACET_SETS[name]
+    versions = table_versions(facet_set.tables)
+    versions = tuple(versions[table] for table in facet_set.tables)
+    key = (name, filter_hash(filters))
+    with _lock:
+        cached = _results.get(key)
+        if cached is not None and cached[0] == versions:
+            _results.move_to_end(key)
+            return cached[1]
+    result = _count(facet_set, queryset, filters)
+    with _lock:
+        _results[key] = (versions, result)
+        _results.move_to_end(key)
+        while len(_results) > FACET_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
+
+
+def clear():
+    """Drop every cached result in this process"""
+    with _lock:
+        _results.clear()
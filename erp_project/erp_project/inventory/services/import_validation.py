@@ -0,0 +1,233 @@
+"""
+Dry-run validation of the source files read by import_real_data_v2.
+
+Each CSV file or workbook sheet is loaded once into the columns its source
+schema declares (one list of raw strings per column), and every check runs
+over a whole column at a time with the schema's own parsers, so a value is parsed once per
+distinct value and a date column tries the format that matched last first.
+Bad values are reported with their file, line and column instead of being
+zeroed or dropped one row at a time during the import, and nothing touches
+the database.
+"""
+import json
+import re
+from collections import Counter, defaultdict
+from itertools import chain, islice
+from operator import itemgetter
+
+from .source_schemas import DATE, QUANTITY, UNIT, converted, normalise_header
+from ..models import UOMChoices
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Pack sizes such as "500 gm" or "100 pcs./pkt": optional amount, then the unit
+UNIT_PATTERN = re.compile(r'(?:\d+(?:\.\d+)?)?\s*([A-Za-z]+)')
+
+UNIT_ALIASES = {
+    'kg': UOMChoices.KG, 'kgs': UOMChoices.KG,
+    'g': UOMChoices.G, 'gm': UOMChoices.G, 'gms': UOMChoices.G, 'gram': UOMChoices.G, 'grams': UOMChoices.G,
+    'l': UOMChoices.L, 'ltr': UOMChoices.L, 'litre': UOMChoices.L, 'liter': UOMChoices.L,
+    'ml': UOMChoices.ML,
+    'bottle': UOMChoices.BOTTLE, 'bottles': UOMChoices.BOTTLE, 'btl': UOMChoices.BOTTLE,
+    'pcs': UOMChoices.PCS, 'pc': UOMChoices.PCS, 'no': UOMChoices.PCS, 'nos': UOMChoices.PCS,
+    'box': UOMChoices.BOX, 'boxes': UOMChoices.BOX,
+}
+
+
+class ValidationReport:
+    """Issues found across all files, each tied to a file, line and column"""
+
+    def __init__(self):
+        self.issues = []
+        self.files = {}
+
+    def add(self, filename, severity, message, line=None, column=None, value=None):
+        self.issues.append({
+            'file': filename, 'line': line, 'column': column, 'value': value,
+            'severity': severity, 'message': message,
+        })
+        counts = self.files.setdefault(filename, {'rows': 0, ERROR: 0, WARNING: 0})
+        counts[severity] += 1
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue['severity'] == ERROR]
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue['severity'] == WARNING]
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'errors': len(self.errors),
+            'warnings': len(self.warnings),
+            'issues': self.issues,
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(self.as_dict(), handle, indent=2)
+
+
+def load_columns(rows, schema, head=10):
+    """
+    The first `head` raw data rows, the row count and {field: [raw values]}
+    for the schema's columns found in the header. Rows are not kept: only
+    the wanted columns are picked out and transposed.
+    """
+    rows = iter(rows)
+    header = []
+    for _ in range(schema.header_row + 1):
+        header = next(rows, [])
+    first_rows = list(islice(rows, head))
+    indexes = {
+        column.field: index
+        for column, index in zip(schema.columns, schema.compile(header).indexes)
+        if index is not None
+    }
+    if not indexes:
+        return first_rows, len(first_rows) + sum(1 for _ in rows), {}
+    getter = itemgetter(*indexes.values())
+    width = max(indexes.values()) + 1
+    padding = [''] * width
+    picked = [
+        getter(row) if len(row) >= width else getter(row + padding)
+        for row in chain(first_rows, rows)
+    ]
+    if not picked:
+        return first_rows, 0, {field: [] for field in indexes}
+    columns = zip(*picked) if len(indexes) > 1 else [picked]
+    return first_rows, len(picked), dict(zip(indexes, columns))
+
+
+def _line_number(index, schema):
+    # Line numbers count from 1 at the top of the file, header included
+    return index + schema.header_row + 2
+
+
+def check_quantities(report, filename, column, values, schema):
+    parser = column.parser()
+    parsed = {value: parser(value) for value in set(values)}
+    for line, value in enumerate(values):
+        quantity = parsed[value]
+        if quantity == '':
+            continue
+        if not converted(quantity):
+            report.add(filename, ERROR, 'quantity is not a number (the importer records 0)',
+                       _line_number(line, schema), column.header, quantity)
+        elif quantity < 0:
+            report.add(filename, ERROR, 'negative quantity', _line_number(line, schema), column.header, value.strip())
+
+
+def check_units(report, filename, column, values, schema):
+    known = {choice.value for choice in UOMChoices}
+    unknown = set()
+    for value in set(values):
+        text = value.strip()
+        if not text or text in known:
+            continue
+        match = UNIT_PATTERN.match(text)
+        if not match or match.group(1).lower() not in UNIT_ALIASES:
+            unknown.add(value)
+    for line, value in enumerate(values):
+        if value in unknown:
+            report.add(filename, WARNING, f'unit does not map to one of {", ".join(sorted(known))}',
+                       _line_number(line, schema), column.header, value.strip())
+
+
+def check_dates(report, filename, column, values, schema):
+    parser = column.parser()
+    parsed = {value: parser(value) for value in set(values)}
+    for line, value in enumerate(values):
+        result = parsed[value]
+        if result != '' and not converted(result):
+            report.add(filename, ERROR, 'unrecognised date (the importer leaves it empty)',
+                       _line_number(line, schema), column.header, result)
+
+
+CHECKS = {QUANTITY: check_quantities, UNIT: check_units, DATE: check_dates}
+
+
+def find_header_line(rows, schema):
+    """Line number of a row further down that holds the required headers, if any"""
+    wanted = {normalise_header(schema.column(field).header) for field in schema.required}
+    for index, row in enumerate(rows):
+        if wanted <= {normalise_header(cell) for cell in row}:
+            return _line_number(index, schema)
+    return None
+
+
+def validate_file(report, filename, rows, schema, lots):
+    """
+    Check one file or sheet (its raw rows) against its schema. `lots`
+    collects (lot, filename, column, line) across files, since batch ids
+    are unique over the import.
+    """
+    first_rows, count, columns = load_columns(rows, schema)
+    report.files.setdefault(filename, {'rows': 0, ERROR: 0, WARNING: 0})['rows'] = count
+
+    missing = [field for field in schema.required if field not in columns]
+    if missing:
+        header_line = find_header_line(first_rows, schema)
+        where = f'; the header is on line {header_line}' if header_line else ''
+        headers = ', '.join(repr(schema.column(field).header) for field in missing)
+        report.add(filename, ERROR, f'missing column {headers}{where} - every row is skipped')
+        return
+
+    # Rows without the first required column are skipped by the importer
+    keep = [bool(value.strip()) for value in columns[schema.required[0]]]
+    skipped = not all(keep)
+
+    for column in schema.columns:
+        values = columns.get(column.field)
+        if values is None:
+            continue
+        if skipped:
+            values = [value if kept else '' for value, kept in zip(values, keep)]
+        check = CHECKS.get(column.kind)
+        if check is not None:
+            check(report, filename, column, values, schema)
+        if column.unique:
+            for line, value in enumerate(values):
+                value = value.strip()
+                if value:
+                    lots.append((value, filename, column.header, _line_number(line, schema)))
+
+
+def check_duplicate_lots(report, lots):
+    """Every repeat of a lot number is reported: the importer keeps only the first row"""
+    counts = Counter(lot for lot, _, _, _ in lots)
+    first = {}
+    for lot, filename, column, line in lots:
+        if counts[lot] < 2:
+            continue
+        if lot not in first:
+            first[lot] = f'{filename} line {line}'
+            continue
+        report.add(filename, ERROR, f'duplicate lot number, first seen in {first[lot]}', line, column, lot)
+
+
+def validate_sources(sources):
+    """
+    Validate [(name, raw rows, SourceSchema)] and return a ValidationReport.
+    A source whose rows are None was not found.
+    """
+    report = ValidationReport()
+    lots = []
+    for name, rows, schema in sources:
+        if rows is None:
+            report.add(name, WARNING, 'file not found')
+            continue
+        validate_file(report, name, rows, schema, lots)
+    check_duplicate_lots(report, lots)
+    return report
+
+
+def summarise(report):
+    """Issue counts per (file, column, message), largest first"""
+    groups = defaultdict(int)
+    for issue in report.issues:
+        groups[(issue['file'], issue['column'], issue['severity'], issue['message'])] += 1
+    return sorted(groups.items(), key=lambda item: -item[1])
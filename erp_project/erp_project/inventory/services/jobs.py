@@ -0,0 +1,358 @@
+"""
+Database-backed job queue - no broker, just the Job table and run_jobs workers.
+
+Tasks are plain functions registered with @task; they receive a JobContext
+for progress reporting and cancellation plus the job's params as keyword
+arguments, and return a JSON-serialisable result. Workers claim jobs with a
+conditional UPDATE, so any number of worker processes can share the table.
+Failed attempts are retried with exponential back-off; jobs whose worker
+stopped heart-beating are put back on the queue.
+"""
+import csv
+import io
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Job, InventoryTransaction
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+RETRY_BASE_SECONDS = 30
+HEARTBEAT_SECONDS = 30
+STALE_AFTER = timedelta(seconds=HEARTBEAT_SECONDS * 4)
+# Progress writes closer together than this are skipped (except the last one)
+PROGRESS_INTERVAL = timedelta(seconds=1)
+
+TASKS = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a task when its job has been cancelled"""
+
+
+class Task:
+    def __init__(self, name, function, label, max_attempts, params, user_runnable):
+        self.name = name
+        self.function = function
+        self.label = label
+        self.max_attempts = max_attempts
+        self.params = params
+        self.user_runnable = user_runnable
+
+
+def task(name, label='', max_attempts=3, params=(), user_runnable=True):
+    """
+    Register a function as a job task. `params` lists the (name, input type,
+    label) the jobs page asks for; `user_runnable` tasks can be queued there.
+    """
+    def register(function):
+        TASKS[name] = Task(name, function, label or name.replace('_', ' ').capitalize(),
+                           max_attempts, params, user_runnable)
+        return function
+    return register
+
+
+def output_dir():
+    path = getattr(settings, 'JOB_OUTPUT_DIR', os.path.join(settings.BASE_DIR, 'job_output'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobContext:
+    """Handed to a running task: progress reporting, cancellation checks and heartbeats"""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_write = None
+
+    def progress(self, done=None, total=None, message=None, force=False):
+        """
+        Record progress (done/total or a bare message). Also a heartbeat
+        and a cancellation point: raises JobCancelled once cancel is requested.
+        """
+        now = timezone.now()
+        finished = done is not None and done == total
+        if not (force or finished) and self._last_write and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        fields = {'heartbeat_at': now}
+        if done is not None and total:
+            fields['progress'] = min(done / total, 1.0)
+        if message is not None:
+            fields['progress_message'] = str(message)[:500]
+        Job.objects.filter(id=self.job.id).update(**fields)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if Job.objects.filter(id=self.job.id, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+class ProgressWriter(io.TextIOBase):
+    """File-like stdout for management commands: each line becomes the job's progress message"""
+
+    def __init__(self, context, keep=200):
+        self.context = context
+        self.lines = []
+        self.keep = keep
+        self._partial = ''
+
+    def write(self, text):
+        self._partial += text
+        *lines, self._partial = self._partial.split('\n')
+        for line in lines:
+            if line.strip():
+                self.lines = (self.lines + [line])[-self.keep:]
+                self.context.progress(message=line)
+        return len(text)
+
+
+class Heartbeat(threading.Thread):
+    """Keeps heartbeat_at fresh while a task runs, so only dead workers look stale"""
+
+    def __init__(self, job_id, interval=HEARTBEAT_SECONDS):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                Job.objects.filter(id=self.job_id, status=RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Queue operations
+
+def enqueue(task_name, params=None, user='', priority=0, max_attempts=None, run_after=None):
+    if task_name not in TASKS:
+        raise ValueError(f'Unknown task {task_name}')
+    return Job.objects.create(
+        task=task_name,
+        params=params or {},
+        created_by=user,
+        priority=priority,
+        max_attempts=max_attempts or TASKS[task_name].max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+
+
+def cancel(job):
+    """Cancel a queued job at once; a running one stops at its next progress report"""
+    if Job.objects.filter(id=job.id, status=QUEUED).update(
+        status=CANCELLED, finished_at=timezone.now(), cancel_requested=True
+    ):
+        return True
+    return bool(Job.objects.filter(id=job.id, status=RUNNING).update(cancel_requested=True))
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """
+    Put running jobs whose worker stopped heart-beating back on the queue;
+    those that used up their attempts fail instead
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=RUNNING, heartbeat_at__lt=now - stale_after)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=FAILED, worker='', finished_at=now, error='Worker stopped responding on the last attempt',
+    )
+    return stale.update(status=QUEUED, worker='', run_after=now)
+
+
+def claim_next(worker):
+    """Atomically take the next due job; the conditional UPDATE makes concurrent claims safe"""
+    now = timezone.now()
+    candidates = Job.objects.filter(status=QUEUED, run_after__lte=now).order_by('priority', 'id')
+    for job_id in candidates.values_list('id', flat=True)[:5]:
+        claimed = Job.objects.filter(id=job_id, status=QUEUED).update(
+            status=RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+            attempts=F('attempts') + 1, progress=0, progress_message='',
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Run one claimed job and record its outcome"""
+    context = JobContext(job)
+    spec = TASKS.get(job.task)
+    heartbeat = Heartbeat(job.id)
+    heartbeat.start()
+    try:
+        if spec is None:
+            raise ValueError(f'Unknown task {job.task}')
+        context.check_cancelled()
+        result = spec.function(context, **job.params)
+    except JobCancelled:
+        _finish(job, CANCELLED, progress_message='Cancelled')
+    except Exception:
+        error = traceback.format_exc()
+        if spec is not None and job.attempts < job.max_attempts:
+            Job.objects.filter(id=job.id).update(
+                status=QUEUED, error=error, worker='',
+                run_after=timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)),
+            )
+        else:
+            _finish(job, FAILED, error=error)
+    else:
+        _finish(job, SUCCEEDED, result=result, progress=1.0)
+    finally:
+        heartbeat.stop()
+    job.refresh_from_db()
+    return job
+
+
+def _finish(job, status, **fields):
+    Job.objects.filter(id=job.id).update(status=status, finished_at=timezone.now(), **fields)
+
+
+def run_pending(worker=None, limit=None):
+    """Run due jobs until the queue is empty (or `limit` jobs ran); returns how many ran"""
+    worker = worker or worker_name()
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+# Tasks
+
+def _command_task(context, command, *args, **options):
+    output = ProgressWriter(context)
+    call_command(command, *args, stdout=output, **options)
+    return {'output': output.lines[-50:]}
+
+
+def import_data_dir(name):
+    """A directory under settings.IMPORT_DATA_ROOT; anything resolving outside it is refused"""
+    root = os.path.realpath(getattr(settings, 'IMPORT_DATA_ROOT', os.path.join(settings.BASE_DIR, 'Public')))
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f'{name} is not a directory under the import data root')
+    return path
+
+
+@task('import_real_data', label='Import source data (workbooks or CSV exports)', max_attempts=1,
+      params=[('data_dir', 'text', 'Directory under the import data root'),
+              ('force', 'checkbox', 'Import even if validation finds errors')])
+def import_real_data(context, data_dir='data', force=False):
+    # Not retried: a failed import is bad source data far more often than a transient error
+    return _command_task(context, 'import_real_data_v2', data_dir=import_data_dir(data_dir), force=bool(force))
+
+
+@task('recompute_derived_fields', label='Recompute derived fields (C1-C6)')
+def recompute_derived_fields(context):
+    from .rules import recompute_item_records, recompute_supplier_products
+    context.progress(0, 2, 'Item records')
+    items = recompute_item_records()
+    context.progress(1, 2, 'Supplier-products')
+    supplier_products = recompute_supplier_products()
+    return {'item_records': items, 'supplier_products': supplier_products}
+
+
+@task('compute_review_schedule', label='Recompute supplier review schedule')
+def compute_review_schedule(context):
+    from .reviews import recompute_review_schedule
+    return recompute_review_schedule()
+
+
+@task('rebuild_storage_occupancy', label='Rebuild storage occupancy from the ledger')
+def rebuild_storage_occupancy(context):
+    from .storage import rebuild_occupancy
+    return {'slots': rebuild_occupancy()}
+
+
+@task('snapshot_balances', label='Snapshot closing balances', params=[('as_of', 'date', 'Day (default yesterday)')])
+def snapshot_balances(context, as_of=None, period='daily'):
+    from django.utils.dateparse import parse_date
+    from .snapshots import take_snapshot, refresh_stale
+    day = parse_date(as_of) if as_of else timezone.localdate() - timedelta(days=1)
+    refreshed = refresh_stale()
+    run = take_snapshot(day, period)
+    return {'as_of': run.as_of, 'positions': run.positions, 'refreshed': [stale.as_of for stale in refreshed]}
+
+
+@task('render_labels', label='Render unit labels', user_runnable=False)
+def render_labels(context, batch_id, fmt='pdf', unit_ids=None):
+    """Label files too large to render inside a request, written to JOB_OUTPUT_DIR"""
+    from .labels import render_labels as render
+    from .receiving import labelled_units, label_data
+    labels = label_data(labelled_units(batch_id, unit_ids))
+    context.progress(0, 1, f'{len(labels)} labels', force=True)
+    filename = f"labels-{context.job.id}.{fmt}"
+    with open(os.path.join(output_dir(), filename), 'wb') as handle:
+        handle.write(render(labels, fmt))
+    return {'file': filename, 'labels': len(labels)}
+
+
+EXPORT_COLUMNS = [
+    'transaction_id', 'transaction_datetime', 'transaction_type', 'transaction_user', 'item_code',
+    'product_name', 'batch_id', 'unit_id', 'quantity', 'unit', 'unit_cost', 'storage_zone',
+    'storage_location', 'qa_status', 'supplier_code', 'recipient_code', 'invoice_no', 'invoice_date',
+    'adjustment_reason', 'comments',
+]
+
+# Foreign key columns written as the referenced code: a join for suppliers, items and batches
+EXPORT_LOOKUPS = {
+    'item_code': 'item_code__item_record_id',
+    'batch_id': 'batch_id__batch_id',
+    'supplier_code': 'supplier_code__supplier_id',
+    'storage_zone': 'storage_zone_id',
+    'storage_location': 'storage_location_id',
+    'recipient_code': 'recipient_code_id',
+}
+
+
+@task('export_transactions', label='Export the transaction ledger (CSV)',
+      params=[('date_from', 'date', 'From'), ('date_to', 'date', 'To')])
+def export_transactions(context, date_from=None, date_to=None, chunk_size=5000):
+    """Stream the ledger to a CSV file in JOB_OUTPUT_DIR, reporting progress per chunk"""
+    rows = InventoryTransaction.objects.order_by('transaction_datetime', 'transaction_id')
+    if date_from:
+        rows = rows.filter(transaction_datetime__date__gte=date_from)
+    if date_to:
+        rows = rows.filter(transaction_datetime__date__lte=date_to)
+    total = rows.count()
+    filename = f'transactions-{context.job.id}.csv'
+    path = os.path.join(output_dir(), filename)
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows.values_list(
+            *[EXPORT_LOOKUPS.get(column, column) for column in EXPORT_COLUMNS]
+        ).iterator(chunk_size=chunk_size):
+            writer.writerow(row)
+            written += 1
+            if written % chunk_size == 0:
+                context.progress(written, total, f'{written} of {total} rows')
+    context.progress(written, total, f'{written} rows written', force=True)
+    return {'file': filename, 'rows': written}
@@ -0,0 +1,183 @@
+"""Unit label rendering - Code 128 and QR symbols to multi-page PDF, or ZPL for thermal printers"""
+from . import qr
+
+# Label stock: 4 x 2 inch
+LABEL_WIDTH_PT = 288
+LABEL_HEIGHT_PT = 144
+ZPL_DPI = 203
+# QR symbol box in the top right corner, quiet zone included
+QR_BOX_PT = 72
+QR_QUIET_MODULES = 4
+
+LABEL_FORMATS = ('pdf', 'zpl')
+# Label requests larger than this are rendered by a job instead of the request
+INLINE_LABEL_LIMIT = 1000
+
+# Code 128 module widths (bar, space, bar, space, bar, space) for values 0-106
+CODE128_PATTERNS = [
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+]
+CODE128_START_B = 104
+CODE128_STOP = 106
+
+
+def code128_modules(data):
+    """Encode printable ASCII as Code 128 set B; returns the module width string"""
+    values = []
+    for char in data:
+        code = ord(char)
+        if not 32 <= code <= 126:
+            raise ValueError(f'Cannot encode {char!r} in Code 128 set B')
+        values.append(code - 32)
+    checksum = (CODE128_START_B + sum(position * value for position, value in enumerate(values, 1))) % 103
+    symbols = [CODE128_START_B] + values + [checksum, CODE128_STOP]
+    return ''.join(CODE128_PATTERNS[symbol] for symbol in symbols)
+
+
+def qr_payload(label):
+    """Text carried by the label's QR symbol, the same for PDF and ZPL"""
+    return '|'.join([label['unit_id'], label['batch_id'], label['item_code']])
+
+
+def _pdf_qr(text, left, bottom):
+    """Dark QR modules as filled rectangles, one per horizontal run, in a QR_BOX_PT box"""
+    rows = qr.matrix(text)
+    module = QR_BOX_PT / (len(rows) + 2 * QR_QUIET_MODULES)
+    top = bottom + QR_BOX_PT - QR_QUIET_MODULES * module
+    ops = []
+    for row_no, row in enumerate(rows):
+        y = top - (row_no + 1) * module
+        start = None
+        for col_no, dark in enumerate(row + [False]):
+            if dark and start is None:
+                start = col_no
+            elif not dark and start is not None:
+                x = left + (QR_QUIET_MODULES + start) * module
+                ops.append(f"{x:.2f} {y:.2f} {(col_no - start) * module:.2f} {module:.2f} re")
+                start = None
+    return ops + ['f']
+
+
+def _pdf_text(value):
+    """Escape a string for a PDF literal, dropping characters outside Latin-1"""
+    value = str(value).encode('latin-1', 'replace').decode('latin-1')
+    return value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf_page(label):
+    """Content stream for one label page"""
+    ops = ['BT', '/F1 11 Tf', f"12 {LABEL_HEIGHT_PT - 20} Td", f"({_pdf_text(label['item_name'][:30])}) Tj", 'ET']
+    details = [
+        f"Item: {label['item_code']}",
+        f"Batch: {label['batch_id']}",
+        f"Exp: {label.get('expiry_date') or '-'}   Hazard: {label.get('hazard_class') or 'None'}",
+    ]
+    for line_no, line in enumerate(details):
+        ops += ['BT', '/F1 8 Tf', f"12 {LABEL_HEIGHT_PT - 34 - line_no * 10} Td", f"({_pdf_text(line)}) Tj", 'ET']
+
+    # Barcode: bars as filled rectangles, scaled to fit the label width
+    modules = code128_modules(label['unit_id'])
+    total = sum(int(width) for width in modules)
+    module_width = min(1.2, (LABEL_WIDTH_PT - 24) / total)
+    x = 12.0
+    for index, width in enumerate(modules):
+        bar_width = int(width) * module_width
+        if index % 2 == 0:
+            ops.append(f"{x:.2f} 24 {bar_width:.2f} 40 re f")
+        x += bar_width
+    ops += ['BT', '/F1 9 Tf', '12 12 Td', f"({_pdf_text(label['unit_id'])}) Tj", 'ET']
+    ops += _pdf_qr(qr_payload(label), LABEL_WIDTH_PT - 12 - QR_BOX_PT, LABEL_HEIGHT_PT - 4 - QR_BOX_PT)
+    return '\n'.join(ops)
+
+
+def _zpl_field(value):
+    """
+    Field data sent with ^FH: the ^FH escape character and the ZPL command
+    prefixes (^ and ~) go as _XX hex escapes, so text cannot end the field
+    """
+    value = str(value)
+    for char in '_^~':
+        value = value.replace(char, f'_{ord(char):02X}')
+    return f'^FH^FD{value}^FS'
+
+
+def render_zpl_label(label):
+    """ZPL for one label, with Code 128 and QR symbols rendered by the printer"""
+    expiry = label.get('expiry_date') or '-'
+    hazard = label.get('hazard_class') or 'None'
+    return '\n'.join([
+        '^XA',
+        '^CI28',
+        f"^FO20,15^A0N,30,30{_zpl_field(label['item_name'][:40])}",
+        f"^FO20,50^A0N,22,22{_zpl_field('Item: ' + label['item_code'])}",
+        f"^FO20,75^A0N,22,22{_zpl_field('Batch: ' + label['batch_id'])}",
+        f"^FO20,100^A0N,22,22{_zpl_field(f'Exp: {expiry}  Hazard: {hazard}')}",
+        f"^FO20,135^BY2^BCN,90,Y,N,N{_zpl_field(label['unit_id'])}",
+        f"^FO600,40^BQN,2,5{_zpl_field('QA,' + qr_payload(label))}",
+        '^XZ',
+    ])
+
+
+def _render_all(fmt, labels):
+    render = render_pdf_page if fmt == 'pdf' else render_zpl_label
+    return [render(label) for label in labels]
+
+
+def assemble_pdf(page_streams):
+    """Wrap rendered page content streams in a single multi-page PDF document"""
+    # Objects: 1 catalog, 2 pages, 3 font, then a (page, content) pair per label
+    page_ids = [4 + 2 * index for index in range(len(page_streams))]
+    objects = {
+        1: '<< /Type /Catalog /Pages 2 0 R >>',
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {len(page_ids)} >>",
+        3: '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    }
+    for page_id, stream in zip(page_ids, page_streams):
+        data = stream.encode('latin-1')
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LABEL_WIDTH_PT} {LABEL_HEIGHT_PT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects[page_id + 1] = data
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for object_id in range(1, len(objects) + 1):
+        offsets.append(len(output))
+        body = objects[object_id]
+        output += f'{object_id} 0 obj\n'.encode()
+        if isinstance(body, bytes):
+            output += f'<< /Length {len(body)} >>\nstream\n'.encode() + body + b'\nendstream'
+        else:
+            output += body.encode('latin-1')
+        output += b'\nendobj\n'
+
+    xref_offset = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode()
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode()
+    return bytes(output)
+
+
+def render_labels(labels, fmt='pdf'):
+    """
+    Render label dicts (unit_id, item_code, item_name, batch_id, expiry_date,
+    hazard_class) into one PDF document or one ZPL stream.
+    """
+    if fmt not in LABEL_FORMATS:
+        raise ValueError(f'Unknown label format: {fmt}')
+    bodies = _render_all(fmt, list(labels))
+    if fmt == 'pdf':
+        return assemble_pdf(bodies)
+    return ('\n'.join(bodies) + '\n').encode('utf-8')
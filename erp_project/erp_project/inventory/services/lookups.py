@@ -0,0 +1,413 @@
+"""
+Process-level cache of master-data dropdown payloads and their type-ahead index.
+
+Every cached payload records the version of each table it was built from.
+Versions are counters in IdentifierSequence, bumped when master-data
+writes commit, so every worker process sees an invalidation with one small
+indexed read per request. Dropdowns larger than DROPDOWN_INLINE_LIMIT are not inlined
+into pages; forms switch to the type-ahead endpoint instead.
+
+Type-ahead searches go through a PrefixIndex per dropdown. When only the
+dropdown's own table changed, the index is brought up to date from the
+rows whose updated_at moved since it was last refreshed, rather than
+rebuilt. The same indexes, over whole item, batch, supplier and customer
+tables, serve /api/autocomplete/<entity>/.
+
+With settings.MASTER_SNAPSHOT on, the dropdowns over items, suppliers,
+zones and locations are read from the node's shared snapshot file (see
+master_snapshot) instead of being copied into every process.
+"""
+import random
+import re
+import threading
+from bisect import bisect_left, insort
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .codes import code_values
+from .cursors import gap_grace
+from ..models import (
+    IdentifierSequence, ItemRecord, Supplier, Customer, StorageZone, StorageLocation, Batch,
+    QAStatusChoices
+)
+
+VERSION_PREFIX = 'version:'
+# Counter rows per table version
+VERSION_STRIPES = 8
+
+# Above this many options a dropdown becomes a type-ahead field
+DROPDOWN_INLINE_LIMIT = 500
+TYPEAHEAD_LIMIT = 20
+# Rows changed at once above which the type-ahead index is rebuilt instead of updated
+INDEX_REFRESH_LIMIT = 2000
+
+WORD_RE = re.compile(r'[\w\-./]+')
+
+
+def _version_names(table):
+    """Counter rows of a table: its version is their sum (see bump_version)"""
+    name = f'{VERSION_PREFIX}{table}'
+    return [name] + [f'{name}:{stripe}' for stripe in range(1, VERSION_STRIPES)]
+
+
+_pending = threading.local()
+
+
+def bump_version(*tables):
+    """
+    Invalidate cached payloads built from `tables`.
+
+    Called inside a transaction, the bump is deferred to its commit and made
+    once per table however many writes the transaction did, so the counter
+    rows are never held locked for the length of a write. Each bump
+    increments one of VERSION_STRIPES rows at random, spreading concurrent
+    writers to the same table over several rows.
+    """
+    if not connection.in_atomic_block:
+        _bump(tables)
+        return
+    pending = getattr(_pending, 'tables', None)
+    if pending is None:
+        pending = _pending.tables = set()
+    pending.update(tables)
+    # One callback per call: those of a rolled-back savepoint are dropped, the
+    # set is not, so a table stays pending until some commit bumps it (at worst once more than needed)
+    transaction.on_commit(_bump_pending)
+
+
+def _bump_pending():
+    pending = getattr(_pending, 'tables', None)
+    if pending:
+        _pending.tables = set()
+        _bump(pending)
+
+
+def _bump(tables):
+    for table in sorted(tables):
+        name = random.choice(_version_names(table))
+        if not IdentifierSequence.objects.filter(name=name).update(last_value=F('last_value') + 1):
+            _, created = IdentifierSequence.objects.get_or_create(name=name, defaults={'last_value': 1})
+            if not created:
+                IdentifierSequence.objects.filter(name=name).update(last_value=F('last_value') + 1)
+
+
+def table_versions(tables):
+    """Current version of each table, one query"""
+    names = {name: table for table in tables for name in _version_names(table)}
+    versions = dict.fromkeys(tables, 0)
+    for name, value in IdentifierSequence.objects.filter(name__in=names).values_list('name', 'last_value'):
+        versions[names[name]] += value
+    return versions
+
+
+class Dropdown:
+    """
+    A named option list: `values` projects the `rows` queryset over one or
+    more master tables. The first search field identifies an option.
+    """
+
+    def __init__(self, name, tables, rows, values, search_fields):
+        self.name = name
+        self.tables = tables
+        self.rows = rows
+        self.values = values
+        self.search_fields = search_fields
+
+    def build(self, **filters):
+        return list(self.values(self.rows().filter(**filters)))
+
+    @cached_property
+    def fields(self):
+        """Keys of each option"""
+        return list(self.values(self.rows()).query.values_select)
+
+    @property
+    def key_field(self):
+        return self.search_fields[0]
+
+    @cached_property
+    def incremental(self):
+        """Whether changed rows can be found by updated_at"""
+        return any(field.name == 'updated_at' for field in self.rows().model._meta.concrete_fields)
+
+
+DROPDOWNS = {
+    dropdown.name: dropdown
+    for dropdown in (
+        Dropdown(
+            'items', [ItemRecord._meta.db_table],
+            lambda: ItemRecord.objects.order_by('item_record_id'),
+            lambda rows: rows.values('item_record_id', 'item_name', 'unit_of_measure', 'category'),
+            ['item_record_id', 'item_name'],
+        ),
+        Dropdown(
+            'approved_suppliers', [Supplier._meta.db_table],
+            lambda: Supplier.objects.filter(approved=True).order_by('supplier_name'),
+            lambda rows: rows.values('supplier_id', 'supplier_name'),
+            ['supplier_id', 'supplier_name'],
+        ),
+        Dropdown(
+            'approved_customers', [Customer._meta.db_table],
+            lambda: Customer.objects.filter(approved=True).order_by('customer_name'),
+            lambda rows: rows.values('customer_code', 'customer_name'),
+            ['customer_code', 'customer_name'],
+        ),
+        Dropdown(
+            'storage_zones', [StorageZone._meta.db_table],
+            lambda: StorageZone.objects.order_by('zone_id'),
+            lambda rows: rows.values('zone_id', 'zone_name'),
+            ['zone_id', 'zone_name'],
+        ),
+        Dropdown(
+            'storage_locations', [StorageLocation._meta.db_table],
+            lambda: StorageLocation.objects.filter(active=True).order_by('location_id'),
+            lambda rows: rows.values('location_id', 'zone_id', 'rack_shelf'),
+            ['location_id', 'rack_shelf'],
+        ),
+        Dropdown(
+            'pending_batches', [Batch._meta.db_table, ItemRecord._meta.db_table],
+            lambda: Batch.objects.filter(qa_status=QAStatusChoices.PENDING).order_by('batch_id'),
+            lambda rows: code_values(
+                rows, 'batch_id', 'item_record_id', 'supplier_code', item_name=F('item_record_id__item_name'),
+            ),
+            ['batch_id', 'item_name'],
+        ),
+        # Whole tables, for the per-entity autocomplete endpoint
+        Dropdown(
+            'batches', [Batch._meta.db_table, ItemRecord._meta.db_table],
+            lambda: Batch.objects.order_by('batch_id'),
+            lambda rows: code_values(
+                rows, 'batch_id', 'item_record_id', 'qa_status', 'expiry_date',
+                item_name=F('item_record_id__item_name'),
+            ),
+            ['batch_id', 'item_name'],
+        ),
+        Dropdown(
+            'suppliers', [Supplier._meta.db_table],
+            lambda: Supplier.objects.order_by('supplier_name'),
+            lambda rows: rows.values('supplier_id', 'supplier_name', 'approved'),
+            ['supplier_id', 'supplier_name'],
+        ),
+        Dropdown(
+            'customers', [Customer._meta.db_table],
+            lambda: Customer.objects.order_by('customer_name'),
+            lambda rows: rows.values('customer_code', 'customer_name', 'approved'),
+            ['customer_code', 'customer_name'],
+        ),
+    )
+}
+
+# /api/autocomplete/<entity>/ searches these dropdowns, each over a whole table
+AUTOCOMPLETE_ENTITIES = {'items': 'items', 'batches': 'batches', 'suppliers': 'suppliers', 'customers': 'customers'}
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+_payloads = {}
+_sizes = {}
+_lock = threading.Lock()
+
+
+def dropdown(name, versions=None):
+    """Cached option list for a dropdown, rebuilt only when one of its tables changed"""
+    spec = DROPDOWNS[name]
+    from . import master_snapshot
+    if name in master_snapshot.TABLE_SPECS:
+        table = master_snapshot.table(name, versions)
+        if table is not None:
+            return table.records(spec.fields)
+    versions = versions or table_versions(spec.tables)
+    versions = tuple(versions[table] for table in spec.tables)
+    cached = _payloads.get(name)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+    with _lock:
+        cached = _payloads.get(name)
+        if cached is None or cached[0] != versions:
+            cached = _payloads[name] = (versions, spec.build())
+    return cached[1]
+
+
+def dropdown_size(name, versions=None):
+    """Number of options in a dropdown, one COUNT(*) per change of its tables"""
+    spec = DROPDOWNS[name]
+    versions = versions or table_versions(spec.tables)
+    versions = tuple(versions[table] for table in spec.tables)
+    cached = _sizes.get(name)
+    if cached is None or cached[0] != versions:
+        cached = _sizes[name] = (versions, spec.rows().count())
+    return cached[1]
+
+
+def dropdown_context(*names):
+    """
+    Template context for form dropdowns: `<name>` holds the options, or an
+    empty list with `<name>_typeahead` set when the list is too large to inline.
+    """
+    from . import master_snapshot
+    context = {}
+    tables = {table for name in names for table in DROPDOWNS[name].tables}
+    if master_snapshot.enabled():
+        tables.update(master_snapshot.TABLES)
+    versions = table_versions(tables)
+    for name in names:
+        # Sized without building the full list, which large dropdowns never need
+        table = master_snapshot.table(name, versions) if name in master_snapshot.TABLE_SPECS else None
+        size = len(table) if table is not None else dropdown_size(name, versions)
+        typeahead = size > DROPDOWN_INLINE_LIMIT
+        context[name] = [] if typeahead else dropdown(name, versions)
+        context[f'{name}_typeahead'] = typeahead
+    return context
+
+
+def _normalise(value):
+    return str(value if value is not None else '').strip().lower()
+
+
+class PrefixIndex:
+    """
+    The options of one dropdown by key, with two sorted arrays searched by
+    bisection: (value, key) for every search-field value and (word, key) for
+    every word in them. A query costs O(log n + k) whatever the list size,
+    and options are added and removed in place.
+    """
+
+    def __init__(self, key_field, search_fields, options=()):
+        self.key_field = key_field
+        self.search_fields = search_fields
+        self.options = {option[key_field]: dict(option) for option in options}
+        self.values = sorted(entry for key, option in self.options.items() for entry in self._values(key, option))
+        self.words = sorted(entry for key, option in self.options.items() for entry in self._words(key, option))
+
+    def _values(self, key, option):
+        return {(_normalise(option[field]), key) for field in self.search_fields}
+
+    def _words(self, key, option):
+        return {(word, key) for field in self.search_fields for word in WORD_RE.findall(_normalise(option[field]))}
+
+    def __len__(self):
+        return len(self.options)
+
+    def copy(self):
+        clone = PrefixIndex(self.key_field, self.search_fields)
+        clone.options, clone.values, clone.words = dict(self.options), list(self.values), list(self.words)
+        return clone
+
+    def remove(self, key):
+        option = self.options.pop(key, None)
+        if option is None:
+            return
+        for entries, array in ((self._values(key, option), self.values), (self._words(key, option), self.words)):
+            for entry in entries:
+                position = bisect_left(array, entry)
+                if position < len(array) and array[position] == entry:
+                    del array[position]
+
+    def add(self, option):
+        key = option[self.key_field]
+        self.remove(key)
+        option = self.options[key] = dict(option)
+        for entry in self._values(key, option):
+            insort(self.values, entry)
+        for entry in self._words(key, option):
+            insort(self.words, entry)
+
+    @staticmethod
+    def _walk(array, prefix, limit, seen, keys):
+        position = bisect_left(array, (prefix,))
+        while position < len(array) and len(keys) < limit and array[position][0].startswith(prefix):
+            key = array[position][1]
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+            position += 1
+
+    def search(self, query, limit=TYPEAHEAD_LIMIT):
+        """
+        Options with a search field starting with `query` first, then those
+        with a word starting with the query's first word and containing the
+        rest of it. An empty query returns the first options.
+        """
+        query = _normalise(query)
+        seen, keys = set(), []
+        self._walk(self.values, query, limit, seen, keys)
+        words = WORD_RE.findall(query)
+        if words and len(keys) < limit:
+            # Over-fetch on multi-word queries since some candidates miss the other words
+            wanted = limit - len(keys)
+            candidates = []
+            self._walk(self.words, words[0], wanted if len(words) == 1 else wanted * 20, set(seen), candidates)
+            for key in candidates:
+                text = ' '.join(_normalise(self.options[key][field]) for field in self.search_fields)
+                if all(word in text for word in words[1:]):
+                    keys.append(key)
+                    if len(keys) >= limit:
+                        break
+        return [self.options[key] for key in keys]
+
+
+_indexes = {}
+
+
+def _refresh(spec, index, since):
+    """
+    Bring a copy of `index` up to date with rows of the dropdown's table
+    changed since `since`; None when a rebuild is cheaper or required
+    """
+    # Rows written by transactions that were still open at `since` carry an earlier updated_at
+    changed = list(
+        spec.rows().model._base_manager.filter(updated_at__gte=since - gap_grace())
+        .values_list(spec.key_field, flat=True)[:INDEX_REFRESH_LIMIT + 1]
+    )
+    if len(changed) > INDEX_REFRESH_LIMIT:
+        return None
+    index = index.copy()
+    for start in range(0, len(changed), 500):
+        keys = changed[start:start + 500]
+        current = {option[spec.key_field]: option for option in spec.build(**{f'{spec.key_field}__in': keys})}
+        for key in keys:
+            if key in current:
+                index.add(current[key])
+            else:
+                index.remove(key)
+    # Deletes leave no updated_at behind; a count that disagrees means one happened
+    if spec.rows().count() != len(index):
+        return None
+    return index
+
+
+def typeahead_index(name, versions=None):
+    """The dropdown's PrefixIndex, updated or rebuilt when one of its tables changed"""
+    spec = DROPDOWNS[name]
+    versions = versions or table_versions(spec.tables)
+    versions = tuple(versions[table] for table in spec.tables)
+    cached = _indexes.get(name)
+    if cached is not None and cached[0] == versions:
+        return cached[2]
+    with _lock:
+        cached = _indexes.get(name)
+        if cached is None or cached[0] != versions:
+            started = timezone.now()
+            index = None
+            # Only the dropdown's own table changed: options of other tables (item names on batches) still hold
+            if cached is not None and spec.incremental and cached[0][1:] == versions[1:]:
+                index = _refresh(spec, cached[2], cached[1])
+            if index is None:
+                index = PrefixIndex(spec.key_field, spec.search_fields, spec.build())
+            cached = _indexes[name] = (versions, started, index)
+    return cached[2]
+
+
+def search_dropdown(name, query, limit=TYPEAHEAD_LIMIT):
+    """Options of a dropdown matching `query`, served from its prefix index"""
+    return typeahead_index(name).search(query, limit)
+
+
+def clear():
+    """Drop every cached payload and index in this process"""
+    with _lock:
+        _payloads.clear()
+        _sizes.clear()
+        _indexes.clear()
@@ -0,0 +1,380 @@
+"""
+Read-only master-data snapshot shared by the worker processes of a node.
+
+Items, approved suppliers, storage zones and active storage locations are
+serialized into one file: each column is a typed array (integers, or
+offsets into a UTF-8 blob for text) and every table carries a sorted key
+index for lookups by code. Workers map the file read-only, so a node holds
+one copy of the data in the page cache instead of one list of dicts per
+process, and rows are decoded only when read.
+
+The file header records the table versions it was built from (see
+lookups). A worker whose mapped snapshot is older than the current versions
+remaps the file, and the first worker to find the file itself out of date
+rebuilds it under a lock and moves it into place atomically; workers still
+reading the old file keep their mapping until they remap.
+
+The snapshot is optional (settings.MASTER_SNAPSHOT). Columns that change
+with every movement, such as location occupancy, are not part of it.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from .lookups import table_versions
+from ..models import ItemRecord, Supplier, StorageZone, StorageLocation
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b'ERPSNAP1'
+FILE_NAME = 'master.snapshot'
+# Sections start on 8-byte boundaries so integer arrays can be cast in place
+ALIGNMENT = 8
+
+
+def enabled():
+    return getattr(settings, 'MASTER_SNAPSHOT', False)
+
+
+def snapshot_dir():
+    return getattr(settings, 'MASTER_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'master_snapshot'))
+
+
+class TableSpec:
+    """One snapshot table: the rows it holds, their columns and the key column"""
+
+    def __init__(self, name, model, query, columns, key):
+        self.name = name
+        self.model = model
+        self.query = query
+        self.columns = columns
+        self.key = key
+
+
+TABLE_SPECS = {
+    spec.name: spec
+    for spec in (
+        TableSpec(
+            'items', ItemRecord,
+            lambda: ItemRecord.objects.order_by('item_record_id'),
+            ['item_record_id', 'item_name', 'unit_of_measure', 'category', 'subtype', 'grade', 'hazard_class',
+             'qa_required', 'traceability_level', 'sds_mandatory', 'coa_mandatory', 'spec_required'],
+            'item_record_id',
+        ),
+        TableSpec(
+            'approved_suppliers', Supplier,
+            lambda: Supplier.objects.filter(approved=True).order_by('supplier_name'),
+            ['supplier_id', 'supplier_name'],
+            'supplier_id',
+        ),
+        TableSpec(
+            'storage_zones', StorageZone,
+            lambda: StorageZone.objects.order_by('zone_id'),
+            ['zone_id', 'zone_name', 'temperature_range', 'humidity_controlled', 'hazard_compatibility',
+             'default_for_category'],
+            'zone_id',
+        ),
+        TableSpec(
+            'storage_locations', StorageLocation,
+            lambda: StorageLocation.objects.filter(active=True).order_by('location_id'),
+            ['location_id', 'zone_id', 'rack_shelf', 'max_capacity', 'capacity_unit'],
+            'location_id',
+        ),
+    )
+}
+
+TABLES = sorted({spec.model._meta.db_table for spec in TABLE_SPECS.values()})
+
+
+# Writing
+
+def _column_kind(field):
+    internal_type = field.get_internal_type()
+    if internal_type == 'BooleanField':
+        return 'bool'
+    if internal_type in ('IntegerField', 'BigIntegerField', 'SmallIntegerField', 'PositiveIntegerField',
+                         'AutoField', 'BigAutoField'):
+        return 'int'
+    return 'str'
+
+
+class _Writer:
+    """Accumulates aligned sections and records where each one starts"""
+
+    def __init__(self):
+        self.sections = []
+        self.size = 0
+
+    def add(self, data):
+        data = bytes(data)
+        start = self.size
+        self.sections.append(data)
+        self.size += len(data)
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.sections.append(b'\0' * padding)
+            self.size += padding
+        return [start, len(data)]
+
+
+def _encode_table(spec, writer):
+    fields = [spec.model._meta.get_field(column) for column in spec.columns]
+    rows = list(spec.query().values_list(*[field.attname for field in fields]))
+    columns = {}
+    for position, (column, field) in enumerate(zip(spec.columns, fields)):
+        values = [row[position] for row in rows]
+        kind = _column_kind(field)
+        entry = {'kind': kind}
+        if any(value is None for value in values):
+            entry['nulls'] = writer.add(bytes(value is None for value in values))
+        if kind == 'str':
+            offsets, blob = array('q', [0]), bytearray()
+            for value in values:
+                if value is not None:
+                    blob += str(value).encode()
+                offsets.append(len(blob))
+            entry['offsets'] = writer.add(offsets.tobytes())
+            entry['data'] = writer.add(blob)
+        else:
+            entry['data'] = writer.add(array('q', [int(value or 0) for value in values]).tobytes())
+        columns[column] = entry
+    key = spec.columns.index(spec.key)
+    order = sorted(range(len(rows)), key=lambda row: str(rows[row][key]))
+    return {'rows': len(rows), 'columns': columns, 'index': writer.add(array('q', order).tobytes())}
+
+
+def build(path=None):
+    """Write a fresh snapshot file and move it into place; returns its path"""
+    path = path or os.path.join(snapshot_dir(), FILE_NAME)
+    # Read the versions first: a write made while the rows are read leaves the file stale, not wrong
+    versions = table_versions(TABLES)
+    writer = _Writer()
+    tables = {name: _encode_table(spec, writer) for name, spec in TABLE_SPECS.items()}
+    header = json.dumps({'versions': versions, 'tables': tables}).encode()
+    prefix = MAGIC + struct.pack('<I', len(header)) + header
+    prefix += b'\0' * (-len(prefix) % ALIGNMENT)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.master-', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            output.write(prefix)
+            for section in writer.sections:
+                output.write(section)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
+
+
+# Reading
+
+class Table:
+    """One table of a mapped snapshot; rows are decoded on access"""
+
+    def __init__(self, buffer, base, layout):
+        self.rows = layout['rows']
+        self.columns = {}
+        for column, entry in layout['columns'].items():
+            nulls = None
+            if 'nulls' in entry:
+                nulls = self._section(buffer, base, entry['nulls'])
+            if entry['kind'] == 'str':
+                offsets = self._section(buffer, base, entry['offsets']).cast('q')
+                self.columns[column] = ('str', offsets, self._section(buffer, base, entry['data']), nulls)
+            else:
+                values = self._section(buffer, base, entry['data']).cast('q')
+                self.columns[column] = (entry['kind'], values, None, nulls)
+        self.index = self._section(buffer, base, layout['index']).cast('q')
+        self.key = None
+
+    @staticmethod
+    def _section(buffer, base, section):
+        start, length = section
+        return buffer[base + start:base + start + length]
+
+    def __len__(self):
+        return self.rows
+
+    def value(self, row, column):
+        kind, values, blob, nulls = self.columns[column]
+        if nulls is not None and nulls[row]:
+            return None
+        if kind == 'str':
+            return str(blob[values[row]:values[row + 1]], 'utf-8')
+        if kind == 'bool':
+            return bool(values[row])
+        return values[row]
+
+    def row(self, row, fields=None):
+        return {column: self.value(row, column) for column in fields or self.columns}
+
+    def find(self, key):
+        """Row number of the row whose key column equals `key`, or None"""
+        key = str(key)
+        keys = _KeyView(self, self.key)
+        position = bisect_left(keys, key)
+        if position < self.rows and keys[position] == key:
+            return self.index[position]
+        return None
+
+    def get(self, key, fields=None):
+        row = self.find(key)
+        return None if row is None else self.row(row, fields)
+
+    def records(self, fields):
+        return Records(self, fields)
+
+
+class _KeyView:
+    """Key column values in index order, for bisect"""
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, position):
+        return self.table.value(self.table.index[position], self.column)
+
+
+class Records:
+    """A snapshot table as a read-only list of dicts with `fields`, in the table's order"""
+
+    def __init__(self, table, fields):
+        self.table = table
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.table.row(row, self.fields) for row in range(*key.indices(len(self.table)))]
+        if key < 0:
+            key += len(self.table)
+        if not 0 <= key < len(self.table):
+            raise IndexError(key)
+        return self.table.row(key, self.fields)
+
+    def __iter__(self):
+        for row in range(len(self.table)):
+            yield self.table.row(row, self.fields)
+
+
+class Snapshot:
+    """A snapshot file mapped read-only"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            self.stat = os.fstat(source.fileno())
+            self.map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f'{path} is not a master-data snapshot')
+        start = len(MAGIC) + 4
+        (length,) = struct.unpack('<I', self.map[len(MAGIC):start])
+        header = json.loads(self.map[start:start + length])
+        base = start + length
+        base += -base % ALIGNMENT
+        self.versions = header['versions']
+        buffer = memoryview(self.map)
+        self.tables = {}
+        for name, layout in header['tables'].items():
+            table = Table(buffer, base, layout)
+            table.key = TABLE_SPECS[name].key
+            self.tables[name] = table
+
+    def covers(self, versions):
+        """Whether the snapshot is at least as new as `versions` for every table it holds"""
+        return all(self.versions.get(table, 0) >= versions.get(table, 0) for table in TABLES)
+
+    def same_file(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) == (self.stat.st_ino, self.stat.st_mtime_ns)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _open(path):
+    try:
+        return Snapshot(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _rebuild(path):
+    """Rebuild the file unless another process did while we waited for the lock"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            snapshot = _open(path)
+            if snapshot is not None and snapshot.covers(table_versions(TABLES)):
+                return snapshot
+            build(path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return _open(path)
+
+
+def current(versions=None):
+    """
+    The mapped snapshot, remapped or rebuilt when older than `versions`
+    (read if not given). None when MASTER_SNAPSHOT is off, and inside a
+    transaction, whose uncommitted writes must not reach other workers.
+    """
+    global _snapshot
+    if not enabled() or connection.in_atomic_block:
+        return None
+    if versions is None or any(table not in versions for table in TABLES):
+        versions = {**table_versions(TABLES), **(versions or {})}
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.covers(versions):
+        return snapshot
+    path = os.path.join(snapshot_dir(), FILE_NAME)
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or not snapshot.covers(versions):
+            if snapshot is None or not snapshot.same_file(path):
+                snapshot = _open(path)
+            if snapshot is None or not snapshot.covers(versions):
+                snapshot = _rebuild(path)
+            _snapshot = snapshot
+    return snapshot
+
+
+def table(name, versions=None):
+    """Snapshot table `name`, or None when the snapshot is not in use"""
+    snapshot = current(versions)
+    return None if snapshot is None else snapshot.tables[name]
+
+
+def clear():
+    """Drop this process's mapping; the next read maps the file again"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
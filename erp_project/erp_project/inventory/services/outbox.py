@@ -0,0 +1,253 @@
+"""Transactional outbox - change events for ledger, batch-status and QA writes, and their relay"""
+import json
+import os
+import socket
+import urllib.request
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from django.utils.module_loading import import_string
+
+from .codes import related_codes
+from .cursors import settled
+from ..models import OutboxEvent, OutboxCursor
+
+TRANSACTION = 'inventory_transaction'
+BATCH = 'batch'
+QA_REVIEW = 'qa_review'
+QA_REVIEW_UNIT = 'qa_review_unit'
+
+RELAY_BATCH_SIZE = 200
+
+
+# Emitting - call inside the transaction that performs the write
+
+def emit(aggregate, action, payloads, key):
+    """Insert one event per payload dict; `key` names the payload field holding the aggregate ID"""
+    events = [
+        OutboxEvent(
+            event_type=f'{aggregate}.{action}',
+            aggregate=aggregate,
+            aggregate_id=str(payload[key]),
+            payload=payload,
+        )
+        for payload in payloads
+    ]
+    if events:
+        OutboxEvent.objects.bulk_create(events, batch_size=500)
+    return len(events)
+
+
+def emit_transactions(transactions, action='created'):
+    items = related_codes(transactions, 'item_code')
+    batches = related_codes(transactions, 'batch_id')
+    return emit(TRANSACTION, action, [
+        {
+            'transaction_id': txn.transaction_id,
+            'transaction_datetime': txn.transaction_datetime,
+            'transaction_type': txn.transaction_type,
+            'transaction_user': txn.transaction_user,
+            'item_code': items.get(txn.item_code_id),
+            'batch_id': batches.get(txn.batch_id_id),
+            'unit_id': txn.unit_id,
+            'quantity': txn.quantity,
+            'unit': txn.unit,
+            'storage_location': txn.storage_location_id,
+            'qa_status': txn.qa_status,
+            'qa_review_id': txn.qa_review_id_id,
+        }
+        for txn in transactions
+    ], 'transaction_id')
+
+
+def emit_batches(batches, action='updated'):
+    items = related_codes(batches, 'item_record_id')
+    suppliers = related_codes(batches, 'supplier_code')
+    return emit(BATCH, action, [
+        {
+            'batch_id': batch.batch_id,
+            'item_record_id': items.get(batch.item_record_id_id),
+            'supplier_code': suppliers.get(batch.supplier_code_id),
+            'qa_status': batch.qa_status,
+            'expiry_date': batch.expiry_date,
+            'storage_location': batch.storage_location_id,
+        }
+        for batch in batches
+    ], 'batch_id')
+
+
+def emit_batch_status(review_ids, qa_status):
+    """
+    One event per batch for a set-based QA disposition (`review_ids` maps
+    batch_id -> qa_review_id). The batch's open ledger rows take the same status.
+    """
+    return emit(BATCH, 'qa_status_changed', [
+        {'batch_id': batch_id, 'qa_status': qa_status, 'qa_review_id': review_id}
+        for batch_id, review_id in review_ids.items()
+    ], 'batch_id')
+
+
+def emit_qa_reviews(reviews, action='created'):
+    batches = related_codes(reviews, 'batch_number')
+    items = related_codes(reviews, 'item_code')
+    suppliers = related_codes(reviews, 'supplier_code')
+    return emit(QA_REVIEW, action, [
+        {
+            'qa_review_id': review.qa_review_id,
+            'batch_id': batches.get(review.batch_number_id),
+            'item_code': items.get(review.item_code_id),
+            'supplier_code': suppliers.get(review.supplier_code_id),
+            'review_outcome': review.review_outcome,
+            'qa_reviewer': review.qa_reviewer,
+            'review_date': review.review_date,
+        }
+        for review in reviews
+    ], 'qa_review_id')
+
+
+def emit_qa_review_units(units, action='created'):
+    batches = related_codes(units, 'batch_number')
+    return emit(QA_REVIEW_UNIT, action, [
+        {
+            'qa_review_id': unit.qa_review_id_id,
+            'unit_id': unit.unit_id,
+            'batch_id': batches.get(unit.batch_number_id),
+            'inventory_txn_id': unit.inventory_txn_id,
+            'disposition': unit.disposition,
+            'reviewed_on': unit.reviewed_on,
+        }
+        for unit in units
+    ], 'unit_id')
+
+
+# Sinks - each takes a list of event dicts and returns only once they are durably handed off
+
+class FileSink:
+    """Append events as JSON lines, fsynced per batch"""
+
+    def __init__(self, target):
+        self.path = target
+
+    def send(self, events):
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for event in events:
+                handle.write(json.dumps(event, cls=DjangoJSONEncoder) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def close(self):
+        pass
+
+
+class SocketSink:
+    """Newline-delimited JSON over a local Unix socket path or host:port"""
+
+    def __init__(self, target, timeout=10):
+        self.target = target
+        self.timeout = timeout
+        self.connection = None
+
+    def _connect(self):
+        if ':' in self.target and not self.target.startswith('/'):
+            host, port = self.target.rsplit(':', 1)
+            return socket.create_connection((host, int(port)), timeout=self.timeout)
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        connection.connect(self.target)
+        return connection
+
+    def send(self, events):
+        if self.connection is None:
+            self.connection = self._connect()
+        body = ''.join(json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events)
+        try:
+            self.connection.sendall(body.encode('utf-8'))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class WebhookSink:
+    """POST each batch as a JSON array; any non-2xx response fails the batch"""
+
+    def __init__(self, target, timeout=10):
+        self.url = target
+        self.timeout = timeout
+
+    def send(self, events):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'events': events}, cls=DjangoJSONEncoder).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if not 200 <= response.status < 300:
+                raise OSError(f'Webhook answered {response.status}')
+
+    def close(self):
+        pass
+
+
+SINKS = {
+    'file': FileSink,
+    'socket': SocketSink,
+    'webhook': WebhookSink,
+}
+
+
+def get_sink(name, target):
+    """Instantiate a registered sink, or any class given by dotted path"""
+    sink_class = SINKS.get(name) or import_string(name)
+    return sink_class(target)
+
+
+# Relay
+
+def event_dict(event):
+    return {
+        'id': event.id,
+        'event_type': event.event_type,
+        'aggregate': event.aggregate,
+        'aggregate_id': event.aggregate_id,
+        'created_at': event.created_at,
+        'payload': event.payload,
+    }
+
+
+def relay_batch(sink, consumer, batch_size=RELAY_BATCH_SIZE):
+    """
+    Deliver the next batch of events after `consumer`'s cursor, in ID order.
+
+    The cursor only advances after the sink accepts the batch, so a crash or
+    sink error means the batch is sent again: delivery is at-least-once and
+    consumers de-duplicate on the event `id`. A batch ends before an ID that
+    may still be held by an uncommitted write (see cursors), so events are
+    neither skipped nor sent out of order. Returns the number delivered.
+    """
+    cursor, _ = OutboxCursor.objects.get_or_create(consumer=consumer)
+    events = settled(
+        list(OutboxEvent.objects.filter(id__gt=cursor.last_event_id).order_by('id')[:batch_size]),
+        cursor.last_event_id, key=lambda event: (event.id, event.created_at),
+    )
+    if not events:
+        return 0
+    sink.send([event_dict(event) for event in events])
+    OutboxCursor.objects.filter(consumer=consumer).update(last_event_id=events[-1].id)
+    return len(events)
+
+
+def prune_delivered():
+    """Delete events every registered consumer has acknowledged"""
+    low_water = OutboxCursor.objects.aggregate(low=Min('last_event_id'))['low']
+    if not low_water:
+        return 0
+    with transaction.atomic():
+        deleted, _ = OutboxEvent.objects.filter(id__lte=low_water).delete()
+    return deleted
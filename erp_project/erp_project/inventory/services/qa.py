@@ -0,0 +1,210 @@
+"""Bulk QA disposition service - A2.2 reviews propagated to A2.1 batches and A2.3 ledger"""
+from django.db import transaction
+from django.db.models import Q, Case, When, Value, CharField
+from django.utils import timezone
+
+from .counters import count_rows
+from .lookups import bump_version
+from .outbox import emit_batch_status, emit_qa_reviews, emit_qa_review_units, emit_transactions
+from .sync import record_changes, BATCH
+from .write_queue import serialized
+from ..models import (
+    Batch, QAReview, QAReviewUnit, InventoryTransaction, IdentifierSequence,
+    QAStatusChoices, ReviewOutcomeChoices, DocumentMatchChoices
+)
+
+# Review outcome -> QA status written to Batch.qa_status and the ledger
+OUTCOME_TO_QA_STATUS = {
+    ReviewOutcomeChoices.APPROVED: QAStatusChoices.APPROVED,
+    ReviewOutcomeChoices.CONDITIONAL: QAStatusChoices.QUARANTINED,
+    ReviewOutcomeChoices.ESCALATED: QAStatusChoices.QUARANTINED,
+    ReviewOutcomeChoices.REJECTED: QAStatusChoices.REJECTED,
+}
+
+# Ledger rows still awaiting a QA decision
+OPEN_LEDGER_QA_STATUSES = ['', QAStatusChoices.PENDING, QAStatusChoices.QUARANTINED]
+
+
+class BulkDispositionError(ValueError):
+    """Raised when a bulk QA request cannot be applied"""
+
+
+def next_review_ids(count, review_date=None):
+    """
+    Reserve `count` sequential QA-YYYYMMDD-NNN review IDs from the day's
+    IdentifierSequence, so concurrent dispositions never hand out the same ID.
+    """
+    review_date = review_date or timezone.now().date()
+    day = review_date.strftime('%Y%m%d')
+    prefix = f"QA-{day}-"
+    name = f'qa-review-{day}'
+    seed = 0
+    if not IdentifierSequence.objects.filter(name=name).exists():
+        # Reviews created before the sequence existed keep their numbers
+        existing = QAReview.objects.filter(qa_review_id__startswith=prefix).values_list('qa_review_id', flat=True)
+        seed = max((int(rid[len(prefix):]) for rid in existing if rid[len(prefix):].isdigit()), default=0)
+    first = IdentifierSequence.allocate(name, count, seed=seed)
+    return [f"{prefix}{number:03d}" for number in range(first, first + count)]
+
+
+def propagate_disposition(review_ids, qa_status, unit_ids=(), unit_only_batch_ids=()):
+    """
+    Push a QA status to Batch.qa_status and the open ledger rows with two UPDATEs.
+
+    `review_ids` maps batch_id -> qa_review_id and is also written to the
+    ledger rows. Batches listed in `unit_only_batch_ids` keep their status and
+    only have the ledger rows of `unit_ids` updated. Batches are given by code.
+    Every batch and ledger row changed gets an outbox event.
+    """
+    batch_ids = list(review_ids)
+    unit_only = set(unit_only_batch_ids)
+    pks = Batch.objects.pks(batch_ids)
+    full_batch_pks = [pks[batch_id] for batch_id in batch_ids if batch_id in pks and batch_id not in unit_only]
+    unit_only_batch_pks = [pks[batch_id] for batch_id in unit_only if batch_id in pks]
+
+    full_batch_ids = [batch_id for batch_id in batch_ids if batch_id in pks and batch_id not in unit_only]
+
+    now = timezone.now()
+    batches_updated = Batch.objects.filter(pk__in=full_batch_pks).update(qa_status=qa_status, updated_at=now)
+    record_changes(BATCH, full_batch_ids)
+    bump_version(Batch._meta.db_table, InventoryTransaction._meta.db_table)
+    emit_batch_status({batch_id: review_ids[batch_id] for batch_id in full_batch_ids}, qa_status)
+    ledger_updated = InventoryTransaction.objects.filter(
+        Q(batch_id__in=full_batch_pks) |
+        Q(batch_id__in=unit_only_batch_pks, unit_id__in=unit_ids),
+        qa_status__in=OPEN_LEDGER_QA_STATUSES,
+    ).update(
+        qa_status=qa_status,
+        updated_at=now,
+        qa_review_id=Case(
+            *[When(batch_id=pks[batch_id], then=Value(review_id)) for batch_id, review_id in review_ids.items() if batch_id in pks],
+            output_field=CharField(),
+        ),
+    )
+    # The reviews are new, so the rows carrying their IDs are exactly the rows just updated
+    if ledger_updated:
+        emit_transactions(
+            InventoryTransaction.objects.filter(qa_review_id__in=list(review_ids.values())).order_by(),
+            'qa_status_changed',
+        )
+    return batches_updated, ledger_updated
+
+
+@serialized
+def bulk_disposition(review_outcome, reviewer, batch_ids=None, unit_ids=None,
+                     review_date=None, coa_match=False, sds_match=False, spec_match=False,
+                     document_match='', qa_file_link='', comments=''):
+    """
+    Record one QA review per batch and propagate the disposition.
+
+    Batches are taken from `batch_ids` and from the ledger rows of `unit_ids`;
+    each reviewed unit also gets a QAReviewUnit row. Every open ledger row of a
+    batch named in `batch_ids` is updated, while batches reached only through
+    units have just those units' rows updated. Runs in one transaction with a
+    fixed number of queries regardless of how many batches or units are given.
+    """
+    if review_outcome not in OUTCOME_TO_QA_STATUS:
+        raise BulkDispositionError(f'Unknown review outcome: {review_outcome}')
+    if document_match and document_match not in DocumentMatchChoices.values:
+        raise BulkDispositionError(f'Unknown document match: {document_match}')
+
+    for name, values in (('batch_ids', batch_ids), ('unit_ids', unit_ids)):
+        if values is not None and (not isinstance(values, (list, tuple)) or not all(isinstance(v, str) for v in values)):
+            raise BulkDispositionError(f'{name} must be a list of IDs')
+
+    qa_status = OUTCOME_TO_QA_STATUS[review_outcome]
+    review_date = review_date or timezone.now().date()
+    batch_ids = list(dict.fromkeys(batch_ids or []))
+    unit_ids = list(dict.fromkeys(unit_ids or []))
+    requested_batch_ids = set(batch_ids)
+
+    if not batch_ids and not unit_ids:
+        raise BulkDispositionError('No batches or units given')
+
+    with transaction.atomic():
+        # Resolve units to (unit_id, batch_id, transaction_id) from the ledger
+        unit_rows = []
+        if unit_ids:
+            first_rows = {}
+            for row in (InventoryTransaction.objects.filter(unit_id__in=unit_ids, batch_id__isnull=False)
+                        .order_by('transaction_datetime')
+                        .values_list('unit_id', 'batch_id__batch_id', 'transaction_id')):
+                first_rows.setdefault(row[0], row)
+            unit_rows = list(first_rows.values())
+            missing_units = set(unit_ids) - set(first_rows)
+            if missing_units:
+                raise BulkDispositionError(f'Units not found in ledger: {", ".join(sorted(missing_units))}')
+            batch_ids = list(dict.fromkeys(batch_ids + [row[1] for row in unit_rows]))
+
+        batches = {
+            row['batch_id']: row
+            for row in Batch.objects.select_for_update()
+            .filter(batch_id__in=batch_ids)
+            .values('id', 'batch_id', 'item_record_id', 'supplier_code')
+        }
+        missing_batches = [batch_id for batch_id in batch_ids if batch_id not in batches]
+        if missing_batches:
+            raise BulkDispositionError(f'Batches not found: {", ".join(missing_batches)}')
+        no_supplier = [batch_id for batch_id in batch_ids if not batches[batch_id]['supplier_code']]
+        if no_supplier:
+            raise BulkDispositionError(f'Batches without a supplier cannot be reviewed: {", ".join(no_supplier)}')
+
+        # Step 1: one batch-level review per batch
+        review_ids = dict(zip(batch_ids, next_review_ids(len(batch_ids), review_date)))
+        reviews = QAReview.objects.bulk_create([
+            QAReview(
+                qa_review_id=review_ids[batch_id],
+                batch_number_id=batches[batch_id]['id'],
+                item_code_id=batches[batch_id]['item_record_id'],
+                supplier_code_id=batches[batch_id]['supplier_code'],
+                coa_match=coa_match,
+                sds_match=sds_match,
+                spec_match=spec_match,
+                coa_attached=False,
+                sds_attached=False,
+                label_attached=False,
+                spec_attached=False,
+                document_match=document_match,
+                review_outcome=review_outcome,
+                qa_reviewer=reviewer,
+                review_date=review_date,
+                qa_file_link=qa_file_link,
+                comments=comments,
+            )
+            for batch_id in batch_ids
+        ])
+
+        # Step 2: unit-level reviews
+        units = QAReviewUnit.objects.bulk_create([
+            QAReviewUnit(
+                qa_review_id_id=review_ids[batch_id],
+                inventory_txn_id=transaction_id,
+                unit_id=unit_id,
+                batch_number_id=batches[batch_id]['id'],
+                visual_check='Failed' if qa_status == QAStatusChoices.REJECTED else 'Passed',
+                disposition=qa_status,
+                reviewer=reviewer,
+                reviewed_on=review_date,
+                notes=comments,
+            )
+            for unit_id, batch_id, transaction_id in unit_rows
+        ])
+        emit_qa_reviews(reviews)
+        emit_qa_review_units(units)
+        count_rows(QAReview, reviews)
+        bump_version(QAReview._meta.db_table, QAReviewUnit._meta.db_table)
+
+        # Step 3: set-based status propagation
+        batches_updated, ledger_updated = propagate_disposition(
+            review_ids, qa_status,
+            unit_ids=unit_ids,
+            unit_only_batch_ids=[batch_id for batch_id in batch_ids if batch_id not in requested_batch_ids],
+        )
+
+    return {
+        'qa_status': qa_status,
+        'reviews': [review.qa_review_id for review in reviews],
+        'units_reviewed': len(units),
+        'batches_updated': batches_updated,
+        'transactions_updated': ledger_updated,
+    }
@@ -0,0 +1,263 @@
+"""
+QR code symbols for unit labels - byte mode, error correction level M, versions 1-10.
+
+A small ISO/IEC 18004 encoder, so the PDF labels carry the same QR symbol
+the ZPL printers draw with ^BQN without adding a dependency. matrix()
+returns rows of booleans (True is a dark module), without the quiet zone.
+"""
+MAX_VERSION = 10
+
+# Level M per version (index 0 unused): ECC codewords per block and number of blocks
+ECC_CODEWORDS_PER_BLOCK = [0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26]
+ECC_BLOCKS = [0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5]
+# Error correction level M in the format information
+FORMAT_LEVEL_BITS = 0
+
+
+def _gf_multiply(x, y):
+    """Multiply in GF(2^8) modulo x^8 + x^4 + x^3 + x^2 + 1"""
+    z = 0
+    for i in reversed(range(8)):
+        z = (z << 1) ^ ((z >> 7) * 0x11D)
+        z ^= ((y >> i) & 1) * x
+    return z
+
+
+def _rs_divisor(degree):
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _gf_multiply(result[j], root)
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _gf_multiply(root, 0x02)
+    return result
+
+
+def _rs_remainder(data, divisor):
+    result = [0] * len(divisor)
+    for byte in data:
+        factor = byte ^ result.pop(0)
+        result.append(0)
+        for i, coefficient in enumerate(divisor):
+            result[i] ^= _gf_multiply(coefficient, factor)
+    return result
+
+
+def _raw_modules(version):
+    """Modules left for data and ECC once the function patterns are placed"""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        alignments = version // 7 + 2
+        result -= (25 * alignments - 10) * alignments - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _data_codewords(version):
+    return _raw_modules(version) // 8 - ECC_CODEWORDS_PER_BLOCK[version] * ECC_BLOCKS[version]
+
+
+def _alignment_positions(version, size):
+    if version == 1:
+        return []
+    count = version // 7 + 2
+    step = (version * 8 + count * 3 + 5) // (count * 4 - 4) * 2
+    return [6] + sorted(size - 7 - i * step for i in range(count - 1))
+
+
+def _encode_data(data, version):
+    """Mode indicator, length, bytes, terminator and padding, as codewords"""
+    bits = [0, 1, 0, 0]
+    for value, width in [(len(data), 8 if version < 10 else 16)] + [(byte, 8) for byte in data]:
+        bits += [(value >> i) & 1 for i in reversed(range(width))]
+    capacity = _data_codewords(version) * 8
+    bits += [0] * min(4, capacity - len(bits))
+    bits += [0] * (-len(bits) % 8)
+    codewords = [int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+    pad = 0xEC
+    while len(codewords) < capacity // 8:
+        codewords.append(pad)
+        pad ^= 0xEC ^ 0x11
+    return codewords
+
+
+def _add_ecc_and_interleave(codewords, version):
+    blocks_count = ECC_BLOCKS[version]
+    ecc_length = ECC_CODEWORDS_PER_BLOCK[version]
+    raw = _raw_modules(version) // 8
+    short_blocks = blocks_count - raw % blocks_count
+    short_length = raw // blocks_count
+    divisor = _rs_divisor(ecc_length)
+    blocks = []
+    start = 0
+    for index in range(blocks_count):
+        length = short_length - ecc_length + (0 if index < short_blocks else 1)
+        data = codewords[start:start + length]
+        start += length
+        # Short blocks get a placeholder so every block has the same length
+        blocks.append(data + ([0] if index < short_blocks else []) + _rs_remainder(data, divisor))
+    result = []
+    for i in range(len(blocks[0])):
+        for index, block in enumerate(blocks):
+            if i != short_length - ecc_length or index >= short_blocks:
+                result.append(block[i])
+    return result
+
+
+class _Symbol:
+    def __init__(self, version):
+        self.version = version
+        self.size = version * 4 + 17
+        self.modules = [[False] * self.size for _ in range(self.size)]
+        self.function = [[False] * self.size for _ in range(self.size)]
+
+    def set_function(self, x, y, dark):
+        self.modules[y][x] = dark
+        self.function[y][x] = True
+
+    def draw_function_patterns(self):
+        size = self.size
+        for i in range(size):
+            self.set_function(6, i, i % 2 == 0)
+            self.set_function(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self.set_function(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = _alignment_positions(self.version, size)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set_function(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        self.draw_format_bits(0)
+        if self.version >= 7:
+            remainder = self.version
+            for _ in range(12):
+                remainder = (remainder << 1) ^ ((remainder >> 11) * 0x1F25)
+            bits = self.version << 12 | remainder
+            for i in range(18):
+                dark = ((bits >> i) & 1) == 1
+                a, b = size - 11 + i % 3, i // 3
+                self.set_function(a, b, dark)
+                self.set_function(b, a, dark)
+
+    def draw_format_bits(self, mask):
+        data = FORMAT_LEVEL_BITS << 3 | mask
+        remainder = data
+        for _ in range(10):
+            remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+        bits = (data << 10 | remainder) ^ 0x5412
+        bit = [((bits >> i) & 1) == 1 for i in range(15)]
+        size = self.size
+        for i in range(6):
+            self.set_function(8, i, bit[i])
+        self.set_function(8, 7, bit[6])
+        self.set_function(8, 8, bit[7])
+        self.set_function(7, 8, bit[8])
+        for i in range(9, 15):
+            self.set_function(14 - i, 8, bit[i])
+        for i in range(8):
+            self.set_function(size - 1 - i, 8, bit[i])
+        for i in range(8, 15):
+            self.set_function(8, size - 15 + i, bit[i])
+        self.set_function(8, size - 8, True)
+
+    def draw_codewords(self, codewords):
+        size = self.size
+        index = 0
+        total = len(codewords) * 8
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = ((right + 1) & 2) == 0
+            for vertical in range(size):
+                y = size - 1 - vertical if upward else vertical
+                for x in (right, right - 1):
+                    if not self.function[y][x] and index < total:
+                        self.modules[y][x] = ((codewords[index >> 3] >> (7 - (index & 7))) & 1) == 1
+                        index += 1
+            right -= 2
+
+    def apply_mask(self, mask):
+        condition = MASKS[mask]
+        for y in range(self.size):
+            for x in range(self.size):
+                if not self.function[y][x] and condition(x, y):
+                    self.modules[y][x] = not self.modules[y][x]
+
+    def penalty(self):
+        modules = self.modules
+        size = self.size
+        score = 0
+        lines = modules + [list(column) for column in zip(*modules)]
+        finder_like = ([True, False, True, True, True, False, True, False, False, False, False],
+                       [False, False, False, False, True, False, True, True, True, False, True])
+        for line in lines:
+            run = 1
+            for i in range(1, size + 1):
+                if i < size and line[i] == line[i - 1]:
+                    run += 1
+                    continue
+                if run >= 5:
+                    score += run - 2
+                run = 1
+            for i in range(size - 10):
+                if line[i:i + 11] in finder_like:
+                    score += 40
+        for y in range(size - 1):
+            for x in range(size - 1):
+                if modules[y][x] == modules[y][x + 1] == modules[y + 1][x] == modules[y + 1][x + 1]:
+                    score += 3
+        dark = sum(map(sum, modules))
+        total = size * size
+        score += ((abs(dark * 20 - total * 10) + total - 1) // total - 1) * 10
+        return score
+
+
+MASKS = [
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+]
+
+
+def matrix(text):
+    """Module rows of the smallest level-M symbol holding `text` (UTF-8), with the best-scoring mask"""
+    data = text.encode('utf-8')
+    for version in range(1, MAX_VERSION + 1):
+        length_bits = 8 if version < 10 else 16
+        if 4 + length_bits + len(data) * 8 <= _data_codewords(version) * 8:
+            break
+    else:
+        raise ValueError(f'{len(data)} bytes do not fit a version {MAX_VERSION} QR code')
+
+    codewords = _add_ecc_and_interleave(_encode_data(data, version), version)
+    symbol = _Symbol(version)
+    symbol.draw_function_patterns()
+    symbol.draw_codewords(codewords)
+    best = None
+    for mask in range(len(MASKS)):
+        symbol.apply_mask(mask)
+        symbol.draw_format_bits(mask)
+        score = symbol.penalty()
+        if best is None or score < best[0]:
+            best = (score, mask)
+        symbol.apply_mask(mask)
+    symbol.apply_mask(best[1])
+    symbol.draw_format_bits(best[1])
+    return symbol.modules
@@ -0,0 +1,173 @@
+"""Unit-level receiving - block ID allocation and bulk ledger writes for labelled units"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .counters import count_rows
+from .lookups import bump_version
+from .outbox import emit_transactions, emit_qa_review_units
+from .segregation import check_placement, describe_violations
+from .snapshots import invalidate_snapshots
+from .storage import apply_movements
+from .write_queue import serialized
+from ..models import (
+    IdentifierSequence, InventoryTransaction, QAReviewUnit,
+    TransactionTypeChoices, QAStatusChoices
+)
+
+UNIT_SEQUENCE = 'unit_id'
+UNIT_PREFIX = 'UNIT-'
+RECEIPT_TXN_KIND = 'R'
+# Largest receipt recorded (and labelled) in one request
+MAX_UNITS_PER_RECEIPT = 5000
+RECEIPT_TRANSACTION_TYPES = {
+    TransactionTypeChoices.RCV_PUR, TransactionTypeChoices.RCV_INT, TransactionTypeChoices.RCV_PACK,
+    TransactionTypeChoices.RCV_ENG, TransactionTypeChoices.RCV_MIS, TransactionTypeChoices.RCV_FG,
+}
+
+
+class ReceivingError(ValueError):
+    """Raised when a unit receipt cannot be recorded"""
+
+
+def _existing_unit_high_water():
+    """Highest numeric UNIT-nnnnn already in the ledger, used to seed the sequence"""
+    latest = (
+        InventoryTransaction.objects.filter(unit_id__regex=r'^UNIT-[0-9]+$')
+        .order_by(Length('unit_id').desc(), '-unit_id')
+        .values_list('unit_id', flat=True)
+        .first()
+    )
+    return int(latest[len(UNIT_PREFIX):]) if latest else 0
+
+
+def allocate_unit_ids(count):
+    """Reserve `count` consecutive unit IDs in one round trip"""
+    seed = 0
+    if not IdentifierSequence.objects.filter(name=UNIT_SEQUENCE).exists():
+        seed = _existing_unit_high_water()
+    first = IdentifierSequence.allocate(UNIT_SEQUENCE, count, seed=seed)
+    return [f"{UNIT_PREFIX}{number:05d}" for number in range(first, first + count)]
+
+
+def allocate_transaction_ids(count, when=None, kind=RECEIPT_TXN_KIND):
+    """Reserve `count` transaction IDs for the day, e.g. TXN-20240720-R00001 for receipts"""
+    day = (when or timezone.now()).strftime('%Y%m%d')
+    first = IdentifierSequence.allocate(f'txn-{day}', count)
+    prefix = f"TXN-{day}-{kind}"
+    return [f"{prefix}{number:05d}" for number in range(first, first + count)]
+
+
+def labelled_units(batch_id, unit_ids=None):
+    """Labelled unit rows of a batch, ready for label_data()"""
+    units = InventoryTransaction.objects.filter(
+        batch_id__batch_id=batch_id, label_applied=True
+    ).exclude(unit_id='').select_related('item_code', 'batch_id').order_by('unit_id')
+    if unit_ids:
+        units = units.filter(unit_id__in=unit_ids)
+    return units
+
+
+def label_data(transactions):
+    """Label dicts for ledger rows (item_code and batch_id must be select_related)"""
+    return [
+        {
+            'unit_id': txn.unit_id,
+            'item_code': txn.item_code.item_record_id,
+            'item_name': txn.product_name or txn.item_code.item_name,
+            'batch_id': txn.batch_id.batch_id if txn.batch_id_id else None,
+            'expiry_date': txn.expiry_date.isoformat() if txn.expiry_date else '',
+            'hazard_class': txn.item_code.hazard_class,
+        }
+        for txn in transactions
+    ]
+
+
+@serialized
+def receive_units(batch, unit_count, quantity_per_unit, user, unit=None,
+                  transaction_type=TransactionTypeChoices.RCV_PUR, storage_location=None,
+                  qa_review=None, invoice_no='', unit_cost=None, comments=''):
+    """
+    Record a receipt of `unit_count` individually labelled units of `batch`.
+
+    Unit and transaction IDs are reserved as one block each, ledger rows are
+    bulk-created, and occupancy is applied once for the whole receipt. When
+    `qa_review` is given, a Pending QAReviewUnit, visual check not yet done,
+    is created per unit as well.
+    Returns the created InventoryTransaction rows.
+    """
+    if unit_count < 1:
+        raise ReceivingError('unit_count must be at least 1')
+    if unit_count > MAX_UNITS_PER_RECEIPT:
+        raise ReceivingError(f'At most {MAX_UNITS_PER_RECEIPT} units per receipt')
+    if transaction_type not in RECEIPT_TRANSACTION_TYPES:
+        raise ReceivingError(f'{transaction_type} is not a receipt transaction type')
+    quantity_per_unit = Decimal(str(quantity_per_unit))
+    if quantity_per_unit <= 0:
+        raise ReceivingError('quantity_per_unit must be positive')
+
+    item = batch.item_record_id
+    now = timezone.now()
+    location = storage_location or batch.storage_location
+    if location is not None:
+        violations = check_placement(item, location)
+        if violations:
+            raise ReceivingError(f'Cannot store {item.item_record_id} in {location.location_id}: {describe_violations(violations)}')
+
+    with transaction.atomic():
+        unit_ids = allocate_unit_ids(unit_count)
+        transaction_ids = allocate_transaction_ids(unit_count, now)
+        rows = [
+            InventoryTransaction(
+                transaction_id=transaction_id,
+                transaction_datetime=now,
+                transaction_user=user,
+                transaction_type=transaction_type,
+                comments=comments,
+                supplier_code_id=batch.supplier_code_id,
+                supplier_name=batch.supplier_code.supplier_name if batch.supplier_code_id else '',
+                invoice_no=invoice_no,
+                unit_cost=unit_cost,
+                product_code=item.item_record_id,
+                item_code=item,
+                product_name=item.item_name,
+                batch_id=batch,
+                unit_id=unit_id,
+                expiry_date=batch.expiry_date,
+                quantity=quantity_per_unit,
+                unit=unit or item.unit_of_measure,
+                label_applied=True,
+                storage_zone_id=location.zone_id_id if location else None,
+                storage_location=location,
+                qa_status=batch.qa_status,
+                qa_review_id=qa_review,
+            )
+            for transaction_id, unit_id in zip(transaction_ids, unit_ids)
+        ]
+        InventoryTransaction.objects.bulk_create(rows, batch_size=500)
+        # bulk_create bypasses save(), so occupancy is applied here in one pass
+        apply_movements(rows)
+        invalidate_snapshots(rows)
+        emit_transactions(rows)
+        count_rows(InventoryTransaction, rows)
+        bump_version(InventoryTransaction._meta.db_table)
+
+        if qa_review is not None:
+            units = QAReviewUnit.objects.bulk_create([
+                QAReviewUnit(
+                    qa_review_id=qa_review,
+                    inventory_txn_id=row.transaction_id,
+                    unit_id=row.unit_id,
+                    batch_number=batch,
+                    visual_check='',
+                    disposition=QAStatusChoices.PENDING,
+                    reviewer=user,
+                    reviewed_on=now.date(),
+                )
+                for row in rows
+            ], batch_size=500)
+            emit_qa_review_units(units)
+            bump_version(QAReviewUnit._meta.db_table)
+    return rows
@@ -0,0 +1,234 @@
+"""
+Compact rows for bulk paths.
+
+A model instance carries a __dict__ with every field of its model (about
+sixty for InventoryTransaction) plus its _state, and building one runs
+Model.__init__. Bulk jobs that hold many rows at once keep them in a
+RecordTable instead: one column per declared field, stored as an int array
+for non-null integer columns and a list otherwise. Rows are read back as
+__slots__ records with the model's attribute names, so the ledger hooks
+(apply_movements, count_rows, emit_transactions, ...) take them as they are.
+Undeclared fields read as their model default.
+
+Model instances are only built a chunk at a time, when the rows are written
+with bulk_create. LedgerWriter does that for imported ledger rows.
+"""
+from array import array
+
+from django.db import models, transaction
+
+INTEGER_FIELDS = (
+    models.AutoField, models.BigAutoField, models.SmallAutoField,
+    models.IntegerField, models.BigIntegerField, models.SmallIntegerField,
+)
+
+_record_classes = {}
+
+
+def _is_integer(field):
+    target = field.target_field if field.is_relation else field
+    # Primary keys stay in a list: new rows hold None until the database assigns them
+    return isinstance(target, INTEGER_FIELDS) and not field.null and not field.primary_key
+
+
+def record_class(model, attnames):
+    """The __slots__ record type for `model` rows holding `attnames`"""
+    key = (model, tuple(attnames))
+    cls = _record_classes.get(key)
+    if cls is None:
+        undeclared = {
+            field.attname: field
+            for field in model._meta.concrete_fields
+            if field.attname not in attnames
+        }
+
+        def __init__(self, *values):
+            for name, value in zip(attnames, values):
+                setattr(self, name, value)
+
+        def __getattr__(self, name):
+            # Only reached for names without a slot
+            if name in undeclared:
+                return undeclared[name].get_default()
+            raise AttributeError(name)
+
+        def __repr__(self):
+            return f'<{model.__name__} record {self.as_dict()}>'
+
+        def as_dict(self):
+            return {name: getattr(self, name) for name in attnames}
+
+        cls = _record_classes[key] = type(f'{model.__name__}Record', (), {
+            '__slots__': tuple(attnames),
+            '__init__': __init__,
+            '__getattr__': __getattr__,
+            '__repr__': __repr__,
+            'as_dict': as_dict,
+            '_meta': model._meta,
+        })
+    return cls
+
+
+class RecordTable:
+    """
+    Rows of one model held column-wise. `fields` are field names or
+    attnames; every row must give a value for each of them.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        opts = model._meta
+        self.fields = [opts.get_field(name) for name in fields]
+        self.attnames = [field.attname for field in self.fields]
+        self.columns = [array('q') if _is_integer(field) else [] for field in self.fields]
+        self.record = record_class(model, self.attnames)
+
+    @classmethod
+    def from_queryset(cls, queryset, fields, chunk_size=2000):
+        """A table of `fields` read from `queryset` without building model instances"""
+        table = cls(queryset.model, fields)
+        for row in queryset.values_list(*table.attnames).iterator(chunk_size=chunk_size):
+            table.append_row(row)
+        return table
+
+    def _attname(self, name):
+        return self.model._meta.get_field(name).attname
+
+    def append(self, **values):
+        """Append one row; related objects may be given for foreign keys"""
+        values = {
+            self._attname(name): value.pk if isinstance(value, models.Model) else value
+            for name, value in values.items()
+        }
+        undeclared = set(values) - set(self.attnames)
+        if undeclared:
+            raise TypeError(f'Undeclared fields for {self.model.__name__}: {", ".join(sorted(undeclared))}')
+        self.append_row([values[attname] for attname in self.attnames])
+
+    def append_row(self, row):
+        """Append a tuple of values in declared field order"""
+        for column, value in zip(self.columns, row):
+            column.append(value)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append_row(row)
+
+    def column(self, name):
+        return self.columns[self.attnames.index(self._attname(name))]
+
+    def set_column(self, name, values):
+        """Replace the values of one column, e.g. with IDs allocated after the rows were gathered"""
+        index = self.attnames.index(self._attname(name))
+        column = self.columns[index]
+        values = list(values)
+        if len(values) != len(self):
+            raise ValueError(f'{len(values)} values for {len(self)} rows')
+        self.columns[index] = array(column.typecode, values) if isinstance(column, array) else values
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        return self.record(*[column[index] for column in self.columns])
+
+    def __iter__(self):
+        return (self.record(*values) for values in zip(*self.columns))
+
+    def instances(self, start=0, stop=None):
+        """Unsaved model instances for rows [start:stop]"""
+        model, attnames = self.model, self.attnames
+        return [
+            model(**dict(zip(attnames, values)))
+            for values in zip(*[column[start:stop] for column in self.columns])
+        ]
+
+    def bulk_create(self, batch_size=500, **kwargs):
+        """
+        Insert every row with bulk_create, building model instances one
+        batch at a time. Primary keys the database assigns are copied back
+        when the pk is a declared column. Returns the number of rows.
+        """
+        pk = self.model._meta.pk.attname
+        pk_column = self.column(pk) if pk in self.attnames else None
+        for start in range(0, len(self), batch_size):
+            created = self.model.objects.bulk_create(self.instances(start, start + batch_size), **kwargs)
+            if pk_column is not None:
+                for offset, instance in enumerate(created):
+                    pk_column[start + offset] = instance.pk
+        return len(self)
+
+
+class LedgerWriter:
+    """
+    Buffers new InventoryTransaction rows and their sidecar details (see
+    TRANSACTION_DETAILS) in RecordTables and writes them every `flush_rows`
+    rows, with the hooks the receiving and count paths run after a bulk
+    insert. Rows giving different sets of fields go to separate tables.
+    """
+
+    def __init__(self, flush_rows=5000):
+        self.flush_rows = flush_rows
+        self.tables = {}
+        self.pending = set()
+        self.written = 0
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self.pending
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _table(self, model, names):
+        key = (model, tuple(sorted(names)))
+        if key not in self.tables:
+            self.tables[key] = RecordTable(model, key[1])
+        return self.tables[key]
+
+    def add(self, details=None, **values):
+        """Queue one ledger row; `details` holds its sidecar fields by name"""
+        from ..models import InventoryTransaction, TRANSACTION_DETAILS
+        details = dict(details or {})
+        sidecars = []
+        for model in TRANSACTION_DETAILS:
+            fields = {name: details.pop(name) for name in model.detail_fields() if name in details}
+            if fields:
+                sidecars.append((model, fields))
+        # Checked before anything is queued, so a bad call leaves no partial row
+        if details:
+            raise TypeError(f"Unknown transaction detail fields: {', '.join(details)}")
+        self._table(InventoryTransaction, values).append(**values)
+        for model, fields in sidecars:
+            self._table(model, ['transaction', *fields]).append(transaction=values['transaction_id'], **fields)
+        self.pending.add(values['transaction_id'])
+        if len(self.pending) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """Write the queued rows; returns how many ledger rows were written"""
+        from ..models import InventoryTransaction
+        from .counters import count_rows
+        from .lookups import bump_version
+        from .outbox import emit_transactions
+        from .snapshots import invalidate_snapshots
+        from .storage import apply_movements
+
+        if not self.pending:
+            return 0
+        ledger = [table for (model, _), table in self.tables.items() if model is InventoryTransaction]
+        details = [table for (model, _), table in self.tables.items() if model is not InventoryTransaction]
+        with transaction.atomic():
+            for table in ledger:
+                table.bulk_create(batch_size=500)
+                # bulk_create bypasses save(), so the ledger hooks run here once per table
+                apply_movements(table)
+                invalidate_snapshots(table)
+                emit_transactions(table)
+                count_rows(InventoryTransaction, table)
+            for table in details:
+                table.bulk_create(batch_size=500)
+            bump_version(*{table.model._meta.db_table for table in self.tables.values()})
+        written = len(self.pending)
+        self.written += written
+        self.tables, self.pending = {}, set()
+        return written
@@ -0,0 +1,83 @@
+"""Supplier and supplier-product review scheduling - Logic C5"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Count, Case, When, Value, CharField, DateField, ExpressionWrapper
+from django.utils import timezone
+
+from .lookups import bump_version
+from ..models import Supplier, SupplierProduct, REVIEW_INTERVAL_DAYS
+
+# Days ahead of the due date a review is flagged as due soon
+DUE_SOON_DAYS = 30
+
+OVERDUE = 'overdue'
+DUE_SOON = 'due_soon'
+SCHEDULED = 'scheduled'
+
+
+def recompute_review_schedule():
+    """
+    Recompute next_review_due for every supplier and supplier-product.
+
+    Issues one UPDATE per (model, review frequency) pair instead of saving
+    each row, so the cost does not depend on the number of rows.
+    'On change' rows are left untouched since their due date is manual.
+    """
+    updated = {'suppliers': 0, 'supplier_products': 0}
+    now = timezone.now()
+    with transaction.atomic():
+        for frequency, days in REVIEW_INTERVAL_DAYS.items():
+            due = ExpressionWrapper(F('last_reviewed_on') + timedelta(days=days), output_field=DateField())
+            updated['suppliers'] += Supplier.objects.filter(
+                review_frequency=frequency, last_reviewed_on__isnull=False
+            ).update(next_review_due=due, updated_at=now)
+            updated['supplier_products'] += SupplierProduct.objects.filter(
+                review_frequency=frequency, last_reviewed_on__isnull=False
+            ).update(next_review_due=due)
+        bump_version(Supplier._meta.db_table, SupplierProduct._meta.db_table)
+    return updated
+
+
+def review_state(today=None, due_soon_days=DUE_SOON_DAYS):
+    """SQL expression classifying next_review_due as overdue, due soon or scheduled"""
+    today = today or timezone.now().date()
+    return Case(
+        When(next_review_due__lt=today, then=Value(OVERDUE)),
+        When(next_review_due__lte=today + timedelta(days=due_soon_days), then=Value(DUE_SOON)),
+        When(next_review_due__isnull=False, then=Value(SCHEDULED)),
+        default=Value(''),
+        output_field=CharField(),
+    )
+
+
+def due_suppliers(within_days=DUE_SOON_DAYS, today=None):
+    """Suppliers due for review within `within_days` - a range scan on next_review_due"""
+    today = today or timezone.now().date()
+    return Supplier.objects.filter(
+        next_review_due__lte=today + timedelta(days=within_days)
+    ).annotate(review_state=review_state(today)).order_by('next_review_due')
+
+
+def due_supplier_products(within_days=DUE_SOON_DAYS, today=None):
+    """Supplier-products due for review within `within_days` - a range scan on next_review_due"""
+    today = today or timezone.now().date()
+    return SupplierProduct.objects.filter(
+        next_review_due__lte=today + timedelta(days=within_days)
+    ).select_related('item_code', 'supplier_name').annotate(
+        review_state=review_state(today)
+    ).order_by('next_review_due')
+
+
+def review_queue_counts(today=None):
+    """Overdue and due-soon counts for both review queues in one query each"""
+    today = today or timezone.now().date()
+    soon = today + timedelta(days=DUE_SOON_DAYS)
+    counts = {}
+    for key, model in (('suppliers', Supplier), ('supplier_products', SupplierProduct)):
+        counts[key] = model.objects.filter(next_review_due__lte=soon).aggregate(
+            overdue=Count('pk', filter=Q(next_review_due__lt=today)),
+            due_soon=Count('pk', filter=Q(next_review_due__gte=today)),
+        )
+    return counts
+
@@ -0,0 +1,224 @@
+"""
+Derived-field rules (LOGIC.C1-C7) compiled into decision tables.
+
+Each rule declares its input fields with their finite domains and the
+output fields it sets. Compiling a rule evaluates its Python function once
+for every input combination, so applying it becomes a single dict lookup
+keyed by the input tuple. Values outside the declared domains (legacy data)
+fall back to the function; up to MEMO_LIMIT of them are memoised.
+"""
+import threading
+import time
+from collections import defaultdict
+from itertools import product
+
+from django.db import transaction
+from django.utils import timezone
+
+from .lookups import bump_version
+from .sync import record_changes, ITEM
+
+from ..models import (
+    ItemRecord, SupplierProduct, GradeChoices, HazardClassChoices, ContaminationRiskChoices,
+    TraceabilityLevelChoices, calculate_qa_required, calculate_document_requirements,
+)
+
+BOOLEAN = (False, True)
+# Out-of-domain input tuples remembered per rule
+MEMO_LIMIT = 1024
+SEGREGATED_HAZARDS = {
+    HazardClassChoices.FLAMMABLE, HazardClassChoices.CORROSIVE,
+    HazardClassChoices.OXIDIZER, HazardClassChoices.REACTIVE,
+}
+
+
+class Rule:
+    """A pure function over a fixed tuple of fields, compiled to a lookup table"""
+
+    def __init__(self, name, inputs, outputs, function, description=''):
+        self.name = name
+        self.inputs = [field for field, _ in inputs]
+        self.domains = [tuple(domain) for _, domain in inputs]
+        self.outputs = outputs
+        self.function = function
+        self.description = description
+        self.table = None
+        self.memo = {}
+        self._lock = threading.Lock()
+
+    def compile(self):
+        with self._lock:
+            if self.table is None:
+                self.table = {key: self._evaluate(key) for key in product(*self.domains)}
+        return self.table
+
+    def _evaluate(self, key):
+        result = self.function(*key)
+        return result if isinstance(result, tuple) else (result,)
+
+    def lookup(self, key):
+        """Output tuple for an input tuple"""
+        table = self.table if self.table is not None else self.compile()
+        try:
+            return table[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable input; evaluate directly
+            return self._evaluate(key)
+        result = self.memo.get(key)
+        if result is None:
+            result = self._evaluate(key)
+            if len(self.memo) < MEMO_LIMIT:
+                self.memo[key] = result
+        return result
+
+    def key_for(self, instance):
+        return tuple(getattr(instance, field) for field in self.inputs)
+
+    def apply(self, instance):
+        """Set the output fields on a model instance in place"""
+        for field, value in zip(self.outputs, self.lookup(self.key_for(instance))):
+            setattr(instance, field, value)
+        return instance
+
+
+RULES = {}
+
+
+def register(rule):
+    RULES[rule.name] = rule
+    return rule
+
+
+def _with_blank(choices):
+    return ('',) + tuple(choices.values)
+
+
+def item_traceability_level(qa_required, contamination_risk):
+    """LOGIC.C2 as applied to item records (simplified form)"""
+    if qa_required and contamination_risk == ContaminationRiskChoices.HIGH:
+        return TraceabilityLevelChoices.FULL
+    if qa_required:
+        return TraceabilityLevelChoices.BATCH_LEVEL
+    return TraceabilityLevelChoices.NONE
+
+
+def segregation_rule_required(hazard_class):
+    """LOGIC.C4 - Segregation rule required?"""
+    return hazard_class in SEGREGATED_HAZARDS
+
+
+def item_record_derived(grade, critical_to_product, contamination_risk, traceability_level, hazard_class):
+    """C1 -> C2 -> C3 -> C4 chained exactly as ItemRecord.save always has"""
+    qa_required = calculate_qa_required(grade, critical_to_product, contamination_risk, traceability_level)
+    traceability_level = item_traceability_level(qa_required, contamination_risk)
+    coa_mandatory, sds_mandatory, spec_required = calculate_document_requirements(
+        qa_required, hazard_class, traceability_level
+    )
+    return (qa_required, traceability_level, coa_mandatory, sds_mandatory, spec_required,
+            segregation_rule_required(hazard_class))
+
+
+# All item-record derived fields from one lookup
+ITEM_RECORD_RULE = register(Rule(
+    'item_record',
+    inputs=[
+        ('grade', _with_blank(GradeChoices)),
+        ('critical_to_product', BOOLEAN),
+        ('contamination_risk', ContaminationRiskChoices.values),
+        ('traceability_level', TraceabilityLevelChoices.values),
+        ('hazard_class', _with_blank(HazardClassChoices)),
+    ],
+    outputs=['qa_required', 'traceability_level', 'coa_mandatory', 'sds_mandatory',
+             'spec_required', 'segregation_rule_required'],
+    function=item_record_derived,
+))
+
+
+def default_supplier_product(approved, preferred_vendor, is_default):
+    """LOGIC.C6 - approved preferred vendors become the default; an existing default is kept"""
+    return is_default or (approved and preferred_vendor)
+
+
+# LOGIC.C6 - Default Supplier-Product (C5 is date arithmetic, C7 is set by QA)
+SUPPLIER_PRODUCT_RULE = register(Rule(
+    'supplier_product_default',
+    inputs=[('approved', BOOLEAN), ('preferred_vendor', BOOLEAN), ('is_default', BOOLEAN)],
+    outputs=['is_default'],
+    function=default_supplier_product,
+))
+
+
+def recompute_item_records(batch_size=2000):
+    """
+    Recompute derived fields for every item record.
+
+    Reads only the input columns, evaluates the table in memory, and issues
+    one UPDATE per distinct changed output tuple - a handful in practice,
+    since the output space is tiny. The changed items are logged for
+    handheld sync. Returns the number of rows changed.
+    """
+    rule = ITEM_RECORD_RULE
+    groups = defaultdict(list)
+    columns = ['item_record_id'] + rule.inputs + [field for field in rule.outputs if field not in rule.inputs]
+    for row in ItemRecord.objects.values_list(*columns).iterator(chunk_size=batch_size):
+        current = dict(zip(columns, row))
+        outputs = rule.lookup(tuple(current[field] for field in rule.inputs))
+        if any(current[field] != value for field, value in zip(rule.outputs, outputs)):
+            groups[outputs].append(current['item_record_id'])
+
+    changed = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for outputs, item_ids in groups.items():
+            values = dict(zip(rule.outputs, outputs), updated_at=now)
+            for start in range(0, len(item_ids), batch_size):
+                chunk = item_ids[start:start + batch_size]
+                changed += ItemRecord.objects.filter(item_record_id__in=chunk).update(**values)
+                # A bulk update sends no post_save, so log the rows for handheld sync here
+                record_changes(ITEM, chunk)
+        if changed:
+            bump_version(ItemRecord._meta.db_table)
+    return changed
+
+
+def recompute_supplier_products():
+    """Apply LOGIC.C6 set-based; LOGIC.C5 is handled by services.reviews.recompute_review_schedule"""
+    with transaction.atomic():
+        changed = SupplierProduct.objects.filter(
+            approved=True, preferred_vendor=True, is_default=False
+        ).update(is_default=True)
+        if changed:
+            bump_version(SupplierProduct._meta.db_table)
+    return changed
+
+
+def benchmark(rows, repeat=5):
+    """
+    Time the compiled item-record table against the branchy functions over
+    the same input tuples. Returns seconds per pass for each and whether
+    both produced identical results.
+    """
+    rows = list(rows)
+    rule = ITEM_RECORD_RULE
+    rule.compile()
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        branchy = [item_record_derived(*row) for row in rows]
+    branchy_time = (time.perf_counter() - started) / repeat
+
+    lookup = rule.lookup
+    started = time.perf_counter()
+    for _ in range(repeat):
+        compiled = [lookup(row) for row in rows]
+    compiled_time = (time.perf_counter() - started) / repeat
+
+    return {
+        'rows': len(rows),
+        'branchy_seconds': branchy_time,
+        'compiled_seconds': compiled_time,
+        'speedup': branchy_time / compiled_time if compiled_time else None,
+        'identical': branchy == compiled,
+    }
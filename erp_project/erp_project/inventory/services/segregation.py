@@ -0,0 +1,190 @@
+"""Hazard segregation checks - Logic C4 applied to storage zones and locations"""
+import threading
+from collections import defaultdict
+
+from .lookups import table_versions
+from ..models import HazardClassChoices, StorageZoneHazard, StorageOccupancy
+
+# Hazard classes that must never share a storage location
+INCOMPATIBLE_HAZARD_PAIRS = [
+    (HazardClassChoices.FLAMMABLE, HazardClassChoices.OXIDIZER),
+    (HazardClassChoices.FLAMMABLE, HazardClassChoices.REACTIVE),
+    (HazardClassChoices.OXIDIZER, HazardClassChoices.REACTIVE),
+    (HazardClassChoices.OXIDIZER, HazardClassChoices.CORROSIVE),
+    (HazardClassChoices.CORROSIVE, HazardClassChoices.REACTIVE),
+]
+
+ZONE_NOT_PERMITTED = 'zone_not_permitted'
+INCOMPATIBLE_CONTENTS = 'incompatible_contents'
+
+
+def normalise_hazard(hazard_class):
+    """Blank and 'None' both mean no hazard"""
+    return hazard_class if hazard_class and hazard_class != HazardClassChoices.NONE else None
+
+
+class HazardMatrix:
+    """
+    Hazard classes as bit positions with precomputed masks.
+
+    `incompatible[h]` is the bitmask of classes that may not share a location
+    with `h`; `zone_permitted[zone_id]` is the bitmask of classes a zone admits.
+    Every check is then a couple of dict lookups and an AND.
+    """
+
+    def __init__(self, zone_hazards):
+        self.bits = {}
+        for hazard in HazardClassChoices.values:
+            if normalise_hazard(hazard):
+                self.bits[hazard] = 1 << len(self.bits)
+
+        self.incompatible = defaultdict(int)
+        for first, second in INCOMPATIBLE_HAZARD_PAIRS:
+            self.incompatible[first] |= self.bits[second]
+            self.incompatible[second] |= self.bits[first]
+
+        self.zone_permitted = defaultdict(int)
+        for zone_id, hazard in zone_hazards:
+            self.zone_permitted[zone_id] |= self.bits.get(hazard, 0)
+
+    def mask(self, hazard_classes):
+        result = 0
+        for hazard in hazard_classes:
+            result |= self.bits.get(normalise_hazard(hazard), 0)
+        return result
+
+    def names(self, mask):
+        return [hazard for hazard, bit in self.bits.items() if mask & bit]
+
+    def zone_permits(self, zone_id, hazard_class):
+        bit = self.bits.get(normalise_hazard(hazard_class), 0)
+        return not bit or bool(self.zone_permitted[zone_id] & bit)
+
+    def conflicts(self, hazard_class, contents_mask):
+        """Bitmask of hazards already present that clash with `hazard_class`"""
+        return self.incompatible[normalise_hazard(hazard_class)] & contents_mask
+
+    def internal_conflicts(self, contents_mask):
+        """Incompatible pairs among hazards already stored together"""
+        pairs = []
+        for first, second in INCOMPATIBLE_HAZARD_PAIRS:
+            if contents_mask & self.bits[first] and contents_mask & self.bits[second]:
+                pairs.append((first, second))
+        return pairs
+
+
+# Tables the matrix is built from; a change to either rebuilds it
+MATRIX_TABLES = ['storage_zone', 'storage_zone_hazard']
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_matrix():
+    """Process-wide matrix, rebuilt when a zone or its hazard set changes in any process"""
+    global _matrix
+    versions = table_versions(MATRIX_TABLES)
+    cached = _matrix
+    if cached is None or cached[0] != versions:
+        with _matrix_lock:
+            cached = _matrix
+            if cached is None or cached[0] != versions:
+                cached = _matrix = (versions, HazardMatrix(StorageZoneHazard.objects.values_list('zone_id', 'hazard_class')))
+    return cached[1]
+
+
+def clear():
+    """Drop the cached matrix in this process"""
+    global _matrix
+    with _matrix_lock:
+        _matrix = None
+
+
+def incompatible_hazards(hazard_class):
+    """Hazard classes that may not share a location with `hazard_class`"""
+    matrix = get_matrix()
+    return matrix.names(matrix.incompatible[normalise_hazard(hazard_class)])
+
+
+def check_placement(item, location):
+    """
+    Validate putting `item` (or transferring it) into `location`.
+
+    Returns a list of violation dicts; empty means the placement is allowed.
+    Costs one query for the hazard classes currently in the location.
+    """
+    matrix = get_matrix()
+    violations = []
+
+    if not matrix.zone_permits(location.zone_id_id, item.hazard_class):
+        violations.append({
+            'type': ZONE_NOT_PERMITTED,
+            'location_id': location.location_id,
+            'zone_id': location.zone_id_id,
+            'hazard_class': item.hazard_class,
+        })
+
+    contents = StorageOccupancy.objects.filter(
+        location_id=location.location_id, quantity__gt=0
+    ).exclude(item_id=item.pk).values_list('item__hazard_class', flat=True).distinct()
+    clash = matrix.conflicts(item.hazard_class, matrix.mask(contents))
+    if clash:
+        violations.append({
+            'type': INCOMPATIBLE_CONTENTS,
+            'location_id': location.location_id,
+            'hazard_class': item.hazard_class,
+            'conflicts_with': matrix.names(clash),
+        })
+
+    return violations
+
+
+def describe_violations(violations):
+    """One line summarising check_placement() violations, for error messages"""
+    parts = []
+    for violation in violations:
+        if violation['type'] == ZONE_NOT_PERMITTED:
+            parts.append(f"zone {violation['zone_id']} does not admit {violation['hazard_class']}")
+        else:
+            parts.append(f"{violation['location_id']} holds {', '.join(violation['conflicts_with'])}, "
+                         f"incompatible with {violation['hazard_class']}")
+    return '; '.join(parts)
+
+
+def audit_segregation():
+    """
+    Find every segregation violation across all locations in one pass.
+
+    Reads the distinct (location, zone, hazard class) triples of current
+    stock with a single query and checks them against the matrix in memory.
+    """
+    matrix = get_matrix()
+    location_masks = defaultdict(int)
+    location_zones = {}
+    violations = []
+
+    rows = StorageOccupancy.objects.filter(quantity__gt=0).values_list(
+        'location_id', 'location__zone_id', 'item__hazard_class'
+    ).distinct()
+    for location_id, zone_id, hazard_class in rows:
+        location_masks[location_id] |= matrix.mask([hazard_class])
+        location_zones[location_id] = zone_id
+        if not matrix.zone_permits(zone_id, hazard_class):
+            violations.append({
+                'type': ZONE_NOT_PERMITTED,
+                'location_id': location_id,
+                'zone_id': zone_id,
+                'hazard_class': hazard_class,
+            })
+
+    for location_id, mask in location_masks.items():
+        for first, second in matrix.internal_conflicts(mask):
+            violations.append({
+                'type': INCOMPATIBLE_CONTENTS,
+                'location_id': location_id,
+                'zone_id': location_zones[location_id],
+                'hazard_class': first,
+                'conflicts_with': [second],
+            })
+
+    return violations
@@ -0,0 +1,282 @@
+"""
+Point-in-time stock - closing balance snapshots, as-of queries and valuation.
+
+A snapshot run holds every non-zero (location, batch, item) balance and the
+per-item costing state at the end of one day. An as-of query reads the
+latest run on or before the requested day and adds the ledger rows dated
+after it, so answering a month-end question replays days of ledger instead
+of all of it. Snapshots are built the same way from the previous one.
+
+Ledger rows dated on or before a snapshot day (back-dated entries, late
+handheld pushes) make that snapshot wrong; invalidate_snapshots() marks
+such runs stale when the rows are written. Queries skip stale runs and
+refresh_stale() re-takes them, daily and monthly alike.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .records import RecordTable
+from .storage import movement_delta, movement_delta_expression
+from ..models import (
+    BalanceSnapshotRun, BalanceSnapshot, CostSnapshot, InventoryTransaction, TransactionTypeChoices,
+    Batch, ItemRecord
+)
+
+DAILY = 'daily'
+MONTHLY = 'monthly'
+
+FIFO = 'fifo'
+AVERAGE = 'average'
+COSTING_METHODS = (FIFO, AVERAGE)
+
+GROUPINGS = ('position', 'location', 'zone', 'batch', 'item')
+
+CENT = Decimal('0.01')
+COST_PLACES = Decimal('0.0001')
+
+# Transfers move stock between locations and do not change what it cost
+NON_COSTING_TYPES = {TransactionTypeChoices.XFER}
+
+
+def day_end(day):
+    """Exclusive upper bound of `day` in the current time zone"""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def ledger_between(after_day, until_day):
+    """Ledger rows dated after the end of `after_day` (None: from the start) up to the end of `until_day`"""
+    rows = InventoryTransaction.objects.filter(transaction_datetime__lt=day_end(until_day))
+    if after_day is not None:
+        rows = rows.filter(transaction_datetime__gte=day_end(after_day))
+    return rows.order_by()
+
+
+def latest_run(as_of):
+    return BalanceSnapshotRun.objects.filter(as_of__lte=as_of, stale=False).order_by('-as_of').first()
+
+
+# Positions
+
+def positions_as_of(as_of, zone=None, location=None, batch=None, item=None, run=None):
+    """
+    Non-zero closing balances at the end of `as_of` as dicts with location,
+    zone, batch, item and quantity. Returns (run used or None, rows). Batch
+    and item filters are codes; the rows carry primary keys (see with_codes).
+    """
+    run = run if run is not None else latest_run(as_of)
+    totals = defaultdict(Decimal)
+
+    if run is not None:
+        balances = run.balances.all()
+        for field, value in (('zone', zone), ('location', location),
+                             ('batch__batch_id', batch), ('item__item_record_id', item)):
+            if value:
+                balances = balances.filter(**{field: value})
+        for key in balances.values_list('location_id', 'zone_id', 'batch_id', 'item_id', 'quantity'):
+            totals[key[:4]] += key[4]
+
+    delta = ledger_between(run.as_of if run else None, as_of)
+    for field, value in (
+        ('storage_location__zone_id', zone), ('storage_location', location),
+        ('batch_id__batch_id', batch), ('item_code__item_record_id', item),
+    ):
+        if value:
+            delta = delta.filter(**{field: value})
+    rows = delta.values(
+        'storage_location', 'storage_location__zone_id', 'batch_id', 'item_code'
+    ).annotate(moved=Sum(movement_delta_expression()))
+    for row in rows:
+        key = (row['storage_location'], row['storage_location__zone_id'], row['batch_id'], row['item_code'])
+        totals[key] += row['moved'] or 0
+
+    positions = [
+        {'location': key[0], 'zone': key[1], 'batch': key[2], 'item': key[3], 'quantity': quantity}
+        for key, quantity in sorted(totals.items(), key=lambda entry: tuple(str(part) for part in entry[0]))
+        if quantity
+    ]
+    return run, positions
+
+
+def summarise(positions, group_by='position'):
+    """Roll position rows up to one row per location, zone, batch or item"""
+    if group_by == 'position':
+        return positions
+    totals = defaultdict(Decimal)
+    for row in positions:
+        totals[row[group_by]] += row['quantity']
+    return [{group_by: key, 'quantity': quantity} for key, quantity in totals.items() if quantity]
+
+
+def with_codes(rows):
+    """Position or valuation rows with batch and item primary keys replaced by their codes"""
+    batches = Batch.objects.codes(row['batch'] for row in rows if 'batch' in row)
+    items = ItemRecord.objects.codes(row['item'] for row in rows if 'item' in row)
+    labelled = []
+    for row in rows:
+        row = dict(row)
+        if 'batch' in row:
+            row['batch'] = batches.get(row['batch'])
+        if 'item' in row:
+            row['item'] = items.get(row['item'])
+        labelled.append(row)
+    return labelled
+
+
+# Costing
+
+class CostState:
+    """Quantity, moving weighted-average cost and open FIFO layers of one item"""
+
+    def __init__(self, quantity=Decimal('0'), average_cost=Decimal('0'), layers=None):
+        self.quantity = quantity
+        self.average_cost = average_cost
+        self.layers = layers or []
+
+    @classmethod
+    def from_snapshot(cls, cost):
+        return cls(cost.quantity, cost.average_cost,
+                   [[Decimal(unit_cost), Decimal(quantity)] for unit_cost, quantity in cost.fifo_layers])
+
+    def apply(self, delta, unit_cost=None):
+        if delta > 0:
+            self.receive(delta, unit_cost)
+        elif delta < 0:
+            self.issue(-delta)
+
+    def receive(self, quantity, unit_cost=None):
+        # Receipts without an invoice cost (returns, gains) come in at the current average
+        unit_cost = self.average_cost if unit_cost is None else unit_cost
+        if self.quantity > 0:
+            self.average_cost = (
+                (self.quantity * self.average_cost + quantity * unit_cost) / (self.quantity + quantity)
+            ).quantize(COST_PLACES)
+        else:
+            self.average_cost = unit_cost
+        self.quantity += quantity
+        self.layers.append([unit_cost, quantity])
+
+    def issue(self, quantity):
+        self.quantity -= quantity
+        while quantity > 0 and self.layers:
+            layer = self.layers[0]
+            if layer[1] > quantity:
+                layer[1] -= quantity
+                break
+            quantity -= layer[1]
+            self.layers.pop(0)
+
+    def value(self, method=FIFO):
+        if self.quantity <= 0:
+            return Decimal('0.00')
+        if method == AVERAGE:
+            return (self.quantity * self.average_cost).quantize(CENT)
+        return sum((unit_cost * quantity for unit_cost, quantity in self.layers), Decimal('0')).quantize(CENT)
+
+    def unit_cost(self, method=FIFO):
+        if method == AVERAGE or self.quantity <= 0:
+            return self.average_cost
+        return (self.value(FIFO) / self.quantity).quantize(COST_PLACES)
+
+    def layers_json(self):
+        return [[str(unit_cost), str(quantity)] for unit_cost, quantity in self.layers]
+
+
+def cost_states_as_of(as_of, item=None, run=None):
+    """
+    Per-item CostState at the end of `as_of`, from the latest snapshot plus
+    later ledger rows, keyed by item primary key. `item` is an item code.
+    """
+    run = run if run is not None else latest_run(as_of)
+    states = {}
+    if run is not None:
+        costs = run.costs.all()
+        if item:
+            costs = costs.filter(item__item_record_id=item)
+        for cost in costs:
+            states[cost.item_id] = CostState.from_snapshot(cost)
+
+    rows = ledger_between(run.as_of if run else None, as_of).exclude(transaction_type__in=NON_COSTING_TYPES)
+    if item:
+        rows = rows.filter(item_code__item_record_id=item)
+    rows = rows.order_by('transaction_datetime', 'transaction_id').values_list(
+        'item_code', 'transaction_type', 'quantity', 'unit_cost'
+    )
+    for item_id, transaction_type, quantity, unit_cost in rows.iterator(chunk_size=2000):
+        state = states.get(item_id)
+        if state is None:
+            state = states[item_id] = CostState()
+        state.apply(movement_delta(transaction_type, quantity), unit_cost)
+    return states
+
+
+def valuation_as_of(as_of, method=FIFO, item=None):
+    """Quantity, unit cost and value of every item held at the end of `as_of`"""
+    return [
+        {
+            'item': item_id,
+            'quantity': state.quantity,
+            'unit_cost': state.unit_cost(method),
+            'value': state.value(method),
+        }
+        for item_id, state in sorted(cost_states_as_of(as_of, item).items())
+        if state.quantity
+    ]
+
+
+# Snapshot maintenance
+
+def take_snapshot(as_of, period=DAILY):
+    """Write (or rewrite) the complete closing snapshot of `as_of` from the previous one"""
+    with transaction.atomic():
+        # Rewriting a monthly snapshot keeps it monthly, so pruning never takes it
+        if BalanceSnapshotRun.objects.filter(as_of=as_of, period=MONTHLY).exists():
+            period = MONTHLY
+        BalanceSnapshotRun.objects.filter(as_of=as_of).delete()
+        previous = latest_run(as_of)
+        _, positions = positions_as_of(as_of, run=previous)
+        states = cost_states_as_of(as_of, run=previous)
+
+        run = BalanceSnapshotRun.objects.create(as_of=as_of, period=period, positions=len(positions))
+        balances = RecordTable(BalanceSnapshot, ['run', 'location', 'zone', 'batch', 'item', 'quantity'])
+        balances.extend(
+            (run.pk, row['location'], row['zone'], row['batch'], row['item'], row['quantity'])
+            for row in positions
+        )
+        balances.bulk_create(batch_size=1000)
+        CostSnapshot.objects.bulk_create([
+            CostSnapshot(
+                run=run, item_id=item_id, quantity=state.quantity,
+                average_cost=state.average_cost, fifo_layers=state.layers_json(),
+            )
+            for item_id, state in states.items()
+            if state.quantity or state.layers
+        ], batch_size=1000)
+    return run
+
+
+def invalidate_snapshots(transactions):
+    """Mark stale the snapshots that a newly written ledger row falls on or before"""
+    stamps = [txn.transaction_datetime for txn in transactions if txn.transaction_datetime]
+    if not stamps:
+        return 0
+    stamps = [timezone.make_aware(stamp) if timezone.is_naive(stamp) else stamp for stamp in stamps]
+    return BalanceSnapshotRun.objects.filter(
+        as_of__gte=timezone.localdate(min(stamps)), stale=False
+    ).update(stale=True)
+
+
+def refresh_stale():
+    """Re-take every stale snapshot, oldest first so each builds on a corrected one; returns the runs"""
+    stale = list(BalanceSnapshotRun.objects.filter(stale=True).order_by('as_of').values_list('as_of', 'period'))
+    return [take_snapshot(as_of, period) for as_of, period in stale]
+
+
+def prune_daily(before):
+    """Delete daily snapshots older than `before`; monthly ones are kept"""
+    deleted, _ = BalanceSnapshotRun.objects.filter(period=DAILY, as_of__lt=before).delete()
+    return deleted
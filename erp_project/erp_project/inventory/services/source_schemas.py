@@ -0,0 +1,286 @@
+"""
+Declarative layouts of the source spreadsheets the importer reads.
+
+A SourceSchema lists the columns of one layout: the field name the importer
+uses, the header text in the file and the kind of value. Headers match
+ignoring case and runs of whitespace, so 'Batch  No' and '     Sample
+Received From' are written here the way a person would type them.
+
+Compiling a schema against a file's header gives a converter that turns a
+positional row into a namedtuple in one pass. Date and quantity columns
+parse each distinct value once, and a date column tries the format that
+last matched first. Values that do not convert are passed through as
+stripped text, so callers still see that something was there.
+
+Adding a layout is a new SourceSchema in SCHEMAS.
+"""
+import csv
+import math
+from collections import namedtuple
+from datetime import datetime
+
+TEXT = 'text'
+DATE = 'date'
+QUANTITY = 'quantity'
+UNIT = 'unit'
+KINDS = (TEXT, DATE, QUANTITY, UNIT)
+
+# Tried in this order until a column has shown which one it uses
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d',
+    '%d-%m-%Y',
+    '%d/%m/%Y',
+    '%d-%m-%y',
+    '%d/%m/%y',
+)
+
+
+def normalise_header(header):
+    return ' '.join(header.split()).casefold()
+
+
+class DateParser:
+    """
+    Per-column date parsing. The format that last matched is tried first
+    and every distinct value is parsed once.
+    """
+
+    def __init__(self, formats=DATE_FORMATS):
+        self.formats = list(formats)
+        self.parsed = {}
+
+    def __call__(self, value):
+        try:
+            return self.parsed[value]
+        except KeyError:
+            pass
+        text = value.strip()
+        result = text
+        if text:
+            for fmt in self.formats:
+                try:
+                    result = datetime.strptime(text, fmt).date()
+                except ValueError:
+                    continue
+                if fmt is not self.formats[0]:
+                    self.formats.remove(fmt)
+                    self.formats.insert(0, fmt)
+                break
+        self.parsed[value] = result
+        return result
+
+
+class QuantityParser:
+    """Per-column quantity parsing to float, once per distinct value"""
+
+    def __init__(self):
+        self.parsed = {}
+
+    def __call__(self, value):
+        try:
+            return self.parsed[value]
+        except KeyError:
+            pass
+        text = value.strip()
+        result = text
+        if text:
+            try:
+                number = float(text)
+            except ValueError:
+                pass
+            else:
+                if math.isfinite(number):
+                    result = number
+        self.parsed[value] = result
+        return result
+
+
+def converted(value):
+    """True when a DATE or QUANTITY value parsed; unparsed values stay text"""
+    return not isinstance(value, str)
+
+
+class Column:
+    def __init__(self, field, header, kind=TEXT, unique=False):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown column kind {kind}')
+        self.field = field
+        self.header = header
+        self.kind = kind
+        # Values must not repeat across the import (lot and batch numbers)
+        self.unique = unique
+
+    def parser(self):
+        if self.kind == DATE:
+            return DateParser()
+        if self.kind == QUANTITY:
+            return QuantityParser()
+        return str.strip
+
+
+class SourceSchema:
+    """
+    One source layout. Rows whose first `required` field is empty are
+    skipped; `header_row` is the 0-based line holding the headers.
+    """
+
+    def __init__(self, name, columns, required, header_row=0):
+        self.name = name
+        self.columns = columns
+        self.required = required
+        self.header_row = header_row
+        self.record = namedtuple(f'{name.title()}Row', [column.field for column in columns])
+
+    def column(self, field):
+        return next(column for column in self.columns if column.field == field)
+
+    def columns_of(self, kind):
+        return [column for column in self.columns if column.kind == kind]
+
+    def compile(self, header):
+        return RowConverter(self, header)
+
+
+class MissingColumns(ValueError):
+    """Raised when a file's header lacks a required column"""
+
+
+def _empty(value):
+    return ''
+
+
+class RowConverter:
+    """A schema bound to one file's header: positional rows in, records out"""
+
+    def __init__(self, schema, header):
+        self.schema = schema
+        positions = {}
+        for index, name in enumerate(header):
+            positions.setdefault(normalise_header(name), index)
+        self.indexes = [positions.get(normalise_header(column.header)) for column in schema.columns]
+        self.missing = [
+            column.field for column, index in zip(schema.columns, self.indexes)
+            if index is None and column.field in schema.required
+        ]
+        self.parsers = [column.parser() for column in schema.columns]
+        # Absent columns read as an empty cell, like DictReader's row.get(header, '')
+        self._steps = [
+            (index, parser) if index is not None else (0, _empty)
+            for index, parser in zip(self.indexes, self.parsers)
+        ]
+        self.width = max(index for index, _ in self._steps) + 1
+        self.key = [column.field for column in schema.columns].index(schema.required[0])
+        self._make = schema.record._make
+
+    def __call__(self, row):
+        if len(row) < self.width:
+            row = row + [''] * (self.width - len(row))
+        return self._make([parser(row[index]) for index, parser in self._steps])
+
+    def convert(self, rows):
+        """Records for the rows that have the key field, skipping blank ones"""
+        key = self.key
+        for row in rows:
+            record = self(row)
+            if record[key]:
+                yield record
+
+
+def read_records(rows, schema):
+    """
+    Stream records from raw rows (lists of cell text: csv rows or workbook
+    sheet rows). Raises MissingColumns for a header without the required columns.
+    """
+    rows = iter(rows)
+    header = []
+    for _ in range(schema.header_row + 1):
+        header = next(rows, [])
+    converter = schema.compile(header)
+    if converter.missing:
+        raise MissingColumns(
+            f"missing column {', '.join(repr(schema.column(field).header) for field in converter.missing)}"
+        )
+    yield from converter.convert(rows)
+
+
+def csv_rows(path):
+    """Raw rows of a CSV file, streamed"""
+    with open(path, 'r', encoding='utf-8', newline='') as handle:
+        yield from csv.reader(handle)
+
+
+def read_rows(path, schema):
+    """Stream the records of a CSV file"""
+    return read_records(csv_rows(path), schema)
+
+
+STOCK = SourceSchema('stock', [
+    Column('name', 'Name'),
+    Column('grade', 'Grade'),
+    Column('product_code', 'Product code'),
+    Column('lot_no', 'Lot No.', unique=True),
+    Column('quantity', 'Qty', QUANTITY),
+    Column('unit', 'Unit', UNIT),
+    Column('brand', 'Brand'),
+    Column('supplier', 'Supplier'),
+    Column('received_on', 'Received on', DATE),
+    Column('mfg_date', 'Mfg. Date/QC* release date', DATE),
+    Column('expiry_date', 'Exp./Retest* Date', DATE),
+    Column('opened_on', 'Opened on', DATE),
+    Column('finished_on', 'Finished on', DATE),
+    Column('coa', 'COA'),
+    Column('spec', 'Spec'),
+    Column('sds', 'SDS'),
+    Column('comments', 'Comments'),
+    Column('invoice_no', 'Invoice No.'),
+    Column('invoice_date', 'Invoice date', DATE),
+], required=('name',))
+
+PBR = SourceSchema('pbr', [
+    Column('item', 'Item'),
+    Column('quantity', 'Qty', QUANTITY),
+    Column('unit', 'Unit', UNIT),
+    Column('brand', 'Brand'),
+    Column('supplier', 'Supplier'),
+    Column('purchased_on', 'Purchased on', DATE),
+    # Batch ids are built from the date as written
+    Column('purchased_on_text', 'Purchased on'),
+    Column('finished_on', 'Finished on', DATE),
+    Column('comments', 'Comments'),
+], required=('item',))
+
+PBR1 = SourceSchema('pbr1', PBR.columns + [
+    Column('invoice_no', 'Invoice no.'),
+    Column('invoice_date', 'Invoice date', DATE),
+], required=('item',))
+
+INCOMING = SourceSchema('incoming', [
+    Column('product_name', 'Product Name'),
+    Column('quantity', 'Qty. Received', QUANTITY),
+    Column('batch_no', 'Batch No', unique=True),
+    Column('product_code', 'Product code'),
+    Column('mfg_date', 'Mfg.Date', DATE),
+    Column('expiry_date', 'Expiry Date', DATE),
+    Column('manufacturer', 'Manufacturer name'),
+    Column('supplier', 'Sample Received From'),
+    Column('received_date', 'Received Date', DATE),
+    Column('invoice_no', 'Invoice no:'),
+    Column('invoice_date', 'Invoice date', DATE),
+    Column('comment', 'Comment'),
+], required=('product_name',))
+
+OUTGOING = SourceSchema('outgoing', [
+    Column('product_name', 'Product Name'),
+    Column('customer', 'Sample Sent to'),
+    Column('quantity', 'Qty. Sent', QUANTITY),
+    Column('batch_no', 'Batch No'),
+    Column('mfg_date', 'Mfg.Date', DATE),
+    Column('expiry_date', 'Expiry .Date', DATE),
+    Column('manufacturer', 'Manufacturer name'),
+    Column('sent_date', 'Sent Date', DATE),
+    Column('courier_details', 'Courier details'),
+], required=('product_name', 'customer'))
+
+SCHEMAS = {schema.name: schema for schema in (STOCK, PBR, PBR1, INCOMING, OUTGOING)}
+
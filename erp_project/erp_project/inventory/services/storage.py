@@ -0,0 +1,238 @@
+"""Storage occupancy tracking and capacity-aware putaway"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Case, When, Value, FloatField, DecimalField
+from django.db.models.functions import Abs, Cast
+
+from .records import RecordTable
+from .segregation import incompatible_hazards
+from .sync import record_changes, balance_key, BALANCE, LOCATION
+from ..models import (
+    StorageLocation, StorageOccupancy, InventoryTransaction, HazardClassChoices,
+    INBOUND_TRANSACTION_TYPES, OUTBOUND_TRANSACTION_TYPES, SIGNED_TRANSACTION_TYPES
+)
+
+
+def movement_delta(transaction_type, quantity):
+    """Signed stock change a ledger row applies to its storage location"""
+    quantity = Decimal(str(quantity or 0))
+    if transaction_type in INBOUND_TRANSACTION_TYPES:
+        return abs(quantity)
+    if transaction_type in OUTBOUND_TRANSACTION_TYPES:
+        return -abs(quantity)
+    if transaction_type in SIGNED_TRANSACTION_TYPES:
+        return quantity
+    return Decimal('0')
+
+
+def movement_delta_expression():
+    """SQL counterpart of movement_delta() for set-based rebuilds"""
+    return Case(
+        When(transaction_type__in=INBOUND_TRANSACTION_TYPES, then=Abs('quantity')),
+        When(transaction_type__in=OUTBOUND_TRANSACTION_TYPES, then=-Abs('quantity')),
+        When(transaction_type__in=SIGNED_TRANSACTION_TYPES, then=F('quantity')),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def apply_movements(transactions, chunk_size=500):
+    """
+    Apply new ledger rows to StorageOccupancy and StorageLocation.occupied_quantity.
+
+    Deltas are summed per (location, batch, item) first and existing slots
+    are then updated with one UPDATE per distinct delta, so a bulk receipt
+    or a count posting costs a few queries in total, not a few per slot.
+
+    A slot never drops below zero: an outbound move larger than the slot
+    (or from a slot that does not exist) only empties it, and the location's
+    occupied_quantity moves by what the slots actually changed. That keeps
+    occupied_quantity equal to the sum of its slots, as rebuild_occupancy()
+    computes it.
+    """
+    deltas = defaultdict(Decimal)
+    for txn in transactions:
+        if not txn.storage_location_id:
+            continue
+        delta = movement_delta(txn.transaction_type, txn.quantity)
+        if delta:
+            deltas[(txn.storage_location_id, txn.batch_id_id, txn.item_code_id)] += delta
+    if not deltas:
+        return 0
+
+    location_ids = list({location_id for location_id, _, _ in deltas})
+    location_totals = defaultdict(Decimal)
+
+    with transaction.atomic():
+        slots = {}
+        for start in range(0, len(location_ids), chunk_size):
+            for slot_id, quantity, *key in StorageOccupancy.objects.select_for_update().filter(
+                location_id__in=location_ids[start:start + chunk_size]
+            ).values_list('id', 'quantity', 'location_id', 'batch_id', 'item_id'):
+                slots[tuple(key)] = (slot_id, quantity)
+
+        slot_ids_by_delta = defaultdict(list)
+        new_slots = []
+        for key, delta in deltas.items():
+            location_id, batch_id, item_id = key
+            if key in slots:
+                slot_id, quantity = slots[key]
+                delta = max(delta, -quantity)
+                if delta:
+                    slot_ids_by_delta[delta].append(slot_id)
+            else:
+                delta = max(delta, Decimal('0'))
+                if delta:
+                    new_slots.append(StorageOccupancy(
+                        location_id=location_id, batch_id=batch_id, item_id=item_id, quantity=delta
+                    ))
+            location_totals[location_id] += delta
+        for delta, slot_ids in slot_ids_by_delta.items():
+            for start in range(0, len(slot_ids), chunk_size):
+                StorageOccupancy.objects.filter(id__in=slot_ids[start:start + chunk_size]).update(
+                    quantity=F('quantity') + delta
+                )
+        StorageOccupancy.objects.bulk_create(new_slots, batch_size=chunk_size)
+
+        locations_by_delta = defaultdict(list)
+        for location_id, delta in location_totals.items():
+            if delta:
+                locations_by_delta[delta].append(location_id)
+        for delta, ids in locations_by_delta.items():
+            for start in range(0, len(ids), chunk_size):
+                StorageLocation.objects.filter(location_id__in=ids[start:start + chunk_size]).update(
+                    occupied_quantity=F('occupied_quantity') + delta
+                )
+        # Emptied slots no longer count as contents of the location
+        for start in range(0, len(location_ids), chunk_size):
+            StorageOccupancy.objects.filter(
+                location_id__in=location_ids[start:start + chunk_size], quantity__lte=0
+            ).delete()
+        record_changes(BALANCE, [balance_key(*key) for key in deltas])
+        record_changes(LOCATION, location_totals)
+    return len(deltas)
+
+
+def refresh_slots(transactions):
+    """
+    Recompute the slots of edited or deleted ledger rows from the ledger, as
+    rebuild_occupancy() would, and move their locations' occupied_quantity
+    by the difference. Taking the old movement back instead would be wrong
+    whenever apply_movements() clamped it.
+    """
+    keys = {
+        (txn.storage_location_id, txn.batch_id_id, txn.item_code_id)
+        for txn in transactions if txn.storage_location_id
+    }
+    if not keys:
+        return 0
+    location_totals = defaultdict(Decimal)
+    with transaction.atomic():
+        for location_id, batch_id, item_id in keys:
+            on_hand = InventoryTransaction.objects.filter(
+                storage_location_id=location_id, batch_id_id=batch_id, item_code_id=item_id
+            ).order_by().aggregate(on_hand=Sum(movement_delta_expression()))['on_hand'] or Decimal('0')
+            quantity = max(on_hand, Decimal('0'))
+            slot = StorageOccupancy.objects.select_for_update().filter(
+                location_id=location_id, batch_id=batch_id, item_id=item_id
+            ).first()
+            previous = slot.quantity if slot else Decimal('0')
+            if quantity > 0 and slot:
+                slot.quantity = quantity
+                slot.save(update_fields=['quantity', 'updated_at'])
+            elif quantity > 0:
+                StorageOccupancy.objects.create(location_id=location_id, batch_id=batch_id, item_id=item_id, quantity=quantity)
+            elif slot:
+                slot.delete()
+            location_totals[location_id] += quantity - previous
+        for location_id, delta in location_totals.items():
+            if delta:
+                StorageLocation.objects.filter(location_id=location_id).update(occupied_quantity=F('occupied_quantity') + delta)
+        record_changes(BALANCE, [balance_key(*key) for key in keys])
+        record_changes(LOCATION, location_totals)
+    return len(keys)
+
+
+def rebuild_occupancy():
+    """Recompute all occupancy from the ledger with one grouped query"""
+    rows = (
+        InventoryTransaction.objects.filter(storage_location__isnull=False)
+        .order_by()
+        .values('storage_location', 'batch_id', 'item_code')
+        .annotate(on_hand=Sum(movement_delta_expression()))
+        .filter(on_hand__gt=0)
+    )
+    # Held column-wise: a full rebuild reads one row per slot in the warehouse
+    occupancy = RecordTable(StorageOccupancy, ['location', 'batch', 'item', 'quantity'])
+    occupancy.extend(rows.values_list('storage_location', 'batch_id', 'item_code', 'on_hand').iterator(chunk_size=2000))
+
+    location_totals = defaultdict(Decimal)
+    for location_id, quantity in zip(occupancy.column('location'), occupancy.column('quantity')):
+        location_totals[location_id] += quantity
+
+    with transaction.atomic():
+        previous = StorageOccupancy.objects.values_list('location_id', 'batch_id', 'item_id')
+        record_changes(BALANCE, [balance_key(*key) for key in previous] + [
+            balance_key(*key) for key in zip(occupancy.column('location'), occupancy.column('batch'), occupancy.column('item'))
+        ])
+        record_changes(LOCATION, StorageLocation.objects.values_list('location_id', flat=True))
+        StorageOccupancy.objects.all().delete()
+        occupancy.bulk_create(batch_size=500)
+        StorageLocation.objects.update(occupied_quantity=0)
+        locations = [
+            StorageLocation(location_id=location_id, occupied_quantity=total)
+            for location_id, total in location_totals.items()
+        ]
+        StorageLocation.objects.bulk_update(locations, ['occupied_quantity'], batch_size=500)
+    return len(occupancy)
+
+
+def suggest_putaway(item, quantity=None, limit=5):
+    """
+    Rank active locations for putting `item` away.
+
+    Only zones whose hazard set admits the item's hazard class qualify, and
+    locations already holding an incompatible hazard are skipped. Zones
+    defaulting to the item's category come first, then the least-full
+    locations that can still take `quantity`. One indexed query.
+    """
+    locations = StorageLocation.objects.filter(active=True).select_related('zone_id')
+
+    if item.hazard_class and item.hazard_class != HazardClassChoices.NONE:
+        locations = locations.filter(zone_id__hazards__hazard_class=item.hazard_class)
+        clashing = incompatible_hazards(item.hazard_class)
+        if clashing:
+            locations = locations.exclude(
+                location_id__in=StorageOccupancy.objects.filter(
+                    quantity__gt=0, item__hazard_class__in=clashing
+                ).values('location_id')
+            )
+
+    if quantity:
+        locations = locations.filter(
+            Q(capacity_quantity__isnull=True) |
+            Q(capacity_quantity__gte=F('occupied_quantity') + Decimal(str(quantity)))
+        )
+
+    return list(
+        locations.annotate(
+            category_rank=Case(
+                When(zone_id__default_for_category=item.category, then=Value(0)),
+                default=Value(1),
+            ),
+            capacity_rank=Case(
+                When(capacity_quantity__gt=0, then=Value(0)),
+                default=Value(1),
+            ),
+            fill_ratio=Case(
+                When(
+                    capacity_quantity__gt=0,
+                    then=Cast('occupied_quantity', FloatField()) / Cast('capacity_quantity', FloatField()),
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        ).order_by('category_rank', 'capacity_rank', 'fill_ratio', 'occupied_quantity', 'location_id')[:limit]
+    )
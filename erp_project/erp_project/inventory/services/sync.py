@@ -0,0 +1,418 @@
+"""Delta sync for offline handhelds - change-sequence pulls and idempotent transaction pushes"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .codes import code_values
+from .cursors import high_water, settled
+from .lookups import bump_version
+from .segregation import check_placement, describe_violations
+from .write_queue import serialized
+from ..models import (
+    SyncChange, SyncPush, ItemRecord, Batch, StorageLocation, StorageOccupancy,
+    InventoryTransaction, TransactionTypeChoices, QAStatusChoices
+)
+
+ITEM = 'item'
+BATCH = 'batch'
+LOCATION = 'location'
+BALANCE = 'balance'
+
+PULL_LIMIT = 1000
+PUSH_LIMIT = 500
+HANDHELD_TXN_KIND = 'H'
+
+ITEM_FIELDS = [
+    'item_record_id', 'item_name', 'unit_of_measure', 'category', 'subtype', 'grade',
+    'hazard_class', 'qa_required', 'traceability_level', 'sds_mandatory', 'coa_mandatory', 'spec_required',
+]
+BATCH_FIELDS = [
+    'batch_id', 'item_record_id', 'subtype', 'supplier_code', 'quantity_received',
+    'received_date', 'expiry_date', 'qa_status', 'storage_location',
+]
+LOCATION_FIELDS = [
+    'location_id', 'zone_id', 'rack_shelf', 'max_capacity', 'capacity_quantity',
+    'capacity_unit', 'occupied_quantity', 'active',
+]
+BALANCE_FIELDS = ['location_id', 'batch_id', 'item_id', 'quantity']
+
+# Conflict codes reported back to the handheld
+INVALID_UUID = 'invalid_uuid'
+INVALID_TRANSACTION = 'invalid_transaction'
+UNKNOWN_ITEM = 'unknown_item'
+UNKNOWN_BATCH = 'unknown_batch'
+UNKNOWN_LOCATION = 'unknown_location'
+BATCH_ITEM_MISMATCH = 'batch_item_mismatch'
+BATCH_QUARANTINED = 'batch_quarantined'
+BATCH_REJECTED = 'batch_rejected'
+INSUFFICIENT_BALANCE = 'insufficient_balance'
+SEGREGATION_VIOLATION = 'segregation_violation'
+
+HELD_BATCH_CONFLICTS = {
+    QAStatusChoices.QUARANTINED: BATCH_QUARANTINED,
+    QAStatusChoices.REJECTED: BATCH_REJECTED,
+}
+
+
+class SyncError(ValueError):
+    """Raised when a sync request is malformed as a whole"""
+
+
+def balance_key(location_id, batch_id, item_id):
+    """Sync-log key of an occupancy slot: location code, batch and item primary keys"""
+    return f"{location_id}|{batch_id or ''}|{item_id}"
+
+
+def record_changes(entity, keys):
+    """Append changed record keys to the sync log (call inside the writing transaction)"""
+    keys = list(dict.fromkeys(str(key) for key in keys))
+    if keys:
+        SyncChange.objects.bulk_create(
+            [SyncChange(entity=entity, object_key=key) for key in keys], batch_size=500
+        )
+
+
+def _balance_rows(keys):
+    """
+    Current occupancy for balance keys, with batch and item codes; emptied
+    slots come back with quantity 0. Slots of deleted items are left out.
+    """
+    wanted = [key.split('|') for key in keys]
+    if not wanted:
+        return []
+    found = {
+        balance_key(row['location_id'], row['batch_id'], row['item_id']): row['quantity']
+        for row in StorageOccupancy.objects.filter(
+            location_id__in={location for location, _, _ in wanted},
+            item_id__in={int(item) for _, _, item in wanted},
+        ).values(*BALANCE_FIELDS)
+    }
+    batches = Batch.objects.codes(int(batch) for _, batch, _ in wanted if batch)
+    items = ItemRecord.objects.codes(int(item) for _, _, item in wanted)
+    return [
+        {
+            'location_id': location,
+            'batch_id': batches.get(int(batch)) if batch else None,
+            'item_id': items[int(item)],
+            'quantity': found.get(key, Decimal('0')),
+        }
+        for key, (location, batch, item) in zip(keys, wanted)
+        if int(item) in items
+    ]
+
+
+# Snapshot sections in page order: response key, rows, fields
+SNAPSHOT_SECTIONS = (
+    ('items', lambda: ItemRecord.objects.all(), ITEM_FIELDS),
+    ('batches', lambda: Batch.objects.all(), BATCH_FIELDS),
+    ('locations', lambda: StorageLocation.objects.filter(active=True), LOCATION_FIELDS),
+    ('balances', lambda: StorageOccupancy.objects.filter(quantity__gt=0), BALANCE_FIELDS),
+)
+
+
+def _snapshot_position(cursor):
+    """'<since>:<section>:<last primary key>' -> its three parts"""
+    try:
+        since, section, after = cursor.split(':', 2)
+        return int(since), int(section), after
+    except ValueError:
+        raise SyncError('Invalid snapshot cursor')
+
+
+def snapshot(limit=PULL_LIMIT, cursor=None):
+    """
+    Full dataset for a handheld starting from scratch (since=0), `limit`
+    rows per page in section and primary key order.
+
+    While has_more is set the client passes the returned `cursor` back with
+    since=0. `since` is the high-water mark read for the first page; the
+    client stores it once the last page is in, so rows changed while it was
+    paging are pulled again as deltas.
+    """
+    if cursor:
+        since, section, after = _snapshot_position(cursor)
+    else:
+        # Read the high-water mark first so changes made during the snapshot are pulled next time
+        since = high_water(SyncChange.objects.all(), 'seq', 'changed_at')
+        section, after = 0, ''
+
+    result = {
+        'since': since,
+        'has_more': False,
+        'cursor': None,
+        'snapshot': True,
+        'deleted': {ITEM: [], BATCH: [], LOCATION: []},
+    }
+    remaining = limit
+    for index, (name, rows, fields) in enumerate(SNAPSHOT_SECTIONS):
+        result[name] = []
+        if index < section or result['has_more']:
+            continue
+        queryset = rows()
+        if index == section and after:
+            queryset = queryset.filter(pk__gt=after)
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:remaining + 1])
+        page = pks[:remaining]
+        if page:
+            result[name] = code_values(queryset.filter(pk__in=page).order_by('pk'), *fields)
+            remaining -= len(page)
+        if len(pks) > len(page):
+            last = page[-1] if page else (after if index == section else '')
+            result.update(has_more=True, cursor=f'{since}:{index}:{last}')
+    return result
+
+
+def pull_changes(since=0, limit=PULL_LIMIT, cursor=None):
+    """
+    Records changed after change-sequence `since`, current state only.
+
+    Reads up to `limit` log entries, collapses repeated keys, and fetches the
+    current rows with one query per entity. Keys whose rows no longer exist
+    are returned under `deleted`, and so are deactivated locations, which
+    a snapshot leaves out. Clients store `since` and pass it back.
+
+    The read stops short of a sequence number still held by an uncommitted
+    write (see cursors), so a change committing late is not skipped.
+    """
+    if since <= 0:
+        return snapshot(limit, cursor)
+
+    read = list(
+        SyncChange.objects.filter(seq__gt=since).order_by('seq')
+        .values_list('seq', 'changed_at', 'entity', 'object_key')[:limit]
+    )
+    changes = settled(read, since, key=lambda change: change[:2])
+    keys = defaultdict(dict)
+    for _, _, entity, object_key in changes:
+        keys[entity][object_key] = None
+
+    result = {
+        'since': changes[-1][0] if changes else since,
+        'has_more': len(read) == limit and len(changes) == len(read),
+        'cursor': None,
+        'snapshot': False,
+        'deleted': {},
+    }
+    for entity, name, queryset, fields in ((ITEM, 'items', ItemRecord.objects.all(), ITEM_FIELDS),
+                                           (BATCH, 'batches', Batch.objects.all(), BATCH_FIELDS),
+                                           (LOCATION, 'locations', StorageLocation.objects.filter(active=True), LOCATION_FIELDS)):
+        wanted = list(keys[entity])
+        # Items and batches are logged by code, the first of their fields
+        rows = code_values(queryset.filter(**{f'{fields[0]}__in': wanted}), *fields) if wanted else []
+        present = {str(row[fields[0]]) for row in rows}
+        result[name] = rows
+        result['deleted'][entity] = [key for key in wanted if key not in present]
+    result['balances'] = _balance_rows(list(keys[BALANCE]))
+    return result
+
+
+def _ledger_balances(item_ids):
+    """
+    On-hand per (item, batch, location) and per (item, batch) from one
+    grouped ledger query, keyed by item and batch primary keys
+    """
+    from .storage import movement_delta_expression
+
+    by_location = defaultdict(Decimal)
+    by_batch = defaultdict(Decimal)
+    rows = (
+        InventoryTransaction.objects.filter(item_code_id__in=item_ids)
+        .order_by()
+        .values('item_code', 'batch_id', 'storage_location')
+        .annotate(on_hand=Sum(movement_delta_expression()))
+    )
+    for row in rows:
+        by_location[(row['item_code'], row['batch_id'], row['storage_location'])] += row['on_hand']
+        by_batch[(row['item_code'], row['batch_id'])] += row['on_hand']
+    return by_location, by_batch
+
+
+def _stored_result(push):
+    result = {'client_uuid': str(push.client_uuid), 'status': push.status, 'duplicate': True}
+    if push.transaction_id:
+        result['transaction_id'] = push.transaction_id
+    if push.conflict:
+        result.update(conflict=push.conflict, detail=push.detail)
+    return result
+
+
+@serialized
+def push_transactions(entries, device_id='', user=''):
+    """
+    Apply a batch of transactions queued offline on a handheld.
+
+    Each entry carries a client-generated `client_uuid`; an entry whose UUID
+    was seen before returns its recorded outcome instead of posting again, so
+    a handheld can safely resend a whole batch after a dropped connection.
+    Entries are checked in order against live ledger balances (earlier
+    entries in the batch count), outbound movements from quarantined or
+    rejected batches are refused, and so are inbound movements into a
+    location whose zone or contents clash with the item's hazard class. Accepted rows are bulk-created in one
+    transaction; every outcome is recorded. Rows are posted as `user`, or
+    as the device when the push is not authenticated. Returns one result
+    per entry.
+    """
+    try:
+        return _push(entries, device_id, user)
+    except IntegrityError:
+        # A concurrent push of the same client UUIDs committed first: its
+        # transaction was rolled back here, and a second pass returns the stored outcomes
+        return _push(entries, device_id, user)
+
+
+def _push(entries, device_id, user):
+    from .counters import count_rows
+    from .outbox import emit_transactions
+    from .receiving import allocate_transaction_ids
+    from .snapshots import invalidate_snapshots
+    from .storage import apply_movements, movement_delta
+
+    if not isinstance(entries, list):
+        raise SyncError('transactions must be a list')
+    if len(entries) > PUSH_LIMIT:
+        raise SyncError(f'At most {PUSH_LIMIT} transactions per push')
+
+    parsed = []
+    for entry in entries:
+        try:
+            parsed.append((uuid.UUID(str(entry.get('client_uuid'))), entry))
+        except (AttributeError, ValueError):
+            parsed.append((None, entry))
+
+    now = timezone.now()
+    # Who posted comes from the request, never from the payload
+    poster = user or (f'device:{device_id}'[:50] if device_id else '')
+    results = []
+    with transaction.atomic():
+        existing = SyncPush.objects.in_bulk([client_uuid for client_uuid, _ in parsed if client_uuid])
+        batch_ids = {entry.get('batch_id') for client_uuid, entry in parsed if client_uuid and entry.get('batch_id')}
+        batches = Batch.objects.select_for_update().in_bulk(list(batch_ids), field_name='batch_id')
+        item_codes = {entry.get('item_code') for client_uuid, entry in parsed if client_uuid and entry.get('item_code')}
+        items_by_pk = {
+            item.pk: item for item in ItemRecord.objects.filter(
+                Q(item_record_id__in=item_codes) | Q(pk__in=[batch.item_record_id_id for batch in batches.values()])
+            )
+        }
+        items = {item.item_record_id: item for item in items_by_pk.values()}
+        location_ids = {entry.get('storage_location') for client_uuid, entry in parsed if client_uuid and entry.get('storage_location')}
+        locations = StorageLocation.objects.in_bulk(list(location_ids))
+        by_location, by_batch = _ledger_balances(list(items_by_pk))
+
+        rows, pushes, seen, repeats = [], [], {}, []
+        for client_uuid, entry in parsed:
+            if client_uuid is None:
+                results.append({'client_uuid': entry.get('client_uuid') if isinstance(entry, dict) else None,
+                                'status': 'conflict', 'conflict': INVALID_UUID, 'detail': 'client_uuid is not a UUID'})
+                continue
+            if client_uuid in existing:
+                results.append(_stored_result(existing[client_uuid]))
+                continue
+            if client_uuid in seen:
+                # Resolved once the first occurrence has its transaction ID
+                repeats.append((len(results), client_uuid))
+                results.append(None)
+                continue
+
+            conflict, detail, txn = None, '', None
+            batch = batches.get(entry.get('batch_id')) if entry.get('batch_id') else None
+            if entry.get('item_code'):
+                item = items.get(entry.get('item_code'))
+            else:
+                item = items_by_pk.get(batch.item_record_id_id) if batch else None
+            location = locations.get(entry.get('storage_location')) if entry.get('storage_location') else None
+            try:
+                quantity = Decimal(str(entry.get('quantity')))
+            except (InvalidOperation, ValueError):
+                quantity = None
+            posted_at = now
+            if entry.get('transaction_datetime'):
+                try:
+                    posted_at = parse_datetime(entry['transaction_datetime'])
+                except (TypeError, ValueError):
+                    posted_at = None
+
+            if entry.get('transaction_type') not in TransactionTypeChoices.values or quantity is None:
+                conflict, detail = INVALID_TRANSACTION, 'transaction_type and a numeric quantity are required'
+            elif posted_at is None:
+                conflict, detail = INVALID_TRANSACTION, 'transaction_datetime is not an ISO 8601 date and time'
+            elif entry.get('batch_id') and batch is None:
+                conflict, detail = UNKNOWN_BATCH, f"Batch {entry.get('batch_id')} does not exist"
+            elif item is None:
+                conflict, detail = UNKNOWN_ITEM, f"Item {entry.get('item_code')} does not exist"
+            elif entry.get('storage_location') and location is None:
+                conflict, detail = UNKNOWN_LOCATION, f"Location {entry.get('storage_location')} does not exist"
+            elif batch and batch.item_record_id_id != item.pk:
+                conflict, detail = BATCH_ITEM_MISMATCH, f'Batch {batch.batch_id} is not item {item.item_record_id}'
+
+            if conflict is None:
+                delta = movement_delta(entry['transaction_type'], quantity)
+                batch_key = (item.pk, batch.pk if batch else None)
+                location_key = batch_key + (location.location_id if location else None,)
+                on_hand = by_location[location_key] if location else by_batch[batch_key]
+                violations = check_placement(item, location) if delta > 0 and location else []
+                if delta < 0 and batch and batch.qa_status in HELD_BATCH_CONFLICTS:
+                    conflict = HELD_BATCH_CONFLICTS[batch.qa_status]
+                    detail = f'Batch {batch.batch_id} is {batch.qa_status}'
+                elif delta < 0 and on_hand + delta < 0:
+                    conflict = INSUFFICIENT_BALANCE
+                    detail = f'On hand {on_hand}, requested {-delta}'
+                elif violations:
+                    conflict = SEGREGATION_VIOLATION
+                    detail = describe_violations(violations)
+                else:
+                    by_location[location_key] += delta
+                    by_batch[batch_key] += delta
+                    txn = InventoryTransaction(
+                        transaction_datetime=posted_at,
+                        transaction_user=poster,
+                        transaction_type=entry['transaction_type'],
+                        comments=entry.get('comments', ''),
+                        product_code=item.item_record_id,
+                        item_code=item,
+                        product_name=item.item_name,
+                        batch_id=batch,
+                        unit_id=entry.get('unit_id', ''),
+                        expiry_date=batch.expiry_date if batch else None,
+                        quantity=quantity,
+                        unit=entry.get('unit') or item.unit_of_measure,
+                        storage_zone_id=location.zone_id_id if location else None,
+                        storage_location=location,
+                        qa_status=batch.qa_status if batch else '',
+                        adjustment_reason=entry.get('adjustment_reason', ''),
+                    )
+
+            push = SyncPush(
+                client_uuid=client_uuid, device_id=device_id,
+                status='conflict' if conflict else 'applied',
+                conflict=conflict or '', detail=detail[:500],
+            )
+            pushes.append(push)
+            if txn is not None:
+                rows.append((txn, push))
+            result = {'client_uuid': str(client_uuid), 'status': push.status}
+            if conflict:
+                result.update(conflict=conflict, detail=detail)
+            results.append(result)
+            seen[client_uuid] = result
+
+        if rows:
+            for (txn, push), transaction_id in zip(rows, allocate_transaction_ids(len(rows), now, kind=HANDHELD_TXN_KIND)):
+                txn.transaction_id = push.transaction_id = transaction_id
+                seen[push.client_uuid]['transaction_id'] = transaction_id
+            InventoryTransaction.objects.bulk_create([txn for txn, _ in rows], batch_size=500)
+            apply_movements([txn for txn, _ in rows])
+            invalidate_snapshots([txn for txn, _ in rows])
+            emit_transactions([txn for txn, _ in rows])
+            count_rows(InventoryTransaction, [txn for txn, _ in rows])
+            bump_version(InventoryTransaction._meta.db_table)
+        SyncPush.objects.bulk_create(pushes, batch_size=500)
+
+    for index, client_uuid in repeats:
+        results[index] = dict(seen[client_uuid], duplicate=True)
+
+    return results
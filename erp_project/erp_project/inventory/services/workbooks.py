@@ -0,0 +1,83 @@
+"""
+Streaming reads of the source .xlsx workbooks.
+
+Workbooks are opened read-only, so openpyxl parses sheet XML as rows are
+requested instead of building every cell in memory; reading a sheet keeps
+one row at a time whatever its size. Cells are rendered as the text the
+per-sheet CSV exports contain (datetimes as 'YYYY-MM-DD HH:MM:SS', whole
+numbers without '.0'), so sheet rows feed the same source schemas as CSV
+rows and import to the same records.
+
+openpyxl is optional: without it only the CSV exports can be imported.
+"""
+from datetime import date, datetime, time
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - optional dependency
+    openpyxl = None
+
+
+class WorkbookError(ValueError):
+    """Raised when a workbook cannot be read"""
+
+
+def available():
+    return openpyxl is not None
+
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return str(value).upper()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class WorkbookSet:
+    """
+    Read-only workbooks opened on first use and kept open for the rest of
+    a run, so each workbook's shared strings are parsed once. Use as a
+    context manager to close them.
+    """
+
+    def __init__(self):
+        self.workbooks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self, path):
+        if openpyxl is None:
+            raise WorkbookError('Reading .xlsx workbooks needs openpyxl (pip install openpyxl)')
+        if path not in self.workbooks:
+            try:
+                self.workbooks[path] = openpyxl.load_workbook(path, read_only=True, data_only=True)
+            except Exception as e:
+                raise WorkbookError(f'Cannot open {path}: {e}')
+        return self.workbooks[path]
+
+    def has_sheet(self, path, sheet):
+        return sheet in self.open(path).sheetnames
+
+    def rows(self, path, sheet):
+        """Rows of one sheet as lists of cell text, streamed"""
+        worksheet = self.open(path)[sheet]
+        for values in worksheet.iter_rows(values_only=True):
+            yield [cell_text(value) for value in values]
+
+    def close(self):
+        for workbook in self.workbooks.values():
+            workbook.close()
+        self.workbooks.clear()
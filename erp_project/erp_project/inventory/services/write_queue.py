@@ -0,0 +1,113 @@
+"""
+Serialized, batched writes for SQLite deployments.
+
+SQLite admits one writer at a time. Rather than have every request thread
+of a worker race for the database lock, the posting services (marked with
+@serialized) hand their work to one writer thread per process. The writer
+runs everything queued, up to WRITE_BATCH_SIZE jobs, in one transaction
+with a savepoint per job: a burst of posts costs one commit instead of one
+each, and a failing job rolls back alone. Callers block until the
+transaction holding their job has committed, then get its result or
+exception. Writers in other processes still wait on the database lock
+(busy_timeout).
+
+On with settings.SQLITE_WRITE_QUEUE (part of the SQLite production profile,
+see settings) when the default database is SQLite. Calls made inside a
+transaction, or from the writer thread itself, run directly.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+WRITE_BATCH_SIZE = 50
+
+_local = threading.local()
+
+
+def enabled():
+    return getattr(settings, 'SQLITE_WRITE_QUEUE', False) and connection.vendor == 'sqlite'
+
+
+class WriteQueue:
+    """Jobs waiting for the writer thread of this process"""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        """Run `function` on the writer thread and return its result once committed"""
+        future = Future()
+        self.jobs.put((future, function, args, kwargs))
+        self._start()
+        return future.result()
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        _local.writer = True
+        batch_size = getattr(settings, 'SQLITE_WRITE_BATCH_SIZE', WRITE_BATCH_SIZE)
+        while True:
+            batch = [self.jobs.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, function, args, kwargs in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, function(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            # The commit itself failed, so none of the batch was written
+            if isinstance(e, DatabaseError):
+                connection.close()
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_queue = WriteQueue()
+
+
+def _reset_after_fork():
+    # A forked worker starts with no writer thread and must not share the parent's queue
+    global _queue
+    _queue = WriteQueue()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def serialized(function):
+    """Run the decorated write service through the write queue when it is on"""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled() or connection.in_atomic_block or getattr(_local, 'writer', False):
+            return function(*args, **kwargs)
+        return _queue.submit(function, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,93 @@
+"""Model signals feeding the handheld sync change log, the per-table change counters, the related-row counts, storage occupancy and the outbox"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    ItemRecord, Batch, StorageLocation, StorageZone, StorageZoneHazard, Supplier, Customer, SupplierProduct,
+    QAReview, QAReviewUnit, InventoryTransaction,
+    TransactionDocuments, TransactionEquipment, TransactionDispatch, TransactionDisposal, TransactionUsage
+)
+from .services.counters import count_rows
+from .services.lookups import bump_version
+from .services.outbox import emit_transactions, emit_batches, emit_qa_reviews, emit_qa_review_units
+from .services.storage import refresh_slots
+from .services.sync import record_changes, ITEM, BATCH, LOCATION
+
+SYNCED_MODELS = {ItemRecord: ITEM, Batch: BATCH, StorageLocation: LOCATION}
+
+
+@receiver([post_save, post_delete], sender=ItemRecord)
+@receiver([post_save, post_delete], sender=Batch)
+@receiver([post_save, post_delete], sender=StorageLocation)
+def log_sync_change(sender, instance, **kwargs):
+    """Queue the saved or deleted record for the next handheld pull"""
+    if kwargs.get('raw'):
+        return
+    # Handhelds know items and batches by code, not by their integer keys
+    key_field = getattr(sender._default_manager, 'code_field', 'pk')
+    record_changes(SYNCED_MODELS[sender], [getattr(instance, key_field)])
+
+
+@receiver([post_save, post_delete], sender=ItemRecord)
+@receiver([post_save, post_delete], sender=Batch)
+@receiver([post_save, post_delete], sender=StorageLocation)
+@receiver([post_save, post_delete], sender=StorageZone)
+@receiver([post_save, post_delete], sender=StorageZoneHazard)
+@receiver([post_save, post_delete], sender=Supplier)
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=SupplierProduct)
+@receiver([post_save, post_delete], sender=QAReview)
+@receiver([post_save, post_delete], sender=QAReviewUnit)
+@receiver([post_save, post_delete], sender=InventoryTransaction)
+@receiver([post_save, post_delete], sender=TransactionDocuments)
+@receiver([post_save, post_delete], sender=TransactionEquipment)
+@receiver([post_save, post_delete], sender=TransactionDispatch)
+@receiver([post_save, post_delete], sender=TransactionDisposal)
+@receiver([post_save, post_delete], sender=TransactionUsage)
+def bump_table_version(sender, **kwargs):
+    """
+    Every write bumps its table's change counter, invalidating cached dropdown
+    payloads and the HTTP validators of pages built from the table
+    """
+    bump_version(sender._meta.db_table)
+
+
+@receiver(post_save, sender=SupplierProduct)
+@receiver(post_save, sender=Batch)
+@receiver(post_save, sender=QAReview)
+@receiver(post_save, sender=InventoryTransaction)
+def count_created(sender, instance, created, **kwargs):
+    """A new row adds to its supplier, item and customer counts"""
+    if created and not kwargs.get('raw'):
+        count_rows(sender, [instance])
+
+
+@receiver(post_delete, sender=SupplierProduct)
+@receiver(post_delete, sender=Batch)
+@receiver(post_delete, sender=QAReview)
+@receiver(post_delete, sender=InventoryTransaction)
+def count_deleted(sender, instance, **kwargs):
+    count_rows(sender, [instance], sign=-1)
+
+
+@receiver(post_delete, sender=InventoryTransaction)
+def reverse_movement(sender, instance, **kwargs):
+    """A deleted ledger row gives back the stock it moved"""
+    refresh_slots([instance])
+
+
+DELETE_EVENTS = {
+    InventoryTransaction: emit_transactions,
+    Batch: emit_batches,
+    QAReview: emit_qa_reviews,
+    QAReviewUnit: emit_qa_review_units,
+}
+
+
+@receiver(post_delete, sender=InventoryTransaction)
+@receiver(post_delete, sender=Batch)
+@receiver(post_delete, sender=QAReview)
+@receiver(post_delete, sender=QAReviewUnit)
+def emit_deleted(sender, instance, **kwargs):
+    """Deletes reach outbox consumers too, in the deleting transaction"""
+    DELETE_EVENTS[sender]([instance], 'deleted')
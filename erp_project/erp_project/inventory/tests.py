@@ -1,3 +1,1338 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import uuid
+from array import array
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db import DatabaseError
+from django.db.models import Q
+from django.test import Client, TestCase, override_settings
+from django.utils.http import http_date
+from django.utils import timezone
+
+from .api_auth import issue_device_token
+from .management.commands.import_real_data_v2 import Command as ImportCommand, STOCK_WORKBOOK
+from .models import (
+    BalanceSnapshotRun, Batch, CountSession, Customer, DeviceToken, InventoryTransaction, ItemRecord, Job,
+    OutboxCursor, OutboxEvent, QAReview, QAReviewUnit, StorageLocation, StorageOccupancy, StorageZone,
+    StorageZoneHazard, Supplier, SupplierProduct, SyncChange, SyncPush, TransactionDisposal, TransactionDocuments,
+    TransactionEquipment, TransactionUsage, TRANSACTION_DETAILS, CategoryChoices, GradeChoices
+)
+from .services import (
+    bitmaps, cursors, facets, import_validation, jobs, lookups, master_snapshot, outbox, qr, segregation, source_schemas,
+    workbooks, write_queue
+)
+from .services.codes import code_values, related_codes
+from .services.counters import reconcile_counters
+from .services.labels import qr_payload, render_pdf_page, render_zpl_label
+from .services.lookups import dropdown_context, dropdown_size, table_versions
+from .services.receiving import receive_units
+from .services.records import LedgerWriter, RecordTable, record_class
+from .services.rules import ITEM_RECORD_RULE, item_record_derived, recompute_item_records, recompute_supplier_products
+from .services.segregation import audit_segregation, check_placement, INCOMPATIBLE_CONTENTS, ZONE_NOT_PERMITTED
+from .services.snapshots import invalidate_snapshots, positions_as_of, refresh_stale, take_snapshot, MONTHLY
+from .services.storage import rebuild_occupancy, suggest_putaway
+from .views import ITEM_DETAIL_FIELDS
+from .services.reviews import (
+    due_suppliers, recompute_review_schedule, review_queue_counts, DUE_SOON, OVERDUE, SCHEDULED
+)
+
+BATCH = 'BATCH-CHE-SOL-ETH-001-20240720-001'
+OTHER_BATCH = 'BATCH-BIO-RM-ALG-001-20240720-001'
+ITEM = 'CHE-SOL-ETH-001'
+OTHER_ITEM = 'BIO-RM-ALG-001'
+LOCATION = 'LOC-CHEM-A1'
+
+
+class SampleDataTestCase(TestCase):
+    """Tests over the populate_sample_data records, logged in, with empty process caches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_sample_data', stdout=io.StringIO())
+        cls.user = User.objects.create_user('tester', password='secret')
+
+    def setUp(self):
+        # Cached payloads are keyed on table versions, which roll back with each test
+        for cache in (lookups, facets, master_snapshot, segregation):
+            cache.clear()
+        self.client.login(username='tester', password='secret')
+
+    def post_json(self, url, payload, **extra):
+        return self.client.post(url, json.dumps(payload), content_type='application/json', **extra)
+
+
+class BulkDispositionTests(SampleDataTestCase):
+    url = '/inventory/qa-reviews/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        Batch.objects.update(supplier_code=Supplier.objects.get(supplier_id='SUP-CHEMCO'))
+
+    def test_batches_and_their_open_ledger_rows_take_the_status(self):
+        InventoryTransaction.objects.update(qa_status='Pending')
+        response = self.post_json(self.url, {'review_outcome': 'Rejected', 'batch_ids': [BATCH, OTHER_BATCH]})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['batches_updated'], len(result['reviews'])), (2, 2))
+        self.assertEqual(set(Batch.objects.values_list('qa_status', flat=True)), {'Rejected'})
+        reviews = QAReview.objects.filter(qa_review_id__in=result['reviews'])
+        self.assertEqual(set(reviews.values_list('qa_reviewer', flat=True)), {'tester'})
+        changed = OutboxEvent.objects.filter(event_type='inventory_transaction.qa_status_changed')
+        self.assertEqual(changed.count(), InventoryTransaction.objects.filter(batch_id__isnull=False).count())
+        self.assertEqual(changed.count(), result['transactions_updated'])
+
+    def test_units_leave_their_batch_status_alone(self):
+        batch = Batch.objects.get(batch_id=BATCH)
+        status = batch.qa_status
+        units = [row.unit_id for row in receive_units(batch, 2, 1, user='tester')]
+        InventoryTransaction.objects.filter(unit_id__in=units).update(qa_status='Pending')
+        response = self.post_json(self.url, {'review_outcome': 'Rejected', 'unit_ids': units[:1]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['batches_updated'], 0)
+        batch.refresh_from_db()
+        self.assertEqual(batch.qa_status, status)
+        self.assertEqual(
+            dict(InventoryTransaction.objects.filter(unit_id__in=units).values_list('unit_id', 'qa_status')),
+            {units[0]: 'Rejected', units[1]: 'Pending'},
+        )
+        self.assertEqual(QAReviewUnit.objects.get().unit_id, units[0])
+        self.assertFalse(OutboxEvent.objects.filter(event_type='batch.qa_status_changed').exists())
+        self.assertEqual(
+            list(OutboxEvent.objects.filter(event_type='inventory_transaction.qa_status_changed')
+                 .values_list('aggregate_id', flat=True)),
+            list(InventoryTransaction.objects.filter(unit_id=units[0]).values_list('transaction_id', flat=True)),
+        )
+
+    def test_reviewer_is_the_logged_in_user(self):
+        response = self.post_json(self.url, {'review_outcome': 'Approved', 'batch_ids': [BATCH], 'qa_reviewer': 'someone'})
+        self.assertEqual(QAReview.objects.get(qa_review_id=response.json()['reviews'][0]).qa_reviewer, 'tester')
+
+    def test_invalid_requests_are_refused(self):
+        for payload in ({'review_outcome': 'Maybe', 'batch_ids': [BATCH]},
+                        {'review_outcome': 'Approved', 'batch_ids': BATCH},
+                        {'review_outcome': 'Approved', 'batch_ids': ['NO-SUCH-BATCH']}):
+            self.assertEqual(self.post_json(self.url, payload).status_code, 400, payload)
+        self.assertFalse(QAReview.objects.filter(qa_reviewer='tester').exists())
+
+    def test_anonymous_requests_are_refused(self):
+        self.client.logout()
+        reviews = QAReview.objects.count()
+        response = self.post_json(self.url, {'review_outcome': 'Rejected', 'batch_ids': [BATCH]})
+        self.assertNotEqual(response.status_code, 200)
+        self.assertEqual(QAReview.objects.count(), reviews)
+        self.assertNotEqual(Batch.objects.get(batch_id=BATCH).qa_status, 'Rejected')
+
+
+class ReviewScheduleTests(SampleDataTestCase):
+    def test_recompute_follows_review_frequency(self):
+        today = timezone.localdate()
+        Supplier.objects.update(review_frequency='1 year', last_reviewed_on=today - timedelta(days=400), next_review_due=None)
+        Supplier.objects.filter(supplier_id='SUP-CHEMCO').update(review_frequency='6 months')
+        SupplierProduct.objects.update(review_frequency='On change', last_reviewed_on=today, next_review_due=today)
+        self.assertEqual(recompute_review_schedule()['supplier_products'], 0)
+        due = dict(Supplier.objects.values_list('supplier_id', 'next_review_due'))
+        self.assertEqual(due['SUP-CHEMCO'], today - timedelta(days=220))
+        self.assertEqual(due['SUP-ALGAMO'], today - timedelta(days=35))
+        self.assertEqual(set(SupplierProduct.objects.values_list('next_review_due', flat=True)), {today})
+
+    def test_queue_classifies_due_dates(self):
+        today = timezone.localdate()
+        dates = {'SUP-CHEMCO': today - timedelta(days=1), 'SUP-ALGAMO': today + timedelta(days=10),
+                 'SUP-PACKAGING': today + timedelta(days=200)}
+        for supplier_id, due in dates.items():
+            Supplier.objects.filter(supplier_id=supplier_id).update(next_review_due=due)
+        self.assertEqual(
+            list(due_suppliers(today=today).values_list('supplier_id', 'review_state')),
+            [('SUP-CHEMCO', OVERDUE), ('SUP-ALGAMO', DUE_SOON)],
+        )
+        self.assertEqual(due_suppliers(365, today).last().review_state, SCHEDULED)
+        self.assertEqual(review_queue_counts(today)['suppliers'], {'overdue': 1, 'due_soon': 1})
+        response = self.client.get('/inventory/api/reviews-due/?days=30')
+        self.assertEqual([row['supplier_id'] for row in response.json()['suppliers']], ['SUP-CHEMCO', 'SUP-ALGAMO'])
+
+
+class OccupancyTests(SampleDataTestCase):
+    def occupancy(self):
+        slots = dict(
+            ((location, batch, item), quantity)
+            for location, batch, item, quantity in StorageOccupancy.objects.values_list('location', 'batch', 'item', 'quantity')
+        )
+        return slots, dict(StorageLocation.objects.values_list('location_id', 'occupied_quantity'))
+
+    def post(self, transaction_type, quantity, batch=BATCH):
+        batch = Batch.objects.get(batch_id=batch)
+        return InventoryTransaction.objects.create(
+            transaction_id=f'TXN-TEST-{InventoryTransaction.objects.count():03d}', transaction_datetime=timezone.now(),
+            transaction_type=transaction_type, item_code=batch.item_record_id, batch_id=batch, quantity=quantity,
+            unit='L', storage_location_id=LOCATION,
+        )
+
+    def test_ledger_writes_match_a_rebuild(self):
+        slot = (LOCATION, Batch.objects.get(batch_id=BATCH).pk, ItemRecord.objects.get(item_record_id=ITEM).pk)
+        self.post('RCV-PUR', 5)
+        self.post('ISS-MFG', 2)
+        outbound = self.post('ISS-MFG', 500)
+        # An outbound move larger than the slot only empties it
+        slots, totals = self.occupancy()
+        self.assertNotIn(slot, slots)
+        self.assertEqual(totals[LOCATION], sum(quantity for key, quantity in slots.items() if key[0] == LOCATION))
+        outbound.delete()
+        incremental = self.occupancy()
+        self.assertIn(slot, incremental[0])
+        rebuild_occupancy()
+        self.assertEqual(self.occupancy(), incremental)
+
+    def test_putaway_respects_hazards_and_capacity(self):
+        flammable = ItemRecord.objects.get(item_record_id=ITEM)
+        suggested = [location.location_id for location in suggest_putaway(flammable)]
+        self.assertTrue(suggested)
+        self.assertEqual({location.split('-')[1] for location in suggested}, {'CHEM'})
+        StorageLocation.objects.filter(location_id__in=suggested).update(capacity_quantity=10, occupied_quantity=9)
+        self.assertEqual(suggest_putaway(flammable, quantity=5), [])
+        response = self.client.get(f'/inventory/api/items/{ITEM}/putaway/?quantity=1')
+        self.assertEqual({row['id'] for row in response.json()['locations']}, set(suggested))
+        self.assertEqual(self.client.get(f'/inventory/api/items/{ITEM}/putaway/?quantity=x').status_code, 400)
+
+
+class SegregationTests(SampleDataTestCase):
+    def test_zone_and_contents_are_checked(self):
+        location = StorageLocation.objects.get(location_id=LOCATION)
+        self.assertEqual(check_placement(ItemRecord.objects.get(item_record_id=ITEM), location), [])
+        oxidizer = ItemRecord.objects.get(item_record_id=OTHER_ITEM)
+        oxidizer.hazard_class = 'Oxidizer'
+        violations = check_placement(oxidizer, location)
+        self.assertEqual([violation['type'] for violation in violations], [ZONE_NOT_PERMITTED, INCOMPATIBLE_CONTENTS])
+        self.assertEqual(violations[1]['conflicts_with'], ['Flammable'])
+
+        response = self.client.get(f'/inventory/api/segregation/check/?item_id={ITEM}&location_id=LOC-BIO-A1')
+        self.assertEqual(response.json()['allowed'], False)
+
+    def test_matrix_follows_zone_hazard_changes(self):
+        oxidizer = ItemRecord.objects.get(item_record_id=OTHER_ITEM)
+        oxidizer.hazard_class = 'Oxidizer'
+        location = StorageLocation.objects.get(location_id='LOC-PACK-A1')
+        self.assertEqual(check_placement(oxidizer, location)[0]['type'], ZONE_NOT_PERMITTED)
+        # The version bump that rebuilds the matrix runs on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            StorageZoneHazard.objects.create(zone_id=location.zone_id_id, hazard_class='Oxidizer')
+        self.assertEqual(check_placement(oxidizer, location), [])
+
+    def test_audit_finds_stock_that_bypassed_the_checks(self):
+        self.assertEqual(audit_segregation(), [])
+        ItemRecord.objects.filter(item_record_id=OTHER_ITEM).update(hazard_class='Oxidizer')
+        StorageOccupancy.objects.create(location_id=LOCATION, item=ItemRecord.objects.get(item_record_id=OTHER_ITEM), quantity=1)
+        found = [violation['type'] for violation in audit_segregation() if violation['location_id'] == LOCATION]
+        self.assertEqual(sorted(found), [INCOMPATIBLE_CONTENTS, ZONE_NOT_PERMITTED])
+
+
+class SyncTests(SampleDataTestCase):
+    push_url = '/inventory/api/sync/push/'
+
+    def push(self, *entries):
+        response = self.post_json(self.push_url, {'transactions': list(entries)})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def entry(self, **fields):
+        return {'client_uuid': str(uuid.uuid4()), 'transaction_type': 'ISS-MFG', 'batch_id': BATCH,
+                'quantity': 1, 'storage_location': LOCATION, **fields}
+
+    def test_pull_snapshot_uses_codes(self):
+        data = self.client.get('/inventory/api/sync/pull/?since=0').json()
+        self.assertFalse(data['has_more'])
+        batch = next(row for row in data['batches'] if row['batch_id'] == BATCH)
+        self.assertEqual(batch['item_record_id'], ITEM)
+        self.assertEqual(batch['storage_location'], LOCATION)
+        balance = next(row for row in data['balances'] if row['batch_id'] == BATCH)
+        self.assertEqual((balance['location_id'], balance['item_id']), (LOCATION, ITEM))
+
+    def test_snapshot_is_paged(self):
+        sections = ('items', 'batches', 'locations', 'balances')
+        whole = self.client.get('/inventory/api/sync/pull/?since=0').json()
+        pages = []
+        url = '/inventory/api/sync/pull/?since=0&limit=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(sum(len(page[name]) for name in sections), 2)
+            self.assertEqual(page['since'], whole['since'])
+            pages.append(page)
+            url = f"/inventory/api/sync/pull/?since=0&limit=2&cursor={page['cursor']}" if page['has_more'] else None
+        self.assertGreater(len(pages), 2)
+        for name in sections:
+            self.assertEqual([row for page in pages for row in page[name]], whole[name], name)
+        self.assertEqual(self.client.get('/inventory/api/sync/pull/?since=0&cursor=x').status_code, 400)
+
+    def test_pull_changes_after_cursor(self):
+        since = SyncChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+        Batch.objects.get(batch_id=BATCH).save()
+        data = self.client.get(f'/inventory/api/sync/pull/?since={since}').json()
+        self.assertEqual([row['batch_id'] for row in data['batches']], [BATCH])
+        self.assertEqual(data['deleted']['batch'], [])
+
+    def test_push_accepts_codes_and_reports_conflicts(self):
+        results = self.push(
+            self.entry(),
+            self.entry(item_code=OTHER_ITEM, storage_location=None),
+            {'client_uuid': str(uuid.uuid4()), 'transaction_type': 'ISS-MFG', 'item_code': 'NO-SUCH-ITEM', 'quantity': 1},
+            self.entry(quantity=10000),
+        )
+        self.assertEqual(results[0]['status'], 'applied')
+        self.assertEqual(
+            [result.get('conflict') for result in results[1:]],
+            ['batch_item_mismatch', 'unknown_item', 'insufficient_balance'],
+        )
+        posted = InventoryTransaction.objects.get(transaction_id=results[0]['transaction_id'])
+        self.assertEqual((posted.item_code.item_record_id, posted.batch_id.batch_id), (ITEM, BATCH))
+
+    def test_resent_push_is_not_posted_twice(self):
+        entry = self.entry()
+        first = self.push(entry)[0]
+        rows = InventoryTransaction.objects.count()
+        again = self.push(entry)[0]
+        self.assertTrue(again['duplicate'])
+        self.assertEqual(again['transaction_id'], first['transaction_id'])
+        self.assertEqual(InventoryTransaction.objects.count(), rows)
+
+    def test_devices_authenticate_with_a_token(self):
+        device = Client(enforce_csrf_checks=True)
+        self.assertEqual(device.get('/inventory/api/sync/pull/?since=0').status_code, 401)
+        key = issue_device_token(self.user, 'HH-01')
+        auth = {'HTTP_AUTHORIZATION': f'Token {key}'}
+        response = device.post(self.push_url, json.dumps({'transactions': [self.entry()], 'device_id': 'other'}),
+                               content_type='application/json', **auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['applied'], 1)
+        push = SyncPush.objects.get()
+        self.assertEqual(push.device_id, 'HH-01')
+        self.assertEqual(InventoryTransaction.objects.get(transaction_id=push.transaction_id).transaction_user, 'tester')
+
+        DeviceToken.objects.update(active=False)
+        self.assertEqual(device.get('/inventory/api/sync/pull/?since=0', **auth).status_code, 401)
+
+    def test_sessions_still_need_the_csrf_token(self):
+        browser = Client(enforce_csrf_checks=True)
+        browser.login(username='tester', password='secret')
+        payload = json.dumps({'transactions': [self.entry()]})
+        self.assertEqual(browser.post(self.push_url, payload, content_type='application/json').status_code, 403)
+        self.assertEqual(browser.get('/inventory/api/sync/pull/?since=0').status_code, 200)
+        self.assertFalse(SyncPush.objects.exists())
+
+
+class ListSink:
+    def __init__(self, fail=False):
+        self.events = []
+        self.fail = fail
+
+    def send(self, events):
+        if self.fail:
+            raise OSError('sink down')
+        self.events += events
+
+
+class OutboxTests(TestCase):
+    def emit(self, count):
+        outbox.emit('test', 'created', [{'key': index} for index in range(count)], 'key')
+
+    def test_relay_delivers_in_order_and_resumes(self):
+        self.emit(5)
+        sink = ListSink()
+        self.assertEqual(outbox.relay_batch(sink, 'a', batch_size=3), 3)
+        self.assertEqual(outbox.relay_batch(sink, 'a', batch_size=3), 2)
+        self.assertEqual(outbox.relay_batch(sink, 'a'), 0)
+        ids = [event['id'] for event in sink.events]
+        self.assertEqual(ids, sorted(OutboxEvent.objects.values_list('id', flat=True)))
+        self.assertEqual(OutboxCursor.objects.get(consumer='a').last_event_id, ids[-1])
+
+    def test_failed_delivery_keeps_the_cursor(self):
+        self.emit(2)
+        with self.assertRaises(OSError):
+            outbox.relay_batch(ListSink(fail=True), 'a')
+        self.assertEqual(OutboxCursor.objects.get(consumer='a').last_event_id, 0)
+        sink = ListSink()
+        self.assertEqual(outbox.relay_batch(sink, 'a'), 2)
+
+    def test_prune_keeps_events_a_consumer_has_not_seen(self):
+        self.emit(4)
+        outbox.relay_batch(ListSink(), 'a')
+        outbox.relay_batch(ListSink(), 'b', batch_size=1)
+        self.assertEqual(outbox.prune_delivered(), 1)
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+
+    def test_rolled_back_ids_do_not_stall_the_relay(self):
+        self.emit(3)
+        OutboxEvent.objects.filter(id=OutboxEvent.objects.order_by('id')[1].id).delete()
+        self.assertEqual(outbox.relay_batch(ListSink(), 'a'), 2)
+
+    def test_hole_waits_out_the_grace_where_open_transactions_are_unknown(self):
+        now = timezone.now()
+        rows = [(1, now), (3, now)]
+        with mock.patch.object(cursors, 'connection', mock.Mock(vendor='other')):
+            self.assertEqual(cursors.settled(rows, 0, key=lambda row: row, now=now), [(1, now)])
+            later = now + cursors.GAP_GRACE
+            self.assertEqual(cursors.settled(rows, 0, key=lambda row: row, now=later), rows)
+
+
+class RuleTests(SampleDataTestCase):
+    def test_table_matches_the_rule_functions(self):
+        table = ITEM_RECORD_RULE.compile()
+        self.assertTrue(all(outputs == item_record_derived(*key) for key, outputs in table.items()))
+        # Legacy values outside the declared domains fall back to the function
+        key = ('Legacy', False, 'Low', 'None', 'Unknown')
+        self.assertEqual(ITEM_RECORD_RULE.lookup(key), item_record_derived(*key))
+
+    def test_recompute_fixes_stale_items_and_logs_them(self):
+        item = ItemRecord.objects.get(item_record_id=ITEM)
+        expected = [getattr(item, field) for field in ITEM_RECORD_RULE.outputs]
+        ItemRecord.objects.filter(pk=item.pk).update(qa_required=not item.qa_required, segregation_rule_required=False)
+        table = ItemRecord._meta.db_table
+        version = table_versions([table])[table]
+        last_seq = SyncChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(recompute_item_records(), 1)
+        item.refresh_from_db()
+        self.assertEqual([getattr(item, field) for field in ITEM_RECORD_RULE.outputs], expected)
+        self.assertEqual(
+            list(SyncChange.objects.filter(seq__gt=last_seq).values_list('entity', 'object_key')), [('item', ITEM)]
+        )
+        self.assertGreater(table_versions([table])[table], version)
+        self.assertEqual(recompute_item_records(), 0)
+
+    def test_approved_preferred_vendors_become_default(self):
+        SupplierProduct.objects.update(approved=True, preferred_vendor=True, is_default=False)
+        table = SupplierProduct._meta.db_table
+        version = table_versions([table])[table]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(recompute_supplier_products(), SupplierProduct.objects.count())
+        self.assertFalse(SupplierProduct.objects.filter(is_default=False).exists())
+        self.assertGreater(table_versions([table])[table], version)
+
+
+class DropdownTests(SampleDataTestCase):
+    def test_small_lists_are_inlined(self):
+        context = dropdown_context('items', 'storage_zones')
+        self.assertFalse(context['items_typeahead'])
+        self.assertIn(ITEM, [option['item_record_id'] for option in context['items']])
+
+    def test_large_lists_are_sized_by_a_cached_count(self):
+        with mock.patch.object(lookups, 'DROPDOWN_INLINE_LIMIT', 1):
+            context = dropdown_context('items')
+            self.assertEqual((context['items'], context['items_typeahead']), ([], True))
+            # The typeahead index is left for the first search
+            self.assertNotIn('items', lookups._indexes)
+            # Only the table versions are read while nothing changed
+            with self.assertNumQueries(1):
+                dropdown_context('items')
+        size = ItemRecord.objects.count()
+        self.assertEqual(dropdown_size('items'), size)
+        with self.captureOnCommitCallbacks(execute=True):
+            ItemRecord.objects.create(item_record_id='CHE-SOL-ETH-999', item_name='Ethanol 70%', unit_of_measure='L',
+                                      category='Chemical', subtype='Solvent')
+        self.assertEqual(dropdown_size('items'), size + 1)
+
+
+class LookupTests(SampleDataTestCase):
+    def test_typeahead_matches_code_and_name_prefixes(self):
+        codes = [row['item_record_id'] for row in self.client.get('/inventory/api/lookups/items/?q=che').json()['results']]
+        self.assertEqual(codes, [ITEM])
+        names = [row['item_record_id'] for row in lookups.search_dropdown('items', 'algae')]
+        self.assertEqual(names, [OTHER_ITEM])
+        self.assertEqual(self.client.get('/inventory/api/lookups/nothing/').status_code, 404)
+
+    def test_index_follows_item_changes(self):
+        lookups.search_dropdown('items', 'x')
+        item = ItemRecord.objects.get(item_record_id=OTHER_ITEM)
+        item.item_name = 'Zeaxanthin Extract'
+        # Version bumps wait for the commit, which a TestCase never makes
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual([row['item_record_id'] for row in lookups.search_dropdown('items', 'zeax')], [OTHER_ITEM])
+
+    def test_autocomplete_covers_whole_tables(self):
+        Batch.objects.filter(batch_id=OTHER_BATCH).update(qa_status='Approved')
+        batches = self.client.get('/inventory/api/autocomplete/batches/?q=batch-bio').json()['results']
+        self.assertEqual([(row['batch_id'], row['item_record_id']) for row in batches], [(OTHER_BATCH, OTHER_ITEM)])
+        Supplier.objects.filter(supplier_id='SUP-ALGAMO').update(approved=False)
+        suppliers = self.client.get('/inventory/api/autocomplete/suppliers/?q=sup-alg').json()['results']
+        self.assertEqual([row['supplier_id'] for row in suppliers], ['SUP-ALGAMO'])
+        customers = self.client.get('/inventory/api/autocomplete/customers/?q=cus&limit=1').json()['results']
+        self.assertEqual(len(customers), 1)
+        self.assertEqual(self.client.get('/inventory/api/autocomplete/nothing/').status_code, 404)
+
+    def test_autocomplete_revalidates_with_the_etag(self):
+        url = '/inventory/api/autocomplete/suppliers/?q=sup'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.filter(supplier_id='SUP-ALGAMO').update(supplier_name='Algamo Renamed')
+            lookups.bump_version(Supplier._meta.db_table)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('Algamo Renamed', [row['supplier_name'] for row in changed.json()['results']])
+
+
+class ConditionalGetTests(SampleDataTestCase):
+    def test_list_page_answers_304_until_its_table_changes(self):
+        first = self.client.get('/inventory/items/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertEqual(self.client.get('/inventory/items/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        # The filter set is part of the ETag
+        self.assertEqual(self.client.get('/inventory/items/?search=che', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            ItemRecord.objects.get(item_record_id=ITEM).save()
+        self.assertEqual(self.client.get('/inventory/items/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_detail_page_uses_the_row_timestamps(self):
+        url = '/inventory/customers/CUS-AMALA/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        later = timezone.now() + timedelta(hours=1)
+        Customer.objects.filter(customer_code='CUS-AMALA').update(updated_at=later)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(later.timestamp())).status_code, 304)
+
+    def test_validators_differ_per_user(self):
+        first = self.client.get('/inventory/items/')
+        User.objects.create_user('other', password='secret')
+        self.client.login(username='other', password='secret')
+        self.assertEqual(self.client.get('/inventory/items/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class SnapshotTests(SampleDataTestCase):
+    def test_snapshot_reads_match_the_ledger(self):
+        today = timezone.localdate()
+        replayed = positions_as_of(today)
+        self.assertIsNone(replayed[0])
+        first = timezone.localdate(InventoryTransaction.objects.order_by('transaction_datetime').first().transaction_datetime)
+        run = take_snapshot(first + timedelta(days=1), MONTHLY)
+        self.assertEqual(positions_as_of(today), (run, replayed[1]))
+
+    def test_backdated_rows_mark_snapshots_stale_until_retaken(self):
+        first = timezone.localdate(InventoryTransaction.objects.order_by('transaction_datetime').first().transaction_datetime)
+        take_snapshot(first + timedelta(days=1), MONTHLY)
+        expected = positions_as_of(timezone.localdate())[1]
+
+        backdated = InventoryTransaction.objects.order_by('transaction_datetime').first()
+        self.assertEqual(invalidate_snapshots([backdated]), 1)
+        self.assertIsNone(positions_as_of(timezone.localdate())[0])
+
+        self.assertEqual([run.period for run in refresh_stale()], [MONTHLY])
+        run = BalanceSnapshotRun.objects.get()
+        self.assertFalse(run.stale)
+        self.assertEqual(positions_as_of(timezone.localdate()), (run, expected))
+
+
+class CountTests(SampleDataTestCase):
+    def test_count_posts_variance_adjustments(self):
+        response = self.post_json('/inventory/api/counts/', {'locations': [LOCATION]})
+        self.assertEqual(response.status_code, 201)
+        count_id = response.json()['count_id']
+        recorded = self.post_json(f'/inventory/api/counts/{count_id}/counts/', {'counts': [
+            {'location': LOCATION, 'batch': BATCH, 'item': ITEM, 'quantity': 3},
+            {'location': LOCATION, 'batch': BATCH, 'item': OTHER_ITEM, 'quantity': 1},
+        ]}).json()
+        self.assertEqual(recorded['updated'], 1)
+        self.assertEqual(len(recorded['errors']), 1)
+
+        variances = self.client.get(f'/inventory/api/counts/{count_id}/variances/').json()
+        self.assertEqual(variances['summary']['with_variance'], 1)
+
+        posted = self.post_json(f'/inventory/api/counts/{count_id}/post/', {'adjustment_reason': 'Cycle count'})
+        self.assertEqual(posted.status_code, 200)
+        self.assertEqual(posted.json()['adjustments'], 1)
+        _, positions = positions_as_of(timezone.localdate(), batch=BATCH, location=LOCATION)
+        self.assertEqual([row['quantity'] for row in positions], [Decimal('3')])
+        self.assertEqual(self.post_json(f'/inventory/api/counts/{count_id}/post/', {}).status_code, 400)
+
+    def test_counts_load_from_csv(self):
+        count_id = self.post_json('/inventory/api/counts/', {'locations': [LOCATION]}).json()['count_id']
+        body = f'location,item,batch,quantity\n{LOCATION},{ITEM},{BATCH},4\n'
+        recorded = self.client.post(f'/inventory/api/counts/{count_id}/counts/', body, content_type='text/csv').json()
+        self.assertEqual((recorded['updated'], recorded['errors']), (1, []))
+
+    def test_anonymous_counts_are_refused(self):
+        self.client.logout()
+        self.assertEqual(self.post_json('/inventory/api/counts/', {'locations': [LOCATION]}).status_code, 401)
+        self.assertFalse(CountSession.objects.exists())
+
+
+class JobQueueTests(TestCase):
+    def register(self, function, max_attempts=2):
+        jobs.task('test_task', max_attempts=max_attempts, user_runnable=False)(function)
+        self.addCleanup(jobs.TASKS.pop, 'test_task')
+
+    def test_jobs_run_in_priority_order_and_keep_their_result(self):
+        self.register(lambda context, value: {'value': value})
+        low = jobs.enqueue('test_task', {'value': 'low'}, priority=5)
+        high = jobs.enqueue('test_task', {'value': 'high'})
+        self.assertEqual(jobs.run_pending(limit=1), 1)
+        high.refresh_from_db()
+        low.refresh_from_db()
+        self.assertEqual((high.status, high.result, low.status), (jobs.SUCCEEDED, {'value': 'high'}, jobs.QUEUED))
+
+    def test_failures_back_off_then_fail(self):
+        def fail(context):
+            raise RuntimeError('boom')
+        self.register(fail)
+        job = jobs.enqueue('test_task')
+        job = jobs.run_job(jobs.claim_next('test'))
+        self.assertEqual(job.status, jobs.QUEUED)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(jobs.claim_next('test'))
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        job = jobs.run_job(jobs.claim_next('test'))
+        self.assertEqual((job.status, job.attempts), (jobs.FAILED, 2))
+        self.assertIn('boom', job.error)
+
+    def test_cancelled_jobs_do_not_run(self):
+        self.register(lambda context: None)
+        job = jobs.enqueue('test_task')
+        self.assertTrue(jobs.cancel(job))
+        self.assertEqual(jobs.run_pending(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, jobs.CANCELLED)
+
+    def test_stale_jobs_fail_once_attempts_are_used(self):
+        old = timezone.now() - timedelta(hours=1)
+        spent = Job.objects.create(task='snapshot_balances', status=jobs.RUNNING, attempts=3, max_attempts=3,
+                                   heartbeat_at=old, run_after=old)
+        retried = Job.objects.create(task='snapshot_balances', status=jobs.RUNNING, attempts=1, max_attempts=3,
+                                     heartbeat_at=old, run_after=old)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        spent.refresh_from_db()
+        retried.refresh_from_db()
+        self.assertEqual((spent.status, retried.status), (jobs.FAILED, jobs.QUEUED))
+
+    def test_import_directory_stays_under_root(self):
+        self.assertTrue(jobs.import_data_dir('data').endswith('data'))
+        for name in ('../..', '/etc', 'data/../../settings'):
+            with self.assertRaises(ValueError):
+                jobs.import_data_dir(name)
+
+
+STOCK_HEADER = ['Name', 'Lot No.', 'Qty', 'Unit', 'Received on']
+
+
+class ImportValidationTests(TestCase):
+    def write_stock_sheet(self, data_dir, rows):
+        path = os.path.join(data_dir, 'LPS2.Stock details -Pluviago (2) (1)_LP3bChemicals.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as handle:
+            csv.writer(handle).writerows([STOCK_HEADER] + rows)
+
+    def validate(self, rows):
+        return import_validation.validate_sources([('chemicals.csv', [STOCK_HEADER] + rows, source_schemas.STOCK)])
+
+    def test_bad_values_are_reported_with_line_and_column(self):
+        report = self.validate([
+            ['Ethanol', 'LOT-1', '1', '500 ml', '2024-01-16'],
+            ['Acetone', 'LOT-2', 'two', '500 ml', '2024-01-16'],
+            ['Biotin', 'LOT-3', '-1', '1 gm', '31-02-2024'],
+            ['Boric acid', 'LOT-1', '1', 'sack', '2024-01-16'],
+            ['', '', 'x', '', 'never'],
+        ])
+        errors = {(issue['line'], issue['column'], issue['message']) for issue in report.errors}
+        self.assertEqual(errors, {
+            (3, 'Qty', 'quantity is not a number (the importer records 0)'),
+            (4, 'Qty', 'negative quantity'),
+            (4, 'Received on', 'unrecognised date (the importer leaves it empty)'),
+            (5, 'Lot No.', 'duplicate lot number, first seen in chemicals.csv line 2'),
+        })
+        self.assertEqual([(issue['line'], issue['value']) for issue in report.warnings], [(5, 'sack')])
+        self.assertEqual(report.files['chemicals.csv'], {'rows': 5, 'error': 4, 'warning': 1})
+
+    def test_missing_required_column_points_at_the_real_header(self):
+        report = import_validation.validate_sources([
+            ('chemicals.csv', [['Sl.No.'], STOCK_HEADER, ['Ethanol', 'LOT-1', '1', 'ml', '']], source_schemas.STOCK),
+            ('missing.csv', None, source_schemas.STOCK),
+        ])
+        self.assertEqual(len(report.errors), 1)
+        self.assertIn("missing column 'Name'; the header is on line 2", report.errors[0]['message'])
+        self.assertEqual(report.warnings[0]['message'], 'file not found')
+
+    def test_import_stops_on_errors_unless_forced(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.write_stock_sheet(data_dir, [
+                ['Imported chemical', 'LOT-1', '2', 'ml', '2024-01-16'],
+                ['Bad chemical', 'LOT-2', 'two', 'ml', '2024-01-16'],
+            ])
+            report_path = os.path.join(data_dir, 'report.json')
+            with self.assertRaisesMessage(CommandError, 'Validation found 1 errors; nothing was imported'):
+                call_command('import_real_data_v2', data_dir=data_dir, report=report_path, stdout=io.StringIO())
+            self.assertFalse(ItemRecord.objects.filter(item_name='Imported chemical').exists())
+            with open(report_path, encoding='utf-8') as handle:
+                errors = [issue for issue in json.load(handle)['issues'] if issue['severity'] == 'error']
+            self.assertEqual([(issue['line'], issue['column']) for issue in errors], [(3, 'Qty')])
+
+            call_command('import_real_data_v2', data_dir=data_dir, dry_run=True, stdout=io.StringIO())
+            self.assertFalse(ItemRecord.objects.filter(item_name='Imported chemical').exists())
+
+            call_command('import_real_data_v2', data_dir=data_dir, force=True, stdout=io.StringIO())
+        self.assertTrue(ItemRecord.objects.filter(item_name='Imported chemical').exists())
+
+
+class SourceSchemaTests(TestCase):
+    def test_headers_match_ignoring_case_and_spacing(self):
+        header = ['', 'product  NAME', 'Qty. Received', 'Batch  No', '     Sample Received From', 'Received Date']
+        rows = [
+            header,
+            ['1', ' Astaxanthin ', '2', 'B-1', 'Algamo', '16-10-23'],
+            ['2', '', '1', 'B-2', 'Algamo', '16-10-23'],
+            ['3', 'Spirulina', 'n/a'],
+        ]
+        records = list(source_schemas.read_records(rows, source_schemas.INCOMING))
+        self.assertEqual([record.product_name for record in records], ['Astaxanthin', 'Spirulina'])
+        first, short = records
+        self.assertEqual((first.quantity, first.batch_no, first.supplier), (2.0, 'B-1', 'Algamo'))
+        self.assertEqual(first.received_date, date(2023, 10, 16))
+        # Unparsed values stay as text; cells past the end of a short row read empty
+        self.assertEqual((short.quantity, short.batch_no, short.received_date, short.comment), ('n/a', '', '', ''))
+        self.assertFalse(source_schemas.converted(short.quantity))
+
+    def test_missing_required_column_raises(self):
+        with self.assertRaisesMessage(source_schemas.MissingColumns, "missing column 'Product Name', 'Sample Sent to'"):
+            list(source_schemas.read_records([['Qty. Sent']], source_schemas.OUTGOING))
+
+    def test_date_parser_tries_the_last_matching_format_first(self):
+        parser = source_schemas.DateParser()
+        self.assertEqual(parser('19-02-24'), date(2024, 2, 19))
+        self.assertEqual(parser.formats[0], '%d-%m-%y')
+        self.assertEqual(parser('2024-02-19 00:00:00'), date(2024, 2, 19))
+        self.assertEqual(parser.formats[0], '%Y-%m-%d %H:%M:%S')
+        self.assertEqual(parser(' 01-08-2027* '), '01-08-2027*')
+
+    def test_quantity_parser_rejects_non_finite_numbers(self):
+        parser = source_schemas.QuantityParser()
+        self.assertEqual([parser(value) for value in (' 1.5 ', 'nan', 'inf', '1 Kg', '')], [1.5, 'nan', 'inf', '1 Kg', ''])
+
+    def test_unknown_column_kind_is_rejected(self):
+        with self.assertRaises(ValueError):
+            source_schemas.Column('quantity', 'Qty', 'number')
+
+
+@unittest.skipUnless(workbooks.available(), 'openpyxl is not installed')
+class WorkbookTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = directory.name
+
+    def write_workbook(self, sheets):
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        workbook.remove(workbook.active)
+        for title, rows in sheets.items():
+            sheet = workbook.create_sheet(title)
+            for row in rows:
+                sheet.append(row)
+        path = os.path.join(self.data_dir, f'{STOCK_WORKBOOK}.xlsx')
+        workbook.save(path)
+        return path
+
+    def source(self, sheet):
+        command = ImportCommand(stdout=io.StringIO())
+        with workbooks.WorkbookSet() as command.workbooks:
+            name, rows = command.source(self.data_dir, STOCK_WORKBOOK, sheet)
+            return name, rows if rows is None else list(rows)
+
+    def test_cells_read_as_the_csv_export_text(self):
+        self.assertEqual(
+            [workbooks.cell_text(value)
+             for value in (None, 'Ethanol', datetime(2024, 1, 16), date(2024, 1, 16), 1.0, 2.5, 7, True)],
+            ['', 'Ethanol', '2024-01-16 00:00:00', '2024-01-16', '1', '2.5', '7', 'TRUE'],
+        )
+
+    def test_sheet_rows_import_to_the_same_records_as_csv(self):
+        self.write_workbook({'LP3bChemicals': [
+            ['Name', 'Lot No.', 'Qty', 'Unit', 'Received on'],
+            ['Ethanol', 7339460822, 1.0, '500 ml', datetime(2022, 10, 19)],
+            [None, None, None, None, None],
+        ]})
+        name, rows = self.source('LP3bChemicals')
+        self.assertEqual(name, f'{STOCK_WORKBOOK}.xlsx [LP3bChemicals]')
+        csv_rows = [
+            ['Name', 'Lot No.', 'Qty', 'Unit', 'Received on'],
+            ['Ethanol', '7339460822', '1', '500 ml', '2022-10-19 00:00:00'],
+            ['', '', '', '', ''],
+        ]
+        self.assertEqual(rows, csv_rows)
+        self.assertEqual(
+            list(source_schemas.read_records(rows, source_schemas.STOCK)),
+            list(source_schemas.read_records(csv_rows, source_schemas.STOCK)),
+        )
+
+    def test_sheets_missing_from_the_workbook_fall_back_to_csv(self):
+        self.write_workbook({'LP3aEquipment': [['Name']]})
+        with open(os.path.join(self.data_dir, f'{STOCK_WORKBOOK}_LP3bChemicals.csv'), 'w', encoding='utf-8') as handle:
+            handle.write('Name,Qty\nEthanol,1\n')
+        self.assertEqual(
+            self.source('LP3bChemicals'),
+            (f'{STOCK_WORKBOOK}_LP3bChemicals.csv', [['Name', 'Qty'], ['Ethanol', '1']]),
+        )
+        self.assertEqual(self.source('LP3gStationery'), (f'{STOCK_WORKBOOK}_LP3gStationery.csv', None))
+
+    def test_unreadable_workbook_falls_back_to_csv(self):
+        with open(os.path.join(self.data_dir, f'{STOCK_WORKBOOK}.xlsx'), 'w') as handle:
+            handle.write('not a workbook')
+        with open(os.path.join(self.data_dir, f'{STOCK_WORKBOOK}_LP3bChemicals.csv'), 'w', encoding='utf-8') as handle:
+            handle.write('Name\nEthanol\n')
+        self.assertEqual(self.source('LP3bChemicals')[1], [['Name'], ['Ethanol']])
+
+
+class CodeTests(SampleDataTestCase):
+    def test_code_tables_have_integer_keys_and_unique_codes(self):
+        batch = Batch.objects.get_by_natural_key(BATCH)
+        self.assertIsInstance(batch.pk, int)
+        self.assertEqual(Batch.objects.pks([BATCH, 'NO-SUCH-BATCH', '']), {BATCH: batch.pk})
+        self.assertEqual(Batch.objects.codes([batch.pk, None]), {batch.pk: BATCH})
+        self.assertEqual(batch.item_record_id.item_record_id, ITEM)
+        self.assertIsInstance(Batch.objects.filter(pk=batch.pk).values_list('item_record_id', flat=True).get(), int)
+
+    def test_foreign_keys_come_back_as_codes(self):
+        transactions = InventoryTransaction.objects.filter(batch_id__batch_id=BATCH)
+        with self.assertNumQueries(1):
+            rows = code_values(transactions, 'transaction_id', 'item_code', 'batch_id')
+        self.assertTrue(rows)
+        self.assertEqual({(row['item_code'], row['batch_id']) for row in rows}, {(ITEM, BATCH)})
+
+        with self.assertNumQueries(2):
+            codes = related_codes(transactions, 'batch_id')
+        self.assertEqual(set(codes.values()), {BATCH})
+        with self.assertNumQueries(1):
+            self.assertEqual(related_codes(transactions.select_related('batch_id'), 'batch_id'), codes)
+
+    def test_pages_and_apis_are_addressed_by_code(self):
+        supplier = Supplier.objects.get(supplier_id='SUP-CHEMCO')
+        for url in (f'/inventory/items/{ITEM}/', f'/inventory/batches/{BATCH}/',
+                    f'/inventory/suppliers/{supplier.supplier_id}/'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertEqual(self.client.get(f'/inventory/batches/{Batch.objects.get(batch_id=BATCH).pk}/').status_code, 404)
+
+        products = self.client.get(f'/inventory/api/items/{ITEM}/supplier-products/').json()['supplier_products']
+        self.assertEqual([product['product_code'] for product in products], ['ETH-99.9-1L'])
+
+
+class TransactionDetailTests(SampleDataTestCase):
+    def test_sidecar_columns_are_not_on_the_ledger_row(self):
+        core = {field.name for field in InventoryTransaction._meta.concrete_fields}
+        for model in TRANSACTION_DETAILS:
+            self.assertFalse(core & set(model.detail_fields()), model.__name__)
+
+    def test_details_create_only_the_sidecars_given(self):
+        issue = InventoryTransaction.objects.get(transaction_id='TXN-20240720-003')
+        self.assertEqual(issue.usage.used_in, 'BATCH-PRD-001')
+        self.assertFalse(TransactionDocuments.objects.filter(transaction=issue).exists())
+
+        issue.save_details(used_in='BATCH-PRD-002', return_status='Returned', serial_number='SN-1')
+        usage = TransactionUsage.objects.get(transaction=issue)
+        self.assertEqual((usage.used_in, usage.used_by, usage.return_status),
+                         ('BATCH-PRD-002', 'Production Team', 'Returned'))
+        self.assertEqual(TransactionEquipment.objects.get(transaction=issue).serial_number, 'SN-1')
+        self.assertFalse(TransactionDisposal.objects.filter(transaction=issue).exists())
+        with self.assertRaisesMessage(TypeError, 'Unknown transaction detail fields: quantity'):
+            issue.save_details(quantity=1)
+
+    def test_ledger_writer_queues_sidecar_rows(self):
+        batch = Batch.objects.get(batch_id=BATCH)
+        writer = LedgerWriter()
+        for transaction_id, details in (('TXN-T-1', {'used_by': 'Lab', 'coa_provided': True}), ('TXN-T-2', None)):
+            writer.add(
+                transaction_id=transaction_id, transaction_datetime=timezone.now(), transaction_user='tester',
+                transaction_type='ISS-MFG', item_code=batch.item_record_id, product_code='ETH-99.9-1L',
+                product_name='Ethanol 99.9%', batch_id=batch, quantity=Decimal('1'), unit='L', details=details,
+            )
+        with self.assertRaises(TypeError):
+            writer.add(transaction_id='TXN-T-3', details={'no_such_field': 1})
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(TransactionUsage.objects.get(transaction='TXN-T-1').used_by, 'Lab')
+        self.assertTrue(TransactionDocuments.objects.get(transaction='TXN-T-1').coa_provided)
+        self.assertFalse(TransactionUsage.objects.filter(transaction='TXN-T-2').exists())
+
+    def test_detail_page_reads_the_sidecars(self):
+        response = self.client.get('/inventory/transactions/TXN-20240720-003/')
+        self.assertContains(response, 'BATCH-PRD-001')
+        self.assertContains(response, 'Production Team')
+        # A transaction without a usage row renders the section empty
+        response = self.client.get('/inventory/transactions/TXN-20240720-001/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'BATCH-PRD-001')
+
+
+class CounterTests(SampleDataTestCase):
+    def counts(self, supplier_id='SUP-CHEMCO'):
+        return Supplier.objects.values_list('batch_count', 'transaction_count').get(supplier_id=supplier_id)
+
+    def test_sample_data_counts_match(self):
+        self.assertFalse(any(reconcile_counters(fix=False).values()))
+        self.assertEqual(ItemRecord.objects.get(item_record_id=ITEM).transaction_count,
+                         InventoryTransaction.objects.filter(item_code__item_record_id=ITEM).count())
+
+    def test_single_and_bulk_writes_keep_counts(self):
+        supplier = Supplier.objects.get(supplier_id='SUP-CHEMCO')
+        batch = Batch.objects.get(batch_id=BATCH)
+        new_batch = Batch.objects.create(
+            batch_id='BATCH-COUNTER-001', item_record_id=batch.item_record_id, subtype=batch.subtype,
+            supplier_code=supplier, quantity_received=1, received_date=batch.received_date,
+            expiry_date=batch.expiry_date,
+        )
+        self.assertEqual(self.counts(), (1, 1))
+
+        writer = LedgerWriter()
+        for number in range(3):
+            writer.add(
+                transaction_id=f'TXN-COUNTER-{number}', transaction_datetime=timezone.now(), transaction_user='tester',
+                transaction_type='RCV-PUR', item_code=batch.item_record_id, supplier_code=supplier,
+                product_code='ETH-99.9-1L', product_name='Ethanol 99.9%', batch_id=new_batch, quantity=1, unit='L',
+            )
+        writer.flush()
+        self.assertEqual(self.counts(), (1, 4))
+
+        InventoryTransaction.objects.get(transaction_id='TXN-COUNTER-0').delete()
+        new_batch.delete()
+        self.assertEqual(self.counts(), (0, 3))
+        self.assertFalse(any(reconcile_counters(fix=False).values()))
+
+    def test_saving_a_master_row_keeps_moved_counts(self):
+        stale = Supplier.objects.get(supplier_id='SUP-CHEMCO')
+        Supplier.objects.filter(pk=stale.pk).update(transaction_count=5)
+        stale.notes = 'Edited while the count moved'
+        stale.save()
+        self.assertEqual(self.counts(), (0, 5))
+
+    def test_reconcile_fixes_drift_from_bulk_updates(self):
+        Batch.objects.filter(batch_id=OTHER_BATCH).update(supplier_code=Supplier.objects.get(supplier_id='SUP-CHEMCO'))
+        drift = reconcile_counters(fix=False)
+        self.assertEqual({counter: rows for counter, rows in drift.items() if rows}, {'Supplier.batch_count': 1})
+        self.assertEqual(self.counts(), (0, 1))
+
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Supplier.batch_count: 1 rows off', out.getvalue())
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertFalse(any(reconcile_counters(fix=False).values()))
+
+
+class FacetTests(SampleDataTestCase):
+    def expected(self, field, choices, **filters):
+        rows = ItemRecord.objects.filter(**filters)
+        return [(value, label, rows.filter(**{field: value}).count()) for value, label in choices]
+
+    def test_facets_count_under_every_filter_but_their_own(self):
+        filters = {'category': ('Chemical', Q(category='Chemical'))}
+        counts = facets.facet_counts('items', ItemRecord.objects.all(), filters)
+        self.assertEqual(counts['category'], self.expected('category', CategoryChoices.choices))
+        self.assertEqual(counts['grade'], self.expected('grade', GradeChoices.choices, category='Chemical'))
+        self.assertEqual(dict((value, count) for value, _, count in counts['category'])['Biological'],
+                         ItemRecord.objects.filter(category='Biological').count())
+
+        filters['grade'] = ('USP', Q(grade='USP'))
+        counts = facets.facet_counts('items', ItemRecord.objects.all(), filters)
+        self.assertEqual(counts['category'], self.expected('category', CategoryChoices.choices, grade='USP'))
+        self.assertEqual(counts['grade'], self.expected('grade', GradeChoices.choices, category='Chemical'))
+
+    def test_counts_are_cached_until_the_table_changes(self):
+        counts = facets.facet_counts('items', ItemRecord.objects.all(), {})
+        self.assertIs(facets.facet_counts('items', ItemRecord.objects.all(), {}), counts)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item = ItemRecord.objects.get(item_record_id=ITEM)
+            item.category = 'Biological'
+            item.save()
+        fresh = facets.facet_counts('items', ItemRecord.objects.all(), {})
+        self.assertIsNot(fresh, counts)
+        self.assertEqual(fresh['category'], self.expected('category', CategoryChoices.choices))
+
+    def test_list_pages_show_the_counts(self):
+        response = self.client.get('/inventory/items/', {'category': 'Chemical'})
+        self.assertEqual(response.context['categories'], self.expected('category', CategoryChoices.choices))
+        self.assertEqual(len(response.context['page_obj'].object_list),
+                         ItemRecord.objects.filter(category='Chemical').count())
+
+        response = self.client.get('/inventory/transactions/', {'transaction_type': 'ISS-MFG'})
+        self.assertEqual(response.status_code, 200)
+        types = {value: count for value, _, count in response.context['transaction_types']}
+        self.assertEqual(types['ISS-MFG'], InventoryTransaction.objects.filter(transaction_type='ISS-MFG').count())
+        self.assertEqual(types['RCV-PUR'], InventoryTransaction.objects.filter(transaction_type='RCV-PUR').count())
+
+
+@override_settings(BITMAP_INDEX=True)
+class BitmapIndexTests(SampleDataTestCase):
+    def setUp(self):
+        super().setUp()
+        bitmaps.clear()
+        self.addCleanup(bitmaps.clear)
+
+    def add_batches(self, count):
+        item = ItemRecord.objects.get(item_record_id=ITEM)
+        today = timezone.now().date()
+        for number in range(count):
+            Batch.objects.create(
+                batch_id=f'BATCH-INDEX-{number:03d}', item_record_id=item, subtype='Solvent',
+                quantity_received=1, received_date=today - timedelta(days=number % 7),
+                expiry_date=today + timedelta(days=number), qa_status='Approved' if number % 3 else 'Pending',
+            )
+
+    def page_codes(self, url, params, context_name, field):
+        response = self.client.get(url, params)
+        return [getattr(row, field) for row in response.context[context_name]], response.context
+
+    def test_int_bitmap_select_returns_the_nth_value(self):
+        values = sorted({(number * 7919) % 5003 for number in range(700)})
+        bits = bitmaps.IntBitMap(values)
+        self.assertEqual([bits[rank] for rank in range(len(values))], values)
+        self.assertEqual(bits[-1], values[-1])
+        with self.assertRaises(IndexError):
+            bits[len(values)]
+
+    def test_inserts_between_rows_keep_sort_order(self):
+        index = bitmaps.BitmapIndex(('kind',))
+        index.load([(pk, f'C{pk}', f'key-{pk:03d}', ('odd' if pk % 2 else 'even',), None) for pk in range(1, 50, 10)])
+        # Crowd one gap until the index has to renumber
+        for pk in range(12, 21):
+            index.set(pk, f'C{pk}', f'key-{pk:03d}', ('odd' if pk % 2 else 'even',))
+        index.set(31, 'C31', 'key-000', ('odd',))
+        index.remove(41)
+        ordered = sorted(index.rows, key=lambda pk: (index.rows[pk][1], pk))
+        self.assertEqual(index.page(index.all, 0), ordered)
+        self.assertEqual(index.page(index.all, 2, 5, reverse=True), ordered[::-1][2:5])
+        odd = [pk for pk in ordered if pk % 2]
+        self.assertEqual(index.page(index.match([('kind', ['odd'])]), 1, 4), odd[1:4])
+
+    def test_batch_pages_match_the_orm(self):
+        self.add_batches(45)
+        batches = Batch.objects.order_by('-received_date', '-pk')
+        for params, rows in (
+            ({'page': 2}, batches),
+            ({'page': 2, 'qa_status': 'Approved'}, batches.filter(qa_status='Approved')),
+            ({'page': 3}, batches),
+        ):
+            codes, _ = self.page_codes('/inventory/batches/', params, 'page_obj', 'batch_id')
+            start = (params['page'] - 1) * 20
+            self.assertEqual(codes, [batch.batch_id for batch in rows[start:start + 20]], params)
+
+    def test_index_follows_sync_changes(self):
+        self.add_batches(5)
+        index = bitmaps.current()
+        item = ItemRecord.objects.get(item_record_id=ITEM)
+        self.assertEqual(index.items.get(item.pk, 'stock_level'), bitmaps.NORMAL_STOCK)
+
+        batch = Batch.objects.get(batch_id=BATCH)
+        batch.qa_status = 'Quarantined'
+        batch.save()
+        self.assertTrue(SyncChange.objects.filter(object_key=BATCH).exists())
+        self.assertIs(bitmaps.current(), index)
+        self.assertIn(index.items.slots[item.pk], index.items.bitmap('stock_level', [bitmaps.LOW_STOCK]))
+
+        approved = index.batches.match([('qa_status', ['Approved'])])
+        self.assertEqual(
+            sorted(index.batches.page(approved, 0)),
+            sorted(Batch.objects.filter(qa_status='Approved').values_list('pk', flat=True)),
+        )
+        for params in ({}, {'stock_level': 'low'}, {'qa_status': 'Approved'}, {'category': 'Chemical'}):
+            indexed = self.page_codes('/inventory/reports/inventory/', params, 'inventory_items', 'item_record_id')
+            with self.settings(BITMAP_INDEX=False):
+                orm = self.page_codes('/inventory/reports/inventory/', params, 'inventory_items', 'item_record_id')
+            self.assertEqual(indexed[0], orm[0], params)
+            for name in ('total_items', 'low_stock_items'):
+                self.assertEqual(indexed[1][name], orm[1][name], (params, name))
+
+
+class MasterSnapshotTests(SampleDataTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(MASTER_SNAPSHOT=True, MASTER_SNAPSHOT_DIR=directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # Each test runs in a transaction, where the snapshot is bypassed
+        patcher = mock.patch.object(master_snapshot, 'connection', mock.Mock(in_atomic_block=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(master_snapshot.clear)
+
+    def assert_matches_orm(self):
+        for name, spec in master_snapshot.TABLE_SPECS.items():
+            table = master_snapshot.table(name)
+            attnames = [spec.model._meta.get_field(column).attname for column in spec.columns]
+            rows = [dict(zip(spec.columns, row)) for row in spec.query().values_list(*attnames)]
+            self.assertEqual(list(table.records(spec.columns)), rows, name)
+            for row in rows:
+                self.assertEqual(table.get(row[spec.key]), row)
+
+    def test_reads_match_the_orm(self):
+        self.assertIsNotNone(master_snapshot.current())
+        self.assert_matches_orm()
+        self.assertIsNone(master_snapshot.table('items').get('NO-SUCH-ITEM'))
+
+        item = ItemRecord.objects.get(item_record_id=ITEM)
+        response = self.client.get(f'/inventory/api/items/{ITEM}/details/')
+        self.assertEqual(response.json(), {field: getattr(item, field) for field in ITEM_DETAIL_FIELDS})
+        self.assertEqual(self.client.get('/inventory/api/items/NO-SUCH-ITEM/details/').status_code, 404)
+
+    def test_reads_follow_an_update(self):
+        first = master_snapshot.current()
+        with self.captureOnCommitCallbacks(execute=True):
+            item = ItemRecord.objects.get(item_record_id=ITEM)
+            item.item_name = 'Ethanol, absolute'
+            item.save()
+            supplier = Supplier.objects.get(supplier_id='SUP-PACKAGING')
+            supplier.approved = not supplier.approved
+            supplier.save()
+            location = StorageLocation.objects.get(location_id=LOCATION)
+            location.active = False
+            location.save()
+
+        self.assertIsNot(master_snapshot.current(), first)
+        self.assert_matches_orm()
+        self.assertIsNone(master_snapshot.table('storage_locations').get(LOCATION))
+        response = self.client.get(f'/inventory/api/items/{ITEM}/details/')
+        self.assertEqual(response.json()['item_name'], 'Ethanol, absolute')
+
+
+class RecordTableTests(SampleDataTestCase):
+    def test_rows_read_back_as_records(self):
+        queryset = Supplier.objects.order_by('supplier_id')
+        table = RecordTable.from_queryset(queryset, ['supplier_id', 'supplier_name', 'batch_count'], chunk_size=2)
+        self.assertEqual(len(table), queryset.count())
+        self.assertIsInstance(table.column('batch_count'), array)
+        self.assertIsInstance(table.column('supplier_id'), list)
+
+        for record, supplier in zip(table, queryset):
+            self.assertEqual(
+                record.as_dict(),
+                {'supplier_id': supplier.supplier_id, 'supplier_name': supplier.supplier_name,
+                 'batch_count': supplier.batch_count},
+            )
+            self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(table[0].supplier_id, queryset.first().supplier_id)
+        # Undeclared fields read as their default
+        self.assertEqual(table[0].transaction_count, 0)
+        with self.assertRaises(AttributeError):
+            table[0].no_such_field
+        self.assertIs(type(table[0]), record_class(Supplier, table.attnames))
+
+    def test_append_checks_fields_before_adding_the_row(self):
+        zone = StorageLocation.objects.get(location_id=LOCATION).zone_id
+        table = RecordTable(StorageZoneHazard, ['zone', 'hazard_class'])
+        table.append(zone=zone, hazard_class='Test hazard')
+        self.assertEqual(table[0].zone_id, zone.pk)
+        with self.assertRaises(TypeError):
+            table.append(id=1, zone=zone, hazard_class='Other')
+        with self.assertRaises(KeyError):
+            table.append(zone=zone)
+        self.assertEqual(len(table), 1)
+
+        with self.assertRaises(ValueError):
+            table.set_column('hazard_class', [])
+        table.set_column('hazard_class', ['Renamed hazard'])
+        self.assertEqual([record.hazard_class for record in table], ['Renamed hazard'])
+
+    def test_bulk_create_copies_back_primary_keys(self):
+        zone = StorageLocation.objects.get(location_id=LOCATION).zone_id
+        table = RecordTable(StorageZoneHazard, ['id', 'zone', 'hazard_class'])
+        for number in range(5):
+            table.append(id=None, zone=zone, hazard_class=f'Test hazard {number}')
+        self.assertEqual([instance.hazard_class for instance in table.instances(1, 3)],
+                         ['Test hazard 1', 'Test hazard 2'])
+        self.assertEqual(table.bulk_create(batch_size=2), 5)
+
+        saved = StorageZoneHazard.objects.filter(hazard_class__startswith='Test hazard')
+        self.assertEqual(
+            sorted((record.id, record.hazard_class) for record in table),
+            sorted(saved.values_list('id', 'hazard_class')),
+        )
+
+    def test_ledger_writer_flushes_every_flush_rows(self):
+        batch = Batch.objects.get(batch_id=BATCH)
+        writer = LedgerWriter(flush_rows=3)
+        self.assertEqual(writer.flush(), 0)
+        versions = table_versions([InventoryTransaction._meta.db_table])
+        transactions = ItemRecord.objects.get(item_record_id=ITEM).transaction_count
+        for number in range(4):
+            values = dict(
+                transaction_id=f'TXN-RECORD-{number}', transaction_datetime=timezone.now(), transaction_user='tester',
+                transaction_type='ISS-MFG', item_code=batch.item_record_id, batch_id=batch, quantity=1, unit='L',
+            )
+            # Rows naming different fields are kept in separate tables
+            if number % 2:
+                values['comments'] = 'Odd row'
+            with self.captureOnCommitCallbacks(execute=True):
+                writer.add(**values)
+        self.assertEqual((writer.written, len(writer)), (3, 1))
+        self.assertIn('TXN-RECORD-3', writer)
+        self.assertNotEqual(table_versions([InventoryTransaction._meta.db_table]), versions)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(writer.flush(), 1)
+        self.assertEqual((writer.written, len(writer)), (4, 0))
+        rows = InventoryTransaction.objects.filter(transaction_id__startswith='TXN-RECORD-').order_by('transaction_id')
+        self.assertEqual([row.comments for row in rows], ['', 'Odd row', '', 'Odd row'])
+        # The ledger hooks ran for both tables
+        self.assertEqual(ItemRecord.objects.get(item_record_id=ITEM).transaction_count, transactions + 4)
+
+
+class WriteQueueTests(TestCase):
+    def job(self, zone_id, fail=False):
+        StorageZone.objects.create(zone_id=zone_id, zone_name=zone_id)
+        if fail:
+            raise ValueError(zone_id)
+        return zone_id
+
+    def queued(self, *jobs):
+        return [(Future(), function, args, {}) for function, *args in jobs]
+
+    def test_a_failing_job_rolls_back_alone(self):
+        batch = self.queued((self.job, 'WQ-1'), (self.job, 'WQ-2', True), (self.job, 'WQ-3'))
+        write_queue.WriteQueue()._write(batch)
+        self.assertEqual([batch[0][0].result(), batch[2][0].result()], ['WQ-1', 'WQ-3'])
+        with self.assertRaisesMessage(ValueError, 'WQ-2'):
+            batch[1][0].result()
+        self.assertEqual(
+            list(StorageZone.objects.filter(zone_id__startswith='WQ-').values_list('zone_id', flat=True)),
+            ['WQ-1', 'WQ-3'],
+        )
+
+    def test_a_failed_commit_fails_every_job(self):
+        class FailingCommit:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                raise DatabaseError('disk I/O error')
+
+        batch = self.queued((str, 'a'), (str, 'b'))
+        atomic = [FailingCommit(), mock.MagicMock(), mock.MagicMock()]
+        with mock.patch.object(write_queue.transaction, 'atomic', side_effect=atomic), \
+                mock.patch.object(write_queue.connection, 'close') as close:
+            write_queue.WriteQueue()._write(batch)
+        close.assert_called_once_with()
+        for future, *_ in batch:
+            with self.assertRaisesMessage(DatabaseError, 'disk I/O error'):
+                future.result()
+
+    @override_settings(SQLITE_WRITE_BATCH_SIZE=2)
+    def test_writer_runs_queued_jobs_in_batches(self):
+        jobs = write_queue.WriteQueue()
+        batches = []
+
+        def write(batch):
+            batches.append(len(batch))
+            for future, function, args, kwargs in batch:
+                future.set_result(function(*args, **kwargs))
+
+        batch = self.queued(*[(threading.current_thread,)] * 3)
+        for job in batch:
+            jobs.jobs.put(job)
+        with mock.patch.object(jobs, '_write', side_effect=write):
+            self.assertEqual(jobs.submit(lambda: 'last'), 'last')
+        self.assertEqual(batches, [2, 2])
+        self.assertEqual({future.result().name for future, *_ in batch}, {'sqlite-writer'})
+
+    @override_settings(SQLITE_WRITE_QUEUE=True)
+    def test_serialized_calls_go_through_the_queue(self):
+        @write_queue.serialized
+        def post():
+            return threading.current_thread().name, nested()
+
+        @write_queue.serialized
+        def nested():
+            return threading.current_thread().name
+
+        # Inside a transaction (as every test is) the call runs directly
+        self.assertEqual(post(), (threading.current_thread().name,) * 2)
+
+        def write(batch):
+            for future, function, args, kwargs in batch:
+                future.set_result(function(*args, **kwargs))
+
+        jobs = write_queue.WriteQueue()
+        outside = mock.Mock(vendor='sqlite', in_atomic_block=False)
+        with mock.patch.object(write_queue, '_queue', jobs), mock.patch.object(write_queue, 'connection', outside), \
+                mock.patch.object(jobs, '_write', side_effect=write):
+            # The writer thread runs nested calls itself instead of queueing them behind its own job
+            self.assertEqual(post(), ('sqlite-writer', 'sqlite-writer'))
+            with self.settings(SQLITE_WRITE_QUEUE=False):
+                self.assertEqual(post(), (threading.current_thread().name,) * 2)
+
+
+class ReceivingTests(SampleDataTestCase):
+    url = f'/inventory/batches/{BATCH}/receive-units/'
+
+    def test_receipt_creates_labelled_units(self):
+        response = self.post_json(self.url, {'unit_count': 3, 'quantity_per_unit': 2, 'storage_location': LOCATION,
+                                             'transaction_user': 'someone'})
+        self.assertEqual(response.status_code, 201)
+        units = response.json()['unit_ids']
+        self.assertEqual(len(units), 3)
+        rows = InventoryTransaction.objects.filter(unit_id__in=units)
+        self.assertEqual(rows.count(), 3)
+        self.assertTrue(all(row.label_applied and row.quantity == Decimal('2') for row in rows))
+        self.assertEqual(set(rows.values_list('transaction_user', flat=True)), {'tester'})
+
+    def test_invalid_receipts_are_refused(self):
+        for payload in ({'unit_count': 0}, {'unit_count': 1, 'transaction_type': 'ISS-MFG'},
+                        {'unit_count': 1, 'storage_location': 'NO-SUCH-LOCATION'}):
+            self.assertEqual(self.post_json(self.url, payload).status_code, 400, payload)
+        self.assertFalse(InventoryTransaction.objects.exclude(unit_id='').exists())
+
+    def test_anonymous_receipts_are_refused(self):
+        self.client.logout()
+        response = self.post_json(self.url, {'unit_count': 1, 'transaction_user': 'someone'})
+        self.assertNotEqual(response.status_code, 201)
+        self.assertFalse(InventoryTransaction.objects.exclude(unit_id='').exists())
+
+    def test_placement_violation_is_refused(self):
+        ItemRecord.objects.filter(item_record_id=OTHER_ITEM).update(hazard_class='Oxidizer')
+        response = self.post_json(f'/inventory/batches/{OTHER_BATCH}/receive-units/',
+                                  {'unit_count': 1, 'storage_location': LOCATION})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(LOCATION, response.json()['error'])
+
+
+class LabelTests(TestCase):
+    label = {'unit_id': 'UNIT-00001', 'item_code': ITEM, 'item_name': 'Acid ^XZ~JA_mix',
+             'batch_id': BATCH, 'expiry_date': '', 'hazard_class': ''}
+
+    def test_zpl_field_data_is_escaped(self):
+        zpl = render_zpl_label(self.label)
+        self.assertIn('^FDAcid _5EXZ_7EJA_5Fmix^FS', zpl)
+        self.assertEqual(zpl.count('^XZ'), 1)
+        self.assertIn(f'^BQN,2,5^FH^FDQA,{qr_payload(self.label)}^FS', zpl)
+
+    def test_qr_symbol_structure(self):
+        rows = qr.matrix(qr_payload(self.label))
+        # 61 bytes need version 4 at level M
+        self.assertEqual(len(rows), 33)
+        finder = [[max(abs(x - 3), abs(y - 3)) not in (2, 4) for x in range(7)] for y in range(7)]
+        for left, top in ((0, 0), (26, 0), (0, 26)):
+            self.assertEqual([row[left:left + 7] for row in rows[top:top + 7]], finder)
+        # Format information: level M (00), a mask, and a valid BCH remainder
+        bits = sum(rows[8][x] << (14 - i) for i, x in enumerate((0, 1, 2, 3, 4, 5, 7, 8)))
+        bits |= sum(rows[y][8] << (6 - i) for i, y in enumerate((7, 5, 4, 3, 2, 1, 0)))
+        bits ^= 0x5412
+        self.assertEqual(bits >> 13, 0)
+        remainder = bits >> 10
+        for _ in range(10):
+            remainder = (remainder << 1) ^ ((remainder >> 9) * 0x537)
+        self.assertEqual(bits & 0x3FF, remainder)
+
+    def test_pdf_label_draws_the_qr_symbol(self):
+        page = render_pdf_page(self.label)
+        dark_runs = sum(
+            1 for row in qr.matrix(qr_payload(self.label)) for index, dark in enumerate(row)
+            if dark and (index == 0 or not row[index - 1])
+        )
+        self.assertEqual(page.count(' re\n'), dark_runs)
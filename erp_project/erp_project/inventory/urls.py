@@ -19,6 +19,7 @@ urlpatterns = [
     
     # Master Data - Suppliers
     path('suppliers/', views.supplier_list, name='supplier_list'),
+    path('suppliers/reviews-due/', views.reviews_due, name='reviews_due'),
     path('suppliers/<path:supplier_id>/', views.supplier_detail, name='supplier_detail'),
     
     # Master Data - Customers
@@ -33,21 +34,42 @@ urlpatterns = [
     # QA Reviews
     path('qa-reviews/', views.qa_review_list, name='qa_review_list'),
     path('qa-reviews/create/', views.create_qa_review, name='create_qa_review'),
+    path('qa-reviews/bulk/', views.bulk_qa_disposition, name='bulk_qa_disposition'),
     path('qa-reviews/<path:qa_review_id>/', views.qa_review_detail, name='qa_review_detail'),
     
     # Batch Management
     path('batches/', views.batch_list, name='batch_list'),
+    path('batches/<path:batch_id>/receive-units/', views.receive_batch_units, name='receive_batch_units'),
+    path('batches/<path:batch_id>/labels/', views.batch_labels, name='batch_labels'),
     path('batches/<path:batch_id>/', views.batch_detail, name='batch_detail'),
     
     # API Endpoints for AJAX
     path('api/items/<path:item_id>/details/', views.get_item_details, name='get_item_details'),
     path('api/items/<path:item_id>/supplier-products/', views.get_supplier_products, name='get_supplier_products'),
+    path('api/items/<path:item_id>/putaway/', views.get_putaway_suggestions, name='get_putaway_suggestions'),
     path('api/storage-zones/<path:zone_id>/locations/', views.get_storage_locations, name='get_storage_locations'),
+    path('api/reviews-due/', views.get_reviews_due, name='get_reviews_due'),
+    path('api/segregation/check/', views.check_segregation, name='check_segregation'),
+    path('api/stock/as-of/', views.stock_as_of, name='stock_as_of'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/counts/', views.count_start, name='count_start'),
+    path('api/counts/<str:count_id>/counts/', views.count_record, name='count_record'),
+    path('api/counts/<str:count_id>/variances/', views.count_variances, name='count_variances'),
+    path('api/counts/<str:count_id>/post/', views.count_post, name='count_post'),
+    path('api/sync/pull/', views.sync_pull, name='sync_pull'),
+    path('api/sync/push/', views.sync_push, name='sync_push'),
+    path('api/lookups/<str:name>/', views.lookup_options, name='lookup_options'),
+    path('api/autocomplete/<str:entity>/', views.autocomplete, name='autocomplete'),
     
     # Reports
     path('reports/inventory/', views.inventory_report, name='inventory_report'),
     path('reports/expiry/', views.expiry_report, name='expiry_report'),
     
+    # Background Jobs
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/<int:job_id>/cancel/', views.job_cancel, name='job_cancel'),
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
+    
     # Debug
     path('debug/links/', views.debug_links, name='debug_links'),
     path('api/subtype-choices/', views.get_subtype_choices, name='get_subtype_choices'),
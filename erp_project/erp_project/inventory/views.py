@@ -1,21 +1,60 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
-from django.http import JsonResponse, HttpResponse
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.db.models import Q, Count, Sum
+from django.db import transaction as db_transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.conf import settings
 from datetime import datetime, timedelta
 import json
+import os
+from decimal import Decimal, InvalidOperation
 
 from .models import (
     Supplier, ItemRecord, Product, ProductVersion, SupplierProduct, Batch,
-    StorageZone, StorageLocation, Customer, QAReview, QAReviewUnit, InventoryTransaction,
-    calculate_qa_required, calculate_traceability_level, calculate_document_requirements,
-    CategoryChoices, GradeChoices, QAStatusChoices, TransactionTypeChoices,
-    UOMChoices, ReviewOutcomeChoices, DocumentMatchChoices
+    StorageZone, StorageLocation, Customer, QAReview, QAReviewUnit, InventoryTransaction, CountSession, Job,
+    TRANSACTION_DETAILS,
+    calculate_qa_required, calculate_document_requirements,
+    TransactionTypeChoices, UOMChoices, ReviewOutcomeChoices, DocumentMatchChoices
 )
 from .forms import ItemRecordForm
+from .api_auth import api_auth
+from .conditional import conditional_get
+from .services.qa import (
+    bulk_disposition, propagate_disposition, next_review_ids,
+    BulkDispositionError, OUTCOME_TO_QA_STATUS
+)
+from .services.reviews import (
+    due_suppliers, due_supplier_products, review_state, DUE_SOON_DAYS
+)
+from .services.storage import suggest_putaway, movement_delta
+from .services.segregation import check_placement, describe_violations
+from .services.receiving import receive_units, label_data, labelled_units, ReceivingError
+from .services.labels import render_labels, LABEL_FORMATS, INLINE_LABEL_LIMIT
+from .services import master_snapshot
+from .services.lookups import (
+    dropdown_context, search_dropdown, AUTOCOMPLETE_ENTITIES, AUTOCOMPLETE_LIMIT, DROPDOWNS, MAX_AUTOCOMPLETE_LIMIT,
+    TYPEAHEAD_LIMIT
+)
+from .services.codes import code_values
+from .services.facets import facet_counts
+from .services import bitmaps
+from .services.bitmaps import (
+    IndexedResults, EXPIRED, EXPIRING_SOON, VALID, EXPIRING_SOON_DAYS, HIGH_STOCK, HIGH_STOCK_LEVEL, LOW_STOCK,
+    LOW_STOCK_LEVEL
+)
+from .services.sync import pull_changes, push_transactions, SyncError, PULL_LIMIT
+from .services.snapshots import positions_as_of, summarise, valuation_as_of, with_codes, GROUPINGS, COSTING_METHODS
+from .services import jobs as job_queue
+from .services.counts import (
+    start_session, record_counts, parse_counts_csv, variances, post_adjustments, CountError
+)
 
 # Authentication Views
 def login_view(request):
@@ -84,6 +123,7 @@ def dashboard(request):
 
 # Master Data Views
 
+@conditional_get(Customer)
 def customer_list(request):
     """List all customers with search and filter functionality"""
     customers = Customer.objects.all()
@@ -131,6 +171,7 @@ def customer_list(request):
     return render(request, 'inventory/customer_list.html', context)
 
 
+@conditional_get(Customer, InventoryTransaction, ItemRecord, Batch, pk_kwarg='customer_code')
 def customer_detail(request, customer_code):
     """Show detailed customer information"""
     customer = get_object_or_404(Customer, customer_code=customer_code)
@@ -148,14 +189,17 @@ def customer_detail(request, customer_code):
     return render(request, 'inventory/customer_detail.html', context)
 
 
+@conditional_get(ItemRecord)
 def item_list(request):
     """List all items with search and filter functionality"""
     items = ItemRecord.objects.all()
+    # Active filters as {parameter: (value, condition)}, shared with the facet counts
+    filters = {}
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        items = items.filter(
+        filters['search'] = (search_query,
             Q(item_record_id__icontains=search_query) |
             Q(item_name__icontains=search_query) |
             Q(chemical_family__icontains=search_query)
@@ -164,15 +208,18 @@ def item_list(request):
     # Filter functionality
     category_filter = request.GET.get('category', '')
     if category_filter:
-        items = items.filter(category=category_filter)
+        filters['category'] = (category_filter, Q(category=category_filter))
     
     grade_filter = request.GET.get('grade', '')
     if grade_filter:
-        items = items.filter(grade=grade_filter)
+        filters['grade'] = (grade_filter, Q(grade=grade_filter))
     
     qa_required_filter = request.GET.get('qa_required', '')
     if qa_required_filter:
-        items = items.filter(qa_required=qa_required_filter == 'true')
+        filters['qa_required'] = (qa_required_filter, Q(qa_required=qa_required_filter == 'true'))
+    
+    facets = facet_counts('items', items, filters)
+    items = items.filter(*[condition for _, condition in filters.values()])
     
     # Pagination
     paginator = Paginator(items, 20)
@@ -185,8 +232,8 @@ def item_list(request):
         'category_filter': category_filter,
         'grade_filter': grade_filter,
         'qa_required_filter': qa_required_filter,
-        'categories': CategoryChoices.choices,
-        'grades': GradeChoices.choices,
+        'categories': facets['category'],
+        'grades': facets['grade'],
     }
     
     return render(request, 'inventory/item_list.html', context)
@@ -227,16 +274,12 @@ def item_edit(request, item_id):
     }
     return render(request, 'inventory/item_form.html', context)
 
+@conditional_get(ItemRecord, Batch, SupplierProduct, InventoryTransaction, QAReview, Supplier, pk_kwarg='item_id')
 def item_detail(request, item_id):
     """Detailed view of an item with related batches and transactions"""
+    # Related counts come with the row (services/counters.py)
     item = get_object_or_404(ItemRecord, item_record_id=item_id)
     
-    # Get related data counts
-    batches_count = Batch.objects.filter(item_record_id=item).count()
-    suppliers_count = SupplierProduct.objects.filter(item_code=item).count()
-    transactions_count = InventoryTransaction.objects.filter(item_code=item).count()
-    qa_reviews_count = QAReview.objects.filter(item_code=item).count()
-    
     # Get recent batches
     recent_batches = Batch.objects.filter(item_record_id=item).order_by('-received_date')[:5]
     
@@ -250,10 +293,6 @@ def item_detail(request, item_id):
     
     context = {
         'item': item,
-        'batches_count': batches_count,
-        'suppliers_count': suppliers_count,
-        'transactions_count': transactions_count,
-        'qa_reviews_count': qa_reviews_count,
         'recent_batches': recent_batches,
         'recent_transactions': recent_transactions,
         'today': today,
@@ -263,6 +302,7 @@ def item_detail(request, item_id):
     return render(request, 'inventory/item_detail.html', context)
 
 
+@conditional_get(Supplier)
 def supplier_list(request):
     """List all suppliers with search and filter functionality"""
     suppliers = Supplier.objects.all()
@@ -300,57 +340,69 @@ def supplier_list(request):
     return render(request, 'inventory/supplier_list.html', context)
 
 
+@conditional_get(Supplier, SupplierProduct, InventoryTransaction, Batch, QAReview, ItemRecord, pk_kwarg='supplier_id')
 def supplier_detail(request, supplier_id):
     """Detailed view of a supplier with related products and transactions"""
-    supplier = get_object_or_404(Supplier, supplier_id=supplier_id)
-    
-    # Get related data counts
-    supplier_products_count = SupplierProduct.objects.filter(supplier_name=supplier).count()
-    transactions_count = InventoryTransaction.objects.filter(supplier_code=supplier).count()
-    batches_count = Batch.objects.filter(supplier_code=supplier).count()
-    qa_reviews_count = QAReview.objects.filter(supplier_code=supplier).count()
+    # Related counts come with the row (services/counters.py)
+    supplier = get_object_or_404(
+        Supplier.objects.annotate(review_state=review_state()),
+        supplier_id=supplier_id
+    )
     
-    # Get supplier products
+    # Get supplier products with their review state computed in SQL
     supplier_products = SupplierProduct.objects.filter(
         supplier_name=supplier
-    ).select_related('item_code')
+    ).select_related('item_code').annotate(review_state=review_state())
     
     # Get recent transactions
     transactions = InventoryTransaction.objects.filter(
         supplier_code=supplier
     ).select_related('item_code', 'batch_id').order_by('-transaction_datetime')[:10]
     
-    # Calculate dates for review warnings
-    from datetime import date, timedelta
-    today = date.today()
-    today_plus_30 = today + timedelta(days=30)
-    
     context = {
         'supplier': supplier,
-        'supplier_products_count': supplier_products_count,
-        'transactions_count': transactions_count,
-        'batches_count': batches_count,
-        'qa_reviews_count': qa_reviews_count,
         'supplier_products': supplier_products,
         'transactions': transactions,
-        'today': today,
-        'today_plus_30': today_plus_30,
     }
     
     return render(request, 'inventory/supplier_detail.html', context)
 
+
+def _review_due_window(request):
+    """Parse the ?days= look-ahead window for the review queue"""
+    try:
+        return max(0, int(request.GET.get('days', DUE_SOON_DAYS)))
+    except ValueError:
+        return DUE_SOON_DAYS
+
+
+def reviews_due(request):
+    """Supplier and supplier-product reviews that are overdue or due soon"""
+    within_days = _review_due_window(request)
+    
+    context = {
+        'suppliers': due_suppliers(within_days),
+        'supplier_products': due_supplier_products(within_days),
+        'within_days': within_days,
+    }
+    
+    return render(request, 'inventory/reviews_due.html', context)
+
 # Inventory Transaction Views
 
+@conditional_get(InventoryTransaction, ItemRecord, Batch, Supplier, Customer)
 def transaction_list(request):
     """List all inventory transactions with search and filter functionality"""
     transactions = InventoryTransaction.objects.select_related(
         'item_code', 'batch_id', 'supplier_code', 'recipient_code'
     ).order_by('-transaction_datetime')
+    # Active filters as {parameter: (value, condition)}, shared with the facet counts
+    filters = {}
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        transactions = transactions.filter(
+        filters['search'] = (search_query,
             Q(transaction_id__icontains=search_query) |
             Q(item_code__item_name__icontains=search_query) |
             Q(batch_id__batch_id__icontains=search_query) |
@@ -360,19 +412,22 @@ def transaction_list(request):
     # Filter functionality
     transaction_type_filter = request.GET.get('transaction_type', '')
     if transaction_type_filter:
-        transactions = transactions.filter(transaction_type=transaction_type_filter)
+        filters['transaction_type'] = (transaction_type_filter, Q(transaction_type=transaction_type_filter))
     
     qa_status_filter = request.GET.get('qa_status', '')
     if qa_status_filter:
-        transactions = transactions.filter(qa_status=qa_status_filter)
+        filters['qa_status'] = (qa_status_filter, Q(qa_status=qa_status_filter))
     
     date_from = request.GET.get('date_from', '')
     if date_from:
-        transactions = transactions.filter(transaction_datetime__date__gte=date_from)
+        filters['date_from'] = (date_from, Q(transaction_datetime__date__gte=date_from))
     
     date_to = request.GET.get('date_to', '')
     if date_to:
-        transactions = transactions.filter(transaction_datetime__date__lte=date_to)
+        filters['date_to'] = (date_to, Q(transaction_datetime__date__lte=date_to))
+    
+    facets = facet_counts('transactions', InventoryTransaction.objects.all(), filters)
+    transactions = transactions.filter(*[condition for _, condition in filters.values()])
     
     # Pagination
     paginator = Paginator(transactions, 25)
@@ -386,19 +441,26 @@ def transaction_list(request):
         'qa_status_filter': qa_status_filter,
         'date_from': date_from,
         'date_to': date_to,
-        'transaction_types': TransactionTypeChoices.choices,
-        'qa_statuses': QAStatusChoices.choices,
+        'transaction_types': facets['transaction_type'],
+        'qa_statuses': facets['qa_status'],
     }
     
     return render(request, 'inventory/transaction_list.html', context)
 
 
+@conditional_get(
+    InventoryTransaction, ItemRecord, Batch, Supplier, Customer, StorageZone, StorageLocation, QAReview,
+    *TRANSACTION_DETAILS,
+    pk_kwarg='transaction_id'
+)
 def transaction_detail(request, transaction_id):
     """Detailed view of an inventory transaction"""
     transaction = get_object_or_404(
         InventoryTransaction.objects.select_related(
             'item_code', 'batch_id', 'supplier_code', 'recipient_code',
-            'storage_zone', 'storage_location', 'qa_review_id'
+            'storage_zone', 'storage_location', 'qa_review_id',
+            # Sidecar details: a transaction without one renders those sections empty
+            'documents', 'equipment', 'dispatch', 'disposal', 'usage'
         ),
         transaction_id=transaction_id
     )
@@ -417,9 +479,19 @@ def create_transaction(request):
         try:
             # Extract data from POST request
             transaction_type = request.POST.get('transaction_type')
-            item_code_id = request.POST.get('item_code')
+            item_code = ItemRecord.objects.get(item_record_id=request.POST.get('item_code'))
             quantity = request.POST.get('quantity')
             unit = request.POST.get('unit')
+            unit_cost = request.POST.get('unit_cost')
+            location = None
+            if request.POST.get('storage_location'):
+                location = StorageLocation.objects.get(location_id=request.POST.get('storage_location'))
+            
+            # Stock put into a location must respect hazard segregation
+            if location is not None and movement_delta(transaction_type, quantity) > 0:
+                violations = check_placement(item_code, location)
+                if violations:
+                    raise ValueError(f'Cannot store {item_code.item_record_id} in {location.location_id}: {describe_violations(violations)}')
             
             # Create transaction
             transaction = InventoryTransaction.objects.create(
@@ -427,9 +499,14 @@ def create_transaction(request):
                 transaction_datetime=timezone.now(),
                 transaction_user=request.user.username,
                 transaction_type=transaction_type,
-                item_code_id=item_code_id,
+                item_code=item_code,
                 quantity=quantity,
                 unit=unit,
+                invoice_no=request.POST.get('invoice_no', ''),
+                invoice_date=request.POST.get('invoice_date') or None,
+                unit_cost=unit_cost or None,
+                storage_zone_id=location.zone_id_id if location else None,
+                storage_location=location,
                 # Add other fields as needed
             )
             
@@ -439,20 +516,12 @@ def create_transaction(request):
         except Exception as e:
             messages.error(request, f'Error creating transaction: {str(e)}')
     
-    # Get data for form
-    items = ItemRecord.objects.all()
-    suppliers = Supplier.objects.filter(approved=True)
-    customers = Customer.objects.filter(approved=True)
-    storage_zones = StorageZone.objects.all()
-    
-    context = {
-        'items': items,
-        'suppliers': suppliers,
-        'customers': customers,
-        'storage_zones': storage_zones,
+    # Get data for form (cached dropdown payloads; large lists become type-ahead fields)
+    context = dropdown_context('items', 'approved_suppliers', 'approved_customers', 'storage_zones')
+    context.update({
         'transaction_types': TransactionTypeChoices.choices,
         'units': UOMChoices.choices,
-    }
+    })
     
     return render(request, 'inventory/create_transaction.html', context)
 
@@ -523,65 +592,107 @@ def qa_review_detail(request, qa_review_id):
     return render(request, 'inventory/qa_review_detail.html', context)
 
 
+@login_required
 def create_qa_review(request):
     """Create a new QA review"""
     if request.method == 'POST':
         try:
             # Extract data from POST request
-            batch_number_id = request.POST.get('batch_number')
-            item_code_id = request.POST.get('item_code')
-            supplier_code_id = request.POST.get('supplier_code')
-            coa_match = request.POST.get('coa_match') == 'true'
-            sds_match = request.POST.get('sds_match') == 'true'
-            spec_match = request.POST.get('spec_match') == 'true'
+            batch_number = Batch.objects.get(batch_id=request.POST.get('batch_number'))
+            item_code = ItemRecord.objects.get(item_record_id=request.POST.get('item_code'))
+            supplier_code = Supplier.objects.get(supplier_id=request.POST.get('supplier_code'))
+            checked = lambda name: request.POST.get(name) in ('true', 'on')
+            coa_match = checked('coa_match')
+            sds_match = checked('sds_match')
+            spec_match = checked('spec_match')
             review_outcome = request.POST.get('review_outcome')
             
-            # Create QA review
-            qa_review = QAReview.objects.create(
-                qa_review_id=f"QA-{datetime.now().strftime('%Y%m%d')}-{QAReview.objects.count() + 1:03d}",
-                batch_number_id=batch_number_id,
-                item_code_id=item_code_id,
-                supplier_code_id=supplier_code_id,
-                coa_match=coa_match,
-                sds_match=sds_match,
-                spec_match=spec_match,
-                review_outcome=review_outcome,
-                qa_reviewer=request.user.username,
-                review_date=timezone.now().date(),
-                # Add other fields as needed
-            )
+            # Create QA review and propagate its disposition to the batch and ledger
+            with db_transaction.atomic():
+                qa_review = QAReview.objects.create(
+                    qa_review_id=next_review_ids(1)[0],
+                    batch_number=batch_number,
+                    item_code=item_code,
+                    supplier_code=supplier_code,
+                    coa_match=coa_match,
+                    sds_match=sds_match,
+                    spec_match=spec_match,
+                    coa_attached=checked('coa_attached'),
+                    sds_attached=checked('sds_attached'),
+                    label_attached=checked('label_attached'),
+                    spec_attached=checked('spec_attached'),
+                    document_match=request.POST.get('document_match', ''),
+                    review_outcome=review_outcome,
+                    qa_reviewer=request.user.username,
+                    review_date=request.POST.get('review_date') or timezone.now().date(),
+                    sub_ingredient_log=request.POST.get('sub_ingredient_log', ''),
+                    qa_file_link=request.POST.get('qa_file_link', ''),
+                    comments=request.POST.get('comments', ''),
+                    # Add other fields as needed
+                )
+                if review_outcome in OUTCOME_TO_QA_STATUS:
+                    propagate_disposition(
+                        {batch_number.batch_id: qa_review.qa_review_id},
+                        OUTCOME_TO_QA_STATUS[review_outcome]
+                    )
             
             messages.success(request, f'QA Review {qa_review.qa_review_id} created successfully.')
-            return redirect('qa_review_detail', qa_review_id=qa_review.qa_review_id)
+            return redirect('inventory:qa_review_detail', qa_review_id=qa_review.qa_review_id)
             
         except Exception as e:
             messages.error(request, f'Error creating QA review: {str(e)}')
     
-    # Get data for form
-    batches = Batch.objects.filter(qa_status='Pending')
-    items = ItemRecord.objects.all()
-    suppliers = Supplier.objects.filter(approved=True)
-    
-    context = {
-        'batches': batches,
-        'items': items,
-        'suppliers': suppliers,
+    # Get data for form (cached dropdown payloads; large lists become type-ahead fields)
+    context = dropdown_context('pending_batches', 'items', 'approved_suppliers')
+    context.update({
         'outcomes': ReviewOutcomeChoices.choices,
         'document_matches': DocumentMatchChoices.choices,
-    }
+    })
     
     return render(request, 'inventory/create_qa_review.html', context)
 
+@api_auth
+@require_POST
+def bulk_qa_disposition(request):
+    """Bulk QA endpoint: review N batches or units and propagate the disposition"""
+    try:
+        payload = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    try:
+        result = bulk_disposition(
+            review_outcome=payload.get('review_outcome'),
+            reviewer=request.user.username,
+            batch_ids=payload.get('batch_ids'),
+            unit_ids=payload.get('unit_ids'),
+            coa_match=bool(payload.get('coa_match')),
+            sds_match=bool(payload.get('sds_match')),
+            spec_match=bool(payload.get('spec_match')),
+            document_match=payload.get('document_match', ''),
+            qa_file_link=payload.get('qa_file_link', ''),
+            comments=payload.get('comments', ''),
+        )
+    except BulkDispositionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse(result)
+
 # Batch Management Views
 
+@conditional_get(Batch, ItemRecord, SupplierProduct, Supplier, StorageLocation)
 def batch_list(request):
     """List all batches with search and filter functionality"""
-    batches = Batch.objects.select_related('item_record_id', 'supplier_product_id').order_by('-received_date')
+    batches = Batch.objects.select_related('item_record_id', 'supplier_product_id').order_by('-received_date', '-pk')
+    # Active filters as {parameter: (value, condition)}, shared with the facet counts,
+    # and the same filters as (attribute, [values]) for the bitmap index
+    filters = {}
+    criteria = []
     
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        batches = batches.filter(
+        filters['search'] = (search_query,
             Q(batch_id__icontains=search_query) |
             Q(item_record_id__item_name__icontains=search_query)
         )
@@ -589,13 +700,59 @@ def batch_list(request):
     # Filter functionality
     qa_status_filter = request.GET.get('qa_status', '')
     if qa_status_filter:
-        batches = batches.filter(qa_status=qa_status_filter)
+        filters['qa_status'] = (qa_status_filter, Q(qa_status=qa_status_filter))
+        criteria.append(('qa_status', [qa_status_filter]))
+    
+    batch_source_filter = request.GET.get('batch_source', '')
+    if batch_source_filter:
+        filters['batch_source'] = (batch_source_filter, Q(batch_source=batch_source_filter))
+        criteria.append(('batch_source', [batch_source_filter]))
+    
+    batch_type_filter = request.GET.get('batch_type', '')
+    if batch_type_filter:
+        filters['batch_type'] = (batch_type_filter, Q(batch_type=batch_type_filter))
+        criteria.append(('batch_type', [batch_type_filter]))
+    
+    category_filter = request.GET.get('category', '')
+    if category_filter:
+        filters['category'] = (category_filter, Q(item_record_id__category=category_filter))
+        criteria.append(('category', [category_filter]))
+    
+    storage_zone_filter = request.GET.get('storage_zone', '')
+    if storage_zone_filter:
+        filters['storage_zone'] = (storage_zone_filter, Q(storage_location__zone_id=storage_zone_filter))
+        criteria.append(('zone', [storage_zone_filter]))
+    
+    supplier_filter = request.GET.get('supplier', '')
+    if supplier_filter:
+        filters['supplier'] = (supplier_filter, Q(supplier_code__supplier_id=supplier_filter))
+        criteria.append(('supplier', [supplier_filter]))
+    
+    # Expiry filters
+    today = timezone.now().date()
+    soon = today + timedelta(days=EXPIRING_SOON_DAYS)
+    expiry_conditions = {
+        EXPIRED: Q(expiry_date__lt=today),
+        EXPIRING_SOON: Q(expiry_date__gte=today, expiry_date__lte=soon),
+        VALID: Q(expiry_date__gt=soon),
+    }
+    expiry_filter = request.GET.get('expiry_filter', '')
+    if expiry_filter in expiry_conditions:
+        filters['expiry_filter'] = (expiry_filter, expiry_conditions[expiry_filter])
+        criteria.append(('expiry', [expiry_filter]))
     
-    # Expiring batches filter
     expiring_filter = request.GET.get('expiring', '')
     if expiring_filter:
-        thirty_days_from_now = timezone.now().date() + timedelta(days=30)
-        batches = batches.filter(expiry_date__lte=thirty_days_from_now)
+        filters['expiring'] = (expiring_filter, Q(expiry_date__lte=soon))
+        criteria.append(('expiry', [EXPIRED, EXPIRING_SOON]))
+    
+    facets = facet_counts('batches', Batch.objects.all(), filters)
+    index = bitmaps.current()
+    if index is not None and not search_query:
+        # Filters are answered in memory and only the shown page is read
+        batches = IndexedResults(batches, index.batches, index.batches.match(criteria), reverse=True)
+    else:
+        batches = batches.filter(*[condition for _, condition in filters.values()])
     
     # Pagination
     paginator = Paginator(batches, 20)
@@ -604,15 +761,23 @@ def batch_list(request):
     
     context = {
         'page_obj': page_obj,
+        'batches': page_obj,
         'search_query': search_query,
         'qa_status_filter': qa_status_filter,
+        'batch_source_filter': batch_source_filter,
+        'batch_type_filter': batch_type_filter,
+        'expiry_filter': expiry_filter,
         'expiring_filter': expiring_filter,
-        'qa_statuses': QAStatusChoices.choices,
+        'qa_statuses': facets['qa_status'],
     }
     
     return render(request, 'inventory/batch_list.html', context)
 
 
+@conditional_get(
+    Batch, ItemRecord, SupplierProduct, InventoryTransaction, Supplier, QAReview, StorageLocation,
+    pk_kwarg='batch_id'
+)
 def batch_detail(request, batch_id):
     """Detailed view of a batch"""
     batch = get_object_or_404(
@@ -636,35 +801,117 @@ def batch_detail(request, batch_id):
     
     return render(request, 'inventory/batch_detail.html', context)
 
+@api_auth
+@require_POST
+def receive_batch_units(request, batch_id):
+    """Receive N labelled units of a batch in one bulk write"""
+    batch = get_object_or_404(
+        Batch.objects.select_related('item_record_id', 'supplier_code', 'storage_location'),
+        batch_id=batch_id
+    )
+    try:
+        payload = json.loads(request.body or '{}')
+        unit_count = int(payload.get('unit_count', 0))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    location = None
+    if payload.get('storage_location'):
+        location = StorageLocation.objects.filter(location_id=payload['storage_location']).first()
+        if location is None:
+            return JsonResponse({'error': 'Unknown storage location'}, status=400)
+    qa_review = None
+    if payload.get('qa_review_id'):
+        qa_review = QAReview.objects.filter(qa_review_id=payload['qa_review_id'], batch_number=batch).first()
+        if qa_review is None:
+            return JsonResponse({'error': 'QA review not found for this batch'}, status=400)
+    
+    try:
+        unit_cost = payload.get('unit_cost')
+        rows = receive_units(
+            batch, unit_count, payload.get('quantity_per_unit', 1),
+            user=request.user.username,
+            unit=payload.get('unit'),
+            transaction_type=payload.get('transaction_type', TransactionTypeChoices.RCV_PUR),
+            storage_location=location,
+            qa_review=qa_review,
+            invoice_no=payload.get('invoice_no', ''),
+            unit_cost=Decimal(str(unit_cost)) if unit_cost not in (None, '') else None,
+            comments=payload.get('comments', ''),
+        )
+    except (ReceivingError, InvalidOperation) as e:
+        return JsonResponse({'error': str(e) or 'Invalid quantity'}, status=400)
+    
+    return JsonResponse({
+        'batch_id': batch.batch_id,
+        'unit_ids': [row.unit_id for row in rows],
+        'transaction_ids': [row.transaction_id for row in rows],
+        'qa_review_units': len(rows) if qa_review else 0,
+    }, status=201)
+
+def batch_labels(request, batch_id):
+    """Printable labels for a batch's units as one PDF or ZPL stream"""
+    fmt = request.GET.get('format', 'pdf')
+    if fmt not in LABEL_FORMATS:
+        return JsonResponse({'error': f'Unsupported format: {fmt}'}, status=400)
+    
+    requested = [unit for unit in request.GET.get('units', '').split(',') if unit]
+    units = labelled_units(batch_id, requested)
+    
+    # Large label runs are rendered by a job and downloaded from it
+    if units.count() > INLINE_LABEL_LIMIT:
+        job = job_queue.enqueue('render_labels', {'batch_id': batch_id, 'fmt': fmt, 'unit_ids': requested},
+                                user=request.user.username)
+        return JsonResponse({
+            'job_id': job.id,
+            'status_url': reverse('inventory:job_status', args=[job.id]),
+            'download_url': reverse('inventory:job_download', args=[job.id]),
+        }, status=202)
+    
+    labels = label_data(units)
+    if not labels:
+        return JsonResponse({'error': 'No labelled units found'}, status=404)
+    
+    content_type = 'application/pdf' if fmt == 'pdf' else 'application/x-zpl'
+    response = HttpResponse(
+        render_labels(labels, fmt),
+        content_type=content_type
+    )
+    filename = f"labels-{batch_id.replace('/', '-')}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 # API Views for AJAX functionality
 
+ITEM_DETAIL_FIELDS = [
+    'item_name', 'unit_of_measure', 'category', 'subtype', 'grade', 'hazard_class', 'qa_required',
+    'traceability_level', 'sds_mandatory', 'coa_mandatory', 'spec_required',
+]
+
+@conditional_get(ItemRecord, pk_kwarg='item_id')
 def get_item_details(request, item_id):
     """Get item details for AJAX requests"""
+    # Served from the shared master-data snapshot when it is in use
+    items = master_snapshot.table('items')
+    if items is not None:
+        data = items.get(item_id, ITEM_DETAIL_FIELDS)
+        if data is None:
+            return JsonResponse({'error': 'Item not found'}, status=404)
+        return JsonResponse(data)
     try:
         item = ItemRecord.objects.get(item_record_id=item_id)
-        data = {
-            'item_name': item.item_name,
-            'unit_of_measure': item.unit_of_measure,
-            'category': item.category,
-            'subtype': item.subtype,
-            'grade': item.grade,
-            'hazard_class': item.hazard_class,
-            'qa_required': item.qa_required,
-            'traceability_level': item.traceability_level,
-            'sds_mandatory': item.sds_mandatory,
-            'coa_mandatory': item.coa_mandatory,
-            'spec_required': item.spec_required,
-        }
+        data = {field: getattr(item, field) for field in ITEM_DETAIL_FIELDS}
         return JsonResponse(data)
     except ItemRecord.DoesNotExist:
         return JsonResponse({'error': 'Item not found'}, status=404)
 
 
+@conditional_get(SupplierProduct, Supplier)
 def get_supplier_products(request, item_id):
     """Get supplier products for an item"""
     try:
         supplier_products = SupplierProduct.objects.filter(
-            item_code_id=item_id,
+            item_code__item_record_id=item_id,
             approved=True
         ).select_related('supplier_name')
         
@@ -697,12 +944,245 @@ def get_storage_locations(request, zone_id):
                 'id': location.location_id,
                 'name': f"{location.location_id} - {location.rack_shelf}",
                 'max_capacity': location.max_capacity,
+                'capacity_quantity': location.capacity_quantity,
+                'capacity_unit': location.capacity_unit,
+                'occupied_quantity': location.occupied_quantity,
             })
         
         return JsonResponse({'locations': data})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def stock_as_of(request):
+    """Closing stock at the end of a day: latest snapshot plus the ledger since, optionally valued"""
+    as_of = parse_date(request.GET.get('date', ''))
+    if as_of is None:
+        return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+    group_by = request.GET.get('group', 'position')
+    if group_by not in GROUPINGS:
+        return JsonResponse({'error': f'group must be one of {", ".join(GROUPINGS)}'}, status=400)
+    method = request.GET.get('valuation', '')
+    if method and method not in COSTING_METHODS:
+        return JsonResponse({'error': f'valuation must be one of {", ".join(COSTING_METHODS)}'}, status=400)
+    
+    item = request.GET.get('item') or None
+    run, positions = positions_as_of(
+        as_of,
+        zone=request.GET.get('zone') or None,
+        location=request.GET.get('location') or None,
+        batch=request.GET.get('batch') or None,
+        item=item,
+    )
+    data = {
+        'as_of': as_of,
+        'snapshot': run.as_of if run else None,
+        'balances': with_codes(summarise(positions, group_by)),
+    }
+    if method:
+        # Costing is per item, so only the item filter applies to the valuation
+        data['valuation'] = with_codes(valuation_as_of(as_of, method, item=item))
+    return JsonResponse(data)
+
+# Cycle Count API
+
+@api_auth
+@require_POST
+def count_start(request):
+    """Open a count session over a zone, a list of locations, or everything"""
+    try:
+        payload = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    zone = None
+    if payload.get('zone'):
+        zone = StorageZone.objects.filter(zone_id=payload['zone']).first()
+        if zone is None:
+            return JsonResponse({'error': 'Unknown storage zone'}, status=400)
+    session = start_session(
+        request.user.username, zone=zone,
+        location_ids=payload.get('locations') or None,
+        name=payload.get('name', ''),
+    )
+    return JsonResponse({'count_id': session.count_id, 'lines': session.lines.count()}, status=201)
+
+@api_auth
+@require_POST
+def count_record(request, count_id):
+    """Load scanned counts as a JSON list or a CSV body/upload (location,item,batch,quantity)"""
+    session = get_object_or_404(CountSession, count_id=count_id)
+    try:
+        if 'file' in request.FILES:
+            entries = parse_counts_csv(request.FILES['file'].read().decode('utf-8-sig'))
+        elif request.content_type == 'text/csv':
+            entries = parse_counts_csv(request.body.decode('utf-8-sig'))
+        else:
+            entries = json.loads(request.body or '{}').get('counts', [])
+            if not isinstance(entries, list):
+                return JsonResponse({'error': 'counts must be a list'}, status=400)
+        result = record_counts(session, entries, request.user.username)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result)
+
+def count_variances(request, count_id):
+    """Non-zero variances of a count session with totals"""
+    session = get_object_or_404(CountSession, count_id=count_id)
+    uncounted_as_zero = request.GET.get('uncounted_as_zero') in ('1', 'true')
+    try:
+        limit = min(int(request.GET.get('limit', 500)), 5000)
+    except ValueError:
+        limit = 500
+    lines, summary = variances(session, uncounted_as_zero)
+    return JsonResponse({
+        'count_id': session.count_id,
+        'status': session.status,
+        'summary': summary,
+        'variances': code_values(
+            lines.order_by('location_id', 'item__item_record_id')[:limit],
+            'location_id', 'batch_id', 'item_id', 'expected_quantity', 'counted_quantity', 'delta'
+        ),
+    })
+
+@api_auth
+@require_POST
+def count_post(request, count_id):
+    """Post the variances of a count session as ADJ-GAIN/ADJ-LOSS transactions"""
+    session = get_object_or_404(CountSession, count_id=count_id)
+    try:
+        payload = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    try:
+        rows = post_adjustments(
+            session, request.user.username, payload.get('adjustment_reason', ''),
+            uncounted_as_zero=bool(payload.get('uncounted_as_zero')),
+        )
+    except CountError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'count_id': session.count_id,
+        'adjustments': len(rows),
+        'transaction_ids': [row.transaction_id for row in rows],
+    })
+
+@api_auth
+def sync_pull(request):
+    """Handheld delta sync: records changed since a change-sequence number"""
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = min(int(request.GET.get('limit', PULL_LIMIT)), PULL_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+    try:
+        return JsonResponse(pull_changes(since, max(limit, 1), cursor=request.GET.get('cursor')))
+    except SyncError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+@api_auth
+@require_POST
+def sync_push(request):
+    """Handheld delta sync: apply transactions queued offline, idempotent per client UUID"""
+    try:
+        payload = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    try:
+        results = push_transactions(
+            payload.get('transactions', []),
+            device_id=request.device_token.device_id if request.device_token else str(payload.get('device_id', ''))[:50],
+            user=request.user.username,
+        )
+    except SyncError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'results': results,
+        'applied': sum(1 for result in results if result['status'] == 'applied'),
+        'conflicts': sum(1 for result in results if result['status'] == 'conflict'),
+    })
+
+def get_putaway_suggestions(request, item_id):
+    """Suggest storage locations for receiving an item"""
+    try:
+        item = ItemRecord.objects.only('item_record_id', 'category', 'hazard_class').get(item_record_id=item_id)
+    except ItemRecord.DoesNotExist:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+    
+    quantity = request.GET.get('quantity') or None
+    try:
+        locations = suggest_putaway(item, quantity=quantity)
+    except (ArithmeticError, ValueError):
+        return JsonResponse({'error': 'Invalid quantity'}, status=400)
+    
+    data = []
+    for location in locations:
+        data.append({
+            'id': location.location_id,
+            'zone_id': location.zone_id.zone_id,
+            'zone_name': location.zone_id.zone_name,
+            'name': f"{location.location_id} - {location.rack_shelf}",
+            'capacity_quantity': location.capacity_quantity,
+            'capacity_unit': location.capacity_unit,
+            'occupied_quantity': location.occupied_quantity,
+            'fill_ratio': round(location.fill_ratio, 4),
+        })
+    
+    return JsonResponse({'locations': data})
+
+
+def check_segregation(request):
+    """Check a proposed putaway or transfer against the target location's contents"""
+    item_id = request.GET.get('item_id', '')
+    location_id = request.GET.get('location_id', '')
+    try:
+        item = ItemRecord.objects.only('item_record_id', 'hazard_class').get(item_record_id=item_id)
+        location = StorageLocation.objects.only('location_id', 'zone_id').get(location_id=location_id)
+    except ItemRecord.DoesNotExist:
+        return JsonResponse({'error': 'Item not found'}, status=404)
+    except StorageLocation.DoesNotExist:
+        return JsonResponse({'error': 'Location not found'}, status=404)
+    
+    violations = check_placement(item, location)
+    return JsonResponse({'allowed': not violations, 'violations': violations})
+
+
+def get_reviews_due(request):
+    """Get the review queue for AJAX requests"""
+    within_days = _review_due_window(request)
+    
+    suppliers = [
+        {
+            'supplier_id': row['supplier_id'],
+            'supplier_name': row['supplier_name'],
+            'next_review_due': row['next_review_due'],
+            'review_state': row['review_state'],
+        }
+        for row in due_suppliers(within_days).values(
+            'supplier_id', 'supplier_name', 'next_review_due', 'review_state'
+        )
+    ]
+    supplier_products = [
+        {
+            'id': row['id'],
+            'item_code': row['item_code'],
+            'supplier_id': row['supplier_name'],
+            'next_review_due': row['next_review_due'],
+            'review_state': row['review_state'],
+        }
+        for row in code_values(
+            due_supplier_products(within_days), 'id', 'item_code', 'supplier_name', 'next_review_due', 'review_state'
+        )
+    ]
+    
+    return JsonResponse({
+        'within_days': within_days,
+        'suppliers': suppliers,
+        'supplier_products': supplier_products,
+    })
+
 # Report Views
 
 def inventory_report(request):
@@ -710,9 +1190,8 @@ def inventory_report(request):
     from django.db.models import F, Value, CharField, DecimalField
     from django.db.models.functions import Coalesce
     
-    # Get all items with their batch information
-    items = ItemRecord.objects.annotate(
-        batch_count=Count('batch'),
+    # Get all items with their batch information (batch_count is kept on the row)
+    items = ItemRecord.objects.order_by('item_record_id').annotate(
         approved_batches=Count('batch', filter=Q(batch__qa_status='Approved')),
         total_stock=Coalesce(Sum('batch__quantity_received', filter=Q(batch__qa_status='Approved')), Value(0.0, output_field=DecimalField())),
         expiring_batches=Count('batch', filter=Q(batch__expiry_date__lte=F('batch__expiry_date') + timedelta(days=30))),
@@ -728,33 +1207,50 @@ def inventory_report(request):
             Q(chemical_family__icontains=search_query)
         )
     
-    # Filter functionality
+    # Filter functionality; item and batch attributes are also kept for the bitmap index
+    unfiltered = items
+    item_criteria, batch_criteria = [], []
     category_filter = request.GET.get('category', '')
     if category_filter:
         items = items.filter(category=category_filter)
+        item_criteria.append(('category', [category_filter]))
     
     qa_status_filter = request.GET.get('qa_status', '')
     if qa_status_filter:
         items = items.filter(batch__qa_status=qa_status_filter)
+        batch_criteria.append(('qa_status', [qa_status_filter]))
     
     storage_zone_filter = request.GET.get('storage_zone', '')
     if storage_zone_filter:
         items = items.filter(batch__storage_location__zone_id=storage_zone_filter)
+        batch_criteria.append(('zone', [storage_zone_filter]))
     
     stock_level_filter = request.GET.get('stock_level', '')
-    if stock_level_filter:
-        if stock_level_filter == 'low':
-            items = items.filter(total_stock__lt=Value(10.0, output_field=DecimalField()))
-        elif stock_level_filter == 'high':
-            items = items.filter(total_stock__gt=Value(100.0, output_field=DecimalField()))
+    if stock_level_filter == LOW_STOCK:
+        items = items.filter(total_stock__lt=Value(LOW_STOCK_LEVEL, output_field=DecimalField()))
+        item_criteria.append(('stock_level', [LOW_STOCK]))
+    elif stock_level_filter == HIGH_STOCK:
+        items = items.filter(total_stock__gt=Value(HIGH_STOCK_LEVEL, output_field=DecimalField()))
+        item_criteria.append(('stock_level', [HIGH_STOCK]))
     
     # Get storage zones for filter dropdown
     storage_zones = StorageZone.objects.all()
     
     # Calculate summary statistics
-    total_items = items.count()
+    index = bitmaps.current()
+    if index is not None and not search_query:
+        # Category, QA status, zone and stock level are answered in memory, without
+        # the batch joins; only the page shown has its stock aggregated
+        matched = index.items.match(item_criteria)
+        if batch_criteria:
+            matched = matched & index.items_with_batches(index.batches.match(batch_criteria))
+        total_items = len(matched)
+        low_stock_items = len(matched & index.items.bitmap('stock_level', [LOW_STOCK]))
+        items = IndexedResults(unfiltered, index.items, matched)
+    else:
+        total_items = items.count()
+        low_stock_items = items.filter(total_stock__lt=Value(LOW_STOCK_LEVEL, output_field=DecimalField())).count()
     active_batches = Batch.objects.filter(qa_status='Approved').count()
-    low_stock_items = items.filter(total_stock__lt=Value(10.0, output_field=DecimalField())).count()
     expiring_soon = Batch.objects.filter(
         expiry_date__lte=timezone.now().date() + timedelta(days=30),
         qa_status='Approved'
@@ -871,10 +1367,106 @@ def expiry_report(request):
     
     return render(request, 'inventory/expiry_report.html', context)
 
+# Background Jobs
+
+def job_list(request):
+    """Job status page; POST queues one of the user-runnable tasks"""
+    if request.method == 'POST':
+        spec = job_queue.TASKS.get(request.POST.get('task', ''))
+        if spec is None or not spec.user_runnable:
+            messages.error(request, 'Unknown task.')
+        else:
+            params = {name: request.POST[name] for name, _, _ in spec.params if request.POST.get(name)}
+            job = job_queue.enqueue(spec.name, params, user=request.user.username)
+            messages.success(request, f'Queued job {job.id}: {spec.label}.')
+        return redirect('inventory:job_list')
+    
+    status_filter = request.GET.get('status', '')
+    jobs = Job.objects.all()
+    if status_filter:
+        jobs = jobs.filter(status=status_filter)
+    
+    context = {
+        'jobs': jobs[:100],
+        'status_filter': status_filter,
+        'statuses': Job.STATUS_CHOICES,
+        'tasks': [spec for spec in job_queue.TASKS.values() if spec.user_runnable],
+    }
+    return render(request, 'inventory/job_list.html', context)
+
+def job_status(request, job_id):
+    """Job progress for polling"""
+    job = get_object_or_404(Job, id=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'task': job.task,
+        'status': job.status,
+        'progress': job.progress,
+        'progress_message': job.progress_message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    })
+
+@require_POST
+def job_cancel(request, job_id):
+    """Cancel a queued job, or ask a running one to stop"""
+    job = get_object_or_404(Job, id=job_id)
+    if job_queue.cancel(job):
+        messages.success(request, f'Job {job.id} cancelled.')
+    else:
+        messages.error(request, f'Job {job.id} has already finished.')
+    return redirect('inventory:job_list')
+
+def job_download(request, job_id):
+    """File produced by a finished export job"""
+    job = get_object_or_404(Job, id=job_id, status=job_queue.SUCCEEDED)
+    filename = (job.result or {}).get('file')
+    if not filename:
+        raise Http404('This job produced no file')
+    path = os.path.join(job_queue.output_dir(), os.path.basename(filename))
+    if not os.path.exists(path):
+        raise Http404('The job output has been removed')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(filename))
+
 def debug_links(request):
     """Debug view to test if links are working"""
     return render(request, 'inventory/debug_links.html', {})
 
+def lookup_options(request, name):
+    """Type-ahead search over a cached master-data dropdown"""
+    if name not in DROPDOWNS:
+        return JsonResponse({'error': 'Unknown lookup'}, status=404)
+    try:
+        limit = min(int(request.GET.get('limit', TYPEAHEAD_LIMIT)), 100)
+    except ValueError:
+        limit = TYPEAHEAD_LIMIT
+    return JsonResponse({'results': search_dropdown(name, request.GET.get('q', ''), limit)})
+
+def _autocomplete(request, entity):
+    """Type-ahead over a whole entity table by code prefix or name word"""
+    try:
+        limit = min(max(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 1), MAX_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({'results': search_dropdown(AUTOCOMPLETE_ENTITIES[entity], request.GET.get('q', ''), limit)})
+
+# One conditional view per entity, so the ETag follows that entity's tables only
+AUTOCOMPLETE_VIEWS = {
+    entity: conditional_get(*DROPDOWNS[name].tables)(_autocomplete)
+    for entity, name in AUTOCOMPLETE_ENTITIES.items()
+}
+
+def autocomplete(request, entity):
+    """Per-entity type-ahead (items, batches, suppliers, customers), answered with 304 while unchanged"""
+    view = AUTOCOMPLETE_VIEWS.get(entity)
+    if view is None:
+        return JsonResponse({'error': 'Unknown entity'}, status=404)
+    return view(request, entity=entity)
+
 def get_subtype_choices(request):
     """AJAX endpoint to get subtype choices based on category"""
     category = request.GET.get('category')